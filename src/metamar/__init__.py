@@ -2,11 +2,30 @@
 Meta-Mar LLM - Enhanced meta-analysis service with AI integration
 """
 
+import importlib
+
 __version__ = "1.0.0"
 __author__ = "Your Name"
 __email__ = "your.email@example.com"
 
-from metamar.llm.report_generator import ReportGenerator
-from metamar.utils.data_loader import DataLoader
+# Public names and the submodules defining them. Submodules pull in heavy
+# dependencies (openai, anthropic, pandas), so they are imported on first
+# attribute access rather than with the package.
+_LAZY_ATTRIBUTES = {
+    'ReportGenerator': 'metamar.llm.report_generator',
+    'MetaAnalysisDataLoader': 'metamar.utils.data_loader',
+    'DataLoader': 'metamar.utils.data_loader',
+    'MetaAnalysisEngine': 'metamar.stats.engine',
+}
+
+__all__ = ['ReportGenerator', 'MetaAnalysisDataLoader', 'DataLoader', 'MetaAnalysisEngine']
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-__all__ = ['ReportGenerator', 'DataLoader']
\ No newline at end of file
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,115 @@
+"""
+Command-line interface for Meta-Mar
+
+Usage:
+    python -m metamar batch DATA_DIR_OR_MANIFEST [options]
+"""
+
+import argparse
+import json
+import logging
+import sys
+from typing import List, Optional
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='metamar', description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    batch = commands.add_parser(
+        'batch',
+        help='Validate, pool, interpret and store many datasets',
+        description='Run load → pool → interpret → store over a directory or manifest of datasets. '
+                    'Interrupted runs resume from the checkpoint in the output directory.'
+    )
+    batch.add_argument('source', help='Directory of data files, or a JSON/YAML/CSV manifest')
+    batch.add_argument('--analysis-type', choices=['continuous', 'binary', 'generic', 'correlation'],
+                       help='Analysis type (default: inferred from directory names)')
+    batch.add_argument('--structure-type', choices=['basic', 'median', 'range'],
+                       help='Structure type (default: inferred from file names)')
+    batch.add_argument('--settings', help='JSON object of meta-analysis settings')
+    batch.add_argument('--instructions', help='Custom instructions for the LLM reports')
+    batch.add_argument('--output', help='Output directory (default: <storage.results_dir>/batch)')
+    batch.add_argument('--store', help='Result store database (default: <storage.results_dir>/reports.sqlite)')
+    batch.add_argument('--no-llm', action='store_true', help='Only compute statistics')
+    batch.add_argument('--no-reuse', action='store_true', help='Regenerate reports already in the store')
+    batch.add_argument('--restart', action='store_true', help='Ignore the checkpoint and process every dataset')
+    batch.add_argument('--sensitivity', action='store_true', help='Include leave-one-out sensitivity analysis')
+    batch.add_argument('--load-workers', type=int, default=2)
+    batch.add_argument('--pool-workers', type=int)
+    batch.add_argument('--llm-workers', type=int, default=4)
+    batch.add_argument('--queue-size', type=int, default=8, help='Capacity of each queue between stages')
+    batch.add_argument('-q', '--quiet', action='store_true', help='Do not print per-dataset progress')
+    batch.add_argument('-v', '--verbose', action='store_true', help='Log stage errors as they happen')
+    return parser
+
+class _StageErrorFilter(logging.Filter):
+    """Drops errors logged on batch stage threads; the summary reports those failures"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno < logging.ERROR or not record.threadName.startswith('metamar-batch-')
+
+def _run_batch(args: argparse.Namespace) -> int:
+    from .batch import BatchRunner, discover_jobs
+    
+    jobs = discover_jobs(
+        args.source,
+        analysis_type=args.analysis_type,
+        structure_type=args.structure_type,
+        meta_settings=json.loads(args.settings) if args.settings else None,
+        custom_instructions=args.instructions
+    )
+    store = None
+    if args.store and not args.no_llm:
+        from .llm.result_store import ResultStore
+        store = ResultStore(args.store)
+    
+    workers = {'load': args.load_workers, 'interpret': args.llm_workers}
+    if args.pool_workers:
+        workers['pool'] = args.pool_workers
+    runner = BatchRunner(
+        output_dir=args.output,
+        interpret=not args.no_llm,
+        store=store,
+        run_options={'sensitivity': args.sensitivity},
+        workers=workers,
+        queue_size=args.queue_size,
+        reuse=not args.no_reuse
+    )
+    
+    def progress(record):
+        status = 'ok' if record['status'] == 'done' else f"FAILED ({record['stage']}: {record['error']})"
+        print(f"{record['path']}: {status}", flush=True)
+    
+    summary = runner.run(jobs, resume=not args.restart, progress=None if args.quiet else progress)
+    print(summary.format())
+    return 1 if summary.failed else 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of ``python -m metamar``
+    
+    Args:
+        argv: Command-line arguments; defaults to ``sys.argv[1:]``
+    
+    Returns:
+        int: Exit status
+    """
+    args = _build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(name)s: %(message)s')
+    if args.command != 'batch':
+        return 2
+    
+    # Failed datasets are listed in the summary; do not log them twice.
+    # Warnings, e.g. about convergence, still go through.
+    stage_errors = _StageErrorFilter()
+    handlers = [] if args.verbose else list(logging.getLogger().handlers)
+    for handler in handlers:
+        handler.addFilter(stage_errors)
+    try:
+        return _run_batch(args)
+    finally:
+        for handler in handlers:
+            handler.removeFilter(stage_errors)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,486 @@
+"""
+Resumable batch pipeline: load → pool → interpret → store
+
+Datasets flow through four stages connected by bounded queues, each
+stage with its own worker threads: ``MetaAnalysisDataLoader`` validation,
+pooling with ``MetaAnalysisEngine``, LLM interpretation with
+``ReportGenerator`` and persistence. Pooling is CPU-bound and holds the
+GIL, so its threads hand the work to a pool of as many processes.
+Bounded queues keep at most a few datasets in memory per stage, and slow
+LLM calls overlap with loading and pooling the next datasets. A single
+writer persists results and appends one line per finished dataset to a
+checkpoint file, so an interrupted run skips completed datasets when
+restarted.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterable, List, Optional, Union
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from .utils.arrow import IPC_SUFFIXES
+
+logger = logging.getLogger(__name__)
+
+# File types read by MetaAnalysisDataLoader
+DATA_SUFFIXES = ['.csv', '.xlsx', '.xls'] + IPC_SUFFIXES
+
+# Manifest file types; YAML also reads JSON
+MANIFEST_SUFFIXES = ['.json', '.yml', '.yaml', '.csv']
+
+# Analysis type inferred from a dataset's parent directory names
+DIRECTORY_TYPES = {
+    'continuous': 'continuous',
+    'binary': 'binary',
+    'generic': 'generic',
+    'inverse_variance': 'generic',
+    'correlation': 'correlation'
+}
+
+# Continuous structure inferred from markers in the file name
+STRUCTURE_MARKERS = {'iqr': 'median', 'median': 'median', 'range': 'range'}
+
+STAGES = ('load', 'pool', 'interpret', 'store')
+
+CHECKPOINT_FILE = 'checkpoint.jsonl'
+
+@dataclass
+class BatchJob:
+    """One dataset to analyse"""
+    path: str
+    analysis_type: str
+    structure_type: str = 'basic'
+    meta_settings: Optional[Dict[str, Any]] = None
+    custom_instructions: Optional[str] = None
+    
+    @property
+    def key(self) -> str:
+        """Checkpoint key: changes when the file or the job settings change"""
+        try:
+            stat = os.stat(self.path)
+            signature = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            signature = None
+        spec = [
+            str(Path(self.path).resolve()), signature, self.analysis_type,
+            self.structure_type, self.meta_settings, self.custom_instructions
+        ]
+        return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+@dataclass
+class _Item:
+    """A job travelling through the pipeline"""
+    job: BatchJob
+    key: str
+    data: Any = None
+    results: Optional[Dict[str, Any]] = None
+    comparison: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    stage: Optional[str] = None
+
+@dataclass
+class BatchSummary:
+    """Outcome and timing of a batch run"""
+    total: int
+    skipped: int
+    completed: int
+    failed: int
+    wall_time: float
+    stage_time: Dict[str, float] = field(default_factory=dict)
+    stage_count: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    
+    @property
+    def throughput(self) -> float:
+        """Datasets processed per second of wall time"""
+        processed = self.completed + self.failed
+        return processed / self.wall_time if self.wall_time > 0 else 0.0
+    
+    def format(self) -> str:
+        """Human-readable summary with per-stage timing"""
+        lines = [
+            f"Datasets: {self.total} ({self.completed} completed, {self.failed} failed, "
+            f"{self.skipped} already done)",
+            f"Wall time: {self.wall_time:.2f} s, throughput: {self.throughput:.2f} datasets/s",
+            f"{'Stage':<10} {'Datasets':>8} {'Total (s)':>10} {'Mean (s)':>10}"
+        ]
+        for stage in STAGES:
+            count = self.stage_count.get(stage, 0)
+            total = self.stage_time.get(stage, 0.0)
+            mean = total / count if count else 0.0
+            lines.append(f"{stage:<10} {count:>8} {total:>10.3f} {mean:>10.3f}")
+        for failure in self.errors.values():
+            lines.append(f"FAILED {failure['path']}: {failure['error']}")
+        return "\n".join(lines)
+
+def _infer_job(path: Path, analysis_type: Optional[str], structure_type: Optional[str]) -> BatchJob:
+    """Job for a data file, inferring the analysis type and structure from its path"""
+    if analysis_type is None:
+        analysis_type = next(
+            (DIRECTORY_TYPES[part] for part in reversed(path.parent.parts) if part in DIRECTORY_TYPES),
+            None
+        )
+        if analysis_type is None:
+            raise ValueError(f"Cannot infer the analysis type of {path}; pass it explicitly")
+    if structure_type is None:
+        structure_type = 'basic'
+        if analysis_type == 'continuous':
+            structure_type = next(
+                (structure for marker, structure in STRUCTURE_MARKERS.items() if marker in path.stem.lower()),
+                'basic'
+            )
+    return BatchJob(str(path), analysis_type, structure_type)
+
+def _read_manifest(path: Path) -> List[Dict[str, Any]]:
+    """Dataset entries of a JSON, YAML or CSV manifest"""
+    if path.suffix == '.csv':
+        import pandas as pd
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+        return [{k: v for k, v in row.items() if v != ''} for row in frame.to_dict('records')]
+    
+    import yaml
+    with open(path, 'r') as f:
+        entries = yaml.safe_load(f)
+    if isinstance(entries, dict):
+        entries = entries.get('datasets', [])
+    if not isinstance(entries, list):
+        raise ValueError(f"Manifest must list datasets: {path}")
+    return [{'path': entry} if isinstance(entry, str) else entry for entry in entries]
+
+def discover_jobs(
+    source: Union[str, Path],
+    analysis_type: Optional[str] = None,
+    structure_type: Optional[str] = None,
+    meta_settings: Optional[Dict[str, Any]] = None,
+    custom_instructions: Optional[str] = None
+) -> List[BatchJob]:
+    """
+    Collect the datasets of a directory or manifest
+    
+    Args:
+        source: Directory searched recursively for data files, or a
+            manifest listing datasets (``path`` plus optional
+            ``analysis_type``, ``structure_type``, ``meta_settings`` and
+            ``custom_instructions``; relative paths are resolved against
+            the manifest's directory)
+        analysis_type: Analysis type for entries that do not set one;
+            otherwise inferred from the parent directory names
+        structure_type: Structure type for entries that do not set one;
+            otherwise inferred from the file name for continuous data
+        meta_settings: Settings for entries that do not set their own
+        custom_instructions: Instructions for entries that do not set their own
+    
+    Returns:
+        List[BatchJob]: Jobs in a stable order
+    """
+    try:
+        source = Path(source)
+        if source.is_dir():
+            paths = sorted(p for p in source.rglob('*') if p.is_file() and p.suffix in DATA_SUFFIXES)
+            jobs = [_infer_job(p, analysis_type, structure_type) for p in paths]
+        elif source.suffix in MANIFEST_SUFFIXES:
+            jobs = []
+            for entry in _read_manifest(source):
+                path = Path(entry['path'])
+                if not path.is_absolute():
+                    path = source.parent / path
+                job = _infer_job(
+                    path,
+                    entry.get('analysis_type', analysis_type),
+                    entry.get('structure_type', structure_type)
+                )
+                job.meta_settings = entry.get('meta_settings')
+                job.custom_instructions = entry.get('custom_instructions')
+                jobs.append(job)
+        else:
+            raise ValueError(f"Not a directory or manifest: {source}")
+        
+        for job in jobs:
+            job.meta_settings = job.meta_settings or meta_settings
+            job.custom_instructions = job.custom_instructions or custom_instructions
+        return jobs
+    
+    except Exception as e:
+        logger.error(f"Error collecting batch datasets: {str(e)}")
+        raise
+
+def read_checkpoint(path: Union[str, Path]) -> Dict[str, Dict[str, Any]]:
+    """
+    Latest checkpoint record per job key
+    
+    A line cut short by an interruption is ignored, so that job runs again.
+    
+    Args:
+        path: Checkpoint file
+    
+    Returns:
+        Dict: Record per job key
+    """
+    records = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record['key']] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+def _meta_settings(job: BatchJob, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Job settings over the defaults, with a summary measure valid for the analysis type"""
+    from .config.meta_structures import META_SETTINGS
+    
+    settings = {**defaults, **(job.meta_settings or {})}
+    valid = META_SETTINGS['summary_measures'].get(job.analysis_type, [])
+    if valid and 'summary_measure' not in (job.meta_settings or {}) and settings.get('summary_measure') not in valid:
+        settings['summary_measure'] = valid[0]
+    return settings
+
+def _run_engine(
+    meta_settings: Dict[str, Any],
+    data,
+    analysis_type: str,
+    run_options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Pool one dataset (runs in a worker process)"""
+    from .stats.engine import MetaAnalysisEngine
+    
+    return MetaAnalysisEngine(meta_settings).run(data, analysis_type, **run_options)
+
+class BatchRunner:
+    """Runs the load → pool → interpret → store pipeline over many datasets"""
+    
+    def __init__(
+        self,
+        output_dir: Optional[Union[str, Path]] = None,
+        interpret: bool = True,
+        store=None,
+        generator=None,
+        meta_settings: Optional[Dict[str, Any]] = None,
+        run_options: Optional[Dict[str, Any]] = None,
+        workers: Optional[Dict[str, int]] = None,
+        queue_size: int = 8,
+        reuse: bool = True
+    ):
+        """
+        Initialize runner
+        
+        Args:
+            output_dir: Directory for the per-dataset results and the
+                checkpoint; defaults to ``batch`` in ``storage.results_dir``
+            interpret: Generate LLM reports; if False only statistics run
+            store: ``ResultStore`` for the reports; defaults to the store
+                in ``storage.results_dir``
+            generator: ``ReportGenerator`` to use; created on first use
+            meta_settings: Default meta-analysis settings; defaults to the
+                current settings snapshot
+            run_options: Passed to ``MetaAnalysisEngine.run``
+            workers: Workers per stage (the store stage always has one);
+                with more than one pooling worker, pooling runs in that
+                many processes
+            queue_size: Capacity of each queue between stages
+            reuse: Reuse stored reports for identical requests
+        """
+        from .config.settings import get_settings
+        
+        settings = get_settings()
+        self.output_dir = Path(output_dir) if output_dir else Path(settings.storage_config.results_dir) / 'batch'
+        self.interpret = interpret
+        self.store = store
+        self.generator = generator
+        self.meta_settings = dict(meta_settings or settings.meta_settings)
+        self.run_options = run_options or {}
+        self.workers = {'load': 2, 'pool': os.cpu_count() or 1, 'interpret': 4, **(workers or {}), 'store': 1}
+        self.queue_size = queue_size
+        self.reuse = reuse
+        self._loader = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def checkpoint_path(self) -> Path:
+        return self.output_dir / CHECKPOINT_FILE
+    
+    def _load(self, item: _Item):
+        from .utils.data_loader import MetaAnalysisDataLoader
+        
+        if self._loader is None:
+            self._loader = MetaAnalysisDataLoader()
+        item.data = self._loader.load_data(item.job.path, item.job.analysis_type, item.job.structure_type)
+    
+    def _pool(self, item: _Item):
+        args = (_meta_settings(item.job, self.meta_settings), item.data, item.job.analysis_type, self.run_options)
+        if self._processes is None:
+            item.results = _run_engine(*args)
+        else:
+            item.results = self._processes.submit(_run_engine, *args).result()
+        item.data = None
+    
+    def _interpret(self, item: _Item):
+        if not self.interpret:
+            return
+        item.comparison = self.generator.generate_comparative_report(
+            item.results,
+            item.job.analysis_type,
+            _meta_settings(item.job, self.meta_settings),
+            item.job.custom_instructions,
+            reuse=self.reuse
+        )
+    
+    def _record(self, checkpoint, item: _Item) -> Dict[str, Any]:
+        """Persist one finished job: results file, then its checkpoint line"""
+        record = {'key': item.key, 'path': item.job.path, 'time': time.time()}
+        if item.error is None:
+            output = self.output_dir / f"{Path(item.job.path).stem}-{item.key[:12]}.json"
+            payload = {
+                'path': item.job.path,
+                'analysis_type': item.job.analysis_type,
+                'structure_type': item.job.structure_type,
+                'results': item.results,
+                'comparison_id': (item.comparison or {}).get('id')
+            }
+            with open(output, 'w') as f:
+                json.dump(payload, f, indent=2, default=str)
+            record.update(status='done', output=str(output), comparison_id=payload['comparison_id'])
+        else:
+            record.update(status='failed', stage=item.stage, error=item.error)
+        checkpoint.write(json.dumps(record) + "\n")
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+        return record
+    
+    def run(
+        self,
+        jobs: Iterable[BatchJob],
+        resume: bool = True,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> BatchSummary:
+        """
+        Run the pipeline
+        
+        Args:
+            jobs: Datasets to process
+            resume: Skip datasets the checkpoint records as done; failed
+                datasets are always retried
+            progress: Called with each checkpoint record after it is written
+        
+        Returns:
+            BatchSummary: Counts, errors and per-stage timing
+        """
+        start = time.perf_counter()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        done = read_checkpoint(self.checkpoint_path) if resume else {}
+        items = [_Item(job, job.key) for job in jobs]
+        pending = [item for item in items if done.get(item.key, {}).get('status') != 'done']
+        
+        if self.interpret and pending and self.generator is None:
+            from .llm.report_generator import ReportGenerator
+            from .llm.result_store import ResultStore
+            self.store = self.store if self.store is not None else ResultStore()
+            self.generator = ReportGenerator(store=self.store)
+        
+        stage_time = {stage: 0.0 for stage in STAGES}
+        stage_count = {stage: 0 for stage in STAGES}
+        # Keyed by job, so manifest entries sharing a file count separately
+        errors: Dict[str, Dict[str, str]] = {}
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGES]
+        
+        if self.workers['pool'] > 1 and pending:
+            # Spawned, not forked: the pipeline's threads may hold locks
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.workers['pool'], mp_context=multiprocessing.get_context('spawn')
+            )
+        
+        mode = 'a' if resume else 'w'
+        try:
+            with open(self.checkpoint_path, mode) as checkpoint:
+                if resume and checkpoint.tell() > 0:
+                    # Start a fresh line after a record cut short by an interruption
+                    with open(self.checkpoint_path, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n":
+                            checkpoint.write("\n")
+                def record(item: _Item):
+                    entry = self._record(checkpoint, item)
+                    # Results are on disk now; do not keep them for the whole run
+                    item.results = item.comparison = None
+                    if item.error is not None:
+                        errors[item.key] = {'path': item.job.path, 'stage': item.stage, 'error': item.error}
+                    if progress is not None:
+                        progress(entry)
+                
+                steps = {'load': self._load, 'pool': self._pool, 'interpret': self._interpret, 'store': record}
+                
+                def worker(index: int):
+                    stage = STAGES[index]
+                    inbox = queues[index]
+                    outbox = queues[index + 1] if index + 1 < len(STAGES) else None
+                    while True:
+                        item = inbox.get()
+                        if item is None:
+                            break
+                        if item.error is None or stage == 'store':
+                            began = time.perf_counter()
+                            try:
+                                steps[stage](item)
+                            except Exception as e:
+                                item.error = str(e) or type(e).__name__
+                                item.stage = stage
+                                logger.error(f"Error in batch stage {stage} for {item.job.path}: {item.error}")
+                                if stage == 'store':
+                                    errors[item.key] = {'path': item.job.path, 'stage': item.stage, 'error': item.error}
+                            elapsed = time.perf_counter() - began
+                            with self._lock:
+                                stage_time[stage] += elapsed
+                                stage_count[stage] += 1
+                        if outbox is not None:
+                            outbox.put(item)
+                
+                threads = [
+                    [
+                        threading.Thread(target=worker, args=(index,), name=f"metamar-batch-{stage}-{i}", daemon=True)
+                        for i in range(self.workers[stage])
+                    ]
+                    for index, stage in enumerate(STAGES)
+                ]
+                for stage_threads in threads:
+                    for thread in stage_threads:
+                        thread.start()
+                
+                for item in pending:
+                    queues[0].put(item)
+                # Close each stage once the previous one has drained into it
+                for index, stage_threads in enumerate(threads):
+                    for _ in stage_threads:
+                        queues[index].put(None)
+                    for thread in stage_threads:
+                        thread.join()
+        finally:
+            if self._processes is not None:
+                self._processes.shutdown()
+                self._processes = None
+        
+        failed = len(errors)
+        summary = BatchSummary(
+            total=len(items),
+            skipped=len(items) - len(pending),
+            completed=len(pending) - failed,
+            failed=failed,
+            wall_time=time.perf_counter() - start,
+            stage_time=stage_time,
+            stage_count=stage_count,
+            errors=errors
+        )
+        logger.info(f"Batch finished: {summary.completed} completed, {summary.failed} failed")
+        return summary
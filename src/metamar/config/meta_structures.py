@@ -34,7 +34,7 @@ class MetaStructures:
     CONTINUOUS_MEDIAN = MetaAnalysisStructure(
         required_columns=['studlab', 'n.e', 'median.e', 'q1.e', 'q3.e', 
                          'n.c', 'median.c', 'q1.c', 'q3.c'],
-        optional_columns=['subgroup', 'year', 'age'],
+        optional_columns=['subgroup', 'year', 'age', 'min.e', 'max.e', 'min.c', 'max.c'],
         data_types={
             'n.e': 'numeric', 'median.e': 'numeric', 
             'q1.e': 'numeric', 'q3.e': 'numeric',
@@ -51,6 +51,26 @@ class MetaStructures:
         }
     )
     
+    CONTINUOUS_RANGE = MetaAnalysisStructure(
+        required_columns=['studlab', 'n.e', 'median.e', 'min.e', 'max.e',
+                         'n.c', 'median.c', 'min.c', 'max.c'],
+        optional_columns=['subgroup', 'year', 'age', 'q1.e', 'q3.e', 'q1.c', 'q3.c'],
+        data_types={
+            'n.e': 'numeric', 'median.e': 'numeric',
+            'min.e': 'numeric', 'max.e': 'numeric',
+            'n.c': 'numeric', 'median.c': 'numeric',
+            'min.c': 'numeric', 'max.c': 'numeric'
+        },
+        validations={
+            'n.e': lambda x: x > 0,
+            'n.c': lambda x: x > 0,
+            'min.e': lambda x, row: x <= row['median.e'],
+            'max.e': lambda x, row: x >= row['median.e'],
+            'min.c': lambda x, row: x <= row['median.c'],
+            'max.c': lambda x, row: x >= row['median.c']
+        }
+    )
+    
     BINARY = MetaAnalysisStructure(
         required_columns=['studlab', 'event.e', 'n.e', 'event.c', 'n.c'],
         optional_columns=['subgroup', 'cluster', 'rho'],
@@ -5,13 +5,16 @@ Configuration management for Meta-Mar LLM
 import yaml
 import os
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import logging
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, asdict, field, replace
+from functools import cached_property, lru_cache
+from itertools import count
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(frozen=True)
 class LLMConfig:
     """LLM configuration settings"""
     model: str
@@ -19,15 +22,16 @@ class LLMConfig:
     max_tokens: int
     timeout: int
 
-@dataclass
+@dataclass(frozen=True)
 class APIConfig:
     """API configuration settings"""
     retry_attempts: int
     retry_delay: int
     batch_size: int
     rate_limit: int
+    prefetch_share: float
 
-@dataclass
+@dataclass(frozen=True)
 class MetaAnalysisConfig:
     """Meta-analysis configuration settings"""
     visualization_style: str
@@ -40,13 +44,87 @@ class MetaAnalysisConfig:
     tau2_ci_method: str
     publication_bias_method: str
 
-@dataclass
+@dataclass(frozen=True)
 class ShinyConfig:
     """Shiny app configuration settings"""
     port: int
     host: str
     max_upload_size: int
 
+@dataclass(frozen=True)
+class StorageConfig:
+    """Storage configuration settings"""
+    results_dir: str
+    cache_dir: str
+    max_cache_size: int
+
+_snapshot_versions = count(1)
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """
+    Immutable, hashable view of the configuration at one point in time
+    
+    Requests hold on to the snapshot they started with, so a hot reload
+    never changes settings underneath an in-flight report. The version
+    number only identifies the load and takes no part in equality.
+    """
+    gpt4: LLMConfig
+    claude: LLMConfig
+    api: APIConfig
+    meta: MetaAnalysisConfig
+    shiny: ShinyConfig
+    storage: StorageConfig
+    version: int = field(default_factory=lambda: next(_snapshot_versions), compare=False)
+    
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'SettingsSnapshot':
+        """Build a snapshot from the parsed YAML configuration"""
+        return cls(
+            gpt4=LLMConfig(**{k: config['llm']['gpt4'][k] for k in LLMConfig.__dataclass_fields__}),
+            claude=LLMConfig(**{k: config['llm']['claude'][k] for k in LLMConfig.__dataclass_fields__}),
+            api=APIConfig(**{k: config['api'][k] for k in APIConfig.__dataclass_fields__}),
+            meta=MetaAnalysisConfig(**{
+                k: config['meta_analysis'][k] for k in MetaAnalysisConfig.__dataclass_fields__
+            }),
+            shiny=ShinyConfig(**{k: config['shiny'][k] for k in ShinyConfig.__dataclass_fields__}),
+            storage=StorageConfig(**{k: config['storage'][k] for k in StorageConfig.__dataclass_fields__})
+        )
+    
+    def with_meta_settings(self, meta_settings: Dict[str, Any]) -> 'SettingsSnapshot':
+        """Return a snapshot with meta-analysis settings overridden"""
+        overrides = {
+            k: v for k, v in meta_settings.items()
+            if k in MetaAnalysisConfig.__dataclass_fields__
+        }
+        if not overrides:
+            return self
+        return replace(self, meta=replace(self.meta, **overrides), version=self.version)
+    
+    @cached_property
+    def llm_settings(self) -> Dict[str, Any]:
+        """LLM-specific settings, built once per snapshot (treat as read-only)"""
+        return {
+            'gpt4': asdict(self.gpt4),
+            'claude': asdict(self.claude)
+        }
+    
+    @cached_property
+    def meta_settings(self) -> Dict[str, Any]:
+        """Meta-analysis settings, built once per snapshot (treat as read-only)"""
+        return asdict(self.meta)
+    
+    def validation_error(self, analysis_type: str) -> Optional[str]:
+        """Return why the meta settings are invalid for analysis_type, or None"""
+        return _validation_error(self.meta, analysis_type)
+    
+    def validate_meta_settings(self, analysis_type: str) -> bool:
+        """Check meta-analysis settings for analysis_type (memoized)"""
+        error = self.validation_error(analysis_type)
+        if error:
+            logger.error(f"Meta-analysis settings validation error: {error}")
+        return error is None
+
 class Settings:
     """Configuration manager for Meta-Mar LLM"""
     
@@ -95,77 +173,100 @@ class Settings:
         Args:
             config_dir: Optional custom config directory path
         """
-        self.config_dir = Path(config_dir) if config_dir else Path(__file__).parents[3] / 'config'
+        self.config_dir = Path(config_dir) if config_dir else _default_config_dir()
         self.env = os.getenv('METAMAR_ENV', 'development')
+        self._reload_lock = threading.Lock()
         self._load_config()
+    
+    @property
+    def config_paths(self) -> Tuple[Path, Path]:
+        """Paths of the general and logging configuration files in use"""
+        config_path = self.config_dir / f'config.{self.env}.yml'
+        if not config_path.exists():
+            config_path = self.config_dir / 'config.yml'
+        return config_path, self.config_dir / 'logging.yml'
         
     def _load_config(self):
         """Load configuration from YAML files"""
         try:
-            # Load general configuration
-            config_path = self.config_dir / f'config.{self.env}.yml'
-            if not config_path.exists():
-                config_path = self.config_dir / 'config.yml'
-            
-            with open(config_path, 'r') as f:
-                self.config = yaml.safe_load(f)
-            
-            # Load logging configuration
-            log_path = self.config_dir / 'logging.yml'
-            with open(log_path, 'r') as f:
-                self.logging_config = yaml.safe_load(f)
-                
-            # Initialize configuration objects
-            self._initialize_configs()
+            config, logging_config, snapshot = self._read_config()
+            self.config = config
+            self.logging_config = logging_config
+            self.snapshot = snapshot
             
         except Exception as e:
             logger.error(f"Error loading configuration: {str(e)}")
             raise
     
-    def _initialize_configs(self):
-        """Initialize configuration dataclass objects"""
-        # LLM Configurations
-        self.gpt4_config = LLMConfig(
-            model=self.config['llm']['gpt4']['model'],
-            temperature=self.config['llm']['gpt4']['temperature'],
-            max_tokens=self.config['llm']['gpt4']['max_tokens'],
-            timeout=self.config['llm']['gpt4']['timeout']
-        )
+    def _read_config(self) -> Tuple[Dict[str, Any], Dict[str, Any], SettingsSnapshot]:
+        """Read the YAML files and build a snapshot without installing it"""
+        config_path, log_path = self.config_paths
         
-        self.claude_config = LLMConfig(
-            model=self.config['llm']['claude']['model'],
-            temperature=self.config['llm']['claude']['temperature'],
-            max_tokens=self.config['llm']['claude']['max_tokens'],
-            timeout=self.config['llm']['claude']['timeout']
-        )
+        # Load general configuration
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f)
         
-        # API Configuration
-        self.api_config = APIConfig(
-            retry_attempts=self.config['api']['retry_attempts'],
-            retry_delay=self.config['api']['retry_delay'],
-            batch_size=self.config['api']['batch_size'],
-            rate_limit=self.config['api']['rate_limit']
-        )
+        # Load logging configuration
+        with open(log_path, 'r') as f:
+            logging_config = yaml.safe_load(f)
         
-        # Meta-analysis Configuration
-        self.meta_config = MetaAnalysisConfig(
-            visualization_style=self.config['meta_analysis']['visualization_style'],
-            summary_measure=self.config['meta_analysis']['summary_measure'],
-            pooling_method=self.config['meta_analysis']['pooling_method'],
-            tau2_estimator=self.config['meta_analysis']['tau2_estimator'],
-            ci_method=self.config['meta_analysis']['ci_method'],
-            hartung_knapp_adjustment=self.config['meta_analysis']['hartung_knapp_adjustment'],
-            prediction_interval_method=self.config['meta_analysis']['prediction_interval_method'],
-            tau2_ci_method=self.config['meta_analysis']['tau2_ci_method'],
-            publication_bias_method=self.config['meta_analysis']['publication_bias_method']
-        )
+        return config, logging_config, SettingsSnapshot.from_config(config)
+    
+    def reload(self) -> bool:
+        """
+        Re-read the configuration and atomically swap in a new snapshot
         
-        # Shiny Configuration
-        self.shiny_config = ShinyConfig(
-            port=self.config['shiny']['port'],
-            host=self.config['shiny']['host'],
-            max_upload_size=self.config['shiny']['max_upload_size']
-        )
+        The new snapshot replaces the current one only if it loads and its
+        meta-analysis settings are valid for at least one analysis type;
+        otherwise the current snapshot stays in place.
+        
+        Returns:
+            bool: True if a new snapshot was installed
+        """
+        with self._reload_lock:
+            try:
+                config, logging_config, snapshot = self._read_config()
+            except Exception as e:
+                logger.error(f"Error reloading configuration, keeping current settings: {str(e)}")
+                return False
+            
+            errors = [
+                snapshot.validation_error(analysis_type)
+                for analysis_type in self.VALID_SETTINGS['summary_measures']
+            ]
+            if all(errors):
+                logger.error(f"Rejected configuration reload: {errors[0]}")
+                return False
+            
+            self.config = config
+            self.logging_config = logging_config
+            self.snapshot = snapshot
+            logger.info(f"Loaded configuration snapshot {snapshot.version}")
+            return True
+    
+    @property
+    def gpt4_config(self) -> LLMConfig:
+        return self.snapshot.gpt4
+    
+    @property
+    def claude_config(self) -> LLMConfig:
+        return self.snapshot.claude
+    
+    @property
+    def api_config(self) -> APIConfig:
+        return self.snapshot.api
+    
+    @property
+    def meta_config(self) -> MetaAnalysisConfig:
+        return self.snapshot.meta
+    
+    @property
+    def shiny_config(self) -> ShinyConfig:
+        return self.snapshot.shiny
+    
+    @property
+    def storage_config(self) -> StorageConfig:
+        return self.snapshot.storage
     
     def validate_meta_settings(self, analysis_type: str) -> bool:
         """
@@ -177,75 +278,17 @@ class Settings:
         Returns:
             bool: True if settings are valid
         """
-        try:
-            # Check visualization style
-            if self.meta_config.visualization_style not in self.VALID_SETTINGS['visualization_styles']:
-                raise ValueError(f"Invalid visualization style: {self.meta_config.visualization_style}")
-            
-            # Check summary measure
-            valid_measures = self.VALID_SETTINGS['summary_measures'][analysis_type]
-            if self.meta_config.summary_measure not in valid_measures:
-                raise ValueError(f"Invalid summary measure for {analysis_type}: {self.meta_config.summary_measure}")
-            
-            # Check pooling method
-            if analysis_type == 'binary':
-                valid_methods = self.VALID_SETTINGS['pooling_methods']['fixed_effect']['binary']
-            elif analysis_type == 'continuous':
-                valid_methods = self.VALID_SETTINGS['pooling_methods']['fixed_effect']['continuous']
-            else:
-                valid_methods = ['Inverse']
-                
-            if self.meta_config.pooling_method not in valid_methods:
-                raise ValueError(f"Invalid pooling method for {analysis_type}: {self.meta_config.pooling_method}")
-            
-            # Check other settings
-            if self.meta_config.tau2_estimator not in self.VALID_SETTINGS['tau2_estimators']:
-                raise ValueError(f"Invalid τ² estimator: {self.meta_config.tau2_estimator}")
-                
-            if self.meta_config.ci_method not in self.VALID_SETTINGS['ci_methods']['random_effects']:
-                raise ValueError(f"Invalid CI method: {self.meta_config.ci_method}")
-                
-            if self.meta_config.hartung_knapp_adjustment not in self.VALID_SETTINGS['ci_methods']['hartung_knapp_adjustments']:
-                raise ValueError(f"Invalid Hartung-Knapp adjustment: {self.meta_config.hartung_knapp_adjustment}")
-                
-            return True
-            
-        except Exception as e:
-            logger.error(f"Meta-analysis settings validation error: {str(e)}")
-            return False
+        return self.snapshot.validate_meta_settings(analysis_type)
     
     @property
     def llm_settings(self) -> Dict[str, Any]:
         """Get LLM-specific settings"""
-        return {
-            'gpt4': {
-                'model': self.gpt4_config.model,
-                'temperature': self.gpt4_config.temperature,
-                'max_tokens': self.gpt4_config.max_tokens,
-                'timeout': self.gpt4_config.timeout
-            },
-            'claude': {
-                'model': self.claude_config.model,
-                'temperature': self.claude_config.temperature,
-                'max_tokens': self.claude_config.max_tokens,
-                'timeout': self.claude_config.timeout
-            }
-        }
+        return self.snapshot.llm_settings
     
     @property
     def meta_settings(self) -> Dict[str, Any]:
         """Get meta-analysis settings"""
-        return {
-            'visualization_style': self.meta_config.visualization_style,
-            'summary_measure': self.meta_config.summary_measure,
-            'pooling_method': self.meta_config.pooling_method,
-            'tau2_estimator': self.meta_config.tau2_estimator,
-            'ci_method': self.meta_config.ci_method,
-            'hartung_knapp_adjustment': self.meta_config.hartung_knapp_adjustment,
-            'prediction_interval_method': self.meta_config.prediction_interval_method,
-            'tau2_ci_method': self.meta_config.tau2_ci_method,
-            'publication_bias_method': self.meta_config.publication_bias_method
-        }
+        return self.snapshot.meta_settings
     
     def get_valid_settings(self, analysis_type: str) -> Dict[str, List[str]]:
         """Get valid settings for analysis type"""
@@ -265,11 +308,147 @@ class Settings:
             'publication_bias_methods': self.VALID_SETTINGS['publication_bias_methods']
         }
 
-# Create singleton instance
-settings = Settings()
+def _frozen(value):
+    """Convert nested lists of valid settings into frozensets"""
+    if isinstance(value, dict):
+        return {k: _frozen(v) for k, v in value.items()}
+    return frozenset(value)
+
+_VALID_SETS = _frozen(Settings.VALID_SETTINGS)
+
+@lru_cache(maxsize=256)
+def _validation_error(meta: MetaAnalysisConfig, analysis_type: str) -> Optional[str]:
+    """Validate a meta-analysis configuration, memoized per (config, analysis_type)"""
+    if meta.visualization_style not in _VALID_SETS['visualization_styles']:
+        return f"Invalid visualization style: {meta.visualization_style}"
+    
+    valid_measures = _VALID_SETS['summary_measures'].get(analysis_type)
+    if valid_measures is None:
+        return f"Unknown analysis type: {analysis_type}"
+    if meta.summary_measure not in valid_measures:
+        return f"Invalid summary measure for {analysis_type}: {meta.summary_measure}"
+    
+    valid_methods = _VALID_SETS['pooling_methods']['fixed_effect'].get(
+        analysis_type, frozenset(['Inverse'])
+    )
+    if meta.pooling_method not in valid_methods:
+        return f"Invalid pooling method for {analysis_type}: {meta.pooling_method}"
+    
+    if meta.tau2_estimator not in _VALID_SETS['tau2_estimators']:
+        return f"Invalid τ² estimator: {meta.tau2_estimator}"
+    
+    if meta.ci_method not in _VALID_SETS['ci_methods']['random_effects']:
+        return f"Invalid CI method: {meta.ci_method}"
+    
+    if meta.hartung_knapp_adjustment not in _VALID_SETS['ci_methods']['hartung_knapp_adjustments']:
+        return f"Invalid Hartung-Knapp adjustment: {meta.hartung_knapp_adjustment}"
+    
+    return None
+
+class ConfigWatcher:
+    """
+    Polls the configuration files and hot-reloads settings on change
+    
+    Long-running report workers keep serving with the current snapshot
+    while a new one is validated; it is swapped in only if valid.
+    """
+    
+    def __init__(self, settings: Optional[Settings] = None, interval: float = 2.0):
+        """
+        Initialize watcher
+        
+        Args:
+            settings: Settings instance to reload (defaults to the shared one)
+            interval: Polling interval in seconds
+        """
+        self.settings = settings or get_settings()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._signature = self._current_signature()
+    
+    def _current_signature(self) -> Tuple:
+        """File identity used to detect changes (path, mtime, size)"""
+        signature = []
+        for path in self.settings.config_paths:
+            try:
+                stat = path.stat()
+                signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((str(path), None, None))
+        return tuple(signature)
+    
+    def check(self) -> bool:
+        """
+        Reload settings if the configuration files changed
+        
+        Returns:
+            bool: True if a new snapshot was installed
+        """
+        signature = self._current_signature()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        return self.settings.reload()
+    
+    def start(self) -> 'ConfigWatcher':
+        """Start polling in a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='metamar-config-watcher', daemon=True
+            )
+            self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop polling"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error watching configuration: {str(e)}")
+
+def _default_config_dir() -> Path:
+    """Resolve the configuration directory
+    
+    ``METAMAR_CONFIG_DIR`` takes precedence; otherwise the ``config``
+    directory of the source checkout is used.
+    """
+    env_dir = os.getenv('METAMAR_CONFIG_DIR')
+    if env_dir:
+        return Path(env_dir)
+    return Path(__file__).resolve().parents[3] / 'config'
+
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+
+def get_settings() -> Settings:
+    """Return the shared Settings instance, loading it on first use"""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = Settings()
+    return _settings
+
+def __getattr__(name):
+    # ``settings`` used to be created at import time; keep the name
+    # available but defer reading the YAML files until it is requested.
+    if name == 'settings':
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Usage example
 if __name__ == "__main__":
+    settings = get_settings()
+    
     # Print current meta-analysis settings
     print("Meta-Analysis Settings:", settings.meta_settings)
     
@@ -2,8 +2,25 @@
 LLM integration module for Meta-Mar
 """
 
-from .gpt4_handler import GPT4Handler
-from .claude_handler import ClaudeHandler
-from .report_generator import ReportGenerator
+import importlib
 
-__all__ = ['GPT4Handler', 'ClaudeHandler', 'ReportGenerator']
\ No newline at end of file
+_LAZY_ATTRIBUTES = {
+    'GPT4Handler': '.gpt4_handler',
+    'ClaudeHandler': '.claude_handler',
+    'ReportGenerator': '.report_generator',
+    'ResultStore': '.result_store',
+    'ModelRouter': '.router',
+    'ReportPrefetcher': '.prefetch',
+}
+
+__all__ = ['GPT4Handler', 'ClaudeHandler', 'ReportGenerator', 'ResultStore', 'ModelRouter', 'ReportPrefetcher']
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,129 @@
+"""
+Packing several analyses into one LLM request
+
+Subgroup and multi-outcome reports need one interpretation per analysis,
+and one request per analysis repeats the whole instruction block each
+time. These helpers pack related analyses into as few prompts as a token
+budget allows, ask for one delimited report per analysis and split the
+response back into individual reports. Analyses are referred to by short
+generated ids, so labels with arbitrary characters cannot break the
+delimiters.
+"""
+
+from typing import Dict, Any, List, Optional
+import json
+import re
+
+from .router import CHARS_PER_TOKEN
+
+BEGIN_MARKER = "=== BEGIN REPORT {id} ==="
+END_MARKER = "=== END REPORT {id} ==="
+
+_REPORT_PATTERN = re.compile(
+    r"^=== BEGIN REPORT (?P<id>[A-Za-z0-9_-]+) ===[ \t]*\n(?P<body>.*?)\n=== END REPORT (?P=id) ===[ \t]*$",
+    re.DOTALL | re.MULTILINE
+)
+
+def estimate_tokens(value) -> int:
+    """Rough prompt token count of a string or JSON-serializable value"""
+    text = value if isinstance(value, str) else json.dumps(value, indent=2, default=str)
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def analysis_ids(labels: List[str]) -> Dict[str, str]:
+    """
+    Delimiter-safe id per analysis label
+    
+    Args:
+        labels: Analysis labels in prompt order
+    
+    Returns:
+        Dict: Label per id (``A1``, ``A2``, ...)
+    """
+    return {f"A{i + 1}": label for i, label in enumerate(labels)}
+
+def batch_instructions(ids: List[str]) -> str:
+    """Output format appended to the instruction block of a batched request"""
+    example = "\n".join([BEGIN_MARKER.format(id=ids[0]), "...", END_MARKER.format(id=ids[0])])
+    return (
+        f"The input contains {len(ids)} separate analyses ({', '.join(ids)}). "
+        "Write one complete, self-contained report per analysis following the "
+        "structure above, each between its own markers on separate lines:\n"
+        f"{example}\n"
+        "Use the exact analysis ids, keep the analyses in input order and write "
+        "nothing outside the markers."
+    )
+
+def batch_payload(analyses: Dict[str, Dict[str, Any]], labels: Dict[str, str]) -> str:
+    """
+    Delimited results of several analyses
+    
+    Args:
+        analyses: Results per analysis id
+        labels: Label per analysis id
+    
+    Returns:
+        str: One block per analysis
+    """
+    return "\n\n".join(
+        f"=== ANALYSIS {analysis_id}: {labels[analysis_id]} ===\n{json.dumps(results, indent=2, default=str)}"
+        for analysis_id, results in analyses.items()
+    )
+
+def pack_analyses(
+    analyses: Dict[str, Dict[str, Any]],
+    token_budget: int,
+    max_size: int,
+    max_output_tokens: Optional[int] = None,
+    report_tokens: Optional[int] = None
+) -> List[List[str]]:
+    """
+    Group analyses into requests that fit a prompt token budget
+    
+    Analyses are packed greedily in order; an analysis larger than the
+    budget on its own gets a request of its own.
+    
+    Args:
+        analyses: Results per analysis label
+        token_budget: Prompt tokens available for results per request
+        max_size: Maximum number of analyses per request
+        max_output_tokens: Completion limit of the model; with
+            report_tokens, caps a request at the reports that fit it
+        report_tokens: Output tokens allowed per report
+    
+    Returns:
+        List[List[str]]: Analysis labels per request
+    """
+    if max_output_tokens and report_tokens:
+        max_size = max(min(max_size, max_output_tokens // report_tokens), 1)
+    groups: List[List[str]] = []
+    used = 0
+    for label, results in analyses.items():
+        tokens = estimate_tokens(results) + estimate_tokens(label) + 8
+        if groups and len(groups[-1]) < max_size and used + tokens <= token_budget:
+            groups[-1].append(label)
+            used += tokens
+        else:
+            groups.append([label])
+            used = tokens
+    return groups
+
+def parse_batch_output(text: str, ids: List[str]) -> Dict[str, str]:
+    """
+    Split a batched response into reports
+    
+    Args:
+        text: Response text
+        ids: Analysis ids of the request
+    
+    Returns:
+        Dict: Report per analysis id that was delimited exactly once and
+            is not empty; missing ids failed to parse
+    """
+    found: Dict[str, List[str]] = {}
+    for match in _REPORT_PATTERN.finditer(text or ''):
+        found.setdefault(match.group('id'), []).append(match.group('body').strip())
+    return {
+        analysis_id: bodies[0]
+        for analysis_id, bodies in found.items()
+        if analysis_id in ids and len(bodies) == 1 and bodies[0]
+    }
@@ -4,7 +4,9 @@ Enhanced Claude integration handler for Meta-Mar
 
 from anthropic import Anthropic
 from typing import Dict, Any, Optional
-from ..config.settings import settings
+from ..config.settings import get_settings
+from .batching import batch_instructions, batch_payload
+from .router import TruncatedReportError
 import logging
 import json
 
@@ -13,17 +15,29 @@ logger = logging.getLogger(__name__)
 class ClaudeHandler:
     """Handles interactions with Claude API"""
     
+    # Bump whenever the prompt template changes, so stored reports can be
+    # told apart from reports generated with the new prompt
+    PROMPT_VERSION = 1
+    # Batched prompts (shared instructions plus delimited reports) are
+    # versioned apart from single-report prompts, from 1001 up
+    BATCH_PROMPT_VERSION = 1001
+    
     def __init__(self):
         """Initialize Claude handler with settings"""
         self.client = Anthropic()
-        self.settings = settings.llm_settings['claude']
+    
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Current Claude settings from the active settings snapshot"""
+        return get_settings().llm_settings['claude']
     
     def generate_report(
         self,
         meta_analysis_results: Dict[str, Any],
         analysis_type: str,
         meta_settings: Dict[str, Any],
-        custom_instructions: Optional[str] = None
+        custom_instructions: Optional[str] = None,
+        llm_settings: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Generate meta-analysis report using Claude
@@ -33,11 +47,15 @@ class ClaudeHandler:
             analysis_type: Type of meta-analysis ('continuous', 'binary', 'generic', 'correlation')
             meta_settings: Meta-analysis settings used
             custom_instructions: Optional additional instructions
+            llm_settings: Optional model settings pinned by the caller;
+                defaults to the current settings snapshot
             
         Returns:
             str: Generated report text
         """
         try:
+            llm_settings = llm_settings or self.settings
+            
             prompt = self._create_prompt(
                 meta_analysis_results,
                 analysis_type,
@@ -45,18 +63,61 @@ class ClaudeHandler:
                 custom_instructions
             )
             
-            message = self.client.messages.create(
-                model=self.settings['model'],
-                max_tokens=self.settings['max_tokens'],
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            return message.content[0].text
+            return self._complete(prompt, llm_settings)
             
         except Exception as e:
             logger.error(f"Error generating Claude report: {str(e)}")
             raise
     
+    def generate_batch_report(
+        self,
+        analyses: Dict[str, Dict[str, Any]],
+        labels: Dict[str, str],
+        analysis_type: str,
+        meta_settings: Dict[str, Any],
+        custom_instructions: Optional[str] = None,
+        llm_settings: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Generate reports for several analyses in one request
+        
+        Args:
+            analyses: Results per analysis id
+            labels: Label per analysis id
+            analysis_type: Type of meta-analysis
+            meta_settings: Meta-analysis settings used
+            custom_instructions: Optional additional instructions
+            llm_settings: Optional model settings pinned by the caller
+            
+        Returns:
+            str: Response with one delimited report per analysis id
+        """
+        try:
+            llm_settings = llm_settings or self.settings
+            prompt = (
+                f"{self._instructions(analysis_type, meta_settings)}\n\n"
+                f"{batch_instructions(list(analyses))}\n\n"
+                f"Results for Analysis:\n{batch_payload(analyses, labels)}"
+            )
+            if custom_instructions:
+                prompt += f"\n\nAdditional Analysis Instructions:\n{custom_instructions}"
+            return self._complete(prompt, llm_settings)
+            
+        except Exception as e:
+            logger.error(f"Error generating batched Claude report: {str(e)}")
+            raise
+    
+    def _complete(self, prompt: str, llm_settings: Dict[str, Any]) -> str:
+        """Send a message request and return the text; raises if it was cut off"""
+        message = self.client.messages.create(
+            model=llm_settings['model'],
+            max_tokens=llm_settings['max_tokens'],
+            messages=[{"role": "user", "content": prompt}]
+        )
+        if message.stop_reason == 'max_tokens':
+            raise TruncatedReportError('claude', llm_settings['max_tokens'])
+        return message.content[0].text
+    
     def _create_prompt(
         self,
         results: Dict[str, Any],
@@ -65,6 +126,18 @@ class ClaudeHandler:
         custom_instructions: Optional[str]
     ) -> str:
         """Create structured prompt for Claude"""
+        prompt = (
+            f"{self._instructions(analysis_type, meta_settings)}\n\n"
+            f"Results for Analysis:\n{json.dumps(results, indent=2)}"
+        )
+        
+        if custom_instructions:
+            prompt += f"\n\nAdditional Analysis Instructions:\n{custom_instructions}"
+            
+        return prompt
+    
+    def _instructions(self, analysis_type: str, meta_settings: Dict[str, Any]) -> str:
+        """Instruction block shared by single and batched requests"""
         
         type_specific_guidance = {
             'continuous': {
@@ -133,12 +206,6 @@ Please provide a comprehensive analysis including:
    - Main findings summary
    - Practice recommendations
    - Implementation considerations
-   - Research gaps identification
-
-Results for Analysis:
-{json.dumps(results, indent=2)}"""
-
-        if custom_instructions:
-            prompt += f"\n\nAdditional Analysis Instructions:\n{custom_instructions}"
-            
+   - Research gaps identification"""
+        
         return prompt
\ No newline at end of file
@@ -4,7 +4,9 @@ Enhanced GPT-4 integration handler for Meta-Mar
 
 from openai import OpenAI
 from typing import Dict, Any, Optional
-from ..config.settings import settings
+from ..config.settings import get_settings
+from .batching import batch_instructions, batch_payload
+from .router import TruncatedReportError
 import logging
 import json
 
@@ -13,17 +15,29 @@ logger = logging.getLogger(__name__)
 class GPT4Handler:
     """Handles interactions with GPT-4 API"""
     
+    # Bump whenever the prompt template changes, so stored reports can be
+    # told apart from reports generated with the new prompt
+    PROMPT_VERSION = 1
+    # Batched prompts (shared instructions plus delimited reports) are
+    # versioned apart from single-report prompts, from 1001 up
+    BATCH_PROMPT_VERSION = 1001
+    
     def __init__(self):
         """Initialize GPT-4 handler with settings"""
         self.client = OpenAI()
-        self.settings = settings.llm_settings['gpt4']
+    
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Current GPT-4 settings from the active settings snapshot"""
+        return get_settings().llm_settings['gpt4']
     
     def generate_report(
         self,
         meta_analysis_results: Dict[str, Any],
         analysis_type: str,
         meta_settings: Dict[str, Any],
-        custom_instructions: Optional[str] = None
+        custom_instructions: Optional[str] = None,
+        llm_settings: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Generate meta-analysis report using GPT-4
@@ -33,11 +47,15 @@ class GPT4Handler:
             analysis_type: Type of meta-analysis ('continuous', 'binary', 'generic', 'correlation')
             meta_settings: Meta-analysis settings used
             custom_instructions: Optional additional instructions
+            llm_settings: Optional model settings pinned by the caller;
+                defaults to the current settings snapshot
             
         Returns:
             str: Generated report text
         """
         try:
+            llm_settings = llm_settings or self.settings
+            
             messages = self._create_messages(
                 meta_analysis_results,
                 analysis_type,
@@ -45,19 +63,64 @@ class GPT4Handler:
                 custom_instructions
             )
             
-            response = self.client.chat.completions.create(
-                model=self.settings['model'],
-                messages=messages,
-                temperature=self.settings['temperature'],
-                max_tokens=self.settings['max_tokens']
-            )
-            
-            return response.choices[0].message.content
+            return self._complete(messages, llm_settings)
             
         except Exception as e:
             logger.error(f"Error generating GPT-4 report: {str(e)}")
             raise
     
+    def generate_batch_report(
+        self,
+        analyses: Dict[str, Dict[str, Any]],
+        labels: Dict[str, str],
+        analysis_type: str,
+        meta_settings: Dict[str, Any],
+        custom_instructions: Optional[str] = None,
+        llm_settings: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Generate reports for several analyses in one request
+        
+        Args:
+            analyses: Results per analysis id
+            labels: Label per analysis id
+            analysis_type: Type of meta-analysis
+            meta_settings: Meta-analysis settings used
+            custom_instructions: Optional additional instructions
+            llm_settings: Optional model settings pinned by the caller
+            
+        Returns:
+            str: Response with one delimited report per analysis id
+        """
+        try:
+            llm_settings = llm_settings or self.settings
+            system = self._system_prompt(analysis_type, meta_settings, custom_instructions)
+            messages = [
+                {"role": "system", "content": f"{system}\n\n{batch_instructions(list(analyses))}"},
+                {"role": "user", "content": (
+                    f"Please analyze each of these meta-analyses:\n"
+                    f"{batch_payload(analyses, labels)}"
+                )}
+            ]
+            return self._complete(messages, llm_settings)
+            
+        except Exception as e:
+            logger.error(f"Error generating batched GPT-4 report: {str(e)}")
+            raise
+    
+    def _complete(self, messages: list, llm_settings: Dict[str, Any]) -> str:
+        """Send a chat completion request and return the text; raises if it was cut off"""
+        response = self.client.chat.completions.create(
+            model=llm_settings['model'],
+            messages=messages,
+            temperature=llm_settings['temperature'],
+            max_tokens=llm_settings['max_tokens']
+        )
+        choice = response.choices[0]
+        if choice.finish_reason == 'length':
+            raise TruncatedReportError('gpt4', llm_settings['max_tokens'])
+        return choice.message.content
+    
     def _create_messages(
         self,
         results: Dict[str, Any],
@@ -66,6 +129,21 @@ class GPT4Handler:
         custom_instructions: Optional[str]
     ) -> list:
         """Create structured messages for GPT-4"""
+        return [
+            {"role": "system", "content": self._system_prompt(analysis_type, meta_settings, custom_instructions)},
+            {"role": "user", "content": (
+                f"Please analyze these meta-analysis results:\n"
+                f"{json.dumps(results, indent=2)}"
+            )}
+        ]
+    
+    def _system_prompt(
+        self,
+        analysis_type: str,
+        meta_settings: Dict[str, Any],
+        custom_instructions: Optional[str]
+    ) -> str:
+        """Instruction block shared by single and batched requests"""
         
         # Base system prompt for different analysis types
         type_specific_instructions = {
@@ -117,10 +195,4 @@ Provide a comprehensive analysis including:
         if custom_instructions:
             base_prompt += f"\n\nAdditional Instructions:\n{custom_instructions}"
 
-        return [
-            {"role": "system", "content": base_prompt},
-            {"role": "user", "content": (
-                f"Please analyze these meta-analysis results:\n"
-                f"{json.dumps(results, indent=2)}"
-            )}
-        ]
\ No newline at end of file
+        return base_prompt
\ No newline at end of file
@@ -0,0 +1,363 @@
+"""
+Speculative report prefetching for interactive sessions
+
+Users usually load a file, read the pooled results and only then ask for
+the report. ``ReportPrefetcher.prefetch`` starts generating the report as
+soon as pooled results exist, in a background worker that yields to
+interactive requests and draws on its own share of the API rate limit.
+Reports land in an in-memory cache keyed by the content hash of the
+request, so the explicit request is served from it: instantly if the
+prefetch finished, by joining it if it is still running, or by taking it
+over if it has not started yet. A new prefetch for a session cancels the
+session's previous one when the inputs changed.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+import logging
+import queue
+import threading
+import time
+
+from .result_store import content_hash
+
+logger = logging.getLogger(__name__)
+
+# API calls per comparative report (one per model)
+CALLS_PER_REPORT = 2
+
+class RateLimiter:
+    """Token bucket allowing a number of requests per minute"""
+    
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        """
+        Initialize limiter
+        
+        Args:
+            rate_per_minute: Sustained request rate
+            burst: Bucket size; defaults to one report's worth of calls
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else CALLS_PER_REPORT)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: float = 1, cancelled: Optional[threading.Event] = None) -> bool:
+        """
+        Block until tokens are available
+        
+        Args:
+            tokens: Number of requests to admit
+            cancelled: Stop waiting when this event is set
+        
+        Returns:
+            bool: False if the wait was cancelled
+        """
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if cancelled is None:
+                time.sleep(wait)
+            elif cancelled.wait(wait):
+                return False
+
+@dataclass
+class _Request:
+    """A report request and where its result goes"""
+    key: str
+    results: Dict[str, Any]
+    analysis_type: str
+    settings: Optional[Dict[str, Any]]
+    custom_instructions: Optional[str]
+    future: Future
+    cancelled: threading.Event
+
+def infer_analysis_type(summary_measure: Optional[str]) -> str:
+    """
+    First analysis type accepting a summary measure
+    
+    Args:
+        summary_measure: Summary measure of the results
+    
+    Returns:
+        str: 'continuous', 'binary', 'generic' or 'correlation'
+    """
+    from ..config.meta_structures import META_SETTINGS
+    
+    for analysis_type, measures in META_SETTINGS['summary_measures'].items():
+        if summary_measure in measures:
+            return analysis_type
+    raise ValueError(f"Cannot infer the analysis type of summary measure {summary_measure}")
+
+class ReportPrefetcher:
+    """Generates likely reports ahead of the request and caches them"""
+    
+    def __init__(
+        self,
+        generator=None,
+        max_entries: int = 64,
+        rate_limit: Optional[float] = None,
+        prefetch_share: Optional[float] = None,
+        workers: int = 1
+    ):
+        """
+        Initialize prefetcher
+        
+        Args:
+            generator: ``ReportGenerator`` to use; created on first use
+            max_entries: Reports kept in the cache (least recently used
+                are evicted)
+            rate_limit: API requests per minute; defaults to
+                ``api.rate_limit``
+            prefetch_share: Share of the rate limit reserved for
+                prefetching; defaults to ``api.prefetch_share``
+            workers: Background prefetch threads
+        """
+        if rate_limit is None or prefetch_share is None:
+            from ..config.settings import get_settings
+            api = get_settings().api_config
+            rate_limit = api.rate_limit if rate_limit is None else rate_limit
+            prefetch_share = api.prefetch_share if prefetch_share is None else prefetch_share
+        if not 0 < prefetch_share < 1:
+            raise ValueError("prefetch_share must be between 0 and 1")
+        
+        self._generator = generator
+        self.max_entries = max_entries
+        self.foreground_limiter = RateLimiter(rate_limit * (1 - prefetch_share))
+        self.prefetch_limiter = RateLimiter(rate_limit * prefetch_share)
+        self.stats = {'prefetched': 0, 'cancelled': 0, 'hits': 0, 'joined': 0, 'misses': 0}
+        
+        self._cache: "OrderedDict[str, Future]" = OrderedDict()
+        self._pending: Dict[str, _Request] = {}
+        self._sessions: Dict[str, str] = {}
+        self._queue: "queue.LifoQueue[Optional[_Request]]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._foreground = 0
+        self._workers = [
+            threading.Thread(target=self._work, name=f"metamar-prefetch-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+    
+    @property
+    def generator(self):
+        if self._generator is None:
+            from .report_generator import ReportGenerator
+            self._generator = ReportGenerator()
+        return self._generator
+    
+    @staticmethod
+    def _key(results, analysis_type, settings, custom_instructions) -> str:
+        return content_hash([results, analysis_type, settings, custom_instructions])
+    
+    def _remember(self, key: str, future: Future):
+        """Insert into the LRU cache (caller holds the lock)"""
+        self._cache[key] = future
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            old_key, old = self._cache.popitem(last=False)
+            if old_key in self._pending and old.cancel():
+                self._pending.pop(old_key).cancelled.set()
+    
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._cache.get(key) is future:
+                del self._cache[key]
+    
+    def _claim(self, request: _Request) -> bool:
+        """Mark a pending request as running; False if it was cancelled or taken"""
+        with self._lock:
+            if self._pending.get(request.key) is not request:
+                return False
+            del self._pending[request.key]
+            return request.future.set_running_or_notify_cancel()
+    
+    def _generate(self, request: _Request):
+        try:
+            report = self.generator.generate_comparative_report(
+                request.results,
+                request.analysis_type,
+                request.settings,
+                request.custom_instructions
+            )
+            request.future.set_result(report)
+        except Exception as e:
+            request.future.set_exception(e)
+            self._forget(request.key, request.future)
+            raise
+    
+    def _work(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                break
+            # Low priority: do not start while interactive requests run
+            with self._idle:
+                while self._foreground:
+                    self._idle.wait()
+            if request.cancelled.is_set():
+                continue
+            if not self.prefetch_limiter.acquire(CALLS_PER_REPORT, request.cancelled):
+                continue
+            if not self._claim(request):
+                continue
+            try:
+                self._generate(request)
+                self.stats['prefetched'] += 1
+            except Exception as e:
+                logger.warning(f"Report prefetch failed: {str(e)}")
+    
+    def prefetch(
+        self,
+        results: Dict[str, Any],
+        settings: Optional[Dict[str, Any]] = None,
+        analysis_type: Optional[str] = None,
+        custom_instructions: Optional[str] = None,
+        session: str = 'default'
+    ) -> Future:
+        """
+        Start generating a report in the background
+        
+        Args:
+            results: Pooled results as passed to ``generate_comparative_report``
+            settings: Meta-analysis settings
+            analysis_type: Type of meta-analysis; inferred from the
+                summary measure if not given
+            custom_instructions: Optional additional instructions
+            session: Session whose previous prefetch is cancelled if its
+                inputs differ
+        
+        Returns:
+            Future: Resolves to the comparative report
+        """
+        analysis_type = analysis_type or infer_analysis_type(
+            (settings or {}).get('summary_measure') or results.get('summary_measure')
+        )
+        key = self._key(results, analysis_type, settings, custom_instructions)
+        with self._lock:
+            previous = self._sessions.get(session)
+            if previous is not None and previous != key:
+                self._cancel(previous)
+            self._sessions[session] = key
+            
+            future = self._cache.get(key)
+            if future is not None and not future.cancelled():
+                self._cache.move_to_end(key)
+                return future
+            
+            request = _Request(
+                key, results, analysis_type, settings, custom_instructions, Future(), threading.Event()
+            )
+            self._pending[key] = request
+            self._remember(key, request.future)
+        self._queue.put(request)
+        return request.future
+    
+    def _cancel(self, key: str):
+        """Cancel a prefetch that has not started (caller holds the lock)"""
+        request = self._pending.get(key)
+        if request is not None and request.future.cancel():
+            del self._pending[key]
+            request.cancelled.set()
+            self._cache.pop(key, None)
+            self.stats['cancelled'] += 1
+    
+    def cancel(self, session: str = 'default'):
+        """
+        Cancel the session's prefetch, e.g. when the session ends
+        
+        A prefetch that already started runs to completion and stays cached.
+        
+        Args:
+            session: Session id passed to ``prefetch``
+        """
+        with self._lock:
+            key = self._sessions.pop(session, None)
+            if key is not None:
+                self._cancel(key)
+    
+    def get_report(
+        self,
+        results: Dict[str, Any],
+        settings: Optional[Dict[str, Any]] = None,
+        analysis_type: Optional[str] = None,
+        custom_instructions: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Comparative report for an explicit request, from the cache if possible
+        
+        Args:
+            results: Pooled results
+            settings: Meta-analysis settings
+            analysis_type: Type of meta-analysis; inferred if not given
+            custom_instructions: Optional additional instructions
+            timeout: Seconds to wait for a running prefetch
+        
+        Returns:
+            Dict: Comparative report
+        """
+        analysis_type = analysis_type or infer_analysis_type(
+            (settings or {}).get('summary_measure') or results.get('summary_measure')
+        )
+        key = self._key(results, analysis_type, settings, custom_instructions)
+        with self._lock:
+            self._foreground += 1
+            future = self._cache.get(key)
+            request = self._pending.get(key)
+        try:
+            if future is not None and request is None and not future.cancelled():
+                try:
+                    if future.done():
+                        self.stats['hits'] += 1
+                    else:
+                        self.stats['joined'] += 1
+                    return future.result(timeout)
+                except Exception as e:
+                    logger.warning(f"Prefetched report unusable, generating again: {str(e)}")
+            
+            # Not prefetched, or queued but not started: generate in the foreground
+            if request is None or not self._claim(request):
+                request = _Request(
+                    key, results, analysis_type, settings, custom_instructions, Future(), threading.Event()
+                )
+                request.future.set_running_or_notify_cancel()
+                with self._lock:
+                    self._remember(key, request.future)
+            self.stats['misses'] += 1
+            self.foreground_limiter.acquire(CALLS_PER_REPORT)
+            self._generate(request)
+            return request.future.result()
+        
+        except Exception as e:
+            logger.error(f"Error generating report: {str(e)}")
+            raise
+        
+        finally:
+            with self._idle:
+                self._foreground -= 1
+                self._idle.notify_all()
+    
+    def close(self):
+        """Cancel pending prefetches and stop the workers"""
+        with self._lock:
+            for key in list(self._pending):
+                self._cancel(key)
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
@@ -2,29 +2,47 @@
 Enhanced report generator combining multiple LLM outputs for Meta-Mar
 """
 
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+from .batching import analysis_ids, pack_analyses, parse_batch_output
 from .gpt4_handler import GPT4Handler
 from .claude_handler import ClaudeHandler
-from ..config.settings import settings
+from .result_store import ResultStore
+from .router import ModelRouter, TruncatedReportError
+from ..config.settings import get_settings
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Prompt tokens of analysis results per batched request; the shared
+# instruction block comes on top
+BATCH_TOKEN_BUDGET = 6000
+
 class ReportGenerator:
     """Generates and compares reports from multiple LLMs"""
     
-    def __init__(self):
-        """Initialize handlers for different LLMs"""
+    def __init__(self, store: Optional[ResultStore] = None, router: Optional[ModelRouter] = None):
+        """
+        Initialize handlers for different LLMs
+        
+        Args:
+            store: Optional result store that keeps every generated
+                comparison and serves reusable ones
+            router: Model router; defaults to one following the
+                configured routing policy
+        """
         self.gpt4 = GPT4Handler()
         self.claude = ClaudeHandler()
+        self.store = store
+        self.router = router or ModelRouter()
         
     def generate_comparative_report(
         self,
         meta_analysis_results: Dict[str, Any],
         analysis_type: str,
         meta_settings: Optional[Dict[str, Any]] = None,
-        custom_instructions: Optional[str] = None
+        custom_instructions: Optional[str] = None,
+        reuse: bool = False
     ) -> Dict[str, Any]:
         """
         Generate comparative analysis from multiple LLMs
@@ -34,32 +52,75 @@ class ReportGenerator:
             analysis_type: Type of meta-analysis
             meta_settings: Optional custom meta-analysis settings
             custom_instructions: Optional additional instructions
+            reuse: Return a stored comparison for the same results,
+                settings, instructions, models and prompt versions instead
+                of calling the LLMs (requires a store)
             
         Returns:
-            Dict containing both reports and comparison metrics
+            Dict containing both reports and comparison metrics; stored
+            comparisons also carry their store ``id``
         """
         try:
+            # Pin the settings snapshot for the whole request so a hot
+            # reload cannot change settings between the two reports
+            snapshot = get_settings().snapshot
+            
             # Use provided settings or get defaults
-            analysis_settings = meta_settings or settings.meta_settings
+            analysis_settings = meta_settings or snapshot.meta_settings
             
-            # Validate settings for analysis type
-            if not settings.validate_meta_settings(analysis_type):
+            # Validate the settings actually used (memoized per snapshot)
+            if not snapshot.with_meta_settings(analysis_settings).validate_meta_settings(analysis_type):
                 raise ValueError(f"Invalid meta-analysis settings for {analysis_type}")
             
+            # Pick model tier and token budget per provider from the request's complexity
+            routes = self.router.route_all(
+                meta_analysis_results,
+                snapshot.llm_settings,
+                custom_instructions
+            )
+            llm_settings = {
+                provider: routes[provider].apply(settings)
+                for provider, settings in snapshot.llm_settings.items()
+            }
+            
+            if reuse and self.store is not None:
+                stored = self.store.find(
+                    meta_analysis_results,
+                    analysis_type,
+                    analysis_settings,
+                    custom_instructions,
+                    models={
+                        'gpt4': llm_settings['gpt4']['model'],
+                        'claude': llm_settings['claude']['model']
+                    },
+                    prompt_versions={
+                        'gpt4': self.gpt4.PROMPT_VERSION,
+                        'claude': self.claude.PROMPT_VERSION
+                    }
+                )
+                if stored is not None:
+                    return stored
+            
             # Generate reports from both models
             gpt4_report, gpt4_time = self._generate_gpt4_report(
                 meta_analysis_results,
                 analysis_type,
                 analysis_settings,
-                custom_instructions
+                custom_instructions,
+                llm_settings['gpt4'],
+                routes['gpt4'].max_output_tokens
             )
+            self.router.observe(routes['gpt4'], gpt4_time)
             
             claude_report, claude_time = self._generate_claude_report(
                 meta_analysis_results,
                 analysis_type,
                 analysis_settings,
-                custom_instructions
+                custom_instructions,
+                llm_settings['claude'],
+                routes['claude'].max_output_tokens
             )
+            self.router.observe(routes['claude'], claude_time)
             
             # Prepare comparison results
             comparison = {
@@ -69,11 +130,17 @@ class ReportGenerator:
                 "input_data": meta_analysis_results,
                 "gpt4": {
                     "report": gpt4_report,
-                    "time": gpt4_time
+                    "time": gpt4_time,
+                    "model": llm_settings['gpt4']['model'],
+                    "tier": routes['gpt4'].tier,
+                    "prompt_version": self.gpt4.PROMPT_VERSION
                 },
                 "claude": {
                     "report": claude_report,
-                    "time": claude_time
+                    "time": claude_time,
+                    "model": llm_settings['claude']['model'],
+                    "tier": routes['claude'].tier,
+                    "prompt_version": self.claude.PROMPT_VERSION
                 },
                 "comparison_metrics": self._compare_reports(
                     gpt4_report,
@@ -82,26 +149,280 @@ class ReportGenerator:
                 )
             }
             
+            self._store(comparison, custom_instructions)
             return comparison
             
         except Exception as e:
             logger.error(f"Error generating comparative report: {str(e)}")
             raise
     
+    def generate_batch_reports(
+        self,
+        analyses: Dict[str, Dict[str, Any]],
+        analysis_type: str,
+        meta_settings: Optional[Dict[str, Any]] = None,
+        custom_instructions: Optional[str] = None,
+        token_budget: int = BATCH_TOKEN_BUDGET,
+        max_batch_size: int = 8,
+        max_retries: int = 1,
+        reuse: bool = False
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Generate comparative reports for several related analyses
+        
+        Analyses (e.g. subgroups or outcomes of one dataset) are packed into
+        as few requests per model as the token budget allows, so the
+        instruction block is sent once per request instead of once per
+        analysis. Reports that are missing from a response, not delimited
+        properly or lost to a failed request are requested again, batched
+        with the other failures, up to max_retries times; whatever still
+        fails is then requested one analysis at a time.
+        
+        Args:
+            analyses: Meta-analysis results per analysis label
+            analysis_type: Type of meta-analysis
+            meta_settings: Optional custom meta-analysis settings
+            custom_instructions: Optional additional instructions
+            token_budget: Prompt tokens of analysis results per request
+            max_batch_size: Maximum number of analyses per request
+            max_retries: Batched re-issues of reports that failed to parse
+            reuse: Take stored comparisons where available, batched or
+                single (requires a store)
+            
+        Returns:
+            Dict: Comparative report per label, as from
+            generate_comparative_report; each model entry also records
+            the number of analyses that shared its request. Analyses
+            whose reports failed even as single requests are left out
+        """
+        try:
+            snapshot = get_settings().snapshot
+            analysis_settings = meta_settings or snapshot.meta_settings
+            if not snapshot.with_meta_settings(analysis_settings).validate_meta_settings(analysis_type):
+                raise ValueError(f"Invalid meta-analysis settings for {analysis_type}")
+            
+            complexities = {
+                label: self.router.complexity(results, custom_instructions)
+                for label, results in analyses.items()
+            }
+            comparisons = {}
+            if reuse and self.store is not None:
+                for label, results in analyses.items():
+                    # Batched or single, from any tier a batch could route this analysis to
+                    stored = self.store.find(
+                        results,
+                        analysis_type,
+                        analysis_settings,
+                        custom_instructions,
+                        models={
+                            provider: self.router.candidate_models(provider, settings, complexities[label])
+                            for provider, settings in snapshot.llm_settings.items()
+                        },
+                        prompt_versions={
+                            'gpt4': (self.gpt4.PROMPT_VERSION, self.gpt4.BATCH_PROMPT_VERSION),
+                            'claude': (self.claude.PROMPT_VERSION, self.claude.BATCH_PROMPT_VERSION)
+                        }
+                    )
+                    if stored is not None:
+                        comparisons[label] = stored
+            pending = {label: results for label, results in analyses.items() if label not in comparisons}
+            
+            reports = {
+                provider: self._generate_batched(
+                    provider, handler, pending, complexities, analysis_type, analysis_settings,
+                    custom_instructions, snapshot.llm_settings[provider],
+                    token_budget, max_batch_size, max_retries
+                )
+                for provider, handler in (('gpt4', self.gpt4), ('claude', self.claude))
+            } if pending else {}
+            
+            generated = [label for label in pending if all(label in r for r in reports.values())]
+            if len(generated) < len(pending):
+                if not generated and not comparisons:
+                    raise RuntimeError(f"No reports could be generated for {len(pending)} analyses")
+                logger.error(f"Leaving out {len(pending) - len(generated)} analyses without reports from both models")
+            
+            timestamp = datetime.now().isoformat()
+            for label in generated:
+                results = pending[label]
+                comparison = {
+                    "timestamp": timestamp,
+                    "analysis_type": analysis_type,
+                    "settings_used": analysis_settings,
+                    "input_data": results,
+                    "gpt4": reports['gpt4'][label],
+                    "claude": reports['claude'][label],
+                    "comparison_metrics": self._compare_reports(
+                        reports['gpt4'][label]["report"],
+                        reports['claude'][label]["report"],
+                        analysis_type
+                    )
+                }
+                self._store(comparison, custom_instructions)
+                comparisons[label] = comparison
+            
+            return {label: comparisons[label] for label in analyses if label in comparisons}
+            
+        except Exception as e:
+            logger.error(f"Error generating batched reports: {str(e)}")
+            raise
+    
+    def _generate_batched(
+        self,
+        provider: str,
+        handler,
+        analyses: Dict[str, Dict[str, Any]],
+        complexities: Dict[str, float],
+        analysis_type: str,
+        meta_settings: Dict[str, Any],
+        custom_instructions: Optional[str],
+        llm_settings: Dict[str, Any],
+        token_budget: int,
+        max_batch_size: int,
+        max_retries: int
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Reports of one model for every analysis, packed into shared requests
+        
+        Labels whose single-analysis request still fails are left out.
+        """
+        reports = {}
+        remaining = list(analyses)
+        attempt = 0
+        while remaining:
+            if attempt > max_retries:
+                groups = [[label] for label in remaining]
+            else:
+                # Size requests for the most complex remaining analysis, so
+                # every report fits the model's completion limit
+                lookahead = self.router.route(
+                    provider, {}, llm_settings, custom_instructions,
+                    complexity=max(complexities[label] for label in remaining), record=False
+                )
+                groups = pack_analyses(
+                    {label: analyses[label] for label in remaining}, token_budget, max_batch_size,
+                    lookahead.max_output_tokens, lookahead.max_tokens
+                )
+            
+            failed: List[str] = []
+            while groups:
+                group = groups.pop(0)
+                # Route on the most complex analysis; the output budget covers every report
+                route = self.router.route(
+                    provider, {}, llm_settings, custom_instructions,
+                    complexity=max(complexities[label] for label in group)
+                )
+                if len(group) > route.batch_capacity:
+                    # Routed to a tier with a smaller completion limit than the lookahead
+                    capacity = route.batch_capacity
+                    groups[:0] = [group[i:i + capacity] for i in range(0, len(group), capacity)]
+                    continue
+                settings = {**route.apply(llm_settings), 'max_tokens': route.max_tokens * len(group)}
+                
+                start_time = datetime.now()
+                try:
+                    if len(group) == 1:
+                        texts = {group[0]: self._untruncated(
+                            lambda settings: handler.generate_report(
+                                analyses[group[0]], analysis_type, meta_settings, custom_instructions, settings
+                            ),
+                            settings, route.max_output_tokens
+                        )}
+                    else:
+                        labels = analysis_ids(group)
+                        response = self._untruncated(
+                            lambda settings: handler.generate_batch_report(
+                                {analysis_id: analyses[label] for analysis_id, label in labels.items()},
+                                labels, analysis_type, meta_settings, custom_instructions, settings
+                            ),
+                            settings, route.max_output_tokens
+                        )
+                        texts = {
+                            labels[analysis_id]: text
+                            for analysis_id, text in parse_batch_output(response, list(labels)).items()
+                        }
+                except Exception as e:
+                    # Keep the reports of other requests; this group is retried
+                    logger.error(f"Error generating {provider} reports for {len(group)} analyses: {str(e)}")
+                    failed.extend(group)
+                    continue
+                request_time = (datetime.now() - start_time).total_seconds()
+                self.router.observe(route, request_time)
+                
+                # Batched prompts differ from the single-report prompt
+                version = handler.PROMPT_VERSION if len(group) == 1 else handler.BATCH_PROMPT_VERSION
+                for label in group:
+                    if label not in texts:
+                        failed.append(label)
+                        continue
+                    reports[label] = {
+                        "report": texts[label],
+                        "time": request_time / len(group),
+                        "model": settings['model'],
+                        "tier": route.tier,
+                        "prompt_version": version,
+                        "batch_size": len(group)
+                    }
+            
+            if failed and attempt > max_retries:
+                logger.error(f"Giving up on {len(failed)} {provider} reports after single requests failed")
+                break
+            if failed:
+                logger.warning(f"Re-issuing {len(failed)} {provider} reports that failed")
+            remaining = failed
+            attempt += 1
+        return reports
+    
+    @staticmethod
+    def _untruncated(generate, llm_settings: Dict[str, Any], max_output_tokens: Optional[int]) -> str:
+        """
+        Call ``generate(settings)``, doubling ``max_tokens`` while the completion is cut off
+        
+        A truncated report is never returned (or stored): once the budget
+        reaches the model's completion limit, TruncatedReportError propagates.
+        """
+        settings = llm_settings
+        limit = max_output_tokens or settings['max_tokens']
+        while True:
+            try:
+                return generate(settings)
+            except TruncatedReportError as e:
+                if settings['max_tokens'] >= limit:
+                    raise
+                settings = {**settings, 'max_tokens': min(2 * settings['max_tokens'], limit)}
+                logger.warning(f"{str(e)}; retrying with max_tokens={settings['max_tokens']}")
+    
+    def _store(self, comparison: Dict[str, Any], custom_instructions: Optional[str]):
+        """Save a comparison to the result store, if there is one"""
+        if self.store is None:
+            return
+        # A storage failure must not discard reports already paid for
+        try:
+            comparison["id"] = self.store.save(comparison, custom_instructions)
+        except Exception as e:
+            logger.error(f"Error storing comparative report: {str(e)}")
+    
     def _generate_gpt4_report(
         self,
         results: Dict[str, Any],
         analysis_type: str,
         meta_settings: Dict[str, Any],
-        custom_instructions: Optional[str]
+        custom_instructions: Optional[str],
+        llm_settings: Optional[Dict[str, Any]] = None,
+        max_output_tokens: Optional[int] = None
     ) -> Tuple[str, float]:
         """Generate report using GPT-4"""
         start_time = datetime.now()
-        report = self.gpt4.generate_report(
-            results,
-            analysis_type,
-            meta_settings,
-            custom_instructions
+        report = self._untruncated(
+            lambda settings: self.gpt4.generate_report(
+                results,
+                analysis_type,
+                meta_settings,
+                custom_instructions,
+                settings
+            ),
+            llm_settings or self.gpt4.settings,
+            max_output_tokens
         )
         time_taken = (datetime.now() - start_time).total_seconds()
         return report, time_taken
@@ -111,15 +432,22 @@ class ReportGenerator:
         results: Dict[str, Any],
         analysis_type: str,
         meta_settings: Dict[str, Any],
-        custom_instructions: Optional[str]
+        custom_instructions: Optional[str],
+        llm_settings: Optional[Dict[str, Any]] = None,
+        max_output_tokens: Optional[int] = None
     ) -> Tuple[str, float]:
         """Generate report using Claude"""
         start_time = datetime.now()
-        report = self.claude.generate_report(
-            results,
-            analysis_type,
-            meta_settings,
-            custom_instructions
+        report = self._untruncated(
+            lambda settings: self.claude.generate_report(
+                results,
+                analysis_type,
+                meta_settings,
+                custom_instructions,
+                settings
+            ),
+            llm_settings or self.claude.settings,
+            max_output_tokens
         )
         time_taken = (datetime.now() - start_time).total_seconds()
         return report, time_taken
@@ -0,0 +1,422 @@
+"""
+SQLite store for comparative reports
+
+Comparative reports embed the full meta-analysis results, the settings
+and both report texts. The store keeps each distinct input, settings
+dict and set of custom instructions once, keyed by the SHA-256 of its
+canonical JSON, so re-running reports on the same analysis only adds the
+report texts. Payloads and report texts are zlib-compressed. Comparisons
+are indexed by analysis type and timestamp, and reports by model and
+prompt version, so listing history or finding a reusable report only
+reads index pages and never decompresses texts that are not returned.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Collection, Dict, Any, List, Optional, Union
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Providers of a comparative report, as keyed in its dict
+REPORT_PROVIDERS = ('gpt4', 'claude')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payloads (
+    hash TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comparisons (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    analysis_type TEXT NOT NULL,
+    input_hash TEXT NOT NULL REFERENCES payloads(hash),
+    settings_hash TEXT NOT NULL REFERENCES payloads(hash),
+    instructions_hash TEXT REFERENCES payloads(hash),
+    metrics BLOB
+);
+CREATE TABLE IF NOT EXISTS reports (
+    comparison_id INTEGER NOT NULL REFERENCES comparisons(id) ON DELETE CASCADE,
+    provider TEXT NOT NULL,
+    model TEXT,
+    tier TEXT,
+    prompt_version INTEGER,
+    time REAL,
+    text BLOB NOT NULL,
+    PRIMARY KEY (comparison_id, provider)
+);
+CREATE INDEX IF NOT EXISTS comparisons_type_created ON comparisons(analysis_type, created_at);
+CREATE INDEX IF NOT EXISTS comparisons_created ON comparisons(created_at);
+CREATE INDEX IF NOT EXISTS comparisons_content ON comparisons(input_hash, settings_hash, instructions_hash);
+CREATE INDEX IF NOT EXISTS reports_model ON reports(model, prompt_version);
+CREATE INDEX IF NOT EXISTS reports_prompt_version ON reports(prompt_version);
+"""
+
+def _json_default(value):
+    """JSON encoding of NumPy scalars and arrays in results dicts"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _canonical(value) -> bytes:
+    """Canonical JSON encoding: sorted keys, no whitespace"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=_json_default).encode()
+
+def content_hash(value) -> str:
+    """
+    SHA-256 of the canonical JSON encoding of a value
+    
+    Args:
+        value: JSON-serializable value (NumPy scalars and arrays allowed)
+    
+    Returns:
+        str: Hex digest; equal for dicts that differ only in key order
+    """
+    return hashlib.sha256(_canonical(value)).hexdigest()
+
+def _compress(text: str) -> bytes:
+    return zlib.compress(text.encode(), 6)
+
+def _decompress(data: bytes) -> str:
+    return zlib.decompress(data).decode()
+
+def _timestamp(value: Union[str, datetime, None]) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _accepts(value, required) -> bool:
+    """Whether a stored value matches a required value or collection of values"""
+    if isinstance(required, (str, int)):
+        return value == required
+    return value in required
+
+class ResultStore:
+    """Persists comparative reports in a local SQLite database"""
+    
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """
+        Open (and create if needed) a result store
+        
+        Args:
+            path: Database file, or ':memory:'; defaults to
+                ``reports.sqlite`` in the configured ``storage.results_dir``
+        """
+        try:
+            if path is None:
+                from ..config.settings import get_settings
+                path = Path(get_settings().storage_config.results_dir) / 'reports.sqlite'
+            if str(path) != ':memory:':
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.path = str(path)
+            self._lock = threading.Lock()
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA foreign_keys = ON")
+            if self.path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode = WAL")
+                self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(reports)")}
+            if 'tier' not in columns:
+                # Stores created before model routing
+                self._conn.execute("ALTER TABLE reports ADD COLUMN tier TEXT")
+        
+        except Exception as e:
+            logger.error(f"Error opening result store: {str(e)}")
+            raise
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+    
+    def __enter__(self) -> 'ResultStore':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM comparisons").fetchone()[0]
+    
+    def _put_payload(self, kind: str, value) -> str:
+        """Insert a payload unless its content hash is already stored"""
+        data = _canonical(value)
+        digest = hashlib.sha256(data).hexdigest()
+        self._conn.execute(
+            "INSERT OR IGNORE INTO payloads (hash, kind, size, data) VALUES (?, ?, ?, ?)",
+            (digest, kind, len(data), zlib.compress(data, 6))
+        )
+        return digest
+    
+    def _get_payload(self, digest: Optional[str]):
+        if digest is None:
+            return None
+        row = self._conn.execute("SELECT data FROM payloads WHERE hash = ?", (digest,)).fetchone()
+        return json.loads(zlib.decompress(row[0]))
+    
+    def save(self, comparison: Dict[str, Any], custom_instructions: Optional[str] = None) -> int:
+        """
+        Store a comparative report
+        
+        Args:
+            comparison: Result of ``ReportGenerator.generate_comparative_report``
+            custom_instructions: Custom instructions the reports were generated with
+        
+        Returns:
+            int: Id of the stored comparison
+        """
+        try:
+            with self._lock, self._conn:
+                input_hash = self._put_payload('input', comparison['input_data'])
+                settings_hash = self._put_payload('settings', comparison['settings_used'])
+                instructions_hash = (
+                    self._put_payload('instructions', custom_instructions)
+                    if custom_instructions else None
+                )
+                cursor = self._conn.execute(
+                    "INSERT INTO comparisons "
+                    "(created_at, analysis_type, input_hash, settings_hash, instructions_hash, metrics) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        _timestamp(comparison.get('timestamp')) or datetime.now().isoformat(),
+                        comparison['analysis_type'],
+                        input_hash,
+                        settings_hash,
+                        instructions_hash,
+                        zlib.compress(_canonical(comparison.get('comparison_metrics', {})), 6)
+                    )
+                )
+                comparison_id = cursor.lastrowid
+                self._conn.executemany(
+                    "INSERT INTO reports (comparison_id, provider, model, tier, prompt_version, time, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            comparison_id,
+                            provider,
+                            comparison[provider].get('model'),
+                            comparison[provider].get('tier'),
+                            comparison[provider].get('prompt_version'),
+                            comparison[provider].get('time'),
+                            _compress(comparison[provider]['report'])
+                        )
+                        for provider in REPORT_PROVIDERS if provider in comparison
+                    ]
+                )
+            return comparison_id
+        
+        except Exception as e:
+            logger.error(f"Error storing comparative report: {str(e)}")
+            raise
+    
+    def get(self, comparison_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Load a stored comparative report
+        
+        Args:
+            comparison_id: Id returned by ``save`` or ``query``
+        
+        Returns:
+            Dict: The comparison as generated, plus its ``id``, or None if
+                there is no such comparison
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, created_at, analysis_type, input_hash, settings_hash, metrics "
+                "FROM comparisons WHERE id = ?",
+                (comparison_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            comparison = {
+                'id': row[0],
+                'timestamp': row[1],
+                'analysis_type': row[2],
+                'settings_used': self._get_payload(row[4]),
+                'input_data': self._get_payload(row[3])
+            }
+            reports = self._conn.execute(
+                "SELECT provider, model, tier, prompt_version, time, text FROM reports WHERE comparison_id = ?",
+                (comparison_id,)
+            )
+            for provider, model, tier, prompt_version, time_taken, text in reports:
+                comparison[provider] = {
+                    'report': _decompress(text),
+                    'time': time_taken,
+                    'model': model,
+                    'prompt_version': prompt_version
+                }
+                if tier is not None:
+                    comparison[provider]['tier'] = tier
+        comparison['comparison_metrics'] = json.loads(zlib.decompress(row[5])) if row[5] else {}
+        return comparison
+    
+    def query(
+        self,
+        analysis_type: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_version: Optional[int] = None,
+        since: Union[str, datetime, None] = None,
+        until: Union[str, datetime, None] = None,
+        input_data: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        List stored comparisons, newest first, without loading texts or inputs
+        
+        Args:
+            analysis_type: Only comparisons of this analysis type
+            model: Only comparisons with a report from this model
+            prompt_version: Only comparisons with a report from this prompt version
+            since: Only comparisons created at or after this time
+            until: Only comparisons created before this time
+            input_data: Only comparisons of exactly these results
+            limit: Maximum number of rows, None for all
+        
+        Returns:
+            List[Dict]: Id, timestamp, analysis type, content hashes and the
+                model and prompt version of each report
+        """
+        clauses, params = [], []
+        if analysis_type is not None:
+            clauses.append("c.analysis_type = ?")
+            params.append(analysis_type)
+        if since is not None:
+            clauses.append("c.created_at >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            clauses.append("c.created_at < ?")
+            params.append(_timestamp(until))
+        if input_data is not None:
+            clauses.append("c.input_hash = ?")
+            params.append(content_hash(input_data))
+        if model is not None or prompt_version is not None:
+            report_clauses = ["r.comparison_id = c.id"]
+            if model is not None:
+                report_clauses.append("r.model = ?")
+                params.append(model)
+            if prompt_version is not None:
+                report_clauses.append("r.prompt_version = ?")
+                params.append(prompt_version)
+            clauses.append(f"EXISTS (SELECT 1 FROM reports r WHERE {' AND '.join(report_clauses)})")
+        
+        sql = (
+            "SELECT c.id, c.created_at, c.analysis_type, c.input_hash, c.settings_hash "
+            "FROM comparisons c"
+            + (f" WHERE {' AND '.join(clauses)}" if clauses else "")
+            + " ORDER BY c.created_at DESC, c.id DESC"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            ids = [row[0] for row in rows]
+            reports: Dict[int, Dict[str, Any]] = {i: {} for i in ids}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                for comparison_id, provider, model_name, version in self._conn.execute(
+                    "SELECT comparison_id, provider, model, prompt_version FROM reports "
+                    f"WHERE comparison_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ):
+                    reports[comparison_id][provider] = {'model': model_name, 'prompt_version': version}
+        
+        return [
+            {
+                'id': comparison_id,
+                'timestamp': created_at,
+                'analysis_type': kind,
+                'input_hash': input_hash,
+                'settings_hash': settings_hash,
+                'reports': reports[comparison_id]
+            }
+            for comparison_id, created_at, kind, input_hash, settings_hash in rows
+        ]
+    
+    def find(
+        self,
+        input_data: Dict[str, Any],
+        analysis_type: str,
+        settings: Dict[str, Any],
+        custom_instructions: Optional[str] = None,
+        models: Optional[Dict[str, Union[str, Collection[str]]]] = None,
+        prompt_versions: Optional[Dict[str, Union[int, Collection[int]]]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Latest stored comparison that can be reused for a new request
+        
+        Args:
+            input_data: Meta-analysis results of the request
+            analysis_type: Type of meta-analysis
+            settings: Meta-analysis settings of the request
+            custom_instructions: Custom instructions of the request
+            models: Required model per provider, e.g. ``{'gpt4': 'gpt-4o'}``,
+                or a collection of accepted models
+            prompt_versions: Required prompt version per provider, or a
+                collection of accepted versions
+        
+        Returns:
+            Dict: The stored comparison (see ``get``), or None
+        """
+        models = models or {}
+        prompt_versions = prompt_versions or {}
+        instructions_hash = content_hash(custom_instructions) if custom_instructions else None
+        
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT id FROM comparisons "
+                "WHERE input_hash = ? AND settings_hash = ? AND instructions_hash IS ? AND analysis_type = ? "
+                "ORDER BY created_at DESC, id DESC",
+                (content_hash(input_data), content_hash(settings), instructions_hash, analysis_type)
+            ).fetchall()
+            match = None
+            for (comparison_id,) in candidates:
+                reports = {
+                    provider: (model, version)
+                    for provider, model, version in self._conn.execute(
+                        "SELECT provider, model, prompt_version FROM reports WHERE comparison_id = ?",
+                        (comparison_id,)
+                    )
+                }
+                if all(
+                    provider in reports
+                    and (provider not in models or _accepts(reports[provider][0], models[provider]))
+                    and (provider not in prompt_versions or _accepts(reports[provider][1], prompt_versions[provider]))
+                    for provider in REPORT_PROVIDERS
+                ):
+                    match = comparison_id
+                    break
+        
+        return None if match is None else self.get(match)
+    
+    def delete(self, comparison_id: int) -> bool:
+        """
+        Delete a stored comparison and payloads no other comparison uses
+        
+        Args:
+            comparison_id: Id of the comparison
+        
+        Returns:
+            bool: True if the comparison existed
+        """
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM comparisons WHERE id = ?", (comparison_id,)).rowcount
+            self._conn.execute(
+                "DELETE FROM payloads WHERE hash NOT IN ("
+                "SELECT input_hash FROM comparisons UNION SELECT settings_hash FROM comparisons "
+                "UNION SELECT instructions_hash FROM comparisons WHERE instructions_hash IS NOT NULL)"
+            )
+        return bool(deleted)
@@ -0,0 +1,310 @@
+"""
+Adaptive model routing for report generation
+
+Every report used to go to the slowest model of each provider. The router
+scores how demanding a request is (number of studies, subgroups,
+heterogeneity, optional analysis sections and prompt size) and picks the
+cheapest tier of each provider whose policy ceiling covers that score.
+``max_tokens`` is a cap on the completion, never below the configured
+budget of the provider, so routing does not shorten reports; a completion
+that hits the cap raises ``TruncatedReportError``. Observed latencies feed
+back per tier: while a tier runs slower than the latency target, requests
+close to the ceiling of the tier below are routed down. The recorded
+latency of a tier fades while requests avoid it, so it gets probed again
+once the slowdown may be over.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import logging
+import math
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Optional result blocks that each add a section to the report
+REPORT_SECTIONS = (
+    'subgroups', 'publication_bias', 'trim_and_fill', 'sensitivity',
+    'meta_regression', 'multilevel', 'prediction_interval', 'tau2_ci'
+)
+
+# Rough characters per prompt token for English text and JSON
+CHARS_PER_TOKEN = 4
+
+# Completion limit of a tier without a configured ``max_output_tokens``
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+
+class TruncatedReportError(RuntimeError):
+    """A completion stopped because it reached its ``max_tokens`` budget"""
+    
+    def __init__(self, provider: str, max_tokens: int):
+        super().__init__(f"{provider} report truncated at max_tokens={max_tokens}")
+        self.provider = provider
+        self.max_tokens = max_tokens
+
+@dataclass(frozen=True)
+class ModelTier:
+    """One model of a provider and the most complex requests it serves"""
+    name: str
+    model: str
+    max_complexity: float
+    max_tokens: int
+    max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS
+
+@dataclass(frozen=True)
+class RoutingPolicy:
+    """Tiers per provider (cheapest first) and the complexity scoring weights"""
+    enabled: bool
+    tiers: Dict[str, Tuple[ModelTier, ...]]
+    latency_slo: float = 30.0
+    slo_margin: float = 0.15
+    smoothing: float = 0.3
+    weights: Dict[str, float] = field(default_factory=lambda: {
+        'k': 0.2, 'subgroups': 0.15, 'heterogeneity': 0.2, 'sections': 0.25, 'prompt_tokens': 0.2
+    })
+    
+    @classmethod
+    def from_config(cls, routing: Dict[str, Any], llm_settings: Dict[str, Any]) -> 'RoutingPolicy':
+        """
+        Build a policy from the ``routing`` configuration section
+        
+        Args:
+            routing: Parsed ``routing`` section (may be empty)
+            llm_settings: LLM settings per provider; a provider without
+                configured tiers gets a single tier with its configured model
+        
+        Returns:
+            RoutingPolicy
+        """
+        configured = routing.get('tiers') or {}
+        tiers = {}
+        for provider, settings in llm_settings.items():
+            entries = configured.get(provider) or [{
+                'name': 'default',
+                'model': settings['model'],
+                'max_complexity': 1.0,
+                'max_tokens': settings['max_tokens']
+            }]
+            tiers[provider] = tuple(sorted(
+                (ModelTier(**{k: entry[k] for k in ModelTier.__dataclass_fields__ if k in entry}) for entry in entries),
+                key=lambda tier: tier.max_complexity
+            ))
+            if tiers[provider][-1].max_complexity < 1.0:
+                raise ValueError(f"The last routing tier of {provider} must have max_complexity 1.0")
+        
+        defaults = cls(enabled=False, tiers={})
+        return cls(
+            enabled=bool(routing.get('enabled', False)),
+            tiers=tiers,
+            latency_slo=float(routing.get('latency_slo', defaults.latency_slo)),
+            slo_margin=float(routing.get('slo_margin', defaults.slo_margin)),
+            smoothing=float(routing.get('smoothing', defaults.smoothing)),
+            weights={**defaults.weights, **(routing.get('weights') or {})}
+        )
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """Model and token budget chosen for one provider"""
+    provider: str
+    tier: str
+    model: str
+    max_tokens: int
+    complexity: float
+    max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS
+    
+    @property
+    def batch_capacity(self) -> int:
+        """Reports of ``max_tokens`` each that fit one completion of the model"""
+        return max(self.max_output_tokens // self.max_tokens, 1)
+    
+    def apply(self, llm_settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Provider settings with the routed model and token budget"""
+        return {**llm_settings, 'model': self.model, 'max_tokens': self.max_tokens}
+
+def complexity_features(
+    results: Dict[str, Any],
+    custom_instructions: Optional[str] = None
+) -> Dict[str, float]:
+    """
+    Request features scaled to [0, 1]
+    
+    Args:
+        results: Results dict passed to the LLM handlers
+        custom_instructions: Additional instructions of the request
+    
+    Returns:
+        Dict: ``k`` (log scale, 1 at 100 studies), ``subgroups`` (1 at six
+            or more), ``heterogeneity`` (I² / 100), ``sections`` (share of
+            optional sections present) and ``prompt_tokens`` (1 at 4000)
+    """
+    k = results.get('k') or 0
+    subgroups = results.get('subgroups') or {}
+    n_groups = len(subgroups.get('groups', [])) if isinstance(subgroups, dict) else 0
+    i2 = results.get('i2')
+    if i2 is None:
+        i2 = (results.get('heterogeneity') or {}).get('i2')
+    sections = sum(results.get(name) is not None for name in REPORT_SECTIONS)
+    chars = len(json.dumps(results, default=str)) + len(custom_instructions or '')
+    return {
+        'k': min(math.log(max(k, 1)) / math.log(100), 1.0),
+        'subgroups': min(n_groups / 6, 1.0),
+        'heterogeneity': min(max(float(i2 or 0.0), 0.0) / 100, 1.0),
+        'sections': sections / len(REPORT_SECTIONS),
+        'prompt_tokens': min(chars / CHARS_PER_TOKEN / 4000, 1.0)
+    }
+
+class ModelRouter:
+    """Chooses a model tier and token budget per provider for each request"""
+    
+    def __init__(self, policy: Optional[RoutingPolicy] = None):
+        """
+        Initialize router
+        
+        Args:
+            policy: Routing policy; defaults to the ``routing`` section of
+                the configuration
+        """
+        if policy is None:
+            from ..config.settings import get_settings
+            settings = get_settings()
+            policy = RoutingPolicy.from_config(settings.config.get('routing') or {}, settings.llm_settings)
+        self.policy = policy
+        self._latency: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+    
+    def complexity(self, results: Dict[str, Any], custom_instructions: Optional[str] = None) -> float:
+        """Weighted complexity score in [0, 1]"""
+        features = complexity_features(results, custom_instructions)
+        weights = self.policy.weights
+        total = sum(weights.values())
+        return sum(weights[name] * value for name, value in features.items()) / total if total else 0.0
+    
+    def latency(self, provider: str, tier: str) -> Optional[float]:
+        """Smoothed observed latency of a tier in seconds, None before any observation"""
+        with self._lock:
+            return self._latency.get((provider, tier))
+    
+    def observe(self, decision: RouteDecision, seconds: float):
+        """
+        Record the latency of a routed request
+        
+        Args:
+            decision: Decision the request was made with
+            seconds: Wall time of the request
+        """
+        key = (decision.provider, decision.tier)
+        alpha = self.policy.smoothing
+        with self._lock:
+            previous = self._latency.get(key)
+            self._latency[key] = seconds if previous is None else (1 - alpha) * previous + alpha * seconds
+    
+    def _over_slo(self, provider: str, tier: ModelTier) -> bool:
+        latency = self.latency(provider, tier.name)
+        return latency is not None and latency > self.policy.latency_slo
+    
+    def _skip(self, provider: str, tier: ModelTier):
+        """Let the latency of a tier that requests avoid fade, so it is probed again"""
+        with self._lock:
+            self._latency[(provider, tier.name)] *= 1 - self.policy.smoothing
+    
+    def route(
+        self,
+        provider: str,
+        results: Dict[str, Any],
+        llm_settings: Dict[str, Any],
+        custom_instructions: Optional[str] = None,
+        complexity: Optional[float] = None,
+        record: bool = True
+    ) -> RouteDecision:
+        """
+        Choose the model and ``max_tokens`` for one provider
+        
+        Args:
+            provider: 'gpt4' or 'claude'
+            results: Results dict passed to the handlers
+            llm_settings: Configured settings of the provider, used as is
+                when routing is disabled; their ``max_tokens`` is the least
+                budget any tier gets
+            custom_instructions: Additional instructions of the request
+            complexity: Precomputed complexity score
+            record: Let the latency of tiers routed around fade; False
+                for a lookahead that sends no request
+        
+        Returns:
+            RouteDecision
+        """
+        if complexity is None:
+            complexity = self.complexity(results, custom_instructions)
+        tiers = self.policy.tiers.get(provider)
+        if not self.policy.enabled or not tiers:
+            return RouteDecision(provider, 'default', llm_settings['model'], llm_settings['max_tokens'], complexity)
+        
+        index = next(i for i, tier in enumerate(tiers) if complexity <= tier.max_complexity or i == len(tiers) - 1)
+        # Route down while the chosen tier misses the latency target and
+        # the request is within the margin of the cheaper tier's ceiling
+        while (
+            index > 0
+            and self._over_slo(provider, tiers[index])
+            and complexity <= tiers[index - 1].max_complexity + self.policy.slo_margin
+        ):
+            if record:
+                self._skip(provider, tiers[index])
+            index -= 1
+        tier = tiers[index]
+        
+        # A cap on the completion, not a target: never below the configured budget
+        max_tokens = min(max(tier.max_tokens, llm_settings['max_tokens']), tier.max_output_tokens)
+        return RouteDecision(provider, tier.name, tier.model, max_tokens, complexity, tier.max_output_tokens)
+    
+    def candidate_models(self, provider: str, llm_settings: Dict[str, Any], complexity: float) -> List[str]:
+        """
+        Models that may serve a request of the given complexity in a batch
+        
+        A batch is routed on its most complex analysis, so an analysis can
+        be served by its own tier or any tier above it.
+        
+        Args:
+            provider: 'gpt4' or 'claude'
+            llm_settings: Configured settings of the provider
+            complexity: Complexity score of the request
+        
+        Returns:
+            List[str]: Model names
+        """
+        tiers = self.policy.tiers.get(provider)
+        if not self.policy.enabled or not tiers:
+            return [llm_settings['model']]
+        index = next(i for i, tier in enumerate(tiers) if complexity <= tier.max_complexity or i == len(tiers) - 1)
+        return [tier.model for tier in tiers[index:]]
+    
+    def route_all(
+        self,
+        results: Dict[str, Any],
+        llm_settings: Dict[str, Dict[str, Any]],
+        custom_instructions: Optional[str] = None
+    ) -> Dict[str, RouteDecision]:
+        """
+        Route every provider of a request, scoring it once
+        
+        Args:
+            results: Results dict passed to the handlers
+            llm_settings: Configured settings per provider
+            custom_instructions: Additional instructions of the request
+        
+        Returns:
+            Dict: Decision per provider
+        """
+        complexity = self.complexity(results, custom_instructions)
+        return {
+            provider: self.route(provider, results, settings, custom_instructions, complexity)
+            for provider, settings in llm_settings.items()
+        }
+    
+    def stats(self) -> List[Dict[str, Any]]:
+        """Smoothed latency per (provider, tier) observed so far"""
+        with self._lock:
+            return [
+                {'provider': provider, 'tier': tier, 'latency': latency}
+                for (provider, tier), latency in sorted(self._latency.items())
+            ]
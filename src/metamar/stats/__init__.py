@@ -0,0 +1,43 @@
+"""
+Native meta-analysis statistics for Meta-Mar
+"""
+
+from .effect_sizes import EffectSizes, compute_effect_sizes, backtransform
+from .pooling import MetaAnalysisResult, PooledEstimate, pool_inverse
+from .tau2 import Tau2Result, estimate_tau2, TAU2_ESTIMATORS
+from .batch import fdr_bh, pool_outcomes
+from .sensitivity import leave_one_out, influence_summary
+from .cumulative import CumulativeMetaAnalysis
+from .bias import BiasTest, publication_bias, kendall_tau, BIAS_TESTS
+from .resampling import ResamplingResult, bootstrap, permutation_test
+from .mantel_haenszel import pool_mh, pool_peto
+from .conversion import estimate_mean_sd, convert_to_mean_sd
+from .subgroup import SubgroupResult, subgroup_analysis
+from .intervals import Tau2CI, PredictionInterval, tau2_ci, prediction_interval
+from .regression import MetaRegressionResult, meta_regression, screen_moderators
+from .gosh import GoshResult, gosh, GOSH_COLUMNS
+from .multilevel import MultilevelResult, multilevel_meta
+from .trimfill import TrimFillResult, trimfill
+from .plots import PlotPayload, PLOT_LAYERS, downsample_points, forest_payload, funnel_payload, gosh_payload
+from .engine import MetaAnalysisEngine
+
+__all__ = [
+    'EffectSizes', 'compute_effect_sizes', 'backtransform',
+    'MetaAnalysisResult', 'PooledEstimate', 'pool_inverse',
+    'Tau2Result', 'estimate_tau2', 'TAU2_ESTIMATORS',
+    'fdr_bh', 'pool_outcomes',
+    'leave_one_out', 'influence_summary',
+    'CumulativeMetaAnalysis',
+    'BiasTest', 'publication_bias', 'kendall_tau', 'BIAS_TESTS',
+    'ResamplingResult', 'bootstrap', 'permutation_test',
+    'pool_mh', 'pool_peto',
+    'estimate_mean_sd', 'convert_to_mean_sd',
+    'SubgroupResult', 'subgroup_analysis',
+    'Tau2CI', 'PredictionInterval', 'tau2_ci', 'prediction_interval',
+    'MetaRegressionResult', 'meta_regression', 'screen_moderators',
+    'GoshResult', 'gosh', 'GOSH_COLUMNS',
+    'MultilevelResult', 'multilevel_meta',
+    'TrimFillResult', 'trimfill',
+    'PlotPayload', 'PLOT_LAYERS', 'downsample_points', 'forest_payload', 'funnel_payload', 'gosh_payload',
+    'MetaAnalysisEngine'
+]
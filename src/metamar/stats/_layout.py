@@ -0,0 +1,62 @@
+"""
+Array layouts for batches of meta-analyses
+
+``Stacked`` holds analyses on the leading axes and studies on the last
+axis, padded with NaN. ``Segmented`` holds all studies in one flat array
+sorted by analysis, with each analysis a contiguous segment; reductions
+use ``np.add.reduceat`` so ragged batches need no padding.
+"""
+
+import numpy as np
+
+class Stacked:
+    """Analyses on leading axes, studies on the last axis"""
+    
+    def sum(self, x):
+        return x.sum(-1)
+    
+    def max(self, x):
+        return x.max(-1, initial=0.0)
+    
+    def count(self, mask):
+        return mask.sum(-1)
+    
+    def expand(self, t):
+        """Broadcast per-analysis values to per-study values"""
+        return np.asarray(t)[..., None]
+
+class Segmented:
+    """Studies in one flat array, analyses as contiguous segments"""
+    
+    def __init__(self, starts, size: int):
+        self.starts = np.asarray(starts, dtype=np.intp)
+        self.counts = np.diff(np.append(self.starts, size))
+        if self.starts.size and (self.starts[0] != 0 or np.any(self.counts <= 0)):
+            raise ValueError("Segments must start at 0 and be non-empty and increasing")
+    
+    def sum(self, x):
+        return np.add.reduceat(x, self.starts)
+    
+    def max(self, x):
+        return np.maximum.reduceat(x, self.starts)
+    
+    def count(self, mask):
+        return np.add.reduceat(mask.astype(np.int64), self.starts)
+    
+    def expand(self, t):
+        """Broadcast per-analysis values to per-study values"""
+        t = np.asarray(t)
+        return t if t.ndim == 0 else np.repeat(t, self.counts)
+
+def layout_for(yi, segments=None):
+    """Layout for study arrays, segmented if segment starts are given"""
+    if segments is None:
+        return Stacked()
+    return Segmented(segments, np.shape(yi)[-1])
+
+def segment_starts(codes) -> np.ndarray:
+    """Start offsets of runs of equal values in a sorted code array"""
+    codes = np.asarray(codes)
+    if codes.size == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
@@ -0,0 +1,151 @@
+"""
+Batched pooling of many outcomes (genes, probes) across studies
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from ._layout import segment_starts
+from .effect_sizes import backtransform, compute_effect_sizes
+from .mantel_haenszel import pool_mh, pool_peto
+from .pooling import pool_inverse
+
+logger = logging.getLogger(__name__)
+
+def fdr_bh(pvals) -> np.ndarray:
+    """
+    Benjamini-Hochberg adjusted p-values
+    
+    Args:
+        pvals: Raw p-values; NaN entries are ignored and stay NaN
+    
+    Returns:
+        np.ndarray: Adjusted p-values
+    """
+    pvals = np.asarray(pvals, dtype=np.float64)
+    adjusted = np.full_like(pvals, np.nan)
+    finite = np.flatnonzero(np.isfinite(pvals))
+    m = finite.size
+    if m == 0:
+        return adjusted
+    
+    order = finite[np.argsort(pvals[finite], kind='stable')]
+    scaled = pvals[order] * m / np.arange(1, m + 1)
+    adjusted[order] = np.minimum(np.minimum.accumulate(scaled[::-1])[::-1], 1.0)
+    return adjusted
+
+def pool_outcomes(
+    data: pd.DataFrame,
+    analysis_type: str = 'generic',
+    summary_measure: str = 'MD',
+    outcome_col: str = 'outcome',
+    tau2_method: str = 'DL',
+    level: float = 0.95,
+    ci_method: str = 'classic',
+    hk_adjustment: str = '',
+    method_smd: str = 'Hedges',
+    model: str = 'random',
+    pooling_method: str = 'Inverse',
+    incr=0.5
+) -> pd.DataFrame:
+    """
+    Pool every outcome of a long-format data set in one vectorized pass
+    
+    Rows are sorted once by outcome; all per-outcome sums, τ² iterations
+    and pooled estimates are segmented reductions over the sorted arrays,
+    so ragged numbers of studies per outcome need no padding.
+    
+    Args:
+        data: Long-format data with one row per (outcome, study) and either
+            ``TE``/``seTE`` (generic) or the raw columns of ``analysis_type``
+        analysis_type: Type of meta-analysis for the per-row columns
+        summary_measure: Summary measure
+        outcome_col: Column identifying the outcome
+        tau2_method: τ² estimator
+        level: Confidence level
+        ci_method: Random-effects CI method
+        hk_adjustment: Hartung-Knapp adjustment
+        method_smd: SMD estimator for continuous data
+        model: Model whose p-values are FDR-adjusted, 'random' or 'fixed'
+        pooling_method: Common-effect method for binary data: 'Inverse',
+            'MH' or 'Peto'
+        incr: Continuity correction for zero-cell binary studies, or 'TACC'
+    
+    Returns:
+        pd.DataFrame: One row per outcome with pooled estimates,
+            heterogeneity statistics and FDR-adjusted p-values
+    """
+    try:
+        if outcome_col not in data.columns:
+            raise ValueError(f"Missing outcome column: {outcome_col}")
+        
+        if pooling_method != 'Inverse' and analysis_type != 'binary':
+            raise ValueError(f"Pooling method {pooling_method} requires binary data")
+        codes, outcomes = pd.factorize(data[outcome_col], sort=True)
+        if (codes < 0).any():
+            raise ValueError(f"Missing values in outcome column: {outcome_col}")
+        
+        order = np.argsort(codes, kind='stable')
+        starts = segment_starts(codes[order])
+        options = dict(
+            tau2_method=tau2_method,
+            level=level,
+            ci_method=ci_method,
+            hk_adjustment=hk_adjustment,
+            segments=starts
+        )
+        
+        if pooling_method in ('MH', 'Peto'):
+            counts = [data[col].to_numpy(dtype=np.float64)[order] for col in ('event.e', 'n.e', 'event.c', 'n.c')]
+            if pooling_method == 'MH':
+                result = pool_mh(*counts, summary_measure=summary_measure, incr=incr, **options)
+            elif summary_measure == 'OR':
+                result = pool_peto(*counts, **options)
+            else:
+                raise ValueError("Peto pooling requires the OR summary measure")
+        elif pooling_method == 'Inverse':
+            effects = compute_effect_sizes(
+                data, analysis_type, summary_measure, method_smd=method_smd, incr=incr
+            )
+            result = pool_inverse(
+                effects.te[order], effects.vi[order], summary_measure=summary_measure, **options
+            )
+        else:
+            raise ValueError(f"Unsupported pooling method: {pooling_method}")
+        
+        table = pd.DataFrame({
+            outcome_col: outcomes,
+            'k': result.k,
+            'TE.fixed': result.fixed.te,
+            'seTE.fixed': result.fixed.se,
+            'pval.fixed': result.fixed.pval,
+            'TE.random': result.random.te,
+            'seTE.random': result.random.se,
+            'lower.random': result.random.lower,
+            'upper.random': result.random.upper,
+            'pval.random': result.random.pval,
+            'tau2': result.tau2,
+            'Q': result.q,
+            'pval.Q': result.pval_q,
+            'I2': result.i2
+        })
+        headline = result.random if model == 'random' else result.fixed
+        table['effect'] = backtransform(headline.te, summary_measure)
+        table['lower'] = backtransform(headline.lower, summary_measure)
+        table['upper'] = backtransform(headline.upper, summary_measure)
+        table['pval'] = headline.pval
+        table['pval.fdr'] = fdr_bh(headline.pval)
+        
+        if not result.tau2_diagnostics.converged.all():
+            logger.warning(
+                f"τ² solver fell back to bisection for "
+                f"{int((~result.tau2_diagnostics.converged).sum())} outcomes"
+            )
+        
+        return table
+    
+    except Exception as e:
+        logger.error(f"Error pooling outcomes: {str(e)}")
+        raise
@@ -0,0 +1,333 @@
+"""
+Tests for funnel plot asymmetry (small-study effects)
+
+All tests operate on the last axis of their inputs; leading axes index
+independent meta-analyses, and NaN marks missing studies, as in
+``tau2`` and ``pooling``. The regression tests reduce to weighted sums,
+and Begg's rank correlation uses an O(k log k) Kendall τ based on
+counting inversions with a batched bottom-up merge sort.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any
+import numpy as np
+from scipy import stats
+
+from .pooling import _float
+from .tau2 import _masked, _safe_div
+
+BIAS_TESTS = ('Egger', 'Begg', 'Thompson', 'Harbord', 'Deeks')
+
+@dataclass
+class BiasTest:
+    """Funnel plot asymmetry test results"""
+    method: str
+    k: np.ndarray
+    bias: np.ndarray
+    se_bias: np.ndarray
+    statistic: np.ndarray
+    df: np.ndarray
+    pval: np.ndarray
+    
+    def to_dict(self, index=()) -> Dict[str, Any]:
+        """Plain-float summary for the results dict"""
+        df = np.asarray(self.df, dtype=np.float64)[index]
+        return {
+            'method': self.method,
+            'k': int(np.asarray(self.k)[index]),
+            'bias': _float(np.asarray(self.bias)[index]),
+            'se_bias': _float(np.asarray(self.se_bias)[index]),
+            'statistic': _float(np.asarray(self.statistic)[index]),
+            'df': None if np.isnan(df) else int(df),
+            'p_value': _float(np.asarray(self.pval)[index])
+        }
+
+def _line_fit(y, x, w, valid, dispersion: bool = True):
+    """
+    Weighted least-squares fit of y on x for each analysis
+    
+    Args:
+        y, x, w: Responses, predictors and weights, shape (..., k)
+        valid: Mask of studies to use
+        dispersion: Estimate the residual variance; if False it is fixed at 1
+    
+    Returns:
+        Tuple of (intercept, slope, se_intercept, se_slope, df)
+    """
+    w = np.where(valid, w, 0.0)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    sw = w.sum(-1)
+    xm = _safe_div((w * x).sum(-1), sw)
+    ym = _safe_div((w * y).sum(-1), sw)
+    xc = np.where(valid, x - xm[..., None], 0.0)
+    sxx = (w * xc ** 2).sum(-1)
+    slope = _safe_div((w * xc * (y - ym[..., None])).sum(-1), sxx)
+    intercept = ym - slope * xm
+    df = valid.sum(-1) - 2
+    
+    if dispersion:
+        rss = (w * (y - intercept[..., None] - slope[..., None] * x) ** 2).sum(-1)
+        s2 = _safe_div(rss, df)
+    else:
+        s2 = np.ones(sw.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se_slope = np.sqrt(s2 / sxx)
+        se_intercept = np.sqrt(s2 * (1 / sw + xm ** 2 / sxx))
+    usable = (df > 0) & (sxx > 0)
+    nan = lambda a: np.where(usable, a, np.nan)
+    return nan(intercept), nan(slope), nan(se_intercept), nan(se_slope), df
+
+def _t_test(estimate, se, df):
+    """Two-sided t-test with NaN for analyses without residual df"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = estimate / se
+    pval = np.where(df > 0, 2 * stats.t.sf(np.abs(t), np.maximum(df, 1)), np.nan)
+    return t, pval
+
+def egger_test(yi, vi) -> BiasTest:
+    """
+    Egger's regression test: standard normal deviate on precision
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+    
+    Returns:
+        BiasTest: Intercept (bias) with a t-test on k - 2 df
+    """
+    yi, vi, valid = _masked(yi, vi)
+    se = np.sqrt(vi)
+    intercept, _, se_intercept, _, df = _line_fit(yi / se, 1 / se, np.ones_like(se), valid)
+    t, pval = _t_test(intercept, se_intercept, df)
+    return BiasTest('Egger', valid.sum(-1), intercept, se_intercept, t, df, pval)
+
+def thompson_test(yi, vi) -> BiasTest:
+    """
+    Thompson and Sharp's test: meta-regression of effects on standard
+    errors with an additive method-of-moments between-study variance
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+    
+    Returns:
+        BiasTest: Slope (bias) with a z-test
+    """
+    yi, vi, valid = _masked(yi, vi)
+    se = np.sqrt(vi)
+    w = np.where(valid, 1 / vi, 0.0)
+    
+    # DerSimonian-Laird τ² for a meta-regression on one covariate
+    a, b, _, _, df = _line_fit(yi, se, w, valid, dispersion=False)
+    resid = np.where(valid, yi - a[..., None] - b[..., None] * se, 0.0)
+    q_e = (w * resid ** 2).sum(-1)
+    sw, swx, swx2 = w.sum(-1), (w * se).sum(-1), (w * se ** 2).sum(-1)
+    w2 = w ** 2
+    sw2, sw2x, sw2x2 = w2.sum(-1), (w2 * se).sum(-1), (w2 * se ** 2).sum(-1)
+    # trace((X'WX)^-1 X'W²X) for X = [1, se]
+    det = sw * swx2 - swx ** 2
+    trace = _safe_div(swx2 * sw2 - 2 * swx * sw2x + sw * sw2x2, det)
+    tau2 = np.maximum(_safe_div(q_e - df, sw - trace), 0.0)
+    
+    w_re = np.where(valid, 1 / (vi + tau2[..., None]), 0.0)
+    _, slope, _, se_slope, df = _line_fit(yi, se, w_re, valid, dispersion=False)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = slope / se_slope
+    pval = 2 * stats.norm.sf(np.abs(z))
+    return BiasTest('Thompson', valid.sum(-1), slope, se_slope, z, np.full(z.shape, np.nan), pval)
+
+def harbord_test(event_e, n_e, event_c, n_c) -> BiasTest:
+    """
+    Harbord's score-based test for binary outcomes
+    
+    Regresses Z/√V on √V, where Z and V are the efficient score and score
+    variance of the log odds ratio, and tests the intercept.
+    
+    Args:
+        event_e, n_e: Experimental arm events and sample sizes, shape (..., k)
+        event_c, n_c: Control arm events and sample sizes, shape (..., k)
+    
+    Returns:
+        BiasTest: Intercept (bias) with a t-test on k - 2 df
+    """
+    a, n1, c, n2 = (np.asarray(x, dtype=np.float64) for x in (event_e, n_e, event_c, n_c))
+    n = n1 + n2
+    events = a + c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = a - n1 * events / n
+        v = n1 * n2 * events * (n - events) / (n ** 2 * (n - 1))
+    valid = np.isfinite(z) & np.isfinite(v) & (v > 0)
+    sqrt_v = np.sqrt(np.where(valid, v, 1.0))
+    intercept, _, se_intercept, _, df = _line_fit(
+        np.where(valid, z, 0.0) / sqrt_v, sqrt_v, np.ones_like(sqrt_v), valid
+    )
+    t, pval = _t_test(intercept, se_intercept, df)
+    return BiasTest('Harbord', valid.sum(-1), intercept, se_intercept, t, df, pval)
+
+def deeks_test(yi, n_e, n_c) -> BiasTest:
+    """
+    Deeks' test: regression of effects on 1/√ESS weighted by the
+    effective sample size ESS = 4·n_e·n_c/(n_e + n_c)
+    
+    Args:
+        yi: Effect estimates (log diagnostic odds ratios), shape (..., k)
+        n_e, n_c: Group sample sizes, shape (..., k)
+    
+    Returns:
+        BiasTest: Slope (bias) with a t-test on k - 2 df
+    """
+    yi = np.asarray(yi, dtype=np.float64)
+    n1, n2 = (np.asarray(x, dtype=np.float64) for x in (n_e, n_c))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ess = 4 * n1 * n2 / (n1 + n2)
+    valid = np.isfinite(yi) & np.isfinite(ess) & (ess > 0)
+    ess = np.where(valid, ess, 1.0)
+    _, slope, _, se_slope, df = _line_fit(yi, 1 / np.sqrt(ess), ess, valid)
+    t, pval = _t_test(slope, se_slope, df)
+    return BiasTest('Deeks', valid.sum(-1), slope, se_slope, t, df, pval)
+
+def _count_inversions(values) -> np.ndarray:
+    """
+    Number of pairs i < j with values[i] > values[j] along the last axis
+    
+    Bottom-up merge sort on all analyses at once: at each level the
+    stable sort of two adjacent sorted runs is a linear-time merge, and
+    each element of the right run contributes the number of left-run
+    elements ranked after it. Ties are not counted.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lead, n = values.shape[:-1], values.shape[-1]
+    size = 1 << max(n - 1, 0).bit_length()
+    runs = np.full((int(np.prod(lead, dtype=np.int64)), size), np.inf)
+    runs[:, :n] = values.reshape(-1, n)
+    counts = np.zeros(runs.shape[0], dtype=np.int64)
+    
+    width = 1
+    while width < size:
+        blocks = runs.reshape(runs.shape[0], -1, 2 * width)
+        order = np.argsort(blocks, axis=-1, kind='stable')
+        position = np.empty_like(order)
+        np.put_along_axis(position, order, np.arange(2 * width), axis=-1)
+        # Left-run elements merged before each right-run element
+        preceding = position[..., width:] - np.arange(width)
+        counts += (width - preceding).sum(axis=(-2, -1))
+        runs = np.take_along_axis(blocks, order, axis=-1).reshape(runs.shape)
+        width *= 2
+    
+    return counts.reshape(lead)
+
+def _tie_sums(sorted_values, mask, *more):
+    """
+    Tie statistics of sorted values, optionally jointly with more arrays
+    
+    Returns Σt(t-1)/2, Σt(t-1)(2t+5), Σt(t-1)(t-2) over groups of t tied
+    values, accumulated per element via telescoping differences.
+    """
+    n = sorted_values.shape[-1]
+    changed = np.zeros(sorted_values.shape, dtype=bool)
+    changed[..., 0] = True
+    for a in (sorted_values, *more):
+        changed[..., 1:] |= a[..., 1:] != a[..., :-1]
+    idx = np.broadcast_to(np.arange(n), sorted_values.shape)
+    start = np.maximum.accumulate(np.where(changed, idx, 0), axis=-1)
+    j = np.where(mask, idx - start, 0).astype(np.float64)
+    t = j + 1
+    pairs = j.sum(-1)
+    v_term = np.where(mask, t * (t - 1) * (2 * t + 5) - j * (j - 1) * (2 * j + 5), 0.0).sum(-1)
+    t3_term = np.where(mask, t * (t - 1) * (t - 2) - j * (j - 1) * (j - 2), 0.0).sum(-1)
+    return pairs, v_term, t3_term
+
+def kendall_tau(x, y):
+    """
+    Kendall's τ-b in O(k log k) for one or many analyses
+    
+    Args:
+        x, y: Paired observations, shape (..., k); pairs with a NaN are dropped
+    
+    Returns:
+        Tuple of (τ-b, S = concordant - discordant, variance of S under
+            independence with tie corrections)
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    valid = np.isfinite(x) & np.isfinite(y)
+    n = valid.sum(-1).astype(np.float64)
+    
+    # Missing pairs sort to the end as +inf and contribute no pairs
+    xs = np.where(valid, x, np.inf)
+    ys = np.where(valid, y, np.inf)
+    order = np.lexsort((ys, xs), axis=-1)
+    xs = np.take_along_axis(xs, order, axis=-1)
+    ys = np.take_along_axis(ys, order, axis=-1)
+    mask = np.arange(x.shape[-1]) < n[..., None]
+    
+    tied_x, vx, tx3 = _tie_sums(xs, mask)
+    tied_xy, _, _ = _tie_sums(xs, mask, ys)
+    tied_y, vy, ty3 = _tie_sums(np.sort(ys, axis=-1), mask)
+    discordant = _count_inversions(ys)
+    
+    n0 = n * (n - 1) / 2
+    s = n0 - tied_x - tied_y + tied_xy - 2 * discordant
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_s = (
+            (n * (n - 1) * (2 * n + 5) - vx - vy) / 18
+            + (2 * tied_x) * (2 * tied_y) / (2 * n * (n - 1))
+            + tx3 * ty3 / (9 * n * (n - 1) * (n - 2))
+        )
+        tau = s / np.sqrt((n0 - tied_x) * (n0 - tied_y))
+    return tau, s, var_s
+
+def begg_test(yi, vi) -> BiasTest:
+    """
+    Begg and Mazumdar's rank correlation test
+    
+    Kendall's τ between standardized effects and their variances.
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+    
+    Returns:
+        BiasTest: Kendall's τ-b (bias) with a normal test on S
+    """
+    yi, vi, valid = _masked(yi, vi)
+    w = np.where(valid, 1 / vi, 0.0)
+    sw = w.sum(-1)
+    mu = _safe_div((w * yi).sum(-1), sw)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        standardized = (yi - mu[..., None]) / np.sqrt(vi - 1 / sw[..., None])
+    standardized = np.where(valid, standardized, np.nan)
+    tau, s, var_s = kendall_tau(standardized, np.where(valid, vi, np.nan))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = s / np.sqrt(var_s)
+    pval = 2 * stats.norm.sf(np.abs(z))
+    return BiasTest('Begg', valid.sum(-1), tau, np.sqrt(var_s), z, np.full(z.shape, np.nan), pval)
+
+def publication_bias(
+    method: str,
+    yi=None, vi=None,
+    event_e=None, n_e=None, event_c=None, n_c=None
+) -> BiasTest:
+    """
+    Run one of the BIAS_TESTS
+    
+    Args:
+        method: One of BIAS_TESTS
+        yi, vi: Effect estimates and sampling variances (all but Harbord)
+        event_e, n_e, event_c, n_c: 2x2 table counts (Harbord) or group
+            sample sizes (Deeks)
+    
+    Returns:
+        BiasTest
+    """
+    if method not in BIAS_TESTS:
+        raise ValueError(f"Unsupported publication bias test: {method}")
+    if method == 'Harbord':
+        if any(x is None for x in (event_e, n_e, event_c, n_c)):
+            raise ValueError("Harbord's test requires binary outcome counts")
+        return harbord_test(event_e, n_e, event_c, n_c)
+    if method == 'Deeks':
+        if n_e is None or n_c is None:
+            raise ValueError("Deeks' test requires group sample sizes")
+        return deeks_test(yi, n_e, n_c)
+    return {'Egger': egger_test, 'Begg': begg_test, 'Thompson': thompson_test}[method](yi, vi)
@@ -0,0 +1,159 @@
+"""
+Estimating means and standard deviations from medians, quartiles and ranges
+
+Scenarios follow Wan et al. (2014) and Luo et al. (2018):
+
+- S1: median, minimum and maximum
+- S2: median, first and third quartiles
+- S3: median, quartiles, minimum and maximum
+
+Means use Luo's weighted estimators. Standard deviations use Wan's
+estimators for S1 and S2 and Shi et al.'s (2020) optimally weighted
+estimator for S3. Each row uses the richest scenario its non-missing
+values allow, and all rows are converted together.
+"""
+
+from typing import Dict, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ('S1', 'S2', 'S3')
+
+def _xi(n):
+    """Expected range of n standard normal draws, 2Φ⁻¹((n - 0.375)/(n + 0.25))"""
+    return 2 * ndtri((n - 0.375) / (n + 0.25))
+
+def _eta(n):
+    """Expected interquartile range, 2Φ⁻¹((0.75n - 0.125)/(n + 0.25))"""
+    return 2 * ndtri((0.75 * n - 0.125) / (n + 0.25))
+
+def estimate_mean_sd(
+    n, median,
+    q1=None, q3=None,
+    minimum=None, maximum=None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Estimate sample means and SDs from summary statistics
+    
+    Args:
+        n: Sample sizes
+        median: Medians
+        q1, q3: First and third quartiles (optional, NaN where missing)
+        minimum, maximum: Minimum and maximum (optional, NaN where missing)
+    
+    Returns:
+        Tuple of (mean, sd, scenario) arrays; scenario is 'S1', 'S2', 'S3'
+            or '' for rows without enough information (mean and SD NaN)
+    """
+    n = np.asarray(n, dtype=np.float64)
+    m = np.asarray(median, dtype=np.float64)
+    missing = np.full(m.shape, np.nan)
+    q1, q3, a, b = (
+        missing if x is None else np.asarray(x, dtype=np.float64)
+        for x in (q1, q3, minimum, maximum)
+    )
+    
+    has_iqr = np.isfinite(q1) & np.isfinite(q3)
+    has_range = np.isfinite(a) & np.isfinite(b)
+    usable = np.isfinite(n) & (n > 1) & np.isfinite(m)
+    s3 = usable & has_iqr & has_range
+    s2 = usable & has_iqr & ~has_range
+    s1 = usable & has_range & ~has_iqr
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mid_range = (a + b) / 2
+        mid_iqr = (q1 + q3) / 2
+        xi, eta = _xi(n), _eta(n)
+        
+        # Luo et al. (2018)
+        w1 = 4 / (4 + n ** 0.75)
+        w2 = 0.7 + 0.39 / n
+        w3_range = 2.2 / (2.2 + n ** 0.75)
+        w3_iqr = 0.7 - 0.72 / n ** 0.55
+        mean = np.select(
+            [s1, s2, s3],
+            [
+                w1 * mid_range + (1 - w1) * m,
+                w2 * mid_iqr + (1 - w2) * m,
+                w3_range * mid_range + w3_iqr * mid_iqr + (1 - w3_range - w3_iqr) * m
+            ],
+            np.nan
+        )
+        
+        # Wan et al. (2014) for S1/S2, Shi et al. (2020) for S3
+        w_shi = 1 / (1 + 0.07 * n ** 0.6)
+        sd = np.select(
+            [s1, s2, s3],
+            [
+                (b - a) / xi,
+                (q3 - q1) / eta,
+                w_shi * (b - a) / xi + (1 - w_shi) * (q3 - q1) / eta
+            ],
+            np.nan
+        )
+    
+    scenario = np.select([s1, s2, s3], list(SCENARIOS), '')
+    return mean, sd, scenario
+
+def convert_to_mean_sd(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add mean/SD columns estimated from median-based summaries
+    
+    For each arm (``.e``, ``.c``), rows with ``median`` and quartiles
+    (``q1``/``q3``) and/or range (``min``/``max``) get ``mean`` and ``sd``
+    estimates. Rows that already report a mean and SD keep them. The
+    scenario counts are stored in ``data.attrs['mean_sd_conversion']``.
+    
+    Args:
+        data: Continuous data with median-based columns
+    
+    Returns:
+        pd.DataFrame: Copy of the data with ``mean.e``, ``sd.e``,
+            ``mean.c`` and ``sd.c`` columns
+    """
+    try:
+        converted = data.copy()
+        counts: Dict[str, Dict[str, int]] = {}
+        column = lambda name: (
+            pd.to_numeric(data[name], errors='coerce').to_numpy(dtype=np.float64)
+            if name in data.columns else None
+        )
+        
+        for arm in ('e', 'c'):
+            if f"median.{arm}" not in data.columns:
+                raise ValueError(f"Missing required column: median.{arm}")
+            mean, sd, scenario = estimate_mean_sd(
+                column(f"n.{arm}"), column(f"median.{arm}"),
+                q1=column(f"q1.{arm}"), q3=column(f"q3.{arm}"),
+                minimum=column(f"min.{arm}"), maximum=column(f"max.{arm}")
+            )
+            reported_mean, reported_sd = column(f"mean.{arm}"), column(f"sd.{arm}")
+            reported = np.zeros(mean.shape, dtype=bool)
+            if reported_mean is not None and reported_sd is not None:
+                reported = np.isfinite(reported_mean) & np.isfinite(reported_sd)
+                mean = np.where(reported, reported_mean, mean)
+                sd = np.where(reported, reported_sd, sd)
+            
+            converted[f"mean.{arm}"] = mean
+            converted[f"sd.{arm}"] = sd
+            counts[arm] = {s: int(np.sum((scenario == s) & ~reported)) for s in SCENARIOS}
+            
+            unconverted = ~np.isfinite(mean) | ~np.isfinite(sd)
+            if unconverted.any():
+                raise ValueError(
+                    f"Cannot estimate mean and SD for arm {arm} in rows: "
+                    f"{data.index[unconverted].tolist()}"
+                )
+        
+        converted.attrs['mean_sd_conversion'] = counts
+        logger.info(f"Estimated means and SDs from medians: {counts}")
+        return converted
+    
+    except Exception as e:
+        logger.error(f"Error converting medians to means: {str(e)}")
+        raise
@@ -0,0 +1,332 @@
+"""
+Cumulative and online meta-analysis for living reviews
+
+A ``CumulativeMetaAnalysis`` keeps running weighted sums for one analysis.
+Appending studies updates the fixed-effect estimate, Q, I² and the
+moment-based τ² estimators (DL, HS, HE) from those sums, so an update
+costs O(new studies) regardless of how many studies came before. The
+random-effects estimate at the updated τ² is re-weighted over the stored
+study variances in one vectorized pass. The state, including the
+cumulative trajectory, saves to a compressed ``.npz`` file so the next
+update starts from it instead of the raw data.
+"""
+
+from typing import Dict, Any, Optional
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .effect_sizes import backtransform
+from .pooling import MetaAnalysisResult, PooledEstimate, _z_interval, random_effects_estimate
+
+logger = logging.getLogger(__name__)
+
+# τ² estimators computable from running sums
+ONLINE_TAU2_ESTIMATORS = ('DL', 'HS', 'HE')
+
+# Running sums: k, Σw, Σwd, Σwd², Σw², Σd, Σd², Σv with d = yi - shift
+_N_SUMS = 8
+
+TRAJECTORY_COLUMNS = (
+    'studlab', 'year', 'k',
+    'TE.fixed', 'seTE.fixed',
+    'TE.random', 'seTE.random', 'lower.random', 'upper.random', 'pval.random',
+    'tau2', 'Q', 'pval.Q', 'I2',
+    'effect', 'lower', 'upper'
+)
+
+def _moment_statistics(sums: np.ndarray, tau2_method: str) -> Dict[str, np.ndarray]:
+    """
+    Fixed-effect and heterogeneity statistics from running sums
+    
+    Args:
+        sums: Running sums, shape (..., 8)
+        tau2_method: One of ONLINE_TAU2_ESTIMATORS
+    
+    Returns:
+        Dict with k, fixed-effect estimate (relative to the shift) and its
+            standard error, Q, df, p-value of Q, I², H and τ²
+    """
+    k, s0, s1, s2, sw2, sd, sd2, sv = np.moveaxis(sums, -1, 0)
+    df = k - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q = np.maximum(s2 - s1 ** 2 / s0, 0.0)
+        if tau2_method == 'DL':
+            tau2 = (q - df) / (s0 - sw2 / s0)
+        elif tau2_method == 'HS':
+            tau2 = (q - k) / s0
+        else:
+            tau2 = (sd2 - sd ** 2 / k) / df - sv / k
+        tau2 = np.where((df > 0) & np.isfinite(tau2), np.maximum(tau2, 0.0), 0.0)
+        pval_q = np.where(df > 0, stats.chi2.sf(q, np.maximum(df, 1)), np.nan)
+        i2 = np.where(df > 0, np.maximum(0.0, (q - df) / q) * 100, np.nan)
+        i2 = np.where((df > 0) & (q == 0), 0.0, i2)
+        h = np.where(df > 0, np.sqrt(np.maximum(q / df, 1.0)), np.nan)
+        return {
+            'k': k.astype(np.int64),
+            'te': s1 / s0,
+            'se': np.sqrt(1 / s0),
+            'q': q,
+            'df': df.astype(np.int64),
+            'pval_q': pval_q,
+            'i2': i2,
+            'h': h,
+            'tau2': tau2
+        }
+
+class CumulativeMetaAnalysis:
+    """Running inverse-variance meta-analysis that accepts appended studies"""
+    
+    def __init__(
+        self,
+        summary_measure: str = 'MD',
+        tau2_method: str = 'DL',
+        level: float = 0.95,
+        chunk_size: int = 512
+    ):
+        """
+        Initialize an empty analysis
+        
+        Args:
+            summary_measure: Summary measure, used for back-transformation
+            tau2_method: One of ONLINE_TAU2_ESTIMATORS
+            level: Confidence level
+            chunk_size: New studies re-pooled per vectorized block
+        """
+        if tau2_method not in ONLINE_TAU2_ESTIMATORS:
+            raise ValueError(
+                f"Unsupported τ² estimator for online updates: {tau2_method}; "
+                f"use one of {', '.join(ONLINE_TAU2_ESTIMATORS)}"
+            )
+        self.summary_measure = summary_measure
+        self.tau2_method = tau2_method
+        self.level = level
+        self.chunk_size = chunk_size
+        
+        self.shift: Optional[float] = None
+        self.sums = np.zeros(_N_SUMS)
+        self.yi = np.zeros(0)
+        self.vi = np.zeros(0)
+        self.studlab = np.zeros(0, dtype=str)
+        self.year = np.zeros(0)
+        self._trajectory = {
+            column: np.zeros(0, dtype=str if column == 'studlab' else np.float64)
+            for column in TRAJECTORY_COLUMNS
+        }
+    
+    @property
+    def k(self) -> int:
+        """Number of pooled studies"""
+        return int(self.sums[0])
+    
+    def update(self, yi, vi, studlab=None, year=None) -> pd.DataFrame:
+        """
+        Append studies and extend the cumulative trajectory
+        
+        Args:
+            yi: Effect estimates of the new studies on the pooling scale
+            vi: Sampling variances of the new studies
+            studlab: Optional study labels
+            year: Optional publication years; new studies are appended in
+                year order (studies without a year last)
+        
+        Returns:
+            pd.DataFrame: Trajectory rows added by this update, one per study
+        """
+        yi = np.atleast_1d(np.asarray(yi, dtype=np.float64))
+        vi = np.atleast_1d(np.asarray(vi, dtype=np.float64))
+        if yi.shape != vi.shape:
+            raise ValueError("Effect estimates and variances must have the same length")
+        studlab = (np.asarray(studlab, dtype=str) if studlab is not None
+                   else np.arange(self.k + 1, self.k + yi.size + 1).astype(str))
+        year = np.full(yi.size, np.nan) if year is None else np.asarray(year, dtype=np.float64)
+        
+        valid = np.isfinite(yi) & np.isfinite(vi) & (vi > 0)
+        if not valid.all():
+            logger.warning(f"Skipping {int((~valid).sum())} studies without a usable estimate")
+        order = np.flatnonzero(valid)
+        order = order[np.argsort(year[order], kind='stable')]
+        yi, vi, studlab, year = yi[order], vi[order], studlab[order], year[order]
+        if yi.size == 0:
+            return self.trajectory().iloc[0:0]
+        if self.year.size and np.nanmax(self.year, initial=-np.inf) > np.nanmin(year, initial=np.inf):
+            logger.warning("Appended studies predate studies already in the analysis")
+        
+        # Sums are kept relative to the first effect to avoid cancellation in Q
+        if self.shift is None:
+            self.shift = float(yi[0])
+        d = yi - self.shift
+        w = 1 / vi
+        increments = np.column_stack([
+            np.ones_like(w), w, w * d, w * d ** 2, w ** 2, d, d ** 2, vi
+        ])
+        cumulative = self.sums + np.cumsum(increments, axis=0)
+        moments = _moment_statistics(cumulative, self.tau2_method)
+        
+        k_before = self.k
+        self.sums = cumulative[-1]
+        self.yi = np.concatenate([self.yi, yi])
+        self.vi = np.concatenate([self.vi, vi])
+        self.studlab = np.concatenate([self.studlab, studlab])
+        self.year = np.concatenate([self.year, year])
+        
+        random = self._random_estimates(k_before, moments['tau2'])
+        fixed_te = moments['te'] + self.shift
+        rows = {
+            'studlab': studlab,
+            'year': year,
+            'k': moments['k'].astype(np.float64),
+            'TE.fixed': fixed_te,
+            'seTE.fixed': moments['se'],
+            'TE.random': random.te,
+            'seTE.random': random.se,
+            'lower.random': random.lower,
+            'upper.random': random.upper,
+            'pval.random': random.pval,
+            'tau2': moments['tau2'],
+            'Q': moments['q'],
+            'pval.Q': moments['pval_q'],
+            'I2': moments['i2'],
+            'effect': backtransform(random.te, self.summary_measure),
+            'lower': backtransform(random.lower, self.summary_measure),
+            'upper': backtransform(random.upper, self.summary_measure)
+        }
+        for column in TRAJECTORY_COLUMNS:
+            self._trajectory[column] = np.concatenate([self._trajectory[column], rows[column]])
+        
+        return self.trajectory().iloc[k_before:]
+    
+    def _random_estimates(self, k_before: int, tau2: np.ndarray):
+        """Random-effects estimates after each new study, in vectorized blocks"""
+        m = tau2.size
+        te, se, lower, upper, statistic, pval = (np.empty(m) for _ in range(6))
+        for start in range(0, m, self.chunk_size):
+            rows = np.arange(start, min(start + self.chunk_size, m))
+            # Row i pools the studies up to and including new study i
+            n_used = k_before + rows[-1] + 1
+            included = np.arange(n_used) < (k_before + rows + 1)[:, None]
+            y_block = np.where(included, self.yi[:n_used], np.nan)
+            v_block = np.broadcast_to(self.vi[:n_used], y_block.shape)
+            estimate = random_effects_estimate(y_block, v_block, tau2[rows], self.level)
+            te[rows], se[rows] = estimate.te, estimate.se
+            lower[rows], upper[rows] = estimate.lower, estimate.upper
+            statistic[rows], pval[rows] = estimate.statistic, estimate.pval
+        return PooledEstimate(te, se, lower, upper, statistic, pval)
+    
+    def result(self) -> MetaAnalysisResult:
+        """
+        Current pooled result
+        
+        Returns:
+            MetaAnalysisResult
+        """
+        if self.k == 0:
+            raise ValueError("No studies have been added")
+        moments = _moment_statistics(self.sums, self.tau2_method)
+        fixed = _z_interval(moments['te'] + self.shift, moments['se'], self.level)
+        random = random_effects_estimate(self.yi, self.vi, moments['tau2'], self.level)
+        return MetaAnalysisResult(
+            k=moments['k'],
+            fixed=fixed,
+            random=random,
+            tau2=moments['tau2'],
+            q=moments['q'],
+            df_q=moments['df'],
+            pval_q=moments['pval_q'],
+            i2=moments['i2'],
+            h=moments['h'],
+            summary_measure=self.summary_measure,
+            tau2_method=self.tau2_method
+        )
+    
+    def to_results(self, model: str = 'random') -> Dict[str, Any]:
+        """
+        Current results in the shape ``format_results`` expects
+        
+        Args:
+            model: 'random' or 'fixed'
+        
+        Returns:
+            Dict: Results with a ``cumulative`` block listing the trajectory
+        """
+        results = self.result().to_results(model)
+        trajectory = self.trajectory()
+        results['cumulative'] = {
+            'order': 'year' if np.isfinite(self.year).any() else 'input',
+            'effects': [float(x) for x in trajectory['effect']],
+            'studies': [str(s) for s in trajectory['studlab']]
+        }
+        return results
+    
+    def trajectory(self) -> pd.DataFrame:
+        """
+        Cumulative trajectory, one row per added study
+        
+        Returns:
+            pd.DataFrame: Pooled estimates after each study in order of addition
+        """
+        frame = pd.DataFrame({column: self._trajectory[column] for column in TRAJECTORY_COLUMNS})
+        frame['k'] = frame['k'].astype(np.int64)
+        return frame
+    
+    def save(self, path) -> None:
+        """
+        Save the running state and trajectory to a compressed ``.npz`` file
+        
+        Args:
+            path: Output file path
+        """
+        try:
+            meta = {
+                'summary_measure': self.summary_measure,
+                'tau2_method': self.tau2_method,
+                'level': self.level,
+                'shift': self.shift
+            }
+            np.savez_compressed(
+                path,
+                meta=np.array(json.dumps(meta)),
+                sums=self.sums,
+                yi=self.yi,
+                vi=self.vi,
+                studlab=self.studlab,
+                year=self.year,
+                **{f"trajectory/{column}": values for column, values in self._trajectory.items()}
+            )
+        
+        except Exception as e:
+            logger.error(f"Error saving cumulative state: {str(e)}")
+            raise
+    
+    @classmethod
+    def load(cls, path) -> 'CumulativeMetaAnalysis':
+        """
+        Load a state saved with ``save``
+        
+        Args:
+            path: Path to the ``.npz`` file
+        
+        Returns:
+            CumulativeMetaAnalysis
+        """
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                meta = json.loads(str(archive['meta']))
+                state = cls(meta['summary_measure'], meta['tau2_method'], meta['level'])
+                state.shift = meta['shift']
+                state.sums = archive['sums']
+                state.yi = archive['yi']
+                state.vi = archive['vi']
+                state.studlab = archive['studlab']
+                state.year = archive['year']
+                state._trajectory = {
+                    column: archive[f"trajectory/{column}"] for column in TRAJECTORY_COLUMNS
+                }
+            return state
+        
+        except Exception as e:
+            logger.error(f"Error loading cumulative state: {str(e)}")
+            raise
@@ -0,0 +1,323 @@
+"""
+Per-study effect sizes for the supported meta-analysis types
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+logger = logging.getLogger(__name__)
+
+# Measures pooled on the log scale and reported exponentiated
+RATIO_MEASURES = frozenset(['OR', 'RR', 'ROM', 'HR', 'IRR'])
+
+@dataclass
+class EffectSizes:
+    """Per-study effect estimates on the pooling scale"""
+    te: np.ndarray
+    se: np.ndarray
+    summary_measure: str
+    studlab: Optional[np.ndarray] = None
+    n: Optional[np.ndarray] = None
+    
+    @property
+    def vi(self) -> np.ndarray:
+        """Sampling variances"""
+        return self.se ** 2
+    
+    @property
+    def k(self) -> int:
+        """Number of studies with a usable estimate"""
+        return int(np.count_nonzero(np.isfinite(self.te) & np.isfinite(self.se) & (self.se > 0)))
+    
+    def to_frame(self) -> pd.DataFrame:
+        """Per-study table with back-transformed estimates"""
+        frame = pd.DataFrame({'TE': self.te, 'seTE': self.se})
+        if self.studlab is not None:
+            frame.insert(0, 'studlab', self.studlab)
+        if self.n is not None:
+            frame['n'] = self.n
+        return frame
+
+def backtransform(x, summary_measure: str):
+    """Transform values from the pooling scale to the reporting scale"""
+    if summary_measure in RATIO_MEASURES:
+        return np.exp(x)
+    if summary_measure == 'ZCOR':
+        return np.tanh(x)
+    return x
+
+def continuous_effects(
+    n_e, mean_e, sd_e, n_c, mean_c, sd_c,
+    summary_measure: str = 'MD',
+    method_smd: str = 'Hedges'
+):
+    """
+    Effect sizes for two-arm continuous outcomes
+    
+    Args:
+        n_e, mean_e, sd_e: Experimental arm sample size, mean and SD
+        n_c, mean_c, sd_c: Control arm sample size, mean and SD
+        summary_measure: 'MD', 'SMD' or 'ROM'
+        method_smd: 'Hedges', 'Cohen' or 'Glass' (SMD only)
+    
+    Returns:
+        Tuple of (TE, seTE) arrays
+    """
+    n_e, mean_e, sd_e, n_c, mean_c, sd_c = (
+        np.asarray(a, dtype=np.float64) for a in (n_e, mean_e, sd_e, n_c, mean_c, sd_c)
+    )
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if summary_measure == 'MD':
+            te = mean_e - mean_c
+            var = sd_e ** 2 / n_e + sd_c ** 2 / n_c
+        
+        elif summary_measure == 'SMD':
+            n = n_e + n_c
+            if method_smd == 'Glass':
+                te = (mean_e - mean_c) / sd_c
+                var = n / (n_e * n_c) + te ** 2 / (2 * (n_c - 1))
+            else:
+                sd_pooled = np.sqrt(
+                    ((n_e - 1) * sd_e ** 2 + (n_c - 1) * sd_c ** 2) / (n - 2)
+                )
+                te = (mean_e - mean_c) / sd_pooled
+                if method_smd == 'Cohen':
+                    var = n / (n_e * n_c) + te ** 2 / (2 * n)
+                elif method_smd == 'Hedges':
+                    te = te * (1 - 3 / (4 * n - 9))
+                    var = n / (n_e * n_c) + te ** 2 / (2 * (n - 3.94))
+                else:
+                    raise ValueError(f"Unknown SMD method: {method_smd}")
+        
+        elif summary_measure == 'ROM':
+            te = np.log(mean_e / mean_c)
+            var = sd_e ** 2 / (n_e * mean_e ** 2) + sd_c ** 2 / (n_c * mean_c ** 2)
+        
+        else:
+            raise ValueError(f"Invalid summary measure for continuous: {summary_measure}")
+    
+    return te, np.sqrt(var)
+
+def continuity_correction(event_e, n_e, event_c, n_c, incr=0.5):
+    """
+    2x2 cells with a continuity correction for zero-cell studies only
+    
+    Args:
+        event_e, n_e: Experimental arm events and sample size
+        event_c, n_c: Control arm events and sample size
+        incr: Correction added to each cell of zero-cell studies, or
+            'TACC' for the treatment-arm correction of Sweeting et al.
+            (arm corrections proportional to the arm's share of the sample)
+    
+    Returns:
+        Tuple of (a, b, c, d, zero_cell, double_zero) with corrected cells
+            and masks of zero-cell and double-zero studies
+    """
+    a, n1, c, n2 = (np.asarray(x, dtype=np.float64) for x in (event_e, n_e, event_c, n_c))
+    b, d = n1 - a, n2 - c
+    
+    zero_cell = (a == 0) | (b == 0) | (c == 0) | (d == 0)
+    double_zero = ((a == 0) & (c == 0)) | ((b == 0) & (d == 0))
+    if isinstance(incr, str):
+        if incr != 'TACC':
+            raise ValueError(f"Unknown continuity correction: {incr}")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            incr_e, incr_c = n1 / (n1 + n2), n2 / (n1 + n2)
+    else:
+        incr_e = incr_c = incr
+    cc_e = np.where(zero_cell, incr_e, 0.0)
+    cc_c = np.where(zero_cell, incr_c, 0.0)
+    return a + cc_e, b + cc_e, c + cc_c, d + cc_c, zero_cell, double_zero
+
+def binary_effects(
+    event_e, n_e, event_c, n_c,
+    summary_measure: str = 'OR',
+    incr=0.5
+):
+    """
+    Effect sizes for 2x2 tables
+    
+    The continuity correction ``incr`` is added to all four cells of
+    studies with a zero cell only. Studies with no events (or only
+    events) in both arms carry no information on OR/RR and get NaN.
+    
+    Args:
+        event_e, n_e: Experimental arm events and sample size
+        event_c, n_c: Control arm events and sample size
+        summary_measure: 'OR', 'RR' or 'RD'
+        incr: Continuity correction for zero-cell studies, or 'TACC'
+    
+    Returns:
+        Tuple of (TE, seTE) arrays
+    """
+    a, b, c, d, _, double_zero = continuity_correction(event_e, n_e, event_c, n_c, incr)
+    n1, n2 = a + b, c + d
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if summary_measure == 'OR':
+            te = np.log(a * d / (b * c))
+            var = 1 / a + 1 / b + 1 / c + 1 / d
+        elif summary_measure == 'RR':
+            te = np.log((a / n1) / (c / n2))
+            var = 1 / a - 1 / n1 + 1 / c - 1 / n2
+        elif summary_measure == 'RD':
+            p1, p2 = a / n1, c / n2
+            te = p1 - p2
+            var = p1 * (1 - p1) / n1 + p2 * (1 - p2) / n2
+        else:
+            raise ValueError(f"Invalid summary measure for binary: {summary_measure}")
+    
+    if summary_measure != 'RD':
+        te = np.where(double_zero, np.nan, te)
+        var = np.where(double_zero, np.nan, var)
+    
+    return te, np.sqrt(var)
+
+def peto_effects(event_e, n_e, event_c, n_c):
+    """
+    Peto log odds ratios from observed minus expected events
+    
+    Args:
+        event_e, n_e: Experimental arm events and sample size
+        event_c, n_c: Control arm events and sample size
+    
+    Returns:
+        Tuple of (TE, seTE) arrays; studies without information
+            (no events or only events overall) get NaN
+    """
+    a, n1, c, n2 = (np.asarray(x, dtype=np.float64) for x in (event_e, n_e, event_c, n_c))
+    n = n1 + n2
+    events = a + c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        o_e = a - n1 * events / n
+        v = n1 * n2 * events * (n - events) / (n ** 2 * (n - 1))
+        informative = v > 0
+        te = np.where(informative, o_e / v, np.nan)
+        se = np.where(informative, 1 / np.sqrt(v), np.nan)
+    return te, se
+
+def correlation_effects(cor, n, summary_measure: str = 'ZCOR'):
+    """
+    Effect sizes for correlations
+    
+    Args:
+        cor: Correlation coefficients
+        n: Sample sizes
+        summary_measure: 'ZCOR' (Fisher's z) or 'COR' (raw correlation)
+    
+    Returns:
+        Tuple of (TE, seTE) arrays
+    """
+    cor, n = np.asarray(cor, dtype=np.float64), np.asarray(n, dtype=np.float64)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if summary_measure == 'ZCOR':
+            return np.arctanh(cor), np.sqrt(1 / (n - 3))
+        if summary_measure == 'COR':
+            return cor, np.sqrt((1 - cor ** 2) ** 2 / (n - 1))
+    
+    raise ValueError(f"Invalid summary measure for correlation: {summary_measure}")
+
+def generic_effects(te, se=None, lower=None, upper=None, pval=None, df=None, level: float = 0.95):
+    """
+    Effect sizes for generic inverse-variance data
+    
+    Missing standard errors are derived from confidence limits, or from
+    two-sided p-values (using a t distribution where ``df`` is given).
+    
+    Args:
+        te: Effect estimates on the pooling scale
+        se: Standard errors
+        lower, upper: Confidence limits on the pooling scale
+        pval: Two-sided p-values
+        df: Degrees of freedom for p-value based derivation
+        level: Confidence level of the supplied limits
+    
+    Returns:
+        Tuple of (TE, seTE) arrays
+    """
+    te = np.asarray(te, dtype=np.float64)
+    se = np.full_like(te, np.nan) if se is None else np.asarray(se, dtype=np.float64).copy()
+    
+    if lower is not None and upper is not None:
+        width = np.asarray(upper, dtype=np.float64) - np.asarray(lower, dtype=np.float64)
+        from_ci = np.abs(width) / (2 * stats.norm.ppf(0.5 + level / 2))
+        se = np.where(np.isfinite(se), se, from_ci)
+    
+    if pval is not None:
+        pval = np.asarray(pval, dtype=np.float64)
+        quantile = stats.norm.isf(pval / 2)
+        if df is not None:
+            df = np.asarray(df, dtype=np.float64)
+            has_df = np.isfinite(df) & (df > 0)
+            quantile = np.where(has_df, stats.t.isf(pval / 2, np.where(has_df, df, 1.0)), quantile)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            from_p = np.abs(te) / quantile
+        se = np.where(np.isfinite(se), se, from_p)
+    
+    return te, se
+
+def _column(data: pd.DataFrame, name: str):
+    """Column as float array, or None if absent"""
+    if name not in data.columns:
+        return None
+    return pd.to_numeric(data[name], errors='coerce').to_numpy(dtype=np.float64)
+
+def compute_effect_sizes(
+    data: pd.DataFrame,
+    analysis_type: str,
+    summary_measure: str,
+    method_smd: str = 'Hedges',
+    incr=0.5
+) -> EffectSizes:
+    """
+    Compute per-study effect sizes from a loaded data frame
+    
+    Args:
+        data: Frame as returned by MetaAnalysisDataLoader
+        analysis_type: 'continuous', 'binary', 'generic' or 'correlation'
+        summary_measure: Summary measure valid for the analysis type
+        method_smd: SMD estimator for continuous data
+        incr: Continuity correction for zero-cell binary studies, or 'TACC'
+    
+    Returns:
+        EffectSizes: Estimates and standard errors on the pooling scale
+    """
+    col = lambda name: _column(data, name)
+    n = None
+    
+    if analysis_type == 'continuous':
+        te, se = continuous_effects(
+            col('n.e'), col('mean.e'), col('sd.e'),
+            col('n.c'), col('mean.c'), col('sd.c'),
+            summary_measure, method_smd
+        )
+        n = col('n.e') + col('n.c')
+    elif analysis_type == 'binary':
+        te, se = binary_effects(
+            col('event.e'), col('n.e'), col('event.c'), col('n.c'),
+            summary_measure, incr
+        )
+        n = col('n.e') + col('n.c')
+    elif analysis_type == 'correlation':
+        te, se = correlation_effects(col('cor'), col('n'), summary_measure)
+        n = col('n')
+    elif analysis_type == 'generic':
+        te, se = generic_effects(
+            col('TE'), col('seTE'), col('lower'), col('upper'), col('pval'), col('df')
+        )
+    else:
+        raise ValueError(f"Unknown analysis type: {analysis_type}")
+    
+    excluded = ~(np.isfinite(te) & np.isfinite(se) & (se > 0))
+    if excluded.any():
+        logger.info(f"{int(excluded.sum())} studies without a usable estimate are excluded from pooling")
+    
+    studlab = data['studlab'].to_numpy() if 'studlab' in data.columns else None
+    return EffectSizes(te=te, se=se, summary_measure=summary_measure, studlab=studlab, n=n)
@@ -0,0 +1,542 @@
+"""
+Meta-analysis engine computing pooled results from loaded study data
+"""
+
+from dataclasses import replace
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from ..config.meta_structures import META_SETTINGS
+from .bias import BIAS_TESTS, BiasTest, publication_bias
+from .cumulative import CumulativeMetaAnalysis, ONLINE_TAU2_ESTIMATORS
+from .effect_sizes import EffectSizes, compute_effect_sizes, peto_effects
+from .gosh import GoshResult, gosh
+from .intervals import prediction_interval, tau2_ci
+from .mantel_haenszel import pool_mh
+from .multilevel import MULTILEVEL_TAU2_ESTIMATORS, MultilevelResult, multilevel_meta
+from .regression import MetaRegressionResult, REGRESSION_TAU2_ESTIMATORS, meta_regression
+from .plots import PlotPayload, forest_payload, funnel_payload, study_rows
+from .pooling import MetaAnalysisResult, pool_inverse
+from .sensitivity import influence_summary, leave_one_out
+from .subgroup import SubgroupResult, subgroup_analysis
+from .trimfill import TrimFillResult, trimfill
+
+logger = logging.getLogger(__name__)
+
+# SMD estimators selectable through the continuous pooling method setting
+SMD_METHODS = ('Hedges', 'Cohen', 'Glass')
+
+# Common-effect methods for binary data
+BINARY_METHODS = ('MH', 'Peto', 'Inverse')
+
+# Optional study-level columns used as meta-regression moderators
+MODERATOR_COLUMNS = ('year', 'age')
+
+class MetaAnalysisEngine:
+    """Computes meta-analyses natively from MetaAnalysisDataLoader frames"""
+    
+    def __init__(
+        self,
+        meta_settings: Optional[Dict[str, Any]] = None,
+        model: str = 'random',
+        level: float = 0.95
+    ):
+        """
+        Initialize engine
+        
+        Args:
+            meta_settings: Meta-analysis settings; defaults to the current
+                settings snapshot
+            model: Headline model, 'random' or 'fixed'
+            level: Confidence level
+        """
+        if meta_settings is None:
+            from ..config.settings import get_settings
+            meta_settings = get_settings().meta_settings
+        self.meta_settings = dict(meta_settings)
+        self.model = model
+        self.level = level
+        self.incr = self.meta_settings.get('continuity_correction', 0.5)
+    
+    def effect_sizes(self, data: pd.DataFrame, analysis_type: str) -> EffectSizes:
+        """
+        Compute per-study effect sizes
+        
+        Args:
+            data: Validated study data
+            analysis_type: Type of meta-analysis
+        
+        Returns:
+            EffectSizes: Per-study estimates on the pooling scale
+        """
+        summary_measure = self.meta_settings['summary_measure']
+        valid_measures = META_SETTINGS['summary_measures'].get(analysis_type)
+        if valid_measures is None:
+            raise ValueError(f"Unknown analysis type: {analysis_type}")
+        if summary_measure not in valid_measures:
+            raise ValueError(f"Invalid summary measure for {analysis_type}: {summary_measure}")
+        
+        pooling_method = self.meta_settings.get('pooling_method', 'Inverse')
+        method_smd = pooling_method if pooling_method in SMD_METHODS else 'Hedges'
+        if analysis_type == 'binary':
+            if pooling_method not in BINARY_METHODS:
+                raise ValueError(f"Unsupported pooling method for binary data: {pooling_method}")
+            if pooling_method == 'Peto':
+                if summary_measure != 'OR':
+                    raise ValueError("Peto pooling requires the OR summary measure")
+                te, se = peto_effects(*(data[col] for col in ('event.e', 'n.e', 'event.c', 'n.c')))
+                studlab = data['studlab'].to_numpy() if 'studlab' in data.columns else None
+                n = (data['n.e'] + data['n.c']).to_numpy(dtype=np.float64)
+                return EffectSizes(te=te, se=se, summary_measure='OR', studlab=studlab, n=n)
+        
+        return compute_effect_sizes(
+            data, analysis_type, summary_measure, method_smd=method_smd, incr=self.incr
+        )
+    
+    def analyze(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str
+    ) -> Tuple[EffectSizes, MetaAnalysisResult]:
+        """
+        Run the meta-analysis
+        
+        Args:
+            data: Validated study data
+            analysis_type: Type of meta-analysis
+        
+        Returns:
+            Tuple of per-study effect sizes and pooled results
+        """
+        effects = self.effect_sizes(data, analysis_type)
+        options = dict(
+            tau2_method=self.meta_settings.get('tau2_estimator', 'DL'),
+            level=self.level,
+            ci_method=self.meta_settings.get('ci_method', 'classic'),
+            hk_adjustment=self.meta_settings.get('hartung_knapp_adjustment', '')
+        )
+        pooling_method = self.meta_settings.get('pooling_method', 'Inverse')
+        
+        if analysis_type == 'binary' and pooling_method == 'MH':
+            result = pool_mh(
+                *(data[col].to_numpy(dtype=np.float64) for col in ('event.e', 'n.e', 'event.c', 'n.c')),
+                summary_measure=effects.summary_measure,
+                incr=self.incr,
+                **options
+            )
+        else:
+            result = pool_inverse(effects.te, effects.vi, effects.summary_measure, **options)
+            if analysis_type == 'binary' and pooling_method == 'Peto':
+                result = replace(result, pooling_method='Peto')
+        return effects, result
+    
+    def studies(self, effects: EffectSizes, tau2: float = 0.0) -> pd.DataFrame:
+        """
+        Per-study table with confidence limits and percentage weights
+        
+        Args:
+            effects: Per-study effect sizes
+            tau2: Between-study variance for the random-effects weights
+        
+        Returns:
+            pd.DataFrame: See ``plots.study_rows``
+        """
+        return study_rows(effects, tau2, self.level)
+    
+    def plots(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        max_points: int = 5000,
+        max_rows: Optional[int] = None
+    ) -> Dict[str, PlotPayload]:
+        """
+        Forest and funnel plot payloads
+        
+        The forest plot includes the configured prediction interval, if any.
+        
+        Args:
+            data: Validated study data
+            analysis_type: Type of meta-analysis
+            max_points: Downsample funnel points beyond this many studies
+            max_rows: Largest number of study rows in the forest plot
+        
+        Returns:
+            Dict: ``forest`` and ``funnel`` PlotPayloads
+        """
+        effects, result = self.analyze(data, analysis_type)
+        prediction = None
+        predict_method = self.meta_settings.get('prediction_interval_method', '')
+        if predict_method and int(result.k) >= 3:
+            interval = prediction_interval(
+                effects.te, effects.vi, predict_method,
+                self.meta_settings.get('tau2_estimator', 'DL'), self.level
+            )
+            prediction = (float(interval.lower), float(interval.upper))
+        
+        center = result.random if self.model == 'random' else result.fixed
+        return {
+            'forest': forest_payload(effects, result, self.level, prediction, max_rows),
+            'funnel': funnel_payload(
+                effects.te, effects.vi, float(center.te), effects.summary_measure,
+                self.level, max_points=max_points
+            )
+        }
+    
+    def leave_one_out(self, effects: EffectSizes) -> pd.DataFrame:
+        """
+        Leave-one-out sensitivity table for computed effect sizes
+        
+        Args:
+            effects: Per-study effect sizes
+        
+        Returns:
+            pd.DataFrame: Leave-one-out estimates and influence measures
+        """
+        return leave_one_out(
+            effects.te,
+            effects.vi,
+            tau2_method=self.meta_settings.get('tau2_estimator', 'DL'),
+            level=self.level,
+            studlab=effects.studlab,
+            summary_measure=effects.summary_measure
+        )
+    
+    def gosh(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        effects: Optional[EffectSizes] = None,
+        **kwargs
+    ) -> GoshResult:
+        """
+        GOSH diagnostics over subsets of the studies
+        
+        Args:
+            data: Validated study data
+            analysis_type: Type of meta-analysis
+            effects: Per-study effect sizes, computed if omitted
+            **kwargs: Passed to ``gosh`` (max_exhaustive, n_samples,
+                n_workers, seed, progress, ...)
+        
+        Returns:
+            GoshResult
+        """
+        if effects is None:
+            effects = self.effect_sizes(data, analysis_type)
+        return gosh(effects.te, effects.vi, summary_measure=effects.summary_measure, **kwargs)
+    
+    def cumulative(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        state: Optional[CumulativeMetaAnalysis] = None
+    ) -> CumulativeMetaAnalysis:
+        """
+        Add studies to a cumulative (living review) analysis
+        
+        Args:
+            data: Validated data of the new studies
+            analysis_type: Type of meta-analysis
+            state: Running analysis from a previous update; a new one is
+                started if omitted
+        
+        Returns:
+            CumulativeMetaAnalysis: Updated running analysis
+        """
+        effects = self.effect_sizes(data, analysis_type)
+        if state is None:
+            tau2_method = self.meta_settings.get('tau2_estimator', 'DL')
+            if tau2_method not in ONLINE_TAU2_ESTIMATORS:
+                logger.warning(f"Using DL instead of {tau2_method} for online updates")
+                tau2_method = 'DL'
+            state = CumulativeMetaAnalysis(effects.summary_measure, tau2_method, self.level)
+        elif state.summary_measure != effects.summary_measure:
+            raise ValueError(
+                f"Summary measure {effects.summary_measure} does not match "
+                f"the running analysis ({state.summary_measure})"
+            )
+        
+        year = data['year'].to_numpy() if 'year' in data.columns else None
+        state.update(effects.te, effects.vi, effects.studlab, year)
+        return state
+    
+    def publication_bias(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        effects: Optional[EffectSizes] = None,
+        method: Optional[str] = None
+    ) -> BiasTest:
+        """
+        Test for funnel plot asymmetry
+        
+        Harbord's test needs binary counts and Deeks' test group sample
+        sizes; where the data lack them, Egger's test is used instead.
+        
+        Args:
+            data: Validated study data
+            analysis_type: Type of meta-analysis
+            effects: Per-study effect sizes, computed if omitted
+            method: One of BIAS_TESTS; defaults to the configured method
+        
+        Returns:
+            BiasTest
+        """
+        method = method or self.meta_settings.get('publication_bias_method', 'Egger')
+        if method not in BIAS_TESTS:
+            raise ValueError(f"Unsupported publication bias test: {method}")
+        if effects is None:
+            effects = self.effect_sizes(data, analysis_type)
+        
+        column = lambda name: data[name].to_numpy(dtype=np.float64) if name in data.columns else None
+        if method == 'Harbord' and analysis_type != 'binary':
+            logger.warning(f"Harbord's test requires binary data; using Egger's test for {analysis_type} data")
+            method = 'Egger'
+        if method == 'Deeks' and (column('n.e') is None or column('n.c') is None):
+            logger.warning("Deeks' test requires group sample sizes; using Egger's test")
+            method = 'Egger'
+        
+        return publication_bias(
+            method, effects.te, effects.vi,
+            event_e=column('event.e'), n_e=column('n.e'),
+            event_c=column('event.c'), n_c=column('n.c')
+        )
+    
+    def trimfill(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        effects: Optional[EffectSizes] = None,
+        estimator: str = 'L0'
+    ) -> TrimFillResult:
+        """
+        Trim-and-fill adjusted meta-analysis
+        
+        Args:
+            data: Validated study data
+            analysis_type: Type of meta-analysis
+            effects: Per-study effect sizes, computed if omitted
+            estimator: 'L0' or 'R0'
+        
+        Returns:
+            TrimFillResult
+        """
+        if effects is None:
+            effects = self.effect_sizes(data, analysis_type)
+        return trimfill(
+            effects.te, effects.vi,
+            estimator=estimator,
+            summary_measure=effects.summary_measure,
+            tau2_method=self.meta_settings.get('tau2_estimator', 'DL'),
+            level=self.level,
+            ci_method=self.meta_settings.get('ci_method', 'classic'),
+            hk_adjustment=self.meta_settings.get('hartung_knapp_adjustment', '')
+        )
+    
+    def meta_regression(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        moderators: Optional[List[str]] = None,
+        effects: Optional[EffectSizes] = None
+    ) -> MetaRegressionResult:
+        """
+        Mixed-effects meta-regression with the Knapp-Hartung adjustment
+        
+        τ² estimators without a meta-regression counterpart fall back to REML.
+        
+        Args:
+            data: Validated study data
+            analysis_type: Type of meta-analysis
+            moderators: Moderator columns; defaults to the available
+                MODERATOR_COLUMNS
+            effects: Per-study effect sizes, computed if omitted
+        
+        Returns:
+            MetaRegressionResult
+        """
+        if moderators is None:
+            moderators = [col for col in MODERATOR_COLUMNS if col in data.columns]
+        if not moderators:
+            raise ValueError("No moderator columns for meta-regression")
+        missing = set(moderators) - set(data.columns)
+        if missing:
+            raise ValueError(f"Missing moderator columns: {missing}")
+        if effects is None:
+            effects = self.effect_sizes(data, analysis_type)
+        
+        tau2_method = self.meta_settings.get('tau2_estimator', 'REML')
+        if tau2_method not in REGRESSION_TAU2_ESTIMATORS:
+            logger.warning(f"Using REML instead of {tau2_method} for meta-regression")
+            tau2_method = 'REML'
+        
+        return meta_regression(
+            effects.te, effects.vi,
+            data[moderators].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64),
+            names=moderators,
+            tau2_method=tau2_method,
+            knha=True,
+            level=self.level
+        )
+    
+    def multilevel(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        effects: Optional[EffectSizes] = None
+    ) -> MultilevelResult:
+        """
+        Three-level model for effect sizes nested in the ``cluster`` column
+        
+        The optional ``rho`` column sets the assumed correlation of sampling
+        errors within a cluster. τ² estimators other than REML and ML fall
+        back to REML.
+        
+        Args:
+            data: Validated study data with a ``cluster`` column
+            analysis_type: Type of meta-analysis
+            effects: Per-study effect sizes, computed if omitted
+        
+        Returns:
+            MultilevelResult
+        """
+        if 'cluster' not in data.columns:
+            raise ValueError("Missing required column: cluster")
+        if effects is None:
+            effects = self.effect_sizes(data, analysis_type)
+        
+        tau2_method = self.meta_settings.get('tau2_estimator', 'REML')
+        if tau2_method not in MULTILEVEL_TAU2_ESTIMATORS:
+            logger.warning(f"Using REML instead of {tau2_method} for the three-level model")
+            tau2_method = 'REML'
+        
+        rho = None
+        if 'rho' in data.columns:
+            rho = pd.to_numeric(data['rho'], errors='coerce').to_numpy(dtype=np.float64)
+        return multilevel_meta(
+            effects.te, effects.vi, data['cluster'].to_numpy(),
+            rho=rho,
+            tau2_method=tau2_method,
+            level=self.level,
+            summary_measure=effects.summary_measure
+        )
+    
+    def subgroups(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        effects: Optional[EffectSizes] = None
+    ) -> SubgroupResult:
+        """
+        Subgroup analysis on the ``subgroup`` column
+        
+        Args:
+            data: Validated study data with a ``subgroup`` column
+            analysis_type: Type of meta-analysis
+            effects: Per-study effect sizes, computed if omitted
+        
+        Returns:
+            SubgroupResult
+        """
+        if 'subgroup' not in data.columns:
+            raise ValueError("Missing required column: subgroup")
+        if effects is None:
+            effects = self.effect_sizes(data, analysis_type)
+        
+        pooling_method = self.meta_settings.get('pooling_method', 'Inverse')
+        if analysis_type != 'binary' or pooling_method not in BINARY_METHODS:
+            pooling_method = 'Inverse'
+        counts = None
+        if pooling_method == 'MH':
+            counts = tuple(data[col].to_numpy(dtype=np.float64) for col in ('event.e', 'n.e', 'event.c', 'n.c'))
+        
+        result = subgroup_analysis(
+            effects.te, effects.vi, data['subgroup'].to_numpy(),
+            summary_measure=effects.summary_measure,
+            tau2_method=self.meta_settings.get('tau2_estimator', 'DL'),
+            level=self.level,
+            ci_method=self.meta_settings.get('ci_method', 'classic'),
+            hk_adjustment=self.meta_settings.get('hartung_knapp_adjustment', ''),
+            pooling_method='MH' if pooling_method == 'MH' else 'Inverse',
+            counts=counts,
+            incr=self.incr
+        )
+        if pooling_method == 'Peto':
+            result.result = replace(result.result, pooling_method='Peto')
+        return result
+    
+    def run(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        sensitivity: bool = False,
+        bias_test: bool = True,
+        subgroups: bool = True,
+        regression: bool = True,
+        multilevel: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Run the meta-analysis and return the results dict for the LLM handlers
+        
+        Args:
+            data: Validated study data
+            analysis_type: Type of meta-analysis
+            sensitivity: Add a leave-one-out sensitivity block
+            bias_test: Add the configured publication bias test and a
+                trim-and-fill adjusted estimate
+            subgroups: Add a subgroup block when the data have a
+                ``subgroup`` column with at least two subgroups
+            regression: Add a meta-regression block on the available
+                moderator columns (``year``, ``age``)
+            multilevel: Add a three-level block when the data have a
+                ``cluster`` column with repeated clusters
+        
+        Returns:
+            Dict: Results in the shape ``format_results`` expects
+        """
+        try:
+            effects, result = self.analyze(data, analysis_type)
+            results = result.to_results(self.model)
+            if effects.n is not None:
+                usable = np.isfinite(effects.te) & np.isfinite(effects.se) & (effects.se > 0)
+                results['n'] = int(np.nansum(effects.n[usable]))
+            tau2_method = self.meta_settings.get('tau2_estimator', 'DL')
+            tau2_ci_method = self.meta_settings.get('tau2_ci_method', '')
+            if tau2_ci_method and int(result.k) >= 2:
+                results['tau2_ci'] = tau2_ci(
+                    effects.te, effects.vi, tau2_ci_method, tau2_method, self.level
+                ).to_dict()
+            predict_method = self.meta_settings.get('prediction_interval_method', '')
+            if predict_method and int(result.k) >= 3:
+                results['prediction_interval'] = prediction_interval(
+                    effects.te, effects.vi, predict_method, tau2_method, self.level,
+                    summary_measure=effects.summary_measure
+                ).to_dict()
+            if bias_test and int(result.k) >= 3:
+                bias = self.publication_bias(data, analysis_type, effects).to_dict()
+                if bias['k'] < 10:
+                    bias['note'] = "Fewer than 10 studies; the test has low power"
+                results['publication_bias'] = bias
+                results['trim_and_fill'] = self.trimfill(data, analysis_type, effects).to_results(self.model)
+            if sensitivity and int(result.k) >= 3:
+                results['sensitivity'] = influence_summary(
+                    self.leave_one_out(effects), effects.summary_measure
+                )
+            moderators = [col for col in MODERATOR_COLUMNS if col in data.columns]
+            if regression and moderators and int(result.k) >= len(moderators) + 3:
+                results['meta_regression'] = self.meta_regression(
+                    data, analysis_type, moderators, effects
+                ).to_results()
+            if multilevel and 'cluster' in data.columns and 2 <= data['cluster'].nunique() < len(data):
+                results['multilevel'] = self.multilevel(data, analysis_type, effects).to_results()
+            if subgroups and 'subgroup' in data.columns and data['subgroup'].nunique() >= 2:
+                results['subgroups'] = self.subgroups(data, analysis_type, effects).to_results(self.model)
+            return results
+        
+        except Exception as e:
+            logger.error(f"Error running meta-analysis: {str(e)}")
+            raise
@@ -0,0 +1,268 @@
+"""
+GOSH (graphical display of study heterogeneity) diagnostics
+
+The common-effect model is fitted to every subset of studies (Olkin,
+Dahabreh and Trikalinos, 2012). All statistics follow from five sums
+over the subset, so subsets are visited in Gray-code order: consecutive
+subsets differ by one study, whose contribution is added or removed in
+O(1). Within a chunk the signed contributions are accumulated with a
+cumulative sum, and every chunk starts from sums computed directly, so
+rounding errors do not build up across chunks. Beyond
+``max_exhaustive`` studies, subsets are sampled at random, stratified
+by subset size. Chunks can run across a process pool; results are
+written into one float32 array as they arrive, with study membership
+stored as packed bits.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from math import comb
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .effect_sizes import backtransform
+from .pooling import _float
+from .tau2 import _masked
+
+logger = logging.getLogger(__name__)
+
+GOSH_COLUMNS = ('k', 'estimate', 'se', 'Q', 'I2', 'H2', 'tau2')
+
+@dataclass
+class GoshResult:
+    """Statistics for each fitted subset of studies"""
+    values: np.ndarray
+    membership: np.ndarray
+    k: int
+    exhaustive: bool
+    summary_measure: str
+    shift: float
+    
+    def column(self, name: str) -> np.ndarray:
+        """One statistic for all subsets"""
+        return self.values[:, GOSH_COLUMNS.index(name)]
+    
+    def includes(self, study: int) -> np.ndarray:
+        """Whether each subset contains the given study (0-based)"""
+        return (self.membership[:, study // 8] >> (study % 8)) & 1 == 1
+    
+    def to_frame(self) -> pd.DataFrame:
+        """Subset statistics as a data frame, one column per statistic"""
+        return pd.DataFrame(self.values, columns=list(GOSH_COLUMNS))
+    
+    def summary(self, top: int = 3) -> Dict[str, Any]:
+        """
+        Compact summary for the results dict passed to the LLM handlers
+        
+        Args:
+            top: Number of most influential studies to list
+        
+        Returns:
+            Dict: Distribution of the subset estimates and I², and the
+                studies whose inclusion shifts the estimates most
+        """
+        estimate = self.column('estimate').astype(np.float64)
+        quantiles = lambda x: dict(zip(
+            ('min', 'q25', 'median', 'q75', 'max'),
+            (_float(q) for q in np.nanquantile(x, [0, 0.25, 0.5, 0.75, 1]))
+        ))
+        
+        shifts = np.array([
+            np.mean(estimate[inside]) - np.mean(estimate[~inside])
+            if inside.any() and (~inside).any() else np.nan
+            for inside in (self.includes(j) for j in range(self.k))
+        ])
+        order = np.argsort(-np.abs(np.nan_to_num(shifts)), kind='stable')[:top]
+        return {
+            'n_subsets': int(self.values.shape[0]),
+            'exhaustive': self.exhaustive,
+            'estimate': quantiles(backtransform(estimate, self.summary_measure)),
+            'i2': quantiles(self.column('I2').astype(np.float64)),
+            'influential_studies': [
+                {'study': int(j), 'shift': _float(shifts[j])} for j in order
+            ]
+        }
+
+def _statistics(sums: np.ndarray, shift: float) -> np.ndarray:
+    """Subset statistics from [k, Σw, Σwd, Σwd², Σw²] with d = y - shift"""
+    k, sw, swd, swd2, sw2 = sums.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = swd / sw
+        q = np.maximum(swd2 - swd * mean, 0.0)
+        df = k - 1
+        i2 = np.where(df > 0, np.where(q > 0, np.maximum(0.0, (q - df) / q) * 100, 0.0), np.nan)
+        h2 = np.where(df > 0, q / df, np.nan)
+        tau2 = np.where(df > 0, np.maximum(0.0, (q - df) / (sw - sw2 / sw)), 0.0)
+        out = np.column_stack([k, shift + mean, np.sqrt(1 / sw), q, i2, h2, tau2])
+    return out.astype(np.float32)
+
+def _packed(masks: np.ndarray, n_bytes: int) -> np.ndarray:
+    """Packed study membership from integer subset masks (study j = bit j)"""
+    return masks.astype('<u8').view(np.uint8).reshape(-1, 8)[:, :n_bytes].copy()
+
+def _gray_chunk(payload: Dict[str, Any], start: int, stop: int):
+    """Subsets with Gray-code indices start..stop-1 by incremental updates"""
+    contrib = payload['contrib']
+    k = contrib.shape[0]
+    i = np.arange(start, stop, dtype=np.int64)
+    gray = i ^ (i >> 1)
+    
+    first = (gray[0] >> np.arange(k)) & 1 == 1
+    sums = np.empty((i.size, contrib.shape[1]))
+    sums[0] = contrib[first].sum(0)
+    if i.size > 1:
+        # Step i flips the lowest set bit of i, adding or removing that study
+        step = i[1:]
+        bit = np.log2(step & -step).astype(np.int64)
+        sign = np.where((gray[1:] >> bit) & 1 == 1, 1.0, -1.0)
+        sums[1:] = sums[0] + np.cumsum(sign[:, None] * contrib[bit], axis=0)
+    
+    return _statistics(sums, payload['shift']), _packed(gray, payload['n_bytes'])
+
+def _sampled_chunk(payload: Dict[str, Any], seed: np.random.SeedSequence, sizes: np.ndarray):
+    """Random subsets of the given sizes, one per entry"""
+    rng = np.random.default_rng(seed)
+    contrib = payload['contrib']
+    k = contrib.shape[0]
+    mask = np.zeros((sizes.size, k), dtype=bool)
+    offset = 0
+    for size, count in zip(*np.unique(sizes, return_counts=True)):
+        draws = rng.random((count, k))
+        cut = np.partition(draws, size - 1, axis=1)[:, size - 1:size]
+        mask[offset:offset + count] = draws <= cut
+        offset += count
+    sums = mask.astype(np.float64) @ contrib
+    return _statistics(sums, payload['shift']), np.packbits(mask, axis=1, bitorder='little')
+
+def _size_allocation(k: int, n_samples: int) -> np.ndarray:
+    """Subsets per size 1..k, proportional to the number of subsets of that size"""
+    share = np.array([comb(k, s) for s in range(1, k + 1)], dtype=np.float64)
+    share = share / share.sum() * n_samples
+    counts = np.floor(share).astype(np.int64)
+    remainder = n_samples - counts.sum()
+    counts[np.argsort(-(share - counts), kind='stable')[:remainder]] += 1
+    return counts
+
+def _run_chunks(
+    fn: Callable,
+    payload: Dict[str, Any],
+    tasks: List[Tuple],
+    offsets: np.ndarray,
+    values: np.ndarray,
+    membership: np.ndarray,
+    n_workers: int,
+    progress: Optional[Callable[[int, int], None]]
+):
+    """Run chunk tasks, writing each result at its row offset as it arrives"""
+    total = values.shape[0]
+    done = 0
+    
+    def store(index, result):
+        nonlocal done
+        chunk_values, chunk_membership = result
+        rows = slice(offsets[index], offsets[index] + chunk_values.shape[0])
+        values[rows] = chunk_values
+        membership[rows] = chunk_membership
+        done += chunk_values.shape[0]
+        if progress is not None:
+            progress(done, total)
+    
+    if n_workers <= 1:
+        for index, task in enumerate(tasks):
+            store(index, fn(payload, *task))
+        return
+    
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        pending = {}
+        submitted = 0
+        while submitted < len(tasks) or pending:
+            while submitted < len(tasks) and len(pending) < 2 * n_workers:
+                pending[pool.submit(fn, payload, *tasks[submitted])] = submitted
+                submitted += 1
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                store(pending.pop(future), future.result())
+
+def gosh(
+    yi, vi,
+    summary_measure: str = 'MD',
+    max_exhaustive: int = 20,
+    n_samples: int = 1_000_000,
+    chunk_size: int = 65536,
+    n_workers: int = 1,
+    seed=None,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> GoshResult:
+    """
+    Common-effect statistics for all (or sampled) subsets of studies
+    
+    Args:
+        yi: Effect estimates on the pooling scale, shape (k,)
+        vi: Sampling variances, shape (k,)
+        summary_measure: Summary measure, used for back-transformation
+        max_exhaustive: Largest k for which all 2^k - 1 subsets are fitted
+        n_samples: Number of random subsets for larger k
+        chunk_size: Subsets per chunk
+        n_workers: Worker processes; 1 runs in-process
+        seed: Root seed for subset sampling
+        progress: Callback ``(subsets_done, n_subsets)`` after each chunk
+    
+    Returns:
+        GoshResult: float32 statistics (columns GOSH_COLUMNS) and packed
+            membership bits per subset, in Gray-code order for exhaustive
+            runs and sorted by subset size for sampled runs
+    """
+    try:
+        yi, vi, valid = _masked(yi, vi)
+        yi, vi = yi[valid], vi[valid]
+        k = yi.size
+        if k < 2:
+            raise ValueError("GOSH needs at least two studies")
+        if max_exhaustive > 62:
+            raise ValueError("max_exhaustive must be at most 62")
+        
+        w = 1 / vi
+        shift = float(np.sum(w * yi) / np.sum(w))
+        d = yi - shift
+        payload = {
+            'contrib': np.column_stack([np.ones(k), w, w * d, w * d ** 2, w ** 2]),
+            'shift': shift,
+            'n_bytes': (k + 7) // 8
+        }
+        
+        exhaustive = k <= max_exhaustive
+        if exhaustive:
+            n_subsets = 2 ** k - 1
+            starts = np.arange(1, n_subsets + 1, chunk_size, dtype=np.int64)
+            stops = np.minimum(starts + chunk_size, n_subsets + 1)
+            tasks = [(int(a), int(b)) for a, b in zip(starts, stops)]
+            offsets = starts - 1
+            fn = _gray_chunk
+        else:
+            sizes = np.repeat(np.arange(1, k + 1), _size_allocation(k, n_samples))
+            n_subsets = sizes.size
+            offsets = np.arange(0, n_subsets, chunk_size, dtype=np.int64)
+            root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+            tasks = list(zip(root.spawn(offsets.size), np.split(sizes, offsets[1:])))
+            fn = _sampled_chunk
+            logger.info(f"Sampling {n_subsets} of 2^{k} - 1 subsets")
+        
+        values = np.empty((n_subsets, len(GOSH_COLUMNS)), dtype=np.float32)
+        membership = np.empty((n_subsets, payload['n_bytes']), dtype=np.uint8)
+        _run_chunks(fn, payload, tasks, offsets, values, membership, n_workers, progress)
+        
+        return GoshResult(
+            values=values,
+            membership=membership,
+            k=k,
+            exhaustive=exhaustive,
+            summary_measure=summary_measure,
+            shift=shift
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in GOSH analysis: {str(e)}")
+        raise
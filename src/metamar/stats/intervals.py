@@ -0,0 +1,495 @@
+"""
+Confidence intervals for τ² and prediction intervals
+
+τ² intervals invert a statistic whose distribution depends on τ²:
+
+- QP: Q-profile (Viechtbauer, 2007), the generalised Q statistic
+  against χ² quantiles
+- BJ: Biggerstaff and Jackson (2008), the exact distribution of the
+  DerSimonian-Laird Q statistic
+- J: Jackson (2013), as BJ with weights 1/SE
+- PL: profile (restricted) likelihood
+
+Each bound is the root of a monotone function of τ². The roots of all
+analyses, and both bounds, are found together by one vectorized
+bracketed root finder. Quantities that do not depend on τ² (masked
+data, quadratic form matrices, target quantiles and the eigenvalues of
+inverse-variance quadratic forms) are computed once, and the function
+values at the bracket ends are kept, so every step costs one evaluation
+of the weighted sums for the whole batch.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any, Callable
+import logging
+
+import numpy as np
+from scipy import stats
+from scipy.special import gammaln
+
+from ._layout import Segmented
+from .effect_sizes import backtransform
+from .pooling import _float, kenward_roger, random_effects_estimate, weighted_mean
+from .tau2 import _Sums, _masked, estimate_tau2
+
+logger = logging.getLogger(__name__)
+
+TAU2_CI_METHODS = ('QP', 'BJ', 'J', 'PL')
+
+PREDICTION_METHODS = ('HTS', 'HK', 'KR', 'NNF', 'S')
+
+@dataclass
+class Tau2CI:
+    """Confidence interval for τ²"""
+    tau2: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    method: str
+    level: float
+    
+    def to_dict(self, index=()) -> Dict[str, Any]:
+        """Plain-float summary including the interval for τ"""
+        lower, upper = (np.asarray(x)[index] for x in (self.lower, self.upper))
+        return {
+            'method': self.method,
+            'tau2': _float(np.asarray(self.tau2)[index]),
+            'tau2_lower': _float(lower),
+            'tau2_upper': _float(upper),
+            'tau_lower': _float(np.sqrt(lower)),
+            'tau_upper': _float(np.sqrt(upper))
+        }
+
+@dataclass
+class PredictionInterval:
+    """Prediction interval for the effect in a new study"""
+    te: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    df: np.ndarray
+    method: str
+    level: float
+    summary_measure: str
+    
+    def to_dict(self, index=()) -> Dict[str, Any]:
+        """Plain-float summary on the reporting scale"""
+        lower, upper = (
+            backtransform(np.asarray(x)[index], self.summary_measure)
+            for x in (self.lower, self.upper)
+        )
+        return {
+            'method': self.method,
+            'lower': _float(lower),
+            'upper': _float(upper),
+            'df': _float(np.asarray(self.df)[index])
+        }
+
+def _stacked(x, segments):
+    """Flat, segmented values as a NaN-padded (analyses, k_max) array"""
+    x = np.asarray(x, dtype=np.float64)
+    if segments is None:
+        return x
+    L = Segmented(segments, x.shape[-1])
+    rows = np.repeat(np.arange(L.counts.size), L.counts)
+    cols = np.arange(x.size) - np.repeat(L.starts, L.counts)
+    out = np.full((L.counts.size, L.counts.max(initial=0)), np.nan)
+    out[rows, cols] = x
+    return out
+
+def bracketed_root(
+    fn: Callable[[np.ndarray], np.ndarray],
+    lo, hi,
+    active=None,
+    tol: float = 1e-10,
+    max_iter: int = 200,
+    max_expand: int = 60
+) -> np.ndarray:
+    """
+    Roots of many monotone functions at once
+    
+    ``fn`` maps an array of arguments to an array of function values of
+    the same shape, evaluating all problems together. Where the values
+    at ``lo`` and ``hi`` share a sign, the bracket is moved up and
+    doubled until they differ. Brackets are then shrunk by the Illinois
+    variant of regula falsi, falling back to bisection for steps that
+    leave the bracket.
+    
+    Args:
+        fn: Vectorized function, monotone on each bracket
+        lo, hi: Initial brackets (``hi`` > 0)
+        active: Problems to solve; the others are returned as NaN
+        tol: Convergence tolerance relative to 1 + |root|
+        max_iter: Maximum number of shrinking steps
+        max_expand: Maximum number of bracket doublings
+    
+    Returns:
+        np.ndarray: Roots, NaN where no sign change was found
+    """
+    lo, hi = (x.astype(np.float64) for x in np.broadcast_arrays(lo, hi))
+    active = np.ones(lo.shape, dtype=bool) if active is None else np.broadcast_to(active, lo.shape).copy()
+    f_lo, f_hi = fn(lo), fn(hi)
+    
+    for _ in range(max_expand):
+        need = active & (np.sign(f_lo) == np.sign(f_hi)) & (f_lo != 0)
+        if not need.any():
+            break
+        lo, f_lo = np.where(need, hi, lo), np.where(need, f_hi, f_lo)
+        hi = np.where(need, 2 * hi, hi)
+        f_hi = np.where(need, fn(hi), f_hi)
+    
+    root = np.where(active & (f_lo == 0), lo, np.where(active & (f_hi == 0), hi, np.nan))
+    active = active & (np.sign(f_lo) * np.sign(f_hi) < 0)
+    kept = np.zeros(lo.shape, dtype=np.int8)
+    
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = hi - f_hi * (hi - lo) / (f_hi - f_lo)
+        x = np.where(np.isfinite(x) & (x > lo) & (x < hi), x, 0.5 * (lo + hi))
+        fx = fn(x)
+        move_hi = np.sign(fx) == np.sign(f_hi)
+        
+        # Illinois step: halve the value at an end kept twice in a row
+        f_lo = np.where(active & move_hi & (kept == 1), 0.5 * f_lo, f_lo)
+        f_hi = np.where(active & ~move_hi & (kept == -1), 0.5 * f_hi, f_hi)
+        hi, f_hi = np.where(active & move_hi, x, hi), np.where(active & move_hi, fx, f_hi)
+        lo, f_lo = np.where(active & ~move_hi, x, lo), np.where(active & ~move_hi, fx, f_lo)
+        kept = np.where(active, np.where(move_hi, 1, -1), kept).astype(np.int8)
+        
+        done = active & ((fx == 0) | (hi - lo <= tol * (1 + np.abs(x))))
+        root = np.where(done, x, root)
+        active = active & ~done
+    
+    return np.where(active, 0.5 * (lo + hi), root)
+
+def quadratic_form_cdf(lam, x, tol: float = 1e-10, max_terms: int = 2000) -> np.ndarray:
+    """
+    Distribution function of Σ λⱼ χ²₁ for non-negative weights λ
+    
+    Uses Ruben's (1962) mixture of χ² distributions, as in Farebrother's
+    algorithm, for many weight vectors at once. χ² probabilities for
+    successive degrees of freedom come from a recurrence.
+    
+    Args:
+        lam: Weights, shape (..., m); zero weights are ignored
+        x: Quantiles, shape (...)
+        tol: Truncation tolerance for the series
+        max_terms: Maximum number of series terms
+    
+    Returns:
+        np.ndarray: P(Σ λⱼ χ²₁ ≤ x), NaN where all weights are zero
+    """
+    lam = np.asarray(lam, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    lam = np.where(lam > 1e-12 * np.max(lam, axis=-1, keepdims=True, initial=0.0), lam, 0.0)
+    positive = lam > 0
+    m = positive.sum(-1)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lam_min = np.min(np.where(positive, lam, np.inf), axis=-1)
+        lam_max = np.max(lam, axis=-1)
+        beta = 2 / (1 / lam_min + 1 / lam_max)
+        ratio = np.where(positive, beta[..., None] / np.where(positive, lam, 1.0), 1.0)
+        c = np.where(positive, 1 - ratio, 0.0)
+        y = np.maximum(x, 0.0) / beta
+        
+        cdf = np.where(m > 0, stats.chi2.cdf(y, np.maximum(m, 1)), np.nan)
+        # Density-type term linking P(χ²_n ≤ y) and P(χ²_{n+2} ≤ y)
+        term = np.exp((m / 2) * np.log(y / 2) - y / 2 - gammaln(m / 2 + 1))
+    term = np.where(y > 0, term, 0.0)
+    
+    shape = y.shape
+    coef = np.zeros((max_terms,) + shape)
+    power_sums = np.zeros((max_terms,) + shape)
+    coef[0] = np.prod(np.sqrt(ratio), axis=-1)
+    total = coef[0] * cdf
+    weight = coef[0].copy()
+    powers = np.ones(c.shape)
+    
+    for n in range(1, max_terms):
+        powers = powers * c
+        power_sums[n] = powers.sum(-1)
+        coef[n] = np.einsum('i...,i...->...', power_sums[n:0:-1], coef[:n]) / (2 * n)
+        cdf = cdf - term
+        term = term * (y / 2) / (m / 2 + n)
+        total = total + coef[n] * cdf
+        weight = weight + coef[n]
+        if np.all(((np.abs(1 - weight) < tol) & (np.abs(coef[n]) < tol)) | (m == 0)):
+            break
+    else:
+        logger.warning(f"Quadratic form series not converged after {max_terms} terms")
+    
+    return np.where(m > 0, np.clip(total, 0.0, 1.0), np.nan)
+
+class _GeneralisedQ:
+    """
+    Generalised Q statistic Σ aᵢ(yᵢ - μₐ)² and its distribution under τ²
+    
+    Q = yᵀAy with A = diag(a) - aaᵀ/Σa, so under τ² it is distributed as
+    Σ λⱼ χ²₁ with λ the eigenvalues of S^½AS^½, S = diag(vᵢ + τ²).
+    
+    With inverse-variance weights (a = 1/v) the k - 1 non-zero λ are
+    1 + τ²η for the non-zero eigenvalues η of A, so the decomposition is
+    done once per analysis. Other weights need one per evaluation.
+    """
+    
+    def __init__(self, yi, vi, valid, exponent: float):
+        self.vi, self.valid = vi, valid
+        a = np.where(valid, vi ** -exponent, 0.0)
+        sa = a.sum(-1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mu = np.where(sa[..., 0] > 0, (a * yi).sum(-1) / sa[..., 0], 0.0)
+            self.matrix = np.where(
+                sa[..., None] > 0,
+                a[..., :, None] * np.eye(a.shape[-1]) - a[..., :, None] * a[..., None, :] / sa[..., None],
+                0.0
+            )
+        self.q = (a * (yi - mu[..., None]) ** 2).sum(-1)
+        
+        self.eta = None
+        if exponent == 1:
+            # The non-zero eigenvalues are at least min(a); the rest are
+            # the null vector of A and padding
+            eta = np.linalg.eigvalsh(self.matrix)
+            a_min = np.min(np.where(valid, a, np.inf), axis=-1, keepdims=True, initial=np.inf)
+            self.eta = np.where(eta >= 0.5 * a_min, eta, np.nan)
+    
+    def cdf(self, tau2):
+        """P(Q ≤ observed Q) under τ², for τ² of shape (n, ...) or (...)"""
+        tau2 = np.asarray(tau2)[..., None]
+        if self.eta is not None:
+            lam = np.where(np.isnan(self.eta), 0.0, 1 + tau2 * np.nan_to_num(self.eta))
+        else:
+            root_s = np.sqrt(np.where(self.valid, self.vi + tau2, 0.0))
+            lam = np.linalg.eigvalsh(root_s[..., :, None] * self.matrix * root_s[..., None, :])
+        return quadratic_form_cdf(lam, np.broadcast_to(self.q, lam.shape[:-1]))
+
+def _upper_start(yi, vi, valid):
+    """Upper bracket start from the spread of the effects and variances"""
+    k = valid.sum(-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(k > 0, yi.sum(-1) / k, 0.0)
+    spread = np.max(np.where(valid, (yi - mean[..., None]) ** 2, 0.0), axis=-1, initial=0.0)
+    return np.maximum(spread + np.max(np.where(valid, vi, 0.0), axis=-1, initial=0.0), 1e-4)
+
+def _log_likelihood(yi, vi, valid, tau2, reml: bool):
+    """(Restricted) log-likelihood profiled over the mean, up to a constant"""
+    tau2 = np.asarray(tau2)
+    s = _Sums(yi, vi, valid, tau2)
+    log_det = np.where(valid, np.log(vi + tau2[..., None]), 0.0).sum(-1)
+    ll = -0.5 * (log_det + s.q)
+    if reml:
+        with np.errstate(divide='ignore'):
+            ll = ll - 0.5 * np.log(s.sw)
+    return ll
+
+def _bound_levels(alpha: float, ndim: int) -> np.ndarray:
+    """Upper and lower tail levels, shaped to stack the two bounds on a leading axis"""
+    return np.array([1 - alpha / 2, alpha / 2]).reshape((2,) + (1,) * ndim)
+
+def tau2_ci(
+    yi, vi,
+    method: str = 'QP',
+    tau2_method: str = 'REML',
+    level: float = 0.95,
+    segments=None,
+    tol: float = 1e-10
+) -> Tau2CI:
+    """
+    Confidence intervals for τ² for one or many meta-analyses
+    
+    Args:
+        yi: Effect estimates, shape (..., k); NaN marks missing studies
+        vi: Sampling variances, shape (..., k)
+        method: One of TAU2_CI_METHODS
+        tau2_method: τ² estimator for the reported point estimate; PL
+            uses the ML likelihood for 'ML' and the REML likelihood otherwise
+        level: Confidence level
+        segments: Optional start offsets of analyses in flat, sorted input
+        tol: Root-finding tolerance
+    
+    Returns:
+        Tau2CI: Point estimates and bounds per analysis (NaN for k < 2)
+    """
+    if method not in TAU2_CI_METHODS:
+        raise ValueError(f"Unsupported τ² CI method: {method}")
+    
+    yi, vi = _stacked(yi, segments), _stacked(vi, segments)
+    estimator = ('ML' if tau2_method == 'ML' else 'REML') if method == 'PL' else tau2_method
+    tau2 = estimate_tau2(yi, vi, estimator).tau2
+    yi, vi, valid = _masked(yi, vi)
+    k = valid.sum(-1)
+    enough = k > 1
+    alpha = 1 - level
+    hi = np.broadcast_to(_upper_start(yi, vi, valid), (2,) + k.shape)
+    
+    if method == 'PL':
+        reml = estimator == 'REML'
+        ll_max = _log_likelihood(yi, vi, valid, tau2, reml)
+        crit = stats.chi2.ppf(level, 1) / 2
+        fn = lambda t: _log_likelihood(yi, vi, valid, t, reml) - ll_max + crit
+        
+        # The lower bound lies in [0, τ̂²], the upper bound above τ̂²
+        at_zero = fn(np.zeros(k.shape))
+        lo = np.stack([np.zeros(k.shape), tau2])
+        hi = np.stack([tau2, tau2 + hi[1]])
+        roots = bracketed_root(fn, lo, hi, active=np.stack([enough & (at_zero < 0), enough]), tol=tol)
+        lower = np.where(at_zero >= 0, 0.0, roots[0])
+        upper = roots[1]
+    else:
+        if method == 'QP':
+            targets = stats.chi2.ppf(_bound_levels(alpha, k.ndim), np.maximum(k - 1, 1))
+            fn = lambda t: _Sums(yi, vi, valid, t).q - targets
+        else:
+            q = _GeneralisedQ(yi, vi, valid, 1.0 if method == 'BJ' else 0.5)
+            targets = _bound_levels(alpha, k.ndim)
+            fn = lambda t: q.cdf(t) - targets
+        
+        # Both statistics decrease in τ²; a bound is zero where the
+        # statistic is already below its target at τ² = 0
+        positive = fn(np.zeros((2,) + k.shape)) > 0
+        roots = bracketed_root(fn, np.zeros((2,) + k.shape), hi, active=positive & enough, tol=tol)
+        bounds = np.where(positive, roots, 0.0)
+        lower, upper = bounds[0], bounds[1]
+    
+    return Tau2CI(
+        tau2=np.where(enough, tau2, np.nan),
+        lower=np.where(enough, lower, np.nan),
+        upper=np.where(enough, upper, np.nan),
+        method=method,
+        level=level
+    )
+
+def _nnf_draws(yi, vi, valid, n_draws: int, n_nodes: int, rng, tol: float):
+    """
+    Draws of a new study's effect for the Nagashima-Noma-Furukawa interval
+    
+    τ² is drawn from its confidence distribution H(τ²) = 1 - P(Q ≤ Q_obs)
+    based on the exact distribution of the DerSimonian-Laird Q. The
+    quantile function of H is solved at ``n_nodes`` levels for all
+    analyses in one batched root search and interpolated for the draws.
+    """
+    k = valid.sum(-1)
+    q = _GeneralisedQ(yi, vi, valid, 1.0)
+    levels = (np.arange(n_nodes) + 0.5) / n_nodes
+    targets = (1 - levels).reshape((n_nodes,) + (1,) * k.ndim)
+    fn = lambda t: q.cdf(t) - targets
+    
+    zeros = np.zeros((n_nodes,) + k.shape)
+    positive = fn(zeros) > 0
+    hi = np.broadcast_to(_upper_start(yi, vi, valid), zeros.shape)
+    nodes = np.where(positive, bracketed_root(fn, zeros, hi, active=positive & (k > 1), tol=tol), 0.0)
+    
+    # Linear interpolation between the nodes, constant beyond the end
+    # levels; the levels are shared, so one search serves all analyses
+    u = rng.uniform(size=(n_draws,) + k.shape)
+    right = np.minimum(np.maximum(np.searchsorted(levels, u), 1), n_nodes - 1)
+    left = np.maximum(right - 1, 0)
+    gap = levels[right] - levels[left]
+    weight = np.clip((u - levels[left]) / np.where(gap > 0, gap, 1.0), 0.0, 1.0)
+    tau2 = (
+        (1 - weight) * np.take_along_axis(nodes, left, axis=0)
+        + weight * np.take_along_axis(nodes, right, axis=0)
+    )
+    
+    s = _Sums(yi, vi, valid, tau2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_hk = s.q / ((k - 1) * s.sw)
+    t = rng.standard_t(np.maximum(k - 1, 1), size=u.shape)
+    z = rng.standard_normal(u.shape)
+    return s.mu + t * np.sqrt(var_hk) + z * np.sqrt(tau2)
+
+def prediction_interval(
+    yi, vi,
+    method: str = 'HTS',
+    tau2_method: str = 'REML',
+    level: float = 0.95,
+    summary_measure: str = 'MD',
+    adjustment: str = '',
+    n_draws: int = 10000,
+    n_nodes: int = 100,
+    seed=None,
+    segments=None,
+    tol: float = 1e-8
+) -> PredictionInterval:
+    """
+    Prediction intervals for the effect in a new study
+    
+    - HTS: Higgins-Thompson-Spiegelhalter, t with k - 2 df
+    - HK: Hartung-Knapp standard error, t with k - 1 df
+    - KR: Kenward-Roger standard error, t with ν - 1 df for the
+      Kenward-Roger df ν (Partlett and Riley, 2017)
+    - NNF: Nagashima-Noma-Furukawa (2019) parametric bootstrap from
+      the confidence distribution of τ²
+    - S: standard normal quantiles
+    
+    Args:
+        yi: Effect estimates, shape (..., k); NaN marks missing studies
+        vi: Sampling variances, shape (..., k)
+        method: One of PREDICTION_METHODS
+        tau2_method: τ² estimator
+        level: Prediction level
+        summary_measure: Summary measure, used for back-transformation
+        adjustment: 'se' to keep the Hartung-Knapp variance factor at
+            least 1 (HK only)
+        n_draws: Bootstrap draws per analysis (NNF only)
+        n_nodes: Quantile levels solved for the τ² confidence
+            distribution (NNF only)
+        seed: Random seed (NNF only)
+        segments: Optional start offsets of analyses in flat, sorted input
+        tol: Root-finding tolerance (NNF only)
+    
+    Returns:
+        PredictionInterval: Bounds per analysis, NaN where k is too small
+    """
+    if method not in PREDICTION_METHODS:
+        raise ValueError(f"Unsupported prediction interval method: {method}")
+    
+    yi, vi = _stacked(yi, segments), _stacked(vi, segments)
+    tau2 = estimate_tau2(yi, vi, tau2_method).tau2
+    yi, vi, valid = _masked(yi, vi)
+    yi_nan = np.where(valid, yi, np.nan)
+    k = valid.sum(-1)
+    
+    if method == 'NNF':
+        random = random_effects_estimate(yi_nan, vi, tau2, level)
+        draws = _nnf_draws(yi, vi, valid, n_draws, n_nodes, np.random.default_rng(seed), tol)
+        with np.errstate(invalid='ignore'):
+            lower, upper = np.quantile(draws, [0.5 - level / 2, 0.5 + level / 2], axis=0)
+        enough = k > 1
+        return PredictionInterval(
+            te=random.te,
+            lower=np.where(enough, lower, np.nan),
+            upper=np.where(enough, upper, np.nan),
+            df=np.full(k.shape, np.nan),
+            method=method,
+            level=level,
+            summary_measure=summary_measure
+        )
+    
+    if method == 'HK':
+        random = random_effects_estimate(
+            yi_nan, vi, tau2, level, 'HK', 'se' if adjustment == 'se' else ''
+        )
+        df = k - 1.0
+    elif method == 'KR':
+        random = random_effects_estimate(yi_nan, vi, tau2, level, 'KR')
+        _, _, w = weighted_mean(yi_nan, vi, tau2)
+        df = kenward_roger(w)[1] - 1
+    else:
+        random = random_effects_estimate(yi_nan, vi, tau2, level)
+        df = k - 2.0 if method == 'HTS' else np.full(k.shape, np.inf)
+    
+    usable = (df > 0) & (k > 1)
+    se = np.sqrt(tau2 + random.se ** 2)
+    with np.errstate(invalid='ignore'):
+        crit = stats.t.ppf(0.5 + level / 2, np.where(usable, df, 1.0))
+    return PredictionInterval(
+        te=random.te,
+        lower=np.where(usable, random.te - crit * se, np.nan),
+        upper=np.where(usable, random.te + crit * se, np.nan),
+        df=np.where(usable, df, np.nan),
+        method=method,
+        level=level,
+        summary_measure=summary_measure
+    )
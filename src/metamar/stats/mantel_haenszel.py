@@ -0,0 +1,151 @@
+"""
+Mantel-Haenszel and Peto pooling of 2x2 tables
+
+Inputs follow the layout of ``pooling``: studies on the last axis with
+NaN marking missing studies, or flat arrays sorted by analysis with
+segment start offsets, so many tables (e.g. adverse events in a safety
+screen) are pooled in one call. The common-effect estimate comes from
+the Mantel-Haenszel or Peto method; heterogeneity and the
+random-effects model use the inverse-variance study estimates.
+"""
+
+from dataclasses import replace
+import numpy as np
+
+from ._layout import layout_for
+from .effect_sizes import binary_effects, continuity_correction, peto_effects
+from .pooling import MetaAnalysisResult, _z_interval, pool_inverse
+from .tau2 import _safe_div
+
+MH_MEASURES = ('OR', 'RR', 'RD')
+
+def _mh_estimate(a, b, c, d, include, summary_measure, L):
+    """Mantel-Haenszel estimate and variance from (corrected) cells"""
+    zero = lambda x: np.where(include, x, 0.0)
+    a, b, c, d = zero(a), zero(b), zero(c), zero(d)
+    n1, n2 = a + b, c + d
+    n = np.where(include, n1 + n2, 1.0)
+    
+    if summary_measure == 'OR':
+        # Robins-Breslow-Greenland variance
+        r, s = a * d / n, b * c / n
+        p, q = (a + d) / n, (b + c) / n
+        sr, ss = L.sum(r), L.sum(s)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            te = np.log(sr / ss)
+            var = (
+                L.sum(p * r) / (2 * sr ** 2)
+                + L.sum(p * s + q * r) / (2 * sr * ss)
+                + L.sum(q * s) / (2 * ss ** 2)
+            )
+    elif summary_measure == 'RR':
+        r, s = a * n2 / n, c * n1 / n
+        sr, ss = L.sum(r), L.sum(s)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            te = np.log(sr / ss)
+            var = L.sum((n1 * n2 * (a + c) - a * c * n) / n ** 2) / (sr * ss)
+    elif summary_measure == 'RD':
+        # Greenland-Robins variance
+        w = n1 * n2 / n
+        sw = L.sum(w)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            te = L.sum((a * n2 - c * n1) / n) / sw
+            terms = _safe_div(a * b * n2 ** 3 + c * d * n1 ** 3, n1 * n2 * n ** 2)
+            var = L.sum(terms) / sw ** 2
+    else:
+        raise ValueError(f"Invalid summary measure for Mantel-Haenszel pooling: {summary_measure}")
+    
+    return te, np.sqrt(var)
+
+def pool_mh(
+    event_e, n_e, event_c, n_c,
+    summary_measure: str = 'OR',
+    incr=0.5,
+    mh_exact: bool = False,
+    tau2_method: str = 'DL',
+    level: float = 0.95,
+    ci_method: str = 'classic',
+    hk_adjustment: str = '',
+    segments=None
+) -> MetaAnalysisResult:
+    """
+    Mantel-Haenszel meta-analysis of 2x2 tables
+    
+    The continuity correction is added to zero-cell studies only.
+    Double-zero studies are excluded for OR and RR, and kept for RD.
+    
+    Args:
+        event_e, n_e: Experimental arm events and sample sizes, shape (..., k)
+        event_c, n_c: Control arm events and sample sizes, shape (..., k)
+        summary_measure: 'OR', 'RR' or 'RD'
+        incr: Continuity correction for zero-cell studies, or 'TACC'
+        mh_exact: Pool uncorrected cells (the correction then only
+            affects the study estimates used for heterogeneity)
+        tau2_method: τ² estimator for the random-effects model
+        level: Confidence level
+        ci_method: Random-effects CI method
+        hk_adjustment: Hartung-Knapp adjustment
+        segments: Optional start offsets of analyses in flat, sorted input
+    
+    Returns:
+        MetaAnalysisResult: Mantel-Haenszel common effect and
+            inverse-variance random effects
+    """
+    if summary_measure not in MH_MEASURES:
+        raise ValueError(f"Invalid summary measure for Mantel-Haenszel pooling: {summary_measure}")
+    
+    L = layout_for(event_e, segments)
+    raw = [np.asarray(x, dtype=np.float64) for x in (event_e, n_e, event_c, n_c)]
+    present = np.logical_and.reduce([np.isfinite(x) for x in raw]) & (raw[1] > 0) & (raw[3] > 0)
+    raw = [np.where(present, x, 1.0) for x in raw]
+    
+    a, b, c, d, _, double_zero = continuity_correction(*raw, incr=incr)
+    if mh_exact:
+        a, c = raw[0], raw[2]
+        b, d = raw[1] - a, raw[3] - c
+    include = present & ~double_zero if summary_measure != 'RD' else present
+    te, se = _mh_estimate(a, b, c, d, include, summary_measure, L)
+    
+    yi, sei = binary_effects(*raw, summary_measure=summary_measure, incr=incr)
+    yi = np.where(present, yi, np.nan)
+    result = pool_inverse(
+        yi, sei ** 2, summary_measure, tau2_method, level, ci_method, hk_adjustment,
+        segments=segments
+    )
+    return replace(result, fixed=_z_interval(te, se, level), pooling_method='MH')
+
+def pool_peto(
+    event_e, n_e, event_c, n_c,
+    tau2_method: str = 'DL',
+    level: float = 0.95,
+    ci_method: str = 'classic',
+    hk_adjustment: str = '',
+    segments=None
+) -> MetaAnalysisResult:
+    """
+    Peto odds ratio meta-analysis of 2x2 tables
+    
+    The Peto estimate Σ(O - E)/ΣV is the inverse-variance mean of the
+    study estimates (O - E)/V with weights V, so no continuity
+    correction is needed; studies without events (or with only events)
+    have V = 0 and are excluded.
+    
+    Args:
+        event_e, n_e: Experimental arm events and sample sizes, shape (..., k)
+        event_c, n_c: Control arm events and sample sizes, shape (..., k)
+        tau2_method: τ² estimator for the random-effects model
+        level: Confidence level
+        ci_method: Random-effects CI method
+        hk_adjustment: Hartung-Knapp adjustment
+        segments: Optional start offsets of analyses in flat, sorted input
+    
+    Returns:
+        MetaAnalysisResult: Peto common effect and random effects on the
+            Peto log odds ratios
+    """
+    yi, sei = peto_effects(event_e, n_e, event_c, n_c)
+    result = pool_inverse(
+        yi, sei ** 2, 'OR', tau2_method, level, ci_method, hk_adjustment,
+        segments=segments
+    )
+    return replace(result, pooling_method='Peto')
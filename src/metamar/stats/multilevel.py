@@ -0,0 +1,288 @@
+"""
+Three-level random-effects model with cluster-robust inference
+
+Effect sizes nested in clusters (e.g. several outcomes or samples from
+one study) have marginal covariance
+
+    Σⱼ = σ²_between 11ᵀ + σ²_within I + Vⱼ
+
+within cluster j, where Vⱼ holds the sampling variances on the diagonal
+and ρⱼ√(vᵢvₗ) off the diagonal (the correlated-and-hierarchical effects
+working model). Σ is block-diagonal, so it is never formed as a k x k
+matrix: clusters are bucketed by size and each bucket's blocks are
+inverted together as one (clusters, n, n) batch. Everything the
+restricted likelihood and its gradient need then reduces to a handful of
+scalars per cluster.
+
+The CR2 adjustment matrices of Tipton and Pustejovsky (2015),
+Aⱼ = Dⱼᵀ Bⱼ^{-1/2} Dⱼ with Σⱼ = DⱼᵀDⱼ and Bⱼ = Dⱼ(Σⱼ - 11ᵀ/Σw)Dⱼᵀ for
+the intercept-only model, are n x n as well and are computed per size
+bucket from batched Cholesky and symmetric eigen decompositions. The
+robust variance and its Satterthwaite degrees of freedom are then sums
+over clusters.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any, List, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import optimize, stats
+
+from .pooling import PooledEstimate, _float, _z_interval
+from .tau2 import estimate_tau2
+
+logger = logging.getLogger(__name__)
+
+MULTILEVEL_TAU2_ESTIMATORS = ('REML', 'ML')
+
+@dataclass
+class MultilevelResult:
+    """Three-level model estimates with model-based and CR2 inference"""
+    k: int
+    n_clusters: int
+    estimate: PooledEstimate
+    robust: PooledEstimate
+    robust_df: float
+    sigma2_between: float
+    sigma2_within: float
+    i2_between: float
+    i2_within: float
+    rho: float
+    loglik: float
+    summary_measure: str
+    tau2_method: str
+    converged: bool
+    
+    def to_results(self) -> Dict[str, Any]:
+        """
+        Multilevel block for the results dict passed to the LLM handlers
+        
+        Returns:
+            Dict: Variance components and the pooled estimate with
+                model-based and cluster-robust intervals
+        """
+        return {
+            'model_type': f"Three-level random effects ({self.tau2_method})",
+            'summary_measure': self.summary_measure,
+            'k': self.k,
+            'n_clusters': self.n_clusters,
+            'rho': _float(self.rho),
+            'sigma2_between': _float(self.sigma2_between),
+            'sigma2_within': _float(self.sigma2_within),
+            'i2_between': _float(self.i2_between),
+            'i2_within': _float(self.i2_within),
+            'model_based': self.estimate.to_dict(self.summary_measure),
+            'robust': {
+                **self.robust.to_dict(self.summary_measure),
+                'method': 'CR2',
+                'df': _float(self.robust_df)
+            }
+        }
+
+class _ClusterBlocks:
+    """Effect sizes grouped into covariance blocks, batched by cluster size"""
+    
+    def __init__(self, yi: np.ndarray, vi: np.ndarray, codes: np.ndarray, rho: np.ndarray):
+        order = np.argsort(codes, kind='stable')
+        sizes = np.bincount(codes)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        
+        self.buckets: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for n in np.unique(sizes):
+            clusters = np.flatnonzero(sizes == n)
+            index = order[starts[clusters][:, None] + np.arange(n)]
+            s = np.sqrt(vi[index])
+            sampling = rho[clusters][:, None, None] * s[:, :, None] * s[:, None, :]
+            diagonal = np.arange(n)
+            sampling[:, diagonal, diagonal] = vi[index]
+            self.buckets.append((yi[index], sampling, np.eye(n, dtype=bool)))
+    
+    def evaluate(self, sigma2_between: float, sigma2_within: float) -> Dict[str, np.ndarray]:
+        """Per-cluster scalars of Σⱼ⁻¹ for the given variance components"""
+        parts = []
+        for y, sampling, eye in self.buckets:
+            cov = sampling + sigma2_between + sigma2_within * eye
+            inv = np.linalg.inv(cov)
+            c = inv.sum(-1)
+            z = np.einsum('cij,cj->ci', inv, y)
+            parts.append(np.column_stack([
+                c.sum(-1),                                  # w = 1ᵀΣ⁻¹1
+                (c * y).sum(-1),                            # 1ᵀΣ⁻¹y
+                (z * y).sum(-1),                            # yᵀΣ⁻¹y
+                (z * z).sum(-1),
+                (z * c).sum(-1),
+                (c * c).sum(-1),
+                np.linalg.slogdet(cov)[1],
+                np.trace(inv, axis1=-2, axis2=-1)
+            ]))
+        names = ('w', 'cy', 'yz', 'zz', 'zc', 'cc', 'logdet', 'trace')
+        return dict(zip(names, np.concatenate(parts).T))
+    
+    def cr2_terms(self, sigma2_between: float, sigma2_within: float, mu: float) -> Dict[str, np.ndarray]:
+        """
+        Per-cluster terms of the CR2 sandwich for the pooled estimate
+        
+        With gⱼ = Aⱼcⱼ / Σw: ``r`` = gⱼᵀ(yⱼ - μ), ``a`` = gⱼᵀΣⱼgⱼ and
+        ``u`` = 1ᵀgⱼ.
+        """
+        buckets = []
+        for y, sampling, eye in self.buckets:
+            cov = sampling + sigma2_between + sigma2_within * eye
+            c = np.linalg.solve(cov, np.ones(cov.shape[:-1] + (1,)))[..., 0]
+            buckets.append((y, cov, c))
+        m = 1 / sum(c.sum() for _, _, c in buckets)
+        
+        parts = []
+        for y, cov, c in buckets:
+            d = np.swapaxes(np.linalg.cholesky(cov), -1, -2)     # Σⱼ = DⱼᵀDⱼ
+            d1 = d.sum(-1)
+            b = d @ np.swapaxes(d, -1, -2) @ d @ np.swapaxes(d, -1, -2) - m * d1[:, :, None] * d1[:, None, :]
+            values, vectors = np.linalg.eigh(b)
+            # Pseudo-inverse root where a cluster has leverage one
+            keep = values > 1e-12 * values.max(-1, keepdims=True)
+            root = np.where(keep, 1 / np.sqrt(np.where(keep, values, 1.0)), 0.0)
+            b_inv_root = (vectors * root[:, None, :]) @ np.swapaxes(vectors, -1, -2)
+            adjust = np.swapaxes(d, -1, -2) @ b_inv_root @ d
+            g = m * np.einsum('cij,cj->ci', adjust, c)
+            parts.append(np.column_stack([
+                (g * (y - mu)).sum(-1),
+                np.einsum('ci,cij,cj->c', g, cov, g),
+                g.sum(-1)
+            ]))
+        return dict(zip(('r', 'a', 'u'), np.concatenate(parts).T))
+
+def _objective(blocks: _ClusterBlocks, reml: bool):
+    """Negative (restricted) log-likelihood and its gradient in (σ²_between, σ²_within)"""
+    def fn(theta):
+        s = blocks.evaluate(*theta)
+        total_w = s['w'].sum()
+        mu = s['cy'].sum() / total_w
+        m = 1 / total_w if reml else 0.0
+        
+        nll = 0.5 * (s['logdet'].sum() + s['yz'].sum() - mu * s['cy'].sum())
+        if reml:
+            nll += 0.5 * np.log(total_w)
+        grad_between = 0.5 * (s['w'].sum() - m * np.sum(s['w'] ** 2) - np.sum((s['cy'] - mu * s['w']) ** 2))
+        grad_within = 0.5 * (
+            s['trace'].sum() - m * s['cc'].sum()
+            - np.sum(s['zz'] - 2 * mu * s['zc'] + mu ** 2 * s['cc'])
+        )
+        return nll, np.array([grad_between, grad_within])
+    return fn
+
+def _cr2(terms: Dict[str, np.ndarray], total_w: float):
+    """CR2 variance of the pooled estimate and its Satterthwaite df"""
+    m = 1 / total_w
+    variance = np.sum(terms['r'] ** 2)
+    # Under the working model the cluster contributions have covariance
+    # Pⱼₗ = δⱼₗaⱼ - m uⱼuₗ, so E[V] = tr P and Var[V] = 2 tr P²
+    a, u = terms['a'], terms['u']
+    u2 = np.sum(u ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df = (np.sum(a) - m * u2) ** 2 / (np.sum(a ** 2) - 2 * m * np.sum(a * u ** 2) + m ** 2 * u2 ** 2)
+    return variance, df
+
+def multilevel_meta(
+    yi, vi, cluster,
+    rho=None,
+    tau2_method: str = 'REML',
+    level: float = 0.95,
+    summary_measure: str = 'MD',
+    tol: float = 1e-10
+) -> MultilevelResult:
+    """
+    Three-level meta-analysis of effect sizes nested in clusters
+    
+    Args:
+        yi: Effect estimates on the pooling scale
+        vi: Sampling variances
+        cluster: Cluster label of each effect size
+        rho: Assumed correlation of sampling errors within a cluster,
+            scalar or per effect size (averaged within each cluster,
+            ignoring NaN); defaults to 0
+        tau2_method: 'REML' or 'ML' for the variance components
+        level: Confidence level
+        summary_measure: Summary measure, used for back-transformation
+        tol: Convergence tolerance of the optimiser
+    
+    Returns:
+        MultilevelResult: Pooled estimate with model-based (normal) and
+            CR2 cluster-robust (t, Satterthwaite df) inference
+    """
+    try:
+        if tau2_method not in MULTILEVEL_TAU2_ESTIMATORS:
+            raise ValueError(f"Unsupported estimator for the three-level model: {tau2_method}")
+        
+        yi = np.asarray(yi, dtype=np.float64)
+        vi = np.asarray(vi, dtype=np.float64)
+        codes, _ = pd.factorize(pd.Series(cluster))
+        if (codes < 0).any():
+            raise ValueError("Missing cluster labels")
+        rho = np.broadcast_to(np.asarray(0.0 if rho is None else rho, dtype=np.float64), yi.shape)
+        if np.any((rho < 0) | (rho >= 1)):
+            raise ValueError("rho must be in [0, 1)")
+        
+        valid = np.isfinite(yi) & np.isfinite(vi) & (vi > 0)
+        yi, vi = yi[valid], vi[valid]
+        codes, _ = pd.factorize(codes[valid])
+        rho, given = np.nan_to_num(rho[valid]), np.isfinite(rho[valid])
+        rho_cluster = np.bincount(codes, rho) / np.maximum(np.bincount(codes, given), 1)
+        k, n_clusters = yi.size, int(codes.max(initial=-1)) + 1
+        if n_clusters < 2:
+            raise ValueError("The three-level model needs at least two clusters")
+        
+        blocks = _ClusterBlocks(yi, vi, codes, rho_cluster)
+        start = max(float(estimate_tau2(yi, vi, 'DL').tau2) / 2, 0.01 * float(np.mean(vi)))
+        fit = optimize.minimize(
+            _objective(blocks, tau2_method == 'REML'),
+            x0=[start, start],
+            jac=True,
+            method='L-BFGS-B',
+            bounds=[(0, None), (0, None)],
+            options={'ftol': tol, 'gtol': tol * 1e2}
+        )
+        if not fit.success:
+            logger.warning(f"Three-level model did not converge: {fit.message}")
+        sigma2_between, sigma2_within = (float(x) for x in fit.x)
+        
+        s = blocks.evaluate(sigma2_between, sigma2_within)
+        mu = s['cy'].sum() / s['w'].sum()
+        estimate = _z_interval(mu, np.sqrt(1 / s['w'].sum()), level)
+        
+        variance, df = _cr2(blocks.cr2_terms(sigma2_between, sigma2_within, mu), s['w'].sum())
+        se = np.sqrt(variance)
+        t = mu / se
+        crit = stats.t.ppf(0.5 + level / 2, df)
+        robust = PooledEstimate(
+            te=mu, se=se,
+            lower=mu - crit * se, upper=mu + crit * se,
+            statistic=t, pval=2 * stats.t.sf(np.abs(t), df)
+        )
+        
+        # Cheung (2014): typical sampling variance shared by both levels
+        w = 1 / vi
+        typical = (k - 1) * w.sum() / (w.sum() ** 2 - np.sum(w ** 2))
+        total = sigma2_between + sigma2_within + typical
+        
+        return MultilevelResult(
+            k=k,
+            n_clusters=n_clusters,
+            estimate=estimate,
+            robust=robust,
+            robust_df=float(df),
+            sigma2_between=sigma2_between,
+            sigma2_within=sigma2_within,
+            i2_between=100 * sigma2_between / total,
+            i2_within=100 * sigma2_within / total,
+            rho=float(np.mean(rho_cluster)),
+            loglik=-float(fit.fun) - (0.5 * (k - (tau2_method == 'REML')) * np.log(2 * np.pi)),
+            summary_measure=summary_measure,
+            tau2_method=tau2_method,
+            converged=bool(fit.success)
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in three-level meta-analysis: {str(e)}")
+        raise
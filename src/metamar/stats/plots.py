@@ -0,0 +1,345 @@
+"""
+Plot-ready payloads for forest, funnel and GOSH plots
+
+Payloads hold precomputed layers (data frames with a fixed column
+order per plot kind, see PLOT_LAYERS) and a small metadata dict, so the
+Shiny app draws them without recomputing anything. Point clouds larger
+than ``max_points`` are reduced on a regular grid, either by sampling
+within each occupied cell in proportion to its count (every cell keeps
+at least one point, so sparse regions and outliers survive) or by
+binning; the ``n`` column records how many original points each row
+stands for. Payloads serialize to column-oriented JSON or to Arrow
+tables.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Sequence
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .effect_sizes import RATIO_MEASURES, backtransform
+from .pooling import MetaAnalysisResult
+
+logger = logging.getLogger(__name__)
+
+PLOT_SCHEMA_VERSION = 1
+
+# Layers of each plot kind and their column order
+PLOT_LAYERS = {
+    'forest': {
+        'studies': ('studlab', 'TE', 'seTE', 'effect', 'lower', 'upper', 'w.fixed', 'w.random'),
+        'pooled': ('label', 'TE', 'seTE', 'effect', 'lower', 'upper')
+    },
+    'funnel': {
+        'points': ('TE', 'seTE', 'n'),
+        'contours': ('center', 'level', 'seTE', 'lower', 'upper')
+    },
+    'gosh': {
+        'points': ('I2', 'estimate', 'n')
+    }
+}
+
+# Significance levels of the contour-enhanced funnel plot (Peters et al., 2008)
+CONTOUR_LEVELS = (0.90, 0.95, 0.99)
+
+@dataclass
+class PlotPayload:
+    """Precomputed layers of one plot with a stable column schema"""
+    kind: str
+    meta: Dict[str, Any]
+    layers: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    
+    def __post_init__(self):
+        if self.kind not in PLOT_LAYERS:
+            raise ValueError(f"Unknown plot kind: {self.kind}")
+        for name, columns in PLOT_LAYERS[self.kind].items():
+            layer = self.layers.get(name)
+            if layer is None:
+                raise ValueError(f"Missing {self.kind} layer: {name}")
+            missing = set(columns) - set(layer.columns)
+            if missing:
+                raise ValueError(f"Missing columns in {self.kind} layer {name}: {missing}")
+            self.layers[name] = layer.loc[:, list(columns)].reset_index(drop=True)
+    
+    def header(self) -> Dict[str, Any]:
+        """Schema version, plot kind and metadata"""
+        return {'schema': 'metamar.plot', 'version': PLOT_SCHEMA_VERSION, 'kind': self.kind, 'meta': self.meta}
+    
+    def to_json(self, digits: int = 6) -> str:
+        """
+        Column-oriented JSON, one array per column
+        
+        Args:
+            digits: Significant digits of floating-point values
+        
+        Returns:
+            str: Compact JSON; NaN and infinite values become null
+        """
+        def column(values: pd.Series) -> str:
+            if pd.api.types.is_float_dtype(values):
+                return '[' + ','.join(
+                    f"{v:.{digits}g}" if np.isfinite(v) else 'null' for v in values.to_numpy(dtype=np.float64)
+                ) + ']'
+            return json.dumps(values.tolist(), separators=(',', ':'), default=str)
+        
+        layers = ','.join(
+            json.dumps(name) + ':{' + ','.join(
+                json.dumps(col) + ':' + column(layer[col]) for col in layer.columns
+            ) + '}'
+            for name, layer in self.layers.items()
+        )
+        header = json.dumps(self.header(), separators=(',', ':'), default=_json_default)
+        return header[:-1] + ',"layers":{' + layers + '}}'
+    
+    def to_arrow(self) -> Dict[str, Any]:
+        """
+        One Arrow table per layer, with the header in the schema metadata
+        
+        Returns:
+            Dict: Layer name to pyarrow.Table
+        """
+        from ..utils.arrow import to_arrow
+        header = json.dumps(self.header(), default=_json_default)
+        return {name: to_arrow(layer, metadata={'metamar.plot': header}) for name, layer in self.layers.items()}
+
+def _json_default(value):
+    """JSON conversion for numpy scalars in payload metadata"""
+    if isinstance(value, np.generic):
+        value = value.item()
+        return None if isinstance(value, float) and not np.isfinite(value) else value
+    return str(value)
+
+def _scale(summary_measure: str) -> str:
+    """Axis scale of the pooling scale relative to the reporting scale"""
+    if summary_measure in RATIO_MEASURES:
+        return 'log'
+    return 'atanh' if summary_measure == 'ZCOR' else 'identity'
+
+def downsample_points(
+    x, y,
+    max_points: int = 5000,
+    bins: int = 64,
+    method: str = 'sample',
+    seed: Optional[int] = 0
+) -> pd.DataFrame:
+    """
+    Density-preserving reduction of a two-dimensional point cloud
+    
+    Args:
+        x, y: Point coordinates; non-finite points are dropped
+        max_points: Largest number of rows returned
+        bins: Grid cells per axis, capped so every occupied cell fits
+            into ``max_points``
+        method: 'sample' keeps 1 + ⌊(count - 1)·r⌋ random points per cell,
+            with r chosen so at most ``max_points`` are kept; 'bin'
+            returns the mean position of each occupied cell
+        seed: Random seed for 'sample'
+    
+    Returns:
+        pd.DataFrame: Columns ``x``, ``y`` and ``n``, the number of
+            original points each row represents
+    """
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    if x.size <= max_points:
+        return pd.DataFrame({'x': x, 'y': y, 'n': np.ones(x.size)})
+    if method not in ('sample', 'bin'):
+        raise ValueError(f"Unsupported downsampling method: {method}")
+    
+    bins = max(1, min(bins, int(np.sqrt(max_points))))
+    cell_of = lambda v: np.minimum(((v - v.min()) / max(np.ptp(v), 1e-300) * bins).astype(np.int64), bins - 1)
+    cell = cell_of(x) * bins + cell_of(y)
+    cells, cell, counts = np.unique(cell, return_inverse=True, return_counts=True)
+    
+    if method == 'bin':
+        return pd.DataFrame({
+            'x': np.bincount(cell, x) / counts,
+            'y': np.bincount(cell, y) / counts,
+            'n': counts.astype(np.float64)
+        })
+    
+    rate = (max_points - cells.size) / (x.size - cells.size)
+    quota = 1 + np.floor((counts - 1) * rate).astype(np.int64)
+    order = np.lexsort((np.random.default_rng(seed).random(x.size), cell))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(x.size) - starts[cell[order]]
+    keep = np.sort(order[rank < quota[cell[order]]])
+    return pd.DataFrame({
+        'x': x[keep],
+        'y': y[keep],
+        'n': (counts / quota)[cell[keep]]
+    })
+
+def study_rows(effects, tau2: float = 0.0, level: float = 0.95) -> pd.DataFrame:
+    """
+    Per-study table with confidence limits and percentage weights
+    
+    Args:
+        effects: Per-study effect sizes (EffectSizes)
+        tau2: Between-study variance for the random-effects weights
+        level: Confidence level of the study intervals
+    
+    Returns:
+        pd.DataFrame: ``TE``/``seTE``, back-transformed ``effect``,
+            ``lower`` and ``upper``, and inverse-variance weights
+            ``w.fixed`` and ``w.random`` in percent
+    """
+    crit = stats.norm.ppf(0.5 + level / 2)
+    sm = effects.summary_measure
+    usable = np.isfinite(effects.te) & np.isfinite(effects.se) & (effects.se > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w_fixed = np.where(usable, 1 / effects.vi, 0.0)
+        w_random = np.where(usable, 1 / (effects.vi + tau2), 0.0)
+    
+    frame = effects.to_frame()
+    frame['effect'] = backtransform(effects.te, sm)
+    frame['lower'] = backtransform(effects.te - crit * effects.se, sm)
+    frame['upper'] = backtransform(effects.te + crit * effects.se, sm)
+    frame['w.fixed'] = 100 * w_fixed / w_fixed.sum()
+    frame['w.random'] = 100 * w_random / w_random.sum()
+    return frame
+
+def forest_payload(
+    effects,
+    result: MetaAnalysisResult,
+    level: float = 0.95,
+    prediction: Optional[Sequence[float]] = None,
+    max_rows: Optional[int] = None
+) -> PlotPayload:
+    """
+    Forest plot rows with confidence intervals and weights
+    
+    Args:
+        effects: Per-study effect sizes (EffectSizes)
+        result: Meta-analysis of the same studies
+        level: Confidence level of the study intervals
+        prediction: Optional prediction interval (lower, upper) on the
+            pooling scale
+        max_rows: Keep only this many studies with the largest
+            random-effects weights, in their original order
+    
+    Returns:
+        PlotPayload: Layers ``studies`` and ``pooled`` (fixed, random
+            and, if given, prediction rows) on both scales
+    """
+    sm = effects.summary_measure
+    tau2 = float(result.tau2)
+    studies = study_rows(effects, tau2, level)
+    if 'studlab' not in studies.columns:
+        studies.insert(0, 'studlab', [f"Study {i + 1}" for i in range(len(studies))])
+    studies['studlab'] = studies['studlab'].astype(str)
+    omitted = 0
+    if max_rows is not None and len(studies) > max_rows:
+        keep = np.sort(np.argsort(-studies['w.random'].to_numpy(), kind='stable')[:max_rows])
+        omitted = len(studies) - keep.size
+        studies = studies.iloc[keep]
+    
+    pooled = [
+        (label, float(est.te), float(est.se), float(est.lower), float(est.upper))
+        for label, est in (('fixed', result.fixed), ('random', result.random))
+    ]
+    if prediction is not None:
+        pooled.append(('prediction', np.nan, np.nan, float(prediction[0]), float(prediction[1])))
+    label, te, se, lower, upper = (np.array(col) for col in zip(*pooled))
+    
+    return PlotPayload('forest', {
+        'summary_measure': sm,
+        'scale': _scale(sm),
+        'level': level,
+        'k': int(result.k),
+        'tau2': tau2,
+        'i2': float(result.i2),
+        'omitted': omitted
+    }, {
+        'studies': studies,
+        'pooled': pd.DataFrame({
+            'label': label,
+            'TE': te.astype(np.float64),
+            'seTE': se.astype(np.float64),
+            'effect': backtransform(te.astype(np.float64), sm),
+            'lower': backtransform(lower.astype(np.float64), sm),
+            'upper': backtransform(upper.astype(np.float64), sm)
+        })
+    })
+
+def funnel_payload(
+    yi, vi,
+    center: float,
+    summary_measure: str = 'MD',
+    level: float = 0.95,
+    contour_levels: Sequence[float] = CONTOUR_LEVELS,
+    max_points: int = 5000,
+    method: str = 'sample'
+) -> PlotPayload:
+    """
+    Funnel plot coordinates with pseudo-confidence and significance contours
+    
+    Contours are straight lines, so each is given by its end points at
+    seTE = 0 and at the largest standard error.
+    
+    Args:
+        yi: Effect estimates on the pooling scale
+        vi: Sampling variances
+        center: Pooled estimate on the pooling scale
+        summary_measure: Summary measure
+        level: Level of the pseudo-confidence region around ``center``
+        contour_levels: Significance contours around zero
+        max_points: Downsample beyond this many studies
+        method: Downsampling method, 'sample' or 'bin'
+    
+    Returns:
+        PlotPayload: Layers ``points`` and ``contours`` on the pooling scale
+    """
+    se = np.sqrt(np.asarray(vi, dtype=np.float64))
+    points = downsample_points(yi, se, max_points=max_points, method=method)
+    # From all studies: downsampled points may sit inside the largest SE
+    finite = np.isfinite(se) & np.isfinite(np.asarray(yi, dtype=np.float64))
+    se_max = float(se[finite].max()) if finite.any() else 0.0
+    
+    rows = []
+    for kind, mid, levels in (('estimate', float(center), [level]), ('null', 0.0, list(contour_levels))):
+        for lev in levels:
+            crit = stats.norm.ppf(0.5 + lev / 2)
+            for s in (0.0, se_max):
+                rows.append((kind, lev, s, mid - crit * s, mid + crit * s))
+    
+    return PlotPayload('funnel', {
+        'summary_measure': summary_measure,
+        'scale': _scale(summary_measure),
+        'center': float(center),
+        'n_total': int(np.isfinite(se).sum()),
+        'downsampled': bool(points['n'].ne(1).any())
+    }, {
+        'points': points.rename(columns={'x': 'TE', 'y': 'seTE'}),
+        'contours': pd.DataFrame(rows, columns=list(PLOT_LAYERS['funnel']['contours']))
+    })
+
+def gosh_payload(result, max_points: int = 20000, method: str = 'sample') -> PlotPayload:
+    """
+    GOSH scatter of I² against the subset estimates
+    
+    Args:
+        result: GoshResult
+        max_points: Downsample beyond this many subsets
+        method: Downsampling method, 'sample' or 'bin'
+    
+    Returns:
+        PlotPayload: Layer ``points`` with estimates on the pooling scale
+    """
+    points = downsample_points(result.column('I2'), result.column('estimate'), max_points=max_points, method=method)
+    return PlotPayload('gosh', {
+        'summary_measure': result.summary_measure,
+        'scale': _scale(result.summary_measure),
+        'k': result.k,
+        'n_total': int(result.values.shape[0]),
+        'exhaustive': result.exhaustive,
+        'downsampled': bool(points['n'].ne(1).any())
+    }, {
+        'points': points.rename(columns={'x': 'I2', 'y': 'estimate'})
+    })
@@ -0,0 +1,310 @@
+"""
+Inverse-variance fixed- and random-effects pooling
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+import numpy as np
+from scipy import stats
+
+from .effect_sizes import backtransform
+from ._layout import layout_for
+from .tau2 import Tau2Result, _masked, estimate_tau2
+
+# Labels of the common-effect pooling methods in model descriptions
+POOLING_LABELS = {
+    'Inverse': 'Inverse variance',
+    'MH': 'Mantel-Haenszel',
+    'Peto': 'Peto'
+}
+
+@dataclass
+class PooledEstimate:
+    """Pooled effect on the pooling scale"""
+    te: np.ndarray
+    se: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    statistic: np.ndarray
+    pval: np.ndarray
+    
+    def to_dict(self, summary_measure: str, index=()) -> Dict[str, Any]:
+        """Plain-float summary, back-transformed to the reporting scale"""
+        te, lower, upper = (backtransform(np.asarray(x)[index], summary_measure)
+                            for x in (self.te, self.lower, self.upper))
+        return {
+            'effect_size': _float(te),
+            'ci_lower': _float(lower),
+            'ci_upper': _float(upper),
+            'p_value': _float(np.asarray(self.pval)[index]),
+            'TE': _float(np.asarray(self.te)[index]),
+            'seTE': _float(np.asarray(self.se)[index])
+        }
+
+@dataclass
+class MetaAnalysisResult:
+    """Fixed- and random-effects results with heterogeneity statistics"""
+    k: np.ndarray
+    fixed: PooledEstimate
+    random: PooledEstimate
+    tau2: np.ndarray
+    q: np.ndarray
+    df_q: np.ndarray
+    pval_q: np.ndarray
+    i2: np.ndarray
+    h: np.ndarray
+    summary_measure: str
+    tau2_method: str
+    ci_method: str = 'classic'
+    tau2_diagnostics: Optional[Tau2Result] = None
+    pooling_method: str = 'Inverse'
+    
+    def to_results(self, model: str = 'random', index=()) -> Dict[str, Any]:
+        """
+        Results dict in the shape ``format_results`` and the LLM handlers expect
+        
+        Args:
+            model: 'random' or 'fixed', selects the headline estimate
+            index: Index into the leading axes for batched results
+        
+        Returns:
+            Dict: Flat headline results with nested model blocks
+        """
+        fixed = self.fixed.to_dict(self.summary_measure, index)
+        random = self.random.to_dict(self.summary_measure, index)
+        headline = random if model == 'random' else fixed
+        model_type = (
+            f"Random effects ({self.tau2_method})" if model == 'random'
+            else f"Common effect ({POOLING_LABELS[self.pooling_method]})"
+        )
+        return {
+            'model_type': model_type,
+            'summary_measure': self.summary_measure,
+            **headline,
+            'k': int(np.asarray(self.k)[index]),
+            'q': _float(np.asarray(self.q)[index]),
+            'q_df': int(np.asarray(self.df_q)[index]),
+            'q_pval': _float(np.asarray(self.pval_q)[index]),
+            'i2': _float(np.asarray(self.i2)[index]),
+            'h': _float(np.asarray(self.h)[index]),
+            'tau2': _float(np.asarray(self.tau2)[index]),
+            'tau': _float(np.sqrt(np.asarray(self.tau2)[index])),
+            'tau2_estimator': self.tau2_method,
+            'ci_method': self.ci_method,
+            'pooling_method': self.pooling_method,
+            'fixed': fixed,
+            'random': random
+        }
+
+def _float(x) -> Optional[float]:
+    """Convert a 0-d value to float, mapping NaN to None for JSON output"""
+    x = float(x)
+    return None if np.isnan(x) else x
+
+def _z_interval(te, se, level):
+    """Wald interval and two-sided test based on the normal distribution"""
+    crit = stats.norm.ppf(0.5 + level / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = te / se
+    return PooledEstimate(
+        te=te, se=se,
+        lower=te - crit * se, upper=te + crit * se,
+        statistic=z, pval=2 * stats.norm.sf(np.abs(z))
+    )
+
+def weighted_mean(yi, vi, tau2=0.0, segments=None):
+    """
+    Inverse-variance weighted mean and its standard error
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        tau2: Between-study variance, shape (...) or scalar
+        segments: Optional segment start offsets for flat, sorted input
+    
+    Returns:
+        Tuple of (mean, se, weights) with weights zero for missing studies
+    """
+    L = layout_for(yi, segments)
+    yi, vi, valid = _masked(yi, vi)
+    tau2 = np.asarray(tau2, dtype=np.float64)
+    w = np.where(valid, 1 / (vi + L.expand(tau2)), 0.0)
+    sw = L.sum(w)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mu = L.sum(w * yi) / sw
+        se = np.sqrt(1 / sw)
+    return mu, se, w
+
+def heterogeneity(yi, vi, segments=None) -> Dict[str, np.ndarray]:
+    """
+    Cochran's Q and derived heterogeneity statistics
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        segments: Optional segment start offsets for flat, sorted input
+    
+    Returns:
+        Dict with Q, df, p-value, I² (percent) and H
+    """
+    L = layout_for(yi, segments)
+    mu, _, w = weighted_mean(yi, vi, segments=segments)
+    yi0 = np.where(w > 0, np.asarray(yi, dtype=np.float64), 0.0)
+    q = L.sum(w * (yi0 - L.expand(np.nan_to_num(mu))) ** 2)
+    df = L.count(w > 0) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pval = np.where(df > 0, stats.chi2.sf(q, np.maximum(df, 1)), np.nan)
+        i2 = np.where(df > 0, np.maximum(0.0, (q - df) / q) * 100, np.nan)
+        i2 = np.where((df > 0) & (q == 0), 0.0, i2)
+        h = np.where(df > 0, np.sqrt(np.maximum(q / df, 1.0)), np.nan)
+    return {'q': q, 'df': df, 'pval': pval, 'i2': i2, 'h': h}
+
+def kenward_roger(w, segments=None):
+    """
+    Kenward-Roger standard error and degrees of freedom of the pooled mean
+    
+    Uses the expected REML information for τ², following Partlett and
+    Riley (2017). With equal weights this reduces to the usual standard
+    error with k - 1 degrees of freedom.
+    
+    Args:
+        w: Random-effects weights 1/(vi + τ²), zero for missing studies
+        segments: Optional segment start offsets for flat, sorted input
+    
+    Returns:
+        Tuple of (standard error, degrees of freedom); NaN for k < 2
+    """
+    L = layout_for(w, segments)
+    s1, s2, s3 = L.sum(w), L.sum(w ** 2), L.sum(w ** 3)
+    k = L.count(w > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        phi = 1 / s1
+        info = 0.5 * (s2 - 2 * s3 / s1 + (s2 / s1) ** 2)
+        var_tau2 = 1 / info
+        var_adj = phi + 2 * phi ** 2 * var_tau2 * (s3 - s2 ** 2 / s1)
+        df = 2 * s1 ** 2 / (var_tau2 * s2 ** 2)
+    enough = k > 1
+    return np.where(enough, np.sqrt(var_adj), np.nan), np.where(enough, df, np.nan)
+
+def random_effects_estimate(
+    yi, vi, tau2,
+    level: float = 0.95,
+    ci_method: str = 'classic',
+    hk_adjustment: str = '',
+    segments=None
+) -> PooledEstimate:
+    """
+    Random-effects pooled estimate for given τ²
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        tau2: Between-study variance, shape (...)
+        level: Confidence level
+        ci_method: 'classic' (normal), 'HK' (Hartung-Knapp) or 'KR'
+            (Kenward-Roger)
+        hk_adjustment: '', 'se' (variance factor at least 1) or
+            'ci'/'IQWiG6' (use the wider of the HK and classic intervals)
+        segments: Optional segment start offsets for flat, sorted input
+    
+    Returns:
+        PooledEstimate
+    """
+    L = layout_for(yi, segments)
+    mu, se, w = weighted_mean(yi, vi, tau2, segments)
+    classic = _z_interval(mu, se, level)
+    if ci_method == 'classic':
+        return classic
+    if ci_method == 'KR':
+        se_kr, df_kr = kenward_roger(w, segments=segments)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = mu / se_kr
+            crit = stats.t.ppf(0.5 + level / 2, df_kr)
+        return PooledEstimate(
+            te=mu, se=se_kr,
+            lower=mu - crit * se_kr, upper=mu + crit * se_kr,
+            statistic=t, pval=2 * stats.t.sf(np.abs(t), df_kr)
+        )
+    if ci_method != 'HK':
+        raise ValueError(f"Unsupported CI method: {ci_method}")
+    
+    yi0 = np.where(w > 0, np.asarray(yi, dtype=np.float64), 0.0)
+    df = L.count(w > 0) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = L.sum(w * (yi0 - L.expand(mu)) ** 2) / df
+        if hk_adjustment == 'se':
+            factor = np.maximum(factor, 1.0)
+        se_hk = np.sqrt(factor) * se
+        t = mu / se_hk
+        crit = stats.t.ppf(0.5 + level / 2, np.maximum(df, 1))
+    df_valid = df > 0
+    hk = PooledEstimate(
+        te=mu, se=np.where(df_valid, se_hk, np.nan),
+        lower=np.where(df_valid, mu - crit * se_hk, np.nan),
+        upper=np.where(df_valid, mu + crit * se_hk, np.nan),
+        statistic=t, pval=np.where(df_valid, 2 * stats.t.sf(np.abs(t), np.maximum(df, 1)), np.nan)
+    )
+    if hk_adjustment in ('ci', 'IQWiG6'):
+        wider = (hk.upper - hk.lower) < (classic.upper - classic.lower)
+        return PooledEstimate(*(np.where(wider, c, h) for c, h in zip(
+            (classic.te, classic.se, classic.lower, classic.upper, classic.statistic, classic.pval),
+            (hk.te, hk.se, hk.lower, hk.upper, hk.statistic, hk.pval)
+        )))
+    return hk
+
+def pool_inverse(
+    yi, vi,
+    summary_measure: str = 'MD',
+    tau2_method: str = 'DL',
+    level: float = 0.95,
+    ci_method: str = 'classic',
+    hk_adjustment: str = '',
+    tau2_init=None,
+    segments=None
+) -> MetaAnalysisResult:
+    """
+    Inverse-variance fixed- and random-effects meta-analysis
+    
+    Args:
+        yi: Effect estimates on the pooling scale, shape (..., k); NaN marks
+            studies excluded from (or padding in) an analysis
+        vi: Sampling variances, shape (..., k)
+        summary_measure: Summary measure, used for back-transformation
+        tau2_method: τ² estimator
+        level: Confidence level
+        ci_method: Random-effects CI method ('classic', 'HK' or 'KR')
+        hk_adjustment: Hartung-Knapp adjustment
+        tau2_init: Optional warm start for iterative τ² estimators
+        segments: Optional start offsets of analyses when ``yi``/``vi`` are
+            flat arrays sorted by analysis (ragged batches without padding)
+    
+    Returns:
+        MetaAnalysisResult
+    """
+    yi = np.asarray(yi, dtype=np.float64)
+    vi = np.asarray(vi, dtype=np.float64)
+    
+    L = layout_for(yi, segments)
+    het = heterogeneity(yi, vi, segments)
+    mu, se, w = weighted_mean(yi, vi, segments=segments)
+    fixed = _z_interval(mu, se, level)
+    
+    tau2_result = estimate_tau2(yi, vi, tau2_method, tau2_init=tau2_init, segments=segments)
+    tau2 = tau2_result.tau2
+    random = random_effects_estimate(yi, vi, tau2, level, ci_method, hk_adjustment, segments)
+    
+    return MetaAnalysisResult(
+        k=L.count(w > 0),
+        fixed=fixed,
+        random=random,
+        tau2=tau2,
+        q=het['q'],
+        df_q=het['df'],
+        pval_q=het['pval'],
+        i2=het['i2'],
+        h=het['h'],
+        summary_measure=summary_measure,
+        tau2_method=tau2_method,
+        ci_method=ci_method,
+        tau2_diagnostics=tau2_result
+    )
@@ -0,0 +1,338 @@
+"""
+Mixed-effects meta-regression on study-level moderators
+
+Models are fitted by weighted least squares for many analyses at once:
+leading axes index analyses (outcomes, or candidate moderators in a
+screen) and studies lie on the last axis of the effects, with NaN marking
+missing studies or moderator values. The thin QR factorization of each
+design matrix is computed once. Every τ² iteration then only forms and
+solves the p x p weighted Gram matrix of the orthonormal factor, so the
+hat matrix, residuals and REML score never refactor the design.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Sequence
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .batch import fdr_bh
+from .pooling import _float
+from .tau2 import _safe_div, _solve_root, estimate_tau2
+
+logger = logging.getLogger(__name__)
+
+REGRESSION_TAU2_ESTIMATORS = ('REML', 'ML', 'DL')
+
+@dataclass
+class MetaRegressionResult:
+    """Coefficients, τ² and heterogeneity tests of a meta-regression"""
+    terms: List[str]
+    k: np.ndarray
+    coef: np.ndarray
+    se: np.ndarray
+    statistic: np.ndarray
+    pval: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    df: np.ndarray
+    tau2: np.ndarray
+    i2: np.ndarray
+    r2: np.ndarray
+    qe: np.ndarray
+    qe_df: np.ndarray
+    qe_pval: np.ndarray
+    qm: np.ndarray
+    qm_df: int
+    qm_pval: np.ndarray
+    tau2_method: str
+    knha: bool
+    converged: np.ndarray
+    
+    def to_results(self, index=()) -> Dict[str, Any]:
+        """
+        Meta-regression block for the results dict passed to the LLM handlers
+        
+        Args:
+            index: Index into the leading axes for batched results
+        
+        Returns:
+            Dict: Model summary with one entry per coefficient
+        """
+        at = lambda x: np.asarray(x)[index]
+        df = float(at(self.df))
+        coefficients = [
+            {
+                'term': term,
+                'estimate': _float(at(self.coef)[j]),
+                'se': _float(at(self.se)[j]),
+                'statistic': _float(at(self.statistic)[j]),
+                'p_value': _float(at(self.pval)[j]),
+                'ci_lower': _float(at(self.lower)[j]),
+                'ci_upper': _float(at(self.upper)[j])
+            }
+            for j, term in enumerate(self.terms)
+        ]
+        return {
+            'model_type': (
+                f"Mixed-effects meta-regression ({self.tau2_method}"
+                f"{', Knapp-Hartung' if self.knha else ''})"
+            ),
+            'k': int(at(self.k)),
+            'tau2': _float(at(self.tau2)),
+            'i2': _float(at(self.i2)),
+            'r2': _float(at(self.r2)),
+            'coefficients': coefficients,
+            'test_moderators': {
+                'statistic': _float(at(self.qm)),
+                'df': self.qm_df,
+                'df_residual': None if np.isnan(df) else int(df),
+                'distribution': 'F' if self.knha else 'chi2',
+                'p_value': _float(at(self.qm_pval))
+            },
+            'test_residual': {
+                'q': _float(at(self.qe)),
+                'df': int(at(self.qe_df)),
+                'p_value': _float(at(self.qe_pval))
+            }
+        }
+
+class _WeightedFit:
+    """
+    Weighted least-squares fit for given τ² from a precomputed thin QR
+    
+    With X = Q R and W = diag(wᵢ), the residual projector
+    P = W - WQ(QᵀWQ)⁻¹QᵀW depends on the design only through Q.
+    """
+    
+    def __init__(self, q, yi, vi, valid, tau2):
+        self.w = np.where(valid, 1 / (vi + np.asarray(tau2)[..., None]), 0.0)
+        wq = q * self.w[..., None]
+        self.gram = np.einsum('...ki,...kj->...ij', q, wq)
+        self.gram_inv = np.linalg.pinv(self.gram, hermitian=True)
+        self.gamma = np.einsum('...ij,...j->...i', self.gram_inv, np.einsum('...ki,...k->...i', q, self.w * yi))
+        self.resid = np.where(valid, yi - np.einsum('...ki,...i->...k', q, self.gamma), 0.0)
+        self.rss = (self.w * self.resid ** 2).sum(-1)
+        
+        # Traces of P and PP from the p x p matrices QᵀWⁿQ
+        qw2q = np.einsum('...ki,...kj->...ij', q * self.w[..., None] ** 2, q)
+        qw3q = np.einsum('...ki,...kj->...ij', q * self.w[..., None] ** 3, q)
+        a = self.gram_inv @ qw2q
+        self.trace_p = self.w.sum(-1) - np.trace(a, axis1=-2, axis2=-1)
+        self.trace_pp = (
+            (self.w ** 2).sum(-1)
+            - 2 * np.trace(self.gram_inv @ qw3q, axis1=-2, axis2=-1)
+            + np.trace(a @ a, axis1=-2, axis2=-1)
+        )
+        self.yppy = ((self.w * self.resid) ** 2).sum(-1)
+
+def _score(q, yi, vi, valid, tau2, method):
+    """REML or ML score and expected information of the mixed-effects model"""
+    fit = _WeightedFit(q, yi, vi, valid, tau2)
+    if method == 'REML':
+        return 0.5 * (fit.yppy - fit.trace_p), 0.5 * fit.trace_pp
+    return 0.5 * (fit.yppy - fit.w.sum(-1)), 0.5 * (fit.w ** 2).sum(-1)
+
+def _solve_tau2(q, yi, vi, valid, p, method, tol, max_iter):
+    """
+    τ² for the mixed-effects model by moments or safeguarded Fisher scoring
+    
+    Scoring uses the safeguarded solver shared with ``estimate_tau2``;
+    analyses it hands to the bisection fallback count as converged when
+    the bracket closed.
+    """
+    k = valid.sum(-1)
+    fit0 = _WeightedFit(q, yi, vi, valid, np.zeros(k.shape))
+    tau2 = np.maximum(_safe_div(fit0.rss - (k - p), fit0.trace_p), 0.0)
+    converged = np.ones(k.shape, dtype=bool)
+    if method == 'DL':
+        return tau2, fit0, converged
+    
+    def upper():
+        mean = _safe_div(np.where(valid, yi, 0.0).sum(-1), k)
+        spread = np.where(valid, (yi - mean[..., None]) ** 2, 0.0).max(-1, initial=0.0)
+        return np.maximum(spread + np.where(valid, vi, 0.0).max(-1, initial=0.0), 1.0)
+    
+    tau2, _, converged, fallback, closed = _solve_root(
+        lambda t: _score(q, yi, vi, valid, t, method), tau2, k > p, upper, tol, max_iter
+    )
+    converged = converged | (fallback & closed)
+    
+    if not converged.all():
+        logger.warning(f"Meta-regression τ² did not converge for {int((~converged).sum())} analyses")
+    return tau2, fit0, converged
+
+def meta_regression(
+    yi, vi, moderators,
+    names: Optional[Sequence[str]] = None,
+    tau2_method: str = 'REML',
+    knha: bool = True,
+    level: float = 0.95,
+    intercept: bool = True,
+    tol: float = 1e-10,
+    max_iter: int = 100
+) -> MetaRegressionResult:
+    """
+    Mixed-effects meta-regression for one or many analyses
+    
+    Args:
+        yi: Effect estimates on the pooling scale, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        moderators: Moderator values, shape (..., k) for one moderator or
+            (..., k, m); broadcast against ``yi``
+        names: Moderator names for the coefficient table
+        tau2_method: One of REGRESSION_TAU2_ESTIMATORS
+        knha: Knapp-Hartung adjustment (t and F tests on k - p df)
+        level: Confidence level
+        intercept: Add an intercept column
+        tol: Relative convergence tolerance for τ²
+        max_iter: Maximum number of Fisher scoring iterations
+    
+    Returns:
+        MetaRegressionResult: NaN coefficients for analyses without
+            residual degrees of freedom or with a rank-deficient design
+    """
+    if tau2_method not in REGRESSION_TAU2_ESTIMATORS:
+        raise ValueError(f"Unsupported τ² estimator for meta-regression: {tau2_method}")
+    
+    yi = np.asarray(yi, dtype=np.float64)
+    vi = np.asarray(vi, dtype=np.float64)
+    x = np.asarray(moderators, dtype=np.float64)
+    if x.ndim == yi.ndim:
+        x = x[..., None]
+    shape = np.broadcast_shapes(yi.shape, vi.shape, x.shape[:-1])
+    yi, vi = np.broadcast_to(yi, shape), np.broadcast_to(vi, shape)
+    x = np.broadcast_to(x, shape + x.shape[-1:])
+    n_mod = x.shape[-1]
+    names = list(names) if names is not None else [f"x{j + 1}" for j in range(n_mod)]
+    if len(names) != n_mod:
+        raise ValueError(f"Expected {n_mod} moderator names, got {len(names)}")
+    
+    valid = np.isfinite(yi) & np.isfinite(vi) & (vi > 0) & np.isfinite(x).all(-1)
+    y = np.where(valid, yi, 0.0)
+    v = np.where(valid, vi, 1.0)
+    design = np.where(valid[..., None], x, 0.0)
+    if intercept:
+        design = np.concatenate([valid[..., None].astype(np.float64), design], axis=-1)
+    terms = (['intercept'] if intercept else []) + names
+    p = design.shape[-1]
+    k = valid.sum(-1)
+    
+    q, r = np.linalg.qr(design)
+    diag = np.abs(np.diagonal(r, axis1=-2, axis2=-1))
+    full_rank = np.all(diag > 1e-10 * np.max(diag, axis=-1, keepdims=True, initial=0.0), axis=-1)
+    usable = full_rank & (k > p)
+    
+    tau2, fit0, converged = _solve_tau2(q, y, v, valid, p, tau2_method, tol, max_iter)
+    fit = _WeightedFit(q, y, v, valid, tau2)
+    
+    # Coefficients and covariance in the original parameterization
+    r_inv = np.linalg.pinv(r)
+    coef = np.einsum('...ij,...j->...i', r_inv, fit.gamma)
+    cov = r_inv @ fit.gram_inv @ np.swapaxes(r_inv, -1, -2)
+    df = np.where(usable, k - p, np.nan)
+    if knha:
+        cov = cov * _safe_div(fit.rss, k - p)[..., None, None]
+        crit = stats.t.ppf(0.5 + level / 2, np.where(usable, df, 1.0))[..., None]
+    else:
+        crit = stats.norm.ppf(0.5 + level / 2)
+    se = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = coef / se
+    if knha:
+        pval = 2 * stats.t.sf(np.abs(statistic), np.where(usable, df, 1.0)[..., None])
+    else:
+        pval = 2 * stats.norm.sf(np.abs(statistic))
+    
+    # Omnibus test of the moderators
+    m = slice(1, None) if intercept else slice(None)
+    qm_df = p - 1 if intercept else p
+    beta_m = coef[..., m]
+    cov_m = cov[..., m, m]
+    qm = np.einsum('...i,...ij,...j->...', beta_m, np.linalg.pinv(cov_m, hermitian=True), beta_m)
+    if knha:
+        qm = qm / max(qm_df, 1)
+        qm_pval = stats.f.sf(qm, max(qm_df, 1), np.where(usable, df, 1.0))
+    else:
+        qm_pval = stats.chi2.sf(qm, max(qm_df, 1))
+    
+    # Residual heterogeneity and variance accounted for
+    qe_df = k - p
+    qe_pval = np.where(qe_df > 0, stats.chi2.sf(fit0.rss, np.maximum(qe_df, 1)), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        typical = qe_df / fit0.trace_p
+        i2 = 100 * tau2 / (tau2 + typical)
+    tau2_null = estimate_tau2(np.where(valid, yi, np.nan), vi, tau2_method).tau2
+    r2 = np.where(tau2_null > 0, np.maximum(0.0, 100 * _safe_div(tau2_null - tau2, tau2_null)), 0.0)
+    
+    nan = lambda a: np.where(usable, a, np.nan)
+    nan_terms = lambda a: np.where(usable[..., None], a, np.nan)
+    return MetaRegressionResult(
+        terms=terms,
+        k=k,
+        coef=nan_terms(coef),
+        se=nan_terms(se),
+        statistic=nan_terms(statistic),
+        pval=nan_terms(pval),
+        lower=nan_terms(coef - crit * se),
+        upper=nan_terms(coef + crit * se),
+        df=df,
+        tau2=nan(tau2),
+        i2=nan(i2),
+        r2=nan(r2),
+        qe=nan(fit0.rss),
+        qe_df=qe_df,
+        qe_pval=nan(qe_pval),
+        qm=nan(qm),
+        qm_df=qm_df,
+        qm_pval=nan(qm_pval),
+        tau2_method=tau2_method,
+        knha=knha,
+        converged=converged
+    )
+
+def screen_moderators(
+    yi, vi,
+    moderators: pd.DataFrame,
+    tau2_method: str = 'REML',
+    knha: bool = True,
+    level: float = 0.95
+) -> pd.DataFrame:
+    """
+    Fit one single-moderator meta-regression per column in one batched call
+    
+    Args:
+        yi: Effect estimates on the pooling scale, shape (k,)
+        vi: Sampling variances, shape (k,)
+        moderators: One column per candidate moderator, one row per study
+        tau2_method: One of REGRESSION_TAU2_ESTIMATORS
+        knha: Knapp-Hartung adjustment
+        level: Confidence level
+    
+    Returns:
+        pd.DataFrame: One row per moderator with the slope, its test,
+            τ², R² and FDR-adjusted p-values
+    """
+    # One analysis per moderator: designs of shape (m, k, 1)
+    x = moderators.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64).T[..., None]
+    fit = meta_regression(
+        yi, vi, x, names=['slope'], tau2_method=tau2_method, knha=knha, level=level
+    )
+    table = pd.DataFrame({
+        'moderator': list(moderators.columns),
+        'k': fit.k,
+        'estimate': fit.coef[:, 1],
+        'se': fit.se[:, 1],
+        'statistic': fit.statistic[:, 1],
+        'pval': fit.pval[:, 1],
+        'lower': fit.lower[:, 1],
+        'upper': fit.upper[:, 1],
+        'tau2': fit.tau2,
+        'R2': fit.r2,
+        'QE': fit.qe,
+        'pval.QE': fit.qe_pval
+    })
+    table['pval.fdr'] = fdr_bh(table['pval'].to_numpy())
+    return table
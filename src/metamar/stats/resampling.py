@@ -0,0 +1,315 @@
+"""
+Parallel, reproducible bootstrap and permutation resampling
+
+Replicates are generated in batches, and each batch is pooled as one
+stacked array, so a worker does vectorized work for the whole batch.
+Batches run in-process or across a process pool. Every batch draws
+from its own ``SeedSequence`` child of the root seed, so results depend
+only on the seed and batch size, not on the number of workers or the
+order in which they finish. Batches are consumed in order, and the
+resampling stops early once the Monte Carlo error of the reported
+quantities falls below a tolerance.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Callable, Tuple
+import logging
+
+import numpy as np
+
+from .pooling import pool_inverse, _float
+
+logger = logging.getLogger(__name__)
+
+BOOTSTRAP_TYPES = ('nonparametric', 'parametric')
+
+# Batches collected before the Monte Carlo error is first checked
+_MIN_BATCHES_FOR_STOPPING = 4
+
+@dataclass
+class ResamplingResult:
+    """Resampling replicates with intervals or p-values"""
+    method: str
+    observed: Dict[str, float]
+    replicates: Dict[str, np.ndarray]
+    level: float
+    stopped_early: bool = False
+    ci: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    pval: Optional[float] = None
+    mc_error: Dict[str, float] = field(default_factory=dict)
+    
+    @property
+    def n_replicates(self) -> int:
+        """Number of replicates used"""
+        return len(next(iter(self.replicates.values())))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-float summary for the results dict"""
+        result = {
+            'method': self.method,
+            'n_replicates': self.n_replicates,
+            'stopped_early': self.stopped_early,
+            'observed': {name: _float(value) for name, value in self.observed.items()},
+            'mc_error': {name: _float(value) for name, value in self.mc_error.items()}
+        }
+        if self.ci:
+            result['ci'] = {name: [_float(lo), _float(hi)] for name, (lo, hi) in self.ci.items()}
+        if self.pval is not None:
+            result['p_value'] = float(self.pval)
+        return result
+
+def _percentile_ci(x: np.ndarray, level: float) -> Tuple[float, float]:
+    """Percentile interval of bootstrap replicates"""
+    x = x[np.isfinite(x)]
+    if x.size == 0:
+        return np.nan, np.nan
+    return tuple(np.quantile(x, [0.5 - level / 2, 0.5 + level / 2]))
+
+def _quantile_mc_error(x: np.ndarray, q: float) -> float:
+    """
+    Monte Carlo standard error of a sample quantile
+    
+    Half-width of the distribution-free ±1 SE interval for the quantile,
+    from the order statistics at n·q ± √(n·q·(1 - q)).
+    """
+    x = np.sort(x[np.isfinite(x)])
+    n = x.size
+    if n < 2:
+        return np.inf
+    half = np.sqrt(n * q * (1 - q))
+    lo = int(np.clip(np.floor(n * q - half), 0, n - 1))
+    hi = int(np.clip(np.ceil(n * q + half), 0, n - 1))
+    return float(x[hi] - x[lo]) / 2
+
+def _bootstrap_batch(payload: Dict[str, Any], seed: np.random.SeedSequence, size: int):
+    """Pool one batch of bootstrap replicates as a stacked array"""
+    rng = np.random.default_rng(seed)
+    yi, vi = payload['yi'], payload['vi']
+    k = yi.size
+    if payload['kind'] == 'nonparametric':
+        index = rng.integers(0, k, size=(size, k))
+        y, v = yi[index], vi[index]
+    else:
+        v = np.broadcast_to(vi, (size, k))
+        y = rng.normal(payload['mu'], np.sqrt(vi + payload['tau2']), size=(size, k))
+    result = pool_inverse(y, v, tau2_method=payload['tau2_method'])
+    return {'te': result.random.te, 'tau2': result.tau2, 'i2': result.i2}
+
+def _permutation_batch(payload: Dict[str, Any], seed: np.random.SeedSequence, size: int):
+    """Random-effects z-statistics for one batch of random sign flips"""
+    rng = np.random.default_rng(seed)
+    yi, vi = payload['yi'], payload['vi']
+    signs = rng.choice([-1.0, 1.0], size=(size, yi.size))
+    result = pool_inverse(signs * yi, np.broadcast_to(vi, signs.shape), tau2_method=payload['tau2_method'])
+    return {'statistic': result.random.statistic}
+
+def run_replicates(
+    batch_fn: Callable,
+    payload: Dict[str, Any],
+    n_replicates: int,
+    batch_size: int = 250,
+    n_workers: int = 1,
+    seed=None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    mc_error: Optional[Callable[[Dict[str, np.ndarray]], float]] = None,
+    mc_tol: Optional[float] = None
+) -> Tuple[Dict[str, np.ndarray], bool]:
+    """
+    Generate replicates in batches, optionally across a process pool
+    
+    Args:
+        batch_fn: Module-level function ``(payload, seed_sequence, size)``
+            returning a dict of per-replicate arrays
+        payload: Data passed to every batch
+        n_replicates: Maximum number of replicates
+        batch_size: Replicates per batch (stacked into one array)
+        n_workers: Worker processes; 1 runs in-process
+        seed: Root seed (int or SeedSequence)
+        progress: Callback ``(replicates_done, n_replicates)`` after each batch
+        mc_error: Monte Carlo error of the collected replicates
+        mc_tol: Stop once ``mc_error`` falls below this value
+    
+    Returns:
+        Tuple of (replicates per statistic, whether stopping was early)
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    sizes = [min(batch_size, n_replicates - start) for start in range(0, n_replicates, batch_size)]
+    seeds = root.spawn(len(sizes))
+    collected = []
+    done = 0
+    
+    def consume(batch) -> bool:
+        """Add a batch; True if the Monte Carlo error is small enough"""
+        nonlocal done
+        collected.append(batch)
+        done += len(next(iter(batch.values())))
+        if progress is not None:
+            progress(done, n_replicates)
+        if mc_tol is None or mc_error is None or len(collected) < _MIN_BATCHES_FOR_STOPPING:
+            return False
+        return done < n_replicates and mc_error(_concatenate(collected)) < mc_tol
+    
+    stopped = False
+    if n_workers <= 1:
+        for size, batch_seed in zip(sizes, seeds):
+            if consume(batch_fn(payload, batch_seed, size)):
+                stopped = True
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            # Keep a bounded number of batches in flight and consume them in
+            # submission order, so early stopping is deterministic
+            pending = []
+            submitted = 0
+            while submitted < len(sizes) or pending:
+                while submitted < len(sizes) and len(pending) < 2 * n_workers:
+                    pending.append(pool.submit(batch_fn, payload, seeds[submitted], sizes[submitted]))
+                    submitted += 1
+                if consume(pending.pop(0).result()):
+                    stopped = True
+                    for future in pending:
+                        future.cancel()
+                    break
+    
+    if stopped:
+        logger.info(f"Resampling stopped early after {done} of {n_replicates} replicates")
+    return _concatenate(collected), stopped
+
+def _concatenate(batches) -> Dict[str, np.ndarray]:
+    return {name: np.concatenate([b[name] for b in batches]) for name in batches[0]}
+
+def bootstrap(
+    yi, vi,
+    tau2_method: str = 'DL',
+    n_boot: int = 1000,
+    kind: str = 'nonparametric',
+    level: float = 0.95,
+    batch_size: int = 250,
+    n_workers: int = 1,
+    seed=None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    mc_tol: Optional[float] = None
+) -> ResamplingResult:
+    """
+    Bootstrap percentile intervals for the random-effects estimate, τ² and I²
+    
+    Args:
+        yi: Effect estimates on the pooling scale
+        vi: Sampling variances
+        tau2_method: τ² estimator
+        n_boot: Maximum number of bootstrap replicates
+        kind: 'nonparametric' (resample studies) or 'parametric' (draw from
+            the fitted random-effects model)
+        level: Confidence level
+        batch_size: Replicates per stacked batch
+        n_workers: Worker processes; 1 runs in-process
+        seed: Root seed for reproducibility
+        progress: Callback ``(replicates_done, n_boot)``
+        mc_tol: Stop once the Monte Carlo error of both endpoints of the
+            pooled-estimate interval falls below this value
+    
+    Returns:
+        ResamplingResult: Observed values, replicates and percentile intervals
+    """
+    if kind not in BOOTSTRAP_TYPES:
+        raise ValueError(f"Unsupported bootstrap type: {kind}")
+    yi = np.asarray(yi, dtype=np.float64)
+    vi = np.asarray(vi, dtype=np.float64)
+    keep = np.isfinite(yi) & np.isfinite(vi) & (vi > 0)
+    yi, vi = yi[keep], vi[keep]
+    if yi.size < 2:
+        raise ValueError("Bootstrap needs at least two studies")
+    
+    fit = pool_inverse(yi, vi, tau2_method=tau2_method, level=level)
+    observed = {'te': float(fit.random.te), 'tau2': float(fit.tau2), 'i2': float(fit.i2)}
+    payload = {
+        'yi': yi, 'vi': vi, 'tau2_method': tau2_method, 'kind': kind,
+        'mu': observed['te'], 'tau2': observed['tau2']
+    }
+    tails = (0.5 - level / 2, 0.5 + level / 2)
+    
+    def endpoint_error(replicates) -> Dict[str, float]:
+        return {
+            name: max(_quantile_mc_error(values, q) for q in tails)
+            for name, values in replicates.items()
+        }
+    
+    replicates, stopped = run_replicates(
+        _bootstrap_batch, payload, n_boot, batch_size, n_workers, seed, progress,
+        mc_error=lambda r: endpoint_error(r)['te'], mc_tol=mc_tol
+    )
+    return ResamplingResult(
+        method=f"{kind} bootstrap",
+        observed=observed,
+        replicates=replicates,
+        level=level,
+        stopped_early=stopped,
+        ci={name: _percentile_ci(values, level) for name, values in replicates.items()},
+        mc_error=endpoint_error(replicates)
+    )
+
+def permutation_test(
+    yi, vi,
+    tau2_method: str = 'DL',
+    n_perm: int = 1000,
+    batch_size: int = 250,
+    n_workers: int = 1,
+    seed=None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    mc_tol: Optional[float] = None
+) -> ResamplingResult:
+    """
+    Permutation test of the random-effects estimate against zero
+    
+    Under the null hypothesis the signs of the effects are exchangeable,
+    so each replicate flips them at random and refits the model.
+    
+    Args:
+        yi: Effect estimates on the pooling scale
+        vi: Sampling variances
+        tau2_method: τ² estimator
+        n_perm: Maximum number of permutations
+        batch_size: Permutations per stacked batch
+        n_workers: Worker processes; 1 runs in-process
+        seed: Root seed for reproducibility
+        progress: Callback ``(replicates_done, n_perm)``
+        mc_tol: Stop once the Monte Carlo standard error of the p-value
+            falls below this value
+    
+    Returns:
+        ResamplingResult: Observed z-statistic, replicates and p-value
+    """
+    yi = np.asarray(yi, dtype=np.float64)
+    vi = np.asarray(vi, dtype=np.float64)
+    keep = np.isfinite(yi) & np.isfinite(vi) & (vi > 0)
+    yi, vi = yi[keep], vi[keep]
+    if yi.size < 2:
+        raise ValueError("Permutation test needs at least two studies")
+    
+    observed = float(pool_inverse(yi, vi, tau2_method=tau2_method).random.statistic)
+    
+    def pvalue(replicates) -> float:
+        z = replicates['statistic']
+        # Small tolerance so replicates equal to the observed value count as extreme
+        extreme = np.count_nonzero(np.abs(z) >= abs(observed) * (1 - 1e-12))
+        return (extreme + 1) / (z.size + 1)
+    
+    def pvalue_error(replicates) -> float:
+        p = pvalue(replicates)
+        return float(np.sqrt(p * (1 - p) / replicates['statistic'].size))
+    
+    replicates, stopped = run_replicates(
+        _permutation_batch, {'yi': yi, 'vi': vi, 'tau2_method': tau2_method},
+        n_perm, batch_size, n_workers, seed, progress,
+        mc_error=pvalue_error, mc_tol=mc_tol
+    )
+    return ResamplingResult(
+        method='permutation',
+        observed={'statistic': observed},
+        replicates=replicates,
+        level=0.95,
+        stopped_early=stopped,
+        pval=pvalue(replicates),
+        mc_error={'p_value': pvalue_error(replicates)}
+    )
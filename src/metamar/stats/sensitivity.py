@@ -0,0 +1,208 @@
+"""
+Leave-one-out sensitivity analysis and influence diagnostics
+"""
+
+from typing import Dict, Any
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .effect_sizes import backtransform
+from .pooling import pool_inverse, random_effects_estimate
+from .tau2 import estimate_tau2
+
+logger = logging.getLogger(__name__)
+
+def _omit_sums(x):
+    """Totals with each element left out in turn"""
+    return x.sum() - x
+
+def _moment_tau2_omitted(yi, vi, w, method):
+    """
+    Leave-one-out τ² for the moment estimators from full-data sums, O(k)
+    
+    Returns None for estimators that need re-weighting per omission.
+    """
+    k = yi.size
+    s0, s1, s2, sw2 = (_omit_sums(x) for x in (w, w * yi, w * yi ** 2, w ** 2))
+    q = s2 - s1 ** 2 / s0
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'DL':
+            tau2 = (q - (k - 2)) / (s0 - sw2 / s0)
+        elif method == 'HS':
+            tau2 = (q - (k - 1)) / s0
+        elif method == 'HE':
+            sy, sy2, sv = (_omit_sums(x) for x in (yi, yi ** 2, vi))
+            rss = sy2 - sy ** 2 / (k - 1)
+            tau2 = rss / (k - 2) - sv / (k - 1)
+        else:
+            return None
+    return np.where(np.isfinite(tau2), np.maximum(tau2, 0.0), 0.0)
+
+def leave_one_out(
+    yi, vi,
+    tau2_method: str = 'DL',
+    level: float = 0.95,
+    studlab=None,
+    summary_measure: str = 'MD',
+    chunk_size: int = 512
+) -> pd.DataFrame:
+    """
+    Leave-one-out estimates and influence diagnostics
+    
+    Fixed-effect estimates, Q and I² without each study come from the
+    full-data weighted sums in O(k) overall, as do τ² values for the DL,
+    HS and HE estimators. Random-effects re-pooling and the remaining τ²
+    estimators are evaluated for blocks of omitted studies at once, with
+    iterative solvers warm-started at the full-data estimate.
+    
+    Args:
+        yi: Effect estimates on the pooling scale
+        vi: Sampling variances
+        tau2_method: τ² estimator
+        level: Confidence level
+        studlab: Optional study labels
+        summary_measure: Summary measure, used for back-transformation
+        chunk_size: Omitted studies evaluated per vectorized block
+    
+    Returns:
+        pd.DataFrame: One row per omitted study with the pooled estimate
+            without it, Δestimate, ΔI², τ², Q and influence measures
+            (studentized residual, DFFITS, Cook's distance, covariance
+            ratio, hat value and weight)
+    """
+    yi = np.asarray(yi, dtype=np.float64)
+    vi = np.asarray(vi, dtype=np.float64)
+    valid = np.isfinite(yi) & np.isfinite(vi) & (vi > 0)
+    index = np.flatnonzero(valid)
+    labels = np.asarray(studlab)[index] if studlab is not None else index
+    y, v = yi[index], vi[index]
+    k = y.size
+    if k < 3:
+        raise ValueError("Leave-one-out analysis needs at least three studies")
+    
+    full = pool_inverse(y, v, summary_measure, tau2_method, level)
+    tau2_full = float(full.tau2)
+    mu_full = float(full.random.te)
+    var_full = float(full.random.se) ** 2
+    
+    # Fixed-effect quantities from full-data sums
+    w = 1 / v
+    s0, s1, s2 = (_omit_sums(x) for x in (w, w * y, w * y ** 2))
+    q_omit = s2 - s1 ** 2 / s0
+    df_omit = k - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        i2_omit = np.where(q_omit > 0, np.maximum(0.0, (q_omit - df_omit) / q_omit) * 100, 0.0)
+    
+    tau2_omit = _moment_tau2_omitted(y, v, w, tau2_method)
+    
+    # Random-effects re-pooling per omitted study, in vectorized blocks
+    mu_omit = np.empty(k)
+    se_omit = np.empty(k)
+    lower = np.empty(k)
+    upper = np.empty(k)
+    pval = np.empty(k)
+    refit_tau2 = tau2_omit is None
+    if refit_tau2:
+        tau2_omit = np.empty(k)
+    
+    for start in range(0, k, chunk_size):
+        rows = np.arange(start, min(start + chunk_size, k))
+        y_block = np.tile(y, (rows.size, 1))
+        y_block[np.arange(rows.size), rows] = np.nan
+        v_block = np.broadcast_to(v, y_block.shape)
+        
+        if refit_tau2:
+            tau2_omit[rows] = estimate_tau2(
+                y_block, v_block, tau2_method, tau2_init=tau2_full
+            ).tau2
+        
+        estimate = random_effects_estimate(y_block, v_block, tau2_omit[rows], level)
+        mu_omit[rows] = estimate.te
+        se_omit[rows] = estimate.se
+        lower[rows] = estimate.lower
+        upper[rows] = estimate.upper
+        pval[rows] = estimate.pval
+    
+    # Influence measures (as in metafor::influence.rma.uni)
+    w_full = 1 / (v + tau2_full)
+    hat = w_full / w_full.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rstudent = (y - mu_omit) / np.sqrt(v + tau2_omit + se_omit ** 2)
+        dffits = (mu_full - mu_omit) / np.sqrt(hat * (tau2_omit + v))
+        cook_d = (mu_full - mu_omit) ** 2 / var_full
+        cov_r = se_omit ** 2 / var_full
+    
+    table = pd.DataFrame({
+        'studlab': labels,
+        'TE.omit': mu_omit,
+        'seTE.omit': se_omit,
+        'lower.omit': lower,
+        'upper.omit': upper,
+        'pval.omit': pval,
+        'effect.omit': backtransform(mu_omit, summary_measure),
+        'delta.TE': mu_omit - mu_full,
+        'tau2.omit': tau2_omit,
+        'Q.omit': q_omit,
+        'I2.omit': i2_omit,
+        'delta.I2': i2_omit - float(full.i2),
+        'rstudent': rstudent,
+        'dffits': dffits,
+        'cook.d': cook_d,
+        'cov.r': cov_r,
+        'hat': hat,
+        'weight': hat * 100
+    })
+    table['influential'] = _influential(table, k)
+    return table
+
+def _influential(table: pd.DataFrame, k: int) -> np.ndarray:
+    """Flag influential studies with metafor's cut-offs"""
+    return (
+        (np.abs(table['dffits']) > 3 * np.sqrt(1 / (k - 1)))
+        | (table['cook.d'] > stats.chi2.ppf(0.5, 1))
+        | (table['hat'] > 3 / k)
+    ).to_numpy()
+
+def influence_summary(
+    table: pd.DataFrame,
+    summary_measure: str = 'MD',
+    top: int = 3
+) -> Dict[str, Any]:
+    """
+    Compact sensitivity block for the LLM results payload
+    
+    Args:
+        table: Output of ``leave_one_out``
+        summary_measure: Summary measure, used for back-transformation
+        top: Number of most influential studies to list
+    
+    Returns:
+        Dict: Range of leave-one-out estimates, influential studies and
+            the studies whose omission changes the estimate most
+    """
+    order = np.argsort(-np.abs(table['delta.TE'].to_numpy()))[:top]
+    significant = table['pval.omit'] < 0.05
+    return {
+        'method': 'leave-one-out',
+        'estimate_range': [
+            float(backtransform(table['TE.omit'].min(), summary_measure)),
+            float(backtransform(table['TE.omit'].max(), summary_measure))
+        ],
+        'i2_range': [float(table['I2.omit'].min()), float(table['I2.omit'].max())],
+        'significance_changes': bool(significant.any() and not significant.all()),
+        'influential_studies': [str(s) for s in table.loc[table['influential'], 'studlab']],
+        'largest_changes': [
+            {
+                'studlab': str(table['studlab'].iloc[i]),
+                'effect_without': float(table['effect.omit'].iloc[i]),
+                'delta_te': float(table['delta.TE'].iloc[i]),
+                'delta_i2': float(table['delta.I2'].iloc[i]),
+                'dffits': float(table['dffits'].iloc[i])
+            }
+            for i in order
+        ]
+    }
@@ -0,0 +1,202 @@
+"""
+Subgroup analysis with a test for subgroup differences
+
+Studies are sorted once by subgroup, so every subgroup is a contiguous
+segment and all per-subgroup sums, τ² estimates and pooled estimates
+are segmented reductions in a single pass. The between-subgroup Q test
+compares the subgroup estimates of each model.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from ._layout import segment_starts
+from .effect_sizes import backtransform
+from .mantel_haenszel import pool_mh, pool_peto
+from .pooling import MetaAnalysisResult, PooledEstimate, pool_inverse, _float
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SubgroupResult:
+    """Per-subgroup results and tests for subgroup differences"""
+    subgroups: np.ndarray
+    result: MetaAnalysisResult
+    q_between_fixed: float
+    q_between_random: float
+    df_between: int
+    pval_between_fixed: float
+    pval_between_random: float
+    q_within: float
+    df_within: int
+    pval_within: float
+    
+    def to_results(self, model: str = 'random') -> Dict[str, Any]:
+        """
+        Subgroup block for the results dict passed to the LLM handlers
+        
+        Args:
+            model: 'random' or 'fixed', selects the subgroup estimates
+                and the between-subgroup test
+        
+        Returns:
+            Dict: One entry per subgroup and the heterogeneity tests
+        """
+        result = self.result
+        estimate = result.random if model == 'random' else result.fixed
+        q_between = self.q_between_random if model == 'random' else self.q_between_fixed
+        pval_between = self.pval_between_random if model == 'random' else self.pval_between_fixed
+        
+        groups = []
+        for i, label in enumerate(self.subgroups):
+            groups.append({
+                'subgroup': str(label),
+                'k': int(result.k[i]),
+                **estimate.to_dict(result.summary_measure, i),
+                'q': _float(result.q[i]),
+                'q_pval': _float(result.pval_q[i]),
+                'i2': _float(result.i2[i]),
+                'tau2': _float(result.tau2[i])
+            })
+        
+        return {
+            'model_type': 'Random effects' if model == 'random' else 'Common effect',
+            'summary_measure': result.summary_measure,
+            'groups': groups,
+            'test_between': {
+                'q': _float(q_between),
+                'df': self.df_between,
+                'p_value': _float(pval_between)
+            },
+            'test_within': {
+                'q': _float(self.q_within),
+                'df': self.df_within,
+                'p_value': _float(self.pval_within)
+            }
+        }
+    
+    def to_frame(self) -> pd.DataFrame:
+        """One row per subgroup with both models on the reporting scale"""
+        result = self.result
+        sm = result.summary_measure
+        return pd.DataFrame({
+            'subgroup': self.subgroups,
+            'k': result.k,
+            'TE.fixed': result.fixed.te,
+            'seTE.fixed': result.fixed.se,
+            'TE.random': result.random.te,
+            'seTE.random': result.random.se,
+            'effect.random': backtransform(result.random.te, sm),
+            'lower.random': backtransform(result.random.lower, sm),
+            'upper.random': backtransform(result.random.upper, sm),
+            'pval.random': result.random.pval,
+            'tau2': result.tau2,
+            'Q': result.q,
+            'pval.Q': result.pval_q,
+            'I2': result.i2
+        })
+
+def _q_between(estimate: PooledEstimate):
+    """Q statistic comparing subgroup estimates, and its degrees of freedom"""
+    te, se = np.asarray(estimate.te), np.asarray(estimate.se)
+    valid = np.isfinite(te) & np.isfinite(se) & (se > 0)
+    if valid.sum() < 2:
+        return np.nan, 0
+    w = 1 / se[valid] ** 2
+    mu = np.sum(w * te[valid]) / np.sum(w)
+    return float(np.sum(w * (te[valid] - mu) ** 2)), int(valid.sum() - 1)
+
+def subgroup_analysis(
+    yi, vi, subgroup,
+    summary_measure: str = 'MD',
+    tau2_method: str = 'DL',
+    level: float = 0.95,
+    ci_method: str = 'classic',
+    hk_adjustment: str = '',
+    pooling_method: str = 'Inverse',
+    counts=None,
+    incr=0.5
+) -> SubgroupResult:
+    """
+    Meta-analysis within subgroups and tests for subgroup differences
+    
+    Each subgroup has its own τ² (as in R's meta without ``tau.common``).
+    The between-subgroup Q test is computed for both the common-effect
+    and the random-effects subgroup estimates; the within-subgroup Q is
+    the sum of the subgroups' Q statistics.
+    
+    Args:
+        yi: Effect estimates on the pooling scale
+        vi: Sampling variances
+        subgroup: Subgroup label of each study
+        summary_measure: Summary measure
+        tau2_method: τ² estimator
+        level: Confidence level
+        ci_method: Random-effects CI method
+        hk_adjustment: Hartung-Knapp adjustment
+        pooling_method: Common-effect method, 'Inverse', 'MH' or 'Peto'
+        counts: Tuple of (event.e, n.e, event.c, n.c) for MH and Peto pooling
+        incr: Continuity correction for zero-cell studies, or 'TACC'
+    
+    Returns:
+        SubgroupResult
+    """
+    try:
+        codes, labels = pd.factorize(pd.Series(subgroup), sort=True)
+        if (codes < 0).any():
+            raise ValueError("Missing subgroup labels")
+        
+        order = np.argsort(codes, kind='stable')
+        options = dict(
+            tau2_method=tau2_method,
+            level=level,
+            ci_method=ci_method,
+            hk_adjustment=hk_adjustment,
+            segments=segment_starts(codes[order])
+        )
+        
+        if pooling_method in ('MH', 'Peto'):
+            if counts is None:
+                raise ValueError(f"Pooling method {pooling_method} requires event counts")
+            counts = [np.asarray(x, dtype=np.float64)[order] for x in counts]
+            if pooling_method == 'MH':
+                result = pool_mh(*counts, summary_measure=summary_measure, incr=incr, **options)
+            else:
+                result = pool_peto(*counts, **options)
+        elif pooling_method == 'Inverse':
+            yi = np.asarray(yi, dtype=np.float64)[order]
+            vi = np.asarray(vi, dtype=np.float64)[order]
+            result = pool_inverse(yi, vi, summary_measure, **options)
+        else:
+            raise ValueError(f"Unsupported pooling method: {pooling_method}")
+        
+        q_fixed, df_between = _q_between(result.fixed)
+        q_random, _ = _q_between(result.random)
+        pval = lambda q: stats.chi2.sf(q, df_between) if df_between > 0 else np.nan
+        
+        df_q = np.asarray(result.df_q)
+        within = df_q > 0
+        q_within = float(np.sum(np.asarray(result.q)[within]))
+        df_within = int(np.sum(df_q[within]))
+        
+        return SubgroupResult(
+            subgroups=np.asarray(labels),
+            result=result,
+            q_between_fixed=q_fixed,
+            q_between_random=q_random,
+            df_between=df_between,
+            pval_between_fixed=float(pval(q_fixed)),
+            pval_between_random=float(pval(q_random)),
+            q_within=q_within,
+            df_within=df_within,
+            pval_within=float(stats.chi2.sf(q_within, df_within)) if df_within > 0 else np.nan
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in subgroup analysis: {str(e)}")
+        raise
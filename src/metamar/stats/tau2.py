@@ -0,0 +1,354 @@
+"""
+Between-study variance (τ²) estimators
+
+All estimators operate on the last axis of ``yi``/``vi``; leading axes
+index independent meta-analyses, so many analyses are solved in one call.
+Missing studies (or padding of ragged analyses) are marked with NaN.
+Alternatively, ragged batches can be passed as flat arrays sorted by
+analysis together with the segment start offsets.
+
+DL, HE, HS and SJ have closed forms. REML and ML use Fisher scoring, PM
+uses Newton's method on the generalised Q-statistic and EB uses Morris'
+scoring update. Each iterative solver keeps a bracket around the root
+and replaces steps that leave it or stop contracting by bisection
+(as in Numerical Recipes' rtsafe), and analyses that still
+fail to converge fall back to bracketed bisection from scratch.
+"""
+
+from dataclasses import dataclass
+import numpy as np
+
+from ._layout import Stacked, layout_for
+
+TAU2_ESTIMATORS = ('REML', 'PM', 'DL', 'ML', 'HS', 'SJ', 'HE', 'EB')
+
+ITERATIVE_ESTIMATORS = ('REML', 'ML', 'PM', 'EB')
+
+@dataclass
+class Tau2Result:
+    """τ² estimates with solver diagnostics"""
+    tau2: np.ndarray
+    method: str
+    iterations: np.ndarray
+    converged: np.ndarray
+    fallback: np.ndarray
+
+def _masked(yi, vi):
+    """Float arrays with NaN-marked studies zeroed out, plus validity mask"""
+    yi = np.asarray(yi, dtype=np.float64)
+    vi = np.asarray(vi, dtype=np.float64)
+    valid = np.isfinite(yi) & np.isfinite(vi) & (vi > 0)
+    return np.where(valid, yi, 0.0), np.where(valid, vi, 1.0), valid
+
+def _safe_div(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b != 0, a / np.where(b != 0, b, 1.0), 0.0)
+
+class _Sums:
+    """Weighted sums for given τ², shared by the estimating equations"""
+    
+    def __init__(self, yi, vi, valid, tau2, layout=None):
+        L = layout or Stacked()
+        self.w = np.where(valid, 1 / (vi + L.expand(tau2)), 0.0)
+        self.sw = L.sum(self.w)
+        self.mu = _safe_div(L.sum(self.w * yi), self.sw)
+        r2 = (yi - L.expand(self.mu)) ** 2
+        self.w2 = self.w ** 2
+        self.sw2 = L.sum(self.w2)
+        self.sw3 = L.sum(self.w2 * self.w)
+        self.q = L.sum(self.w * r2)
+        self.sw2r2 = L.sum(self.w2 * r2)
+
+def _reml_score(s: _Sums, k):
+    """REML score and expected information"""
+    a = _safe_div(s.sw2, s.sw)
+    score = 0.5 * (s.sw2r2 - s.sw + a)
+    info = 0.5 * (s.sw2 - 2 * _safe_div(s.sw3, s.sw) + a ** 2)
+    return score, info
+
+def _ml_score(s: _Sums, k):
+    """ML score and expected information"""
+    return 0.5 * (s.sw2r2 - s.sw), 0.5 * s.sw2
+
+def _pm_score(s: _Sums, k):
+    """Generalised Q estimating equation and its negative derivative"""
+    return s.q - (k - 1), s.sw2r2
+
+def _eb_score(s: _Sums, k):
+    """Morris' empirical Bayes estimating equation and scoring denominator"""
+    return _safe_div(k, k - 1) * s.q - k, s.sw
+
+_SCORES = {
+    'REML': _reml_score,
+    'ML': _ml_score,
+    'PM': _pm_score,
+    'EB': _eb_score,
+}
+
+def tau2_dl(yi, vi, segments=None):
+    """
+    DerSimonian-Laird method-of-moments estimator
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        segments: Optional segment start offsets for flat, sorted input
+    
+    Returns:
+        np.ndarray: τ² estimates, shape (...)
+    """
+    L = layout_for(yi, segments)
+    yi, vi, valid = _masked(yi, vi)
+    k = L.count(valid)
+    s = _Sums(yi, vi, valid, np.zeros(k.shape), L)
+    c = s.sw - _safe_div(s.sw2, s.sw)
+    return np.maximum(_safe_div(s.q - (k - 1), c), 0.0)
+
+def tau2_he(yi, vi, segments=None):
+    """
+    Hedges' unweighted method-of-moments estimator
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        segments: Optional segment start offsets for flat, sorted input
+    
+    Returns:
+        np.ndarray: τ² estimates, shape (...)
+    """
+    L = layout_for(yi, segments)
+    yi, vi, valid = _masked(yi, vi)
+    k = L.count(valid)
+    mean = _safe_div(L.sum(yi), k)
+    rss = L.sum(np.where(valid, (yi - L.expand(mean)) ** 2, 0.0))
+    mean_vi = _safe_div(L.sum(np.where(valid, vi, 0.0)), k)
+    return np.maximum(_safe_div(rss, k - 1) - mean_vi, 0.0)
+
+def tau2_hs(yi, vi, segments=None):
+    """
+    Hunter-Schmidt estimator
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        segments: Optional segment start offsets for flat, sorted input
+    
+    Returns:
+        np.ndarray: τ² estimates, shape (...)
+    """
+    L = layout_for(yi, segments)
+    yi, vi, valid = _masked(yi, vi)
+    k = L.count(valid)
+    s = _Sums(yi, vi, valid, np.zeros(k.shape), L)
+    return np.maximum(_safe_div(s.q - k, s.sw), 0.0)
+
+def tau2_sj(yi, vi, segments=None):
+    """
+    Sidik-Jonkman estimator
+    
+    Args:
+        yi: Effect estimates, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        segments: Optional segment start offsets for flat, sorted input
+    
+    Returns:
+        np.ndarray: τ² estimates, shape (...)
+    """
+    L = layout_for(yi, segments)
+    yi, vi, valid = _masked(yi, vi)
+    k = L.count(valid)
+    mean = _safe_div(L.sum(yi), k)
+    tau0 = _safe_div(L.sum(np.where(valid, (yi - L.expand(mean)) ** 2, 0.0)), k)
+    # Guard against identical effects, where the initial estimate is zero
+    tau0 = np.where(tau0 > 0, tau0, 0.01)
+    s = _Sums(yi, vi, valid, tau0, L)
+    return _safe_div(tau0 * s.q, k - 1)
+
+_CLOSED_FORM = {
+    'DL': tau2_dl,
+    'HE': tau2_he,
+    'HS': tau2_hs,
+    'SJ': tau2_sj,
+}
+
+def _bisect(score, hi, mask, tol):
+    """
+    Bracketed bisection on a batched estimating equation for the masked analyses
+    
+    The estimating equations are positive below the root and negative
+    above it; analyses whose equation is non-positive at zero get τ² = 0.
+    
+    Args:
+        score: Estimating equation, called with one τ² per analysis
+        hi: Initial upper end of the bracket, expanded as needed
+        mask: Analyses to solve
+        tol: Relative tolerance on the bracket width
+    
+    Returns:
+        Tuple: τ² and whether each bracket closed to the tolerance
+    """
+    lo = np.zeros(hi.shape)
+    
+    # Expand the upper bracket until the equation changes sign
+    for _ in range(60):
+        need = mask & (score(hi) > 0)
+        if not need.any():
+            break
+        hi = np.where(need, hi * 2, hi)
+    
+    positive_at_zero = score(lo) > 0
+    closed = np.zeros(hi.shape, dtype=bool)
+    # Each step halves the bracket, so 200 steps reach any float tolerance
+    for _ in range(200):
+        mid = 0.5 * (lo + hi)
+        above = score(mid) > 0
+        lo = np.where(above, mid, lo)
+        hi = np.where(above, hi, mid)
+        closed = hi - lo <= tol * (1 + lo)
+        if np.all(closed[mask]):
+            break
+    
+    return np.where(positive_at_zero, 0.5 * (lo + hi), 0.0), closed | ~positive_at_zero
+
+def _solve_root(score_info, tau2_init, active, upper, tol, max_iter):
+    """
+    Safeguarded Newton/Fisher scoring on batched estimating equations
+    
+    Shared by the τ² estimators here and the meta-regression.
+    
+    Args:
+        score_info: Called with one τ² per analysis; returns the estimating
+            equation (positive below the root) and the scoring denominator
+        tau2_init: Starting values
+        active: Analyses to solve; the others keep their starting value
+        upper: Called without arguments for the initial upper bracket of
+            the bisection fallback
+        tol: Relative convergence tolerance
+        max_iter: Maximum number of scoring iterations
+    
+    Returns:
+        Tuple: τ², iteration counts, scoring convergence, fallback use
+            and whether the fallback bracket closed
+    """
+    tau2 = np.maximum(np.asarray(tau2_init, dtype=np.float64), 0.0).copy()
+    converged = ~active
+    iterations = np.zeros(tau2.shape, dtype=np.int64)
+    
+    # The estimating equations are positive below the root and negative
+    # above it, so every evaluation narrows a bracket [lo, hi] around it.
+    lo = np.zeros(tau2.shape)
+    hi = np.full(tau2.shape, np.inf)
+    previous_step = np.full(tau2.shape, np.inf)
+    
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        score, info = score_info(tau2)
+        lo = np.where(active & (score > 0), tau2, lo)
+        hi = np.where(active & (score <= 0), tau2, hi)
+        
+        # Scoring steps that leave the bracket or fail to halve the
+        # previous step (oscillation, slow linear convergence) are
+        # replaced by bisection of the bracket
+        step = _safe_div(score, info)
+        new = tau2 + step
+        bisect = (
+            (new <= lo) | (new >= hi) | ~np.isfinite(new)
+            | (np.isfinite(hi) & (np.abs(step) > 0.5 * np.abs(previous_step)))
+        )
+        new = np.where(bisect, np.where(np.isfinite(hi), 0.5 * (lo + hi), 2 * lo + 1), new)
+        new = np.where(hi <= 0, 0.0, new)
+        previous_step = new - tau2
+        
+        done = active & (
+            (np.abs(new - tau2) <= tol * (1 + tau2)) | (hi - lo <= tol * (1 + lo))
+        )
+        tau2 = np.where(active, new, tau2)
+        iterations = iterations + active
+        converged = converged | done
+        active = active & ~done & np.isfinite(tau2)
+    
+    fallback = ~converged | ~np.isfinite(tau2)
+    closed = np.zeros(tau2.shape, dtype=bool)
+    if fallback.any():
+        bisected, closed = _bisect(lambda t: score_info(t)[0], upper(), fallback, tol)
+        tau2 = np.where(fallback, bisected, tau2)
+        closed = closed & fallback
+    return tau2, iterations, converged, fallback, closed
+
+def _solve_iterative(method, yi, vi, valid, tau2_init, tol, max_iter, L):
+    """Safeguarded iterative τ² estimator on batched analyses"""
+    score_fn = _SCORES[method]
+    k = L.count(valid)
+    
+    def upper():
+        mean = _safe_div(L.sum(yi), k)
+        spread = L.max(np.where(valid, (yi - L.expand(mean)) ** 2, 0.0))
+        return np.maximum(spread + L.max(np.where(valid, vi, 0.0)), 1.0)
+    
+    tau2, iterations, converged, fallback, _ = _solve_root(
+        lambda t: score_fn(_Sums(yi, vi, valid, t, L), k),
+        tau2_init, k > 1, upper, tol, max_iter
+    )
+    tau2 = np.where(k > 1, tau2, 0.0)
+    return tau2, iterations, converged, fallback
+
+def estimate_tau2(
+    yi, vi,
+    method: str = 'REML',
+    tau2_init=None,
+    tol: float = 1e-10,
+    max_iter: int = 100,
+    segments=None
+) -> Tau2Result:
+    """
+    Estimate τ² for one or many meta-analyses
+    
+    Args:
+        yi: Effect estimates, shape (..., k); NaN marks missing studies
+        vi: Sampling variances, shape (..., k)
+        method: One of TAU2_ESTIMATORS
+        tau2_init: Warm start for iterative estimators, one value per
+            analysis or scalar; defaults to the DerSimonian-Laird estimate
+        tol: Relative convergence tolerance
+        max_iter: Maximum number of scoring iterations
+        segments: Optional start offsets of analyses in flat ``yi``/``vi``
+            sorted by analysis; estimates are then returned per segment
+    
+    Returns:
+        Tau2Result: Estimates with iteration counts and convergence flags
+    """
+    if method not in TAU2_ESTIMATORS:
+        raise ValueError(f"Unsupported τ² estimator: {method}")
+    
+    L = layout_for(yi, segments)
+    yi, vi, valid = _masked(yi, vi)
+    k = L.count(valid)
+    shape = k.shape
+    
+    if method in _CLOSED_FORM:
+        tau2 = _CLOSED_FORM[method](
+            np.where(valid, yi, np.nan), np.where(valid, vi, np.nan), segments
+        )
+        return Tau2Result(
+            tau2=np.where(k > 1, tau2, 0.0),
+            method=method,
+            iterations=np.zeros(shape, dtype=np.int64),
+            converged=np.ones(shape, dtype=bool),
+            fallback=np.zeros(shape, dtype=bool)
+        )
+    
+    if tau2_init is None:
+        tau2_init = tau2_dl(np.where(valid, yi, np.nan), np.where(valid, vi, np.nan), segments)
+    tau2_init = np.broadcast_to(np.asarray(tau2_init, dtype=np.float64), shape)
+    
+    tau2, iterations, converged, fallback = _solve_iterative(
+        method, yi, vi, valid, tau2_init, tol, max_iter, L
+    )
+    return Tau2Result(
+        tau2=tau2,
+        method=method,
+        iterations=iterations,
+        converged=converged,
+        fallback=fallback
+    )
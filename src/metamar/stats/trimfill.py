@@ -0,0 +1,208 @@
+"""
+Trim-and-fill adjustment for funnel plot asymmetry
+
+Duval and Tweedie's (2000) iterative algorithm with the L0 and R0
+estimators of the number of missing studies, for one or many analyses
+(leading axes index analyses, studies lie on the last axis, NaN marks
+missing studies). Each row is sorted once. As in R's meta, the number of
+missing studies is estimated with the common-effect model: trimming
+always drops the largest effects of the sorted row, so the trimmed
+estimate comes from prefix sums of the weights in O(1). The ranks of the
+centred effects come from binary searches on the sorted row rather than
+a new sort per iteration. Only the final fit on the filled data is a
+full meta-analysis.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any
+import logging
+
+import numpy as np
+
+from .bias import egger_test
+from .effect_sizes import backtransform
+from .pooling import MetaAnalysisResult, _float, pool_inverse
+
+logger = logging.getLogger(__name__)
+
+TRIMFILL_ESTIMATORS = ('L0', 'R0')
+
+@dataclass
+class TrimFillResult:
+    """Number and position of imputed studies and the adjusted meta-analysis"""
+    estimator: str
+    k0: np.ndarray
+    left: np.ndarray
+    filled_yi: np.ndarray
+    filled_vi: np.ndarray
+    result: MetaAnalysisResult
+    iterations: np.ndarray
+    converged: np.ndarray
+    
+    def to_results(self, model: str = 'random', index=()) -> Dict[str, Any]:
+        """
+        Trim-and-fill block for the results dict passed to the LLM handlers
+        
+        Args:
+            model: 'random' or 'fixed', selects the adjusted estimate
+            index: Index into the leading axes for batched results
+        
+        Returns:
+            Dict: Imputed studies and the adjusted estimate
+        """
+        result = self.result
+        estimate = result.random if model == 'random' else result.fixed
+        sm = result.summary_measure
+        k0 = int(np.asarray(self.k0)[index])
+        filled_yi = np.asarray(self.filled_yi)[index][:k0]
+        filled_vi = np.asarray(self.filled_vi)[index][:k0]
+        return {
+            'method': f"Trim-and-fill ({self.estimator})",
+            'k0': k0,
+            'side': 'left' if np.asarray(self.left)[index] else 'right',
+            'k_adjusted': int(np.asarray(result.k)[index]),
+            'adjusted': estimate.to_dict(sm, index),
+            'tau2_adjusted': _float(np.asarray(result.tau2)[index]),
+            'imputed': [
+                {
+                    'effect_size': _float(backtransform(te, sm)),
+                    'TE': _float(te),
+                    'seTE': _float(np.sqrt(v))
+                }
+                for te, v in zip(filled_yi, filled_vi)
+            ]
+        }
+
+def _searchsorted_rows(a: np.ndarray, v: np.ndarray, side: str = 'left') -> np.ndarray:
+    """``np.searchsorted`` along the last axis for sorted rows ``a`` and queries ``v``"""
+    n = a.shape[-1]
+    lo = np.zeros(v.shape, dtype=np.intp)
+    hi = np.full(v.shape, n, dtype=np.intp)
+    while np.any(lo < hi):
+        mid = (lo + hi) // 2
+        x = np.take_along_axis(a, np.minimum(mid, n - 1), -1)
+        right = (x < v) if side == 'left' else (x <= v)
+        active = lo < hi
+        lo = np.where(active & right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+    return lo
+
+def trimfill(
+    yi, vi,
+    estimator: str = 'L0',
+    left=None,
+    summary_measure: str = 'MD',
+    tau2_method: str = 'DL',
+    level: float = 0.95,
+    ci_method: str = 'classic',
+    hk_adjustment: str = '',
+    max_iter: int = 100
+) -> TrimFillResult:
+    """
+    Trim-and-fill meta-analysis for one or many analyses
+    
+    Args:
+        yi: Effect estimates on the pooling scale, shape (..., k)
+        vi: Sampling variances, shape (..., k)
+        estimator: 'L0' or 'R0'
+        left: Whether studies are missing on the left, scalar or one per
+            analysis; by default the side opposite to the sign of Egger's
+            intercept, as in R's meta and metafor
+        summary_measure: Summary measure
+        tau2_method: τ² estimator for the adjusted analysis
+        level: Confidence level
+        ci_method: Random-effects CI method for the adjusted analysis
+        hk_adjustment: Hartung-Knapp adjustment
+        max_iter: Maximum number of trim-and-fill iterations
+    
+    Returns:
+        TrimFillResult: Imputed effects (NaN-padded to the largest k0)
+            and the meta-analysis of observed plus imputed studies
+    """
+    try:
+        if estimator not in TRIMFILL_ESTIMATORS:
+            raise ValueError(f"Unsupported trim-and-fill estimator: {estimator}")
+        
+        yi = np.asarray(yi, dtype=np.float64)
+        vi = np.asarray(vi, dtype=np.float64)
+        valid = np.isfinite(yi) & np.isfinite(vi) & (vi > 0)
+        k = valid.sum(-1)
+        if left is None:
+            left = ~(egger_test(yi, vi).bias < 0)
+        left = np.broadcast_to(np.asarray(left, dtype=bool), k.shape)
+        
+        # Work with the missing studies on the left: flip rows missing on the right
+        sign = np.where(left, 1.0, -1.0)[..., None]
+        order = np.argsort(np.where(valid, sign * yi, np.inf), axis=-1, kind='stable')
+        y = np.take_along_axis(np.where(valid, sign * yi, np.inf), order, -1)
+        v = np.take_along_axis(np.where(valid, vi, np.inf), order, -1)
+        inside = np.isfinite(y)
+        w = np.where(inside, 1 / v, 0.0)
+        cum_w = np.cumsum(w, -1)
+        cum_wy = np.cumsum(w * np.where(inside, y, 0.0), -1)
+        position = np.arange(y.shape[-1])
+        
+        k0 = np.zeros(k.shape, dtype=np.int64)
+        beta = np.zeros(k.shape)
+        iterations = np.zeros(k.shape, dtype=np.int64)
+        active = k >= 3
+        kf = k.astype(np.float64)
+        for _ in range(max_iter):
+            if not active.any():
+                break
+            # Common-effect estimate of the k - k0 smallest effects
+            last = np.maximum(k - k0 - 1, 0)[..., None]
+            beta = np.where(
+                active,
+                (np.take_along_axis(cum_wy, last, -1) / np.take_along_axis(cum_w, last, -1))[..., 0],
+                beta
+            )
+            mirror = 2 * beta[..., None] - y
+            if estimator == 'L0':
+                # Rank of |yᵢ - β| for yᵢ > β: effects within (2β - yᵢ, yᵢ), plus one
+                positive = inside & (y > beta[..., None])
+                ranks = position - _searchsorted_rows(y, mirror, 'right') + 1
+                sr = np.where(positive, ranks, 0).sum(-1)
+                estimate = (4 * sr - kf * (kf + 1)) / (2 * kf - 1)
+            else:
+                # Largest rank among negative deviations belongs to the smallest effect
+                smallest = mirror[..., :1]
+                rank = np.where(y[..., 0] < beta, _searchsorted_rows(y, smallest)[..., 0], 0)
+                estimate = kf - rank - 1
+            
+            new_k0 = np.clip(np.round(np.nan_to_num(estimate)), 0, np.maximum(k - 1, 0)).astype(np.int64)
+            changed = active & (new_k0 != k0)
+            iterations = np.where(active, iterations + 1, iterations)
+            k0 = np.where(active, new_k0, k0)
+            active = changed
+        converged = ~active
+        if not converged.all():
+            logger.warning(f"Trim-and-fill did not converge in {max_iter} iterations for {int((~converged).sum())} analyses")
+        
+        # Mirror the k0 largest effects about the trimmed estimate
+        width = int(k0.max(initial=0))
+        slot = np.arange(width)
+        source = np.clip(k[..., None] - k0[..., None] + slot, 0, y.shape[-1] - 1)
+        filled = slot < k0[..., None]
+        filled_yi = np.where(filled, sign * (2 * beta[..., None] - np.take_along_axis(y, source, -1)), np.nan)
+        filled_vi = np.where(filled, np.take_along_axis(v, source, -1), np.nan)
+        
+        result = pool_inverse(
+            np.concatenate([np.where(valid, yi, np.nan), filled_yi], -1),
+            np.concatenate([np.where(valid, vi, np.nan), filled_vi], -1),
+            summary_measure, tau2_method, level, ci_method, hk_adjustment
+        )
+        return TrimFillResult(
+            estimator=estimator,
+            k0=k0,
+            left=left,
+            filled_yi=filled_yi,
+            filled_vi=filled_vi,
+            result=result,
+            iterations=iterations,
+            converged=converged
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in trim-and-fill: {str(e)}")
+        raise
@@ -2,7 +2,30 @@
 Utility functions for Meta-Mar
 """
 
-from .data_loader import DataLoader
-from .helpers import format_results, validate_data
+import importlib
 
-__all__ = ['DataLoader', 'format_results', 'validate_data']
\ No newline at end of file
+_LAZY_ATTRIBUTES = {
+    'MetaAnalysisDataLoader': '.data_loader',
+    'DataLoader': '.data_loader',
+    'format_results': '.helpers',
+    'validate_data': '.helpers',
+    'to_arrow': '.arrow',
+    'from_arrow': '.arrow',
+    'results_to_arrow': '.arrow',
+    'analyze_arrow': '.arrow',
+}
+
+__all__ = [
+    'MetaAnalysisDataLoader', 'DataLoader', 'format_results', 'validate_data',
+    'to_arrow', 'from_arrow', 'results_to_arrow', 'analyze_arrow'
+]
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
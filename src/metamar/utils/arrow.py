@@ -0,0 +1,252 @@
+"""
+Arrow data exchange with the Shiny app
+
+By default reticulate converts pandas data frames column by column and
+nested result dicts element by element. Arrow tables instead cross the
+R/Python boundary through the Arrow C data interface
+(``reticulate::r_to_py(arrow_table)`` in R, ``arrow::as_arrow_table()``
+on the Python object coming back), and IPC files written here can be
+memory-mapped from R with ``arrow::read_ipc_file()``. Numeric columns
+without nulls share their buffers between Arrow and pandas in both
+directions, so only string and nullable columns are converted.
+
+pyarrow is an optional dependency, imported when these functions are
+first used.
+"""
+
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
+import logging
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# File suffixes read as Arrow IPC (Feather v2 is the IPC file format)
+IPC_SUFFIXES = ['.arrow', '.feather', '.ipc']
+
+def _pyarrow():
+    """Import pyarrow, with an actionable error if it is missing"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError as e:
+        raise ImportError("Arrow data exchange requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+def to_arrow(data: pd.DataFrame, metadata: Optional[Dict[str, str]] = None):
+    """
+    Convert a data frame to an Arrow table without copying numeric columns
+    
+    Args:
+        data: Data frame; the index is dropped
+        metadata: Optional key-value pairs stored in the schema metadata
+    
+    Returns:
+        pyarrow.Table
+    """
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            **{str(k).encode(): str(v).encode() for k, v in metadata.items()}
+        })
+    return table
+
+def read_ipc(path: Union[str, Path], memory_map: bool = True):
+    """
+    Read an Arrow IPC file or stream
+    
+    Args:
+        path: IPC file (``arrow::write_ipc_file``, Feather v2) or stream
+            (``arrow::write_ipc_stream``)
+        memory_map: Memory-map the file instead of reading it into memory
+    
+    Returns:
+        pyarrow.Table
+    """
+    pa = _pyarrow()
+    source = pa.memory_map(str(path)) if memory_map else pa.OSFile(str(path))
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source).read_all()
+
+def write_ipc(data, path: Union[str, Path]) -> Path:
+    """
+    Write a data frame or Arrow table as an Arrow IPC file
+    
+    Args:
+        data: Data frame, pyarrow.Table or pyarrow.RecordBatch
+        path: Destination file
+    
+    Returns:
+        Path: The written file
+    """
+    pa = _pyarrow()
+    table = to_arrow(data) if isinstance(data, pd.DataFrame) else data
+    if isinstance(table, pa.RecordBatch):
+        table = pa.Table.from_batches([table])
+    path = Path(path)
+    with pa.OSFile(str(path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+def from_arrow(source) -> pd.DataFrame:
+    """
+    Convert Arrow data to a data frame without copying numeric columns
+    
+    Args:
+        source: pyarrow.Table, RecordBatch, RecordBatchReader, a list of
+            record batches, any object exporting the Arrow C stream
+            interface, or the path of an Arrow IPC file
+    
+    Returns:
+        pd.DataFrame: Numeric columns without nulls are views of the
+            Arrow buffers and therefore read-only
+    """
+    pa = _pyarrow()
+    if isinstance(source, (str, Path)):
+        table = read_ipc(source)
+    elif isinstance(source, pa.Table):
+        table = source
+    elif isinstance(source, pa.RecordBatch):
+        table = pa.Table.from_batches([source])
+    elif isinstance(source, pa.RecordBatchReader):
+        table = source.read_all()
+    elif isinstance(source, (list, tuple)):
+        table = pa.Table.from_batches(list(source))
+    else:
+        table = pa.table(source)
+    return table.to_pandas(split_blocks=True)
+
+def _leaves(value, path: str) -> Iterator[Tuple[str, Any]]:
+    """(dotted path, scalar) pairs of a nested results dict"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _leaves(item, f"{path}.{key}" if path else str(key))
+    elif isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            yield from _leaves(item, f"{path}.{i}")
+    else:
+        yield path, value
+
+def results_to_arrow(results: Dict[str, Any]):
+    """
+    Flatten a results dict into a long Arrow table
+    
+    Each leaf becomes one row keyed by its dotted path (e.g.
+    ``random.ci_lower`` or ``subgroups.groups.0.effect_size``), with
+    numbers in ``value`` and everything else in ``text``, so the whole
+    payload crosses to R as three columns instead of nested lists.
+    
+    Args:
+        results: Results dict from ``MetaAnalysisEngine.run``
+    
+    Returns:
+        pyarrow.Table: Columns ``path``, ``value`` and ``text``
+    """
+    pa = _pyarrow()
+    paths, values, texts = [], [], []
+    for path, value in _leaves(results, ''):
+        numeric = isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+        paths.append(path)
+        values.append(float(value) if numeric else None)
+        texts.append(None if numeric or value is None else str(value))
+    return pa.table({
+        'path': pa.array(paths, pa.string()),
+        'value': pa.array(values, pa.float64()),
+        'text': pa.array(texts, pa.string())
+    })
+
+def analyze_arrow(
+    data,
+    analysis_type: str,
+    meta_settings: Dict[str, Any],
+    structure_type: str = 'basic',
+    **run_options
+) -> Dict[str, Any]:
+    """
+    Validate Arrow data, run the meta-analysis and return Arrow tables
+    
+    Args:
+        data: Study data in any form ``from_arrow`` accepts
+        analysis_type: Type of meta-analysis
+        meta_settings: Meta-analysis settings
+        structure_type: Data structure variant
+        **run_options: Passed to ``MetaAnalysisEngine.run``
+    
+    Returns:
+        Dict: ``results`` (``results_to_arrow`` table) and ``studies``
+            (per-study estimates, intervals and weights)
+    """
+    from ..stats.engine import MetaAnalysisEngine
+    from .data_loader import MetaAnalysisDataLoader
+    
+    try:
+        frame = MetaAnalysisDataLoader().load_frame(from_arrow(data), analysis_type, structure_type)
+        engine = MetaAnalysisEngine(meta_settings)
+        results = engine.run(frame, analysis_type, **run_options)
+        studies = engine.studies(engine.effect_sizes(frame, analysis_type), results['tau2'] or 0.0)
+        return {
+            'results': results_to_arrow(results),
+            'studies': to_arrow(studies)
+        }
+    
+    except Exception as e:
+        logger.error(f"Error in Arrow meta-analysis: {str(e)}")
+        raise
+
+def benchmark_exchange(n_studies: int = 100_000, repeats: int = 5, seed: int = 0) -> Dict[str, float]:
+    """
+    Time a data frame round trip through each exchange path
+    
+    ``elementwise`` mimics reticulate's default conversion: every value
+    passes through a Python object (``to_dict('list')`` and back).
+    ``arrow`` converts to an Arrow table and back in memory, and
+    ``arrow_ipc`` also writes and memory-maps an IPC file.
+    
+    Args:
+        n_studies: Rows of the synthetic binary data set
+        repeats: Timed repetitions per path; the best time is reported
+        seed: Random seed for the synthetic data
+    
+    Returns:
+        Dict: Seconds per round trip for each path
+    """
+    rng = np.random.default_rng(seed)
+    n = rng.integers(20, 500, (n_studies, 2))
+    data = pd.DataFrame({
+        'studlab': [f"Study {i}" for i in range(n_studies)],
+        'event.e': rng.binomial(n[:, 0], 0.2),
+        'n.e': n[:, 0],
+        'event.c': rng.binomial(n[:, 1], 0.3),
+        'n.c': n[:, 1],
+        'TE': rng.normal(0, 0.3, n_studies),
+        'seTE': rng.uniform(0.1, 0.5, n_studies)
+    })
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "data.arrow"
+        paths = {
+            'elementwise': lambda: pd.DataFrame(data.to_dict('list')),
+            'arrow': lambda: from_arrow(to_arrow(data)),
+            'arrow_ipc': lambda: from_arrow(write_ipc(data, path))
+        }
+        timings = {}
+        for name, fn in paths.items():
+            best = np.inf
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+    
+    logger.info(f"Exchange round trip for {n_studies} rows: {timings}")
+    return timings
@@ -2,14 +2,25 @@
 Enhanced data loading with meta-analysis structure validation
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import Dict, Any, Union, Optional
 import logging
-from ..config.meta_structures import MetaStructures, META_SETTINGS
+from ..config.meta_structures import MetaAnalysisStructure, MetaStructures, META_SETTINGS
+from .arrow import IPC_SUFFIXES
 
 logger = logging.getLogger(__name__)
 
+# Columns holding whole-number counts, eligible for integer downcasting
+COUNT_COLUMNS = ['n.e', 'n.c', 'event.e', 'event.c', 'n', 'year']
+
+# Label columns stored as categoricals in compact mode
+LABEL_COLUMNS = ['studlab', 'subgroup', 'cluster']
+
+# Continuous structures reporting medians, converted to means and SDs
+MEDIAN_STRUCTURES = ['median', 'range']
+
 class MetaAnalysisDataLoader:
     """Enhanced data loader for meta-analysis"""
     
@@ -21,7 +32,10 @@ class MetaAnalysisDataLoader:
         self,
         file_path: Union[str, Path],
         analysis_type: str,
-        structure_type: str = 'basic'
+        structure_type: str = 'basic',
+        compact: bool = False,
+        float32: bool = False,
+        convert: bool = True
     ) -> pd.DataFrame:
         """
         Load and validate meta-analysis data
@@ -30,14 +44,51 @@ class MetaAnalysisDataLoader:
             file_path: Path to data file
             analysis_type: Type of meta-analysis ('continuous', 'binary', 'generic', 'correlation')
             structure_type: Data structure variant ('basic', 'median', 'range' for continuous)
+            compact: Downcast counts and store labels as categoricals
+            float32: In compact mode, also store continuous fields as float32
+                where the values survive the conversion
+            convert: For median-based continuous structures, add mean/SD
+                columns estimated from the medians, quartiles and ranges
             
         Returns:
             pd.DataFrame: Validated data frame
         """
         try:
-            # Load data
             data = self._read_file(file_path)
             
+        except Exception as e:
+            logger.error(f"Error loading meta-analysis data: {str(e)}")
+            raise
+        
+        return self.load_frame(
+            data, analysis_type, structure_type,
+            compact=compact, float32=float32, convert=convert
+        )
+    
+    def load_frame(
+        self,
+        data: pd.DataFrame,
+        analysis_type: str,
+        structure_type: str = 'basic',
+        compact: bool = False,
+        float32: bool = False,
+        convert: bool = True
+    ) -> pd.DataFrame:
+        """
+        Validate an in-memory data frame, e.g. one received as Arrow data
+        
+        Args:
+            data: Study data
+            analysis_type: Type of meta-analysis
+            structure_type: Data structure variant
+            compact: Downcast counts and store labels as categoricals
+            float32: In compact mode, also store continuous fields as float32
+            convert: For median-based continuous structures, add mean/SD columns
+            
+        Returns:
+            pd.DataFrame: Validated data frame
+        """
+        try:
             # Get appropriate structure
             structure = self._get_structure(analysis_type, structure_type)
             
@@ -47,6 +98,13 @@ class MetaAnalysisDataLoader:
             # Validate data types and values
             self._validate_data(data, structure)
             
+            if convert and analysis_type == 'continuous' and structure_type in MEDIAN_STRUCTURES:
+                from ..stats.conversion import convert_to_mean_sd
+                data = convert_to_mean_sd(data)
+            
+            if compact:
+                data = self.compact_data(data, float32=float32)
+            
             return data
             
         except Exception as e:
@@ -60,6 +118,9 @@ class MetaAnalysisDataLoader:
             return pd.read_csv(file_path)
         elif file_path.suffix in ['.xlsx', '.xls']:
             return pd.read_excel(file_path)
+        elif file_path.suffix in IPC_SUFFIXES:
+            from .arrow import from_arrow
+            return from_arrow(file_path)
         else:
             raise ValueError(f"Unsupported file type: {file_path.suffix}")
     
@@ -68,7 +129,8 @@ class MetaAnalysisDataLoader:
         structure_map = {
             'continuous': {
                 'basic': self.structures.CONTINUOUS,
-                'median': self.structures.CONTINUOUS_MEDIAN
+                'median': self.structures.CONTINUOUS_MEDIAN,
+                'range': self.structures.CONTINUOUS_RANGE
             },
             'binary': {'basic': self.structures.BINARY},
             'generic': {'basic': self.structures.GENERIC},
@@ -107,6 +169,68 @@ class MetaAnalysisDataLoader:
                 invalid_rows = data.index[mask].tolist()
                 raise ValueError(f"Validation failed for {col} in rows: {invalid_rows}")
 
+    def compact_data(
+        self,
+        data: pd.DataFrame,
+        float32: bool = False,
+        float32_rtol: float = 1e-6
+    ) -> pd.DataFrame:
+        """
+        Reduce the memory footprint of validated data
+        
+        Count columns are downcast to the smallest integer type that holds
+        them, label columns become categoricals and, if requested, the
+        remaining float columns are stored as float32 when every value
+        round-trips within ``float32_rtol``. Memory use before and after is
+        logged and stored in ``data.attrs['memory_usage']``.
+        
+        Args:
+            data: Validated data frame
+            float32: Store continuous fields as float32 where precision allows
+            float32_rtol: Maximum relative round-trip error for float32 storage
+            
+        Returns:
+            pd.DataFrame: Compacted copy of the data
+        """
+        before = int(data.memory_usage(deep=True).sum())
+        compacted = data.copy()
+        
+        for col in compacted.columns:
+            values = compacted[col]
+            if col in LABEL_COLUMNS:
+                compacted[col] = values.astype('category')
+            elif not pd.api.types.is_numeric_dtype(values):
+                continue
+            elif col in COUNT_COLUMNS:
+                if values.notna().all() and (values == np.round(values)).all():
+                    compacted[col] = pd.to_numeric(
+                        values.astype(np.int64), downcast='integer'
+                    )
+            elif float32 and pd.api.types.is_float_dtype(values):
+                if self._fits_float32(values.to_numpy(dtype=np.float64), float32_rtol):
+                    compacted[col] = values.astype(np.float32)
+        
+        after = int(compacted.memory_usage(deep=True).sum())
+        compacted.attrs['memory_usage'] = {
+            'before_bytes': before,
+            'after_bytes': after,
+            'reduction': 1 - after / before if before else 0.0
+        }
+        logger.info(f"Compacted data from {before} to {after} bytes")
+        
+        return compacted
+    
+    @staticmethod
+    def _fits_float32(values: np.ndarray, rtol: float) -> bool:
+        """Check whether values survive a float32 round trip within rtol"""
+        finite = values[np.isfinite(values)]
+        if finite.size == 0:
+            return True
+        if np.abs(finite).max() > np.finfo(np.float32).max:
+            return False
+        restored = finite.astype(np.float32).astype(np.float64)
+        return bool(np.all(np.abs(restored - finite) <= rtol * np.abs(finite)))
+    
     def get_available_settings(self, analysis_type: str) -> Dict[str, Any]:
         """Get available settings for analysis type"""
         return {
@@ -117,4 +241,8 @@ class MetaAnalysisDataLoader:
             'prediction_intervals': META_SETTINGS['prediction_intervals'],
             'tau2_ci_methods': META_SETTINGS['tau2_ci_methods'],
             'publication_bias_methods': META_SETTINGS['publication_bias_methods']
-        }
\ No newline at end of file
+        }
+
+
+# Package-level name for the loader
+DataLoader = MetaAnalysisDataLoader
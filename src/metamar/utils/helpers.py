@@ -73,4 +73,31 @@ def validate_data(data: pd.DataFrame, analysis_type: str) -> bool:
         if analysis_type == 'continuous':
             numeric_cols = ['n.e', 'mean.e', 'sd.e', 'n.c', 'mean.c', 'sd.c']
             for col in numeric_cols:
-                if not pd.to_numeric(data[col],
\ No newline at end of file
+                if not pd.to_numeric(data[col], errors='coerce').notna().all():
+                    raise ValueError(f"Column {col} must be numeric")
+            if (data[['n.e', 'n.c']] <= 0).any().any():
+                raise ValueError("Sample sizes must be positive")
+            if (data[['sd.e', 'sd.c']] < 0).any().any():
+                raise ValueError("Standard deviations must be non-negative")
+        
+        elif analysis_type == 'binary':
+            numeric_cols = ['event.e', 'n.e', 'event.c', 'n.c']
+            for col in numeric_cols:
+                if not pd.to_numeric(data[col], errors='coerce').notna().all():
+                    raise ValueError(f"Column {col} must be numeric")
+            if ((data['event.e'] < 0) | (data['event.e'] > data['n.e'])).any():
+                raise ValueError("event.e must lie between 0 and n.e")
+            if ((data['event.c'] < 0) | (data['event.c'] > data['n.c'])).any():
+                raise ValueError("event.c must lie between 0 and n.c")
+        
+        elif analysis_type == 'correlation':
+            if not data['cor'].between(-1, 1).all():
+                raise ValueError("Correlations must lie between -1 and 1")
+            if (data['n'] <= 0).any():
+                raise ValueError("Sample sizes must be positive")
+        
+        return True
+        
+    except Exception as e:
+        logger.error(f"Error validating data: {str(e)}")
+        raise
@@ -0,0 +1,23 @@
+"""
+Shared fixtures for the Meta-Mar test suite
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def bcg_data():
+    """BCG vaccine trials in MetaStructures.BINARY layout"""
+    tpos = [4, 6, 3, 62, 33, 180, 8, 505, 29, 17, 186, 5, 27]
+    tneg = [119, 300, 228, 13536, 5036, 1361, 2537, 87886, 7470, 1699, 50448, 2493, 16886]
+    cpos = [11, 29, 11, 248, 47, 372, 10, 499, 45, 65, 141, 3, 29]
+    cneg = [128, 274, 209, 12619, 5761, 1079, 619, 87892, 7232, 1600, 27197, 2338, 17825]
+    return pd.DataFrame({
+        'studlab': [f"Trial {i + 1}" for i in range(13)],
+        'event.e': tpos,
+        'n.e': np.add(tpos, tneg),
+        'event.c': cpos,
+        'n.c': np.add(cpos, cneg),
+        'year': [1948, 1949, 1960, 1977, 1973, 1953, 1973, 1980, 1968, 1961, 1974, 1969, 1976]
+    })
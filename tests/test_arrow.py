@@ -0,0 +1,89 @@
+"""
+Tests for the Arrow exchange layer
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from metamar.utils.arrow import (
+    analyze_arrow, benchmark_exchange, from_arrow, read_ipc,
+    results_to_arrow, to_arrow, write_ipc
+)
+from metamar.utils.data_loader import MetaAnalysisDataLoader
+
+class TestArrowExchange:
+    """Test conversion between pandas and Arrow"""
+
+    def test_zero_copy_round_trip(self, bcg_data):
+        """Test numeric columns share buffers in both directions"""
+        data = bcg_data.assign(TE=np.linspace(-1, 1, 13))
+        table = to_arrow(data, metadata={'analysis_type': 'binary'})
+        back = from_arrow(table)
+
+        buffer = table.column('TE').chunk(0).to_numpy()
+        assert np.shares_memory(data['TE'].to_numpy(), buffer)
+        assert np.shares_memory(back['TE'].to_numpy(), buffer)
+        assert table.schema.metadata[b'analysis_type'] == b'binary'
+        pd.testing.assert_frame_equal(back, data, check_dtype=False)
+
+    def test_sources(self, bcg_data):
+        """Test record batches, readers and C stream exporters"""
+        table = to_arrow(bcg_data)
+        batches = table.to_batches(max_chunksize=5)
+        reader = pa.RecordBatchReader.from_batches(table.schema, batches)
+
+        for source in (batches[0], batches, reader):
+            assert set(from_arrow(source).columns) == set(bcg_data.columns)
+        assert len(from_arrow(batches)) == 13
+        assert len(from_arrow(pa.RecordBatchReader.from_batches(table.schema, batches))) == 13
+
+    def test_ipc_files(self, bcg_data, tmp_path):
+        """Test IPC files and streams, and loading them through the data loader"""
+        path = write_ipc(bcg_data, tmp_path / "bcg.arrow")
+        assert read_ipc(path).num_rows == 13
+
+        stream = tmp_path / "bcg.ipc"
+        with pa.OSFile(str(stream), 'wb') as sink:
+            with pa.ipc.new_stream(sink, to_arrow(bcg_data).schema) as writer:
+                writer.write_table(to_arrow(bcg_data))
+        assert read_ipc(stream, memory_map=False).num_rows == 13
+
+        data = MetaAnalysisDataLoader().load_data(path, 'binary')
+        assert data['event.e'].tolist() == bcg_data['event.e'].tolist()
+
+    def test_results_table(self):
+        """Test nested results flatten to one row per leaf"""
+        table = results_to_arrow({
+            'k': 13,
+            'model_type': 'Random effects (DL)',
+            'fixed': {'effect_size': 0.65, 'p_value': None},
+            'subgroups': {'groups': [{'subgroup': 'A', 'k': 7}]}
+        }).to_pydict()
+        rows = dict(zip(table['path'], zip(table['value'], table['text'])))
+
+        assert rows['k'] == (13.0, None)
+        assert rows['model_type'] == (None, 'Random effects (DL)')
+        assert rows['fixed.p_value'] == (None, None)
+        assert rows['subgroups.groups.0.subgroup'] == (None, 'A')
+
+    def test_analyze(self, bcg_data):
+        """Test the Arrow entry point returns results and per-study tables"""
+        settings = {'summary_measure': 'RR', 'pooling_method': 'Inverse', 'tau2_estimator': 'DL'}
+        output = analyze_arrow(to_arrow(bcg_data), 'binary', settings)
+        results = dict(zip(*output['results'].select(['path', 'value']).to_pydict().values()))
+        studies = output['studies'].to_pandas()
+
+        assert results['k'] == 13
+        assert results['effect_size'] == pytest.approx(0.4896, abs=1e-4)
+        assert len(studies) == 13
+        assert studies['w.random'].sum() == pytest.approx(100)
+        assert (studies['lower'] < studies['effect']).all()
+
+    def test_benchmark(self):
+        """Test every exchange path is timed"""
+        timings = benchmark_exchange(n_studies=1000, repeats=2)
+        assert set(timings) == {'elementwise', 'arrow', 'arrow_ipc'}
+        assert all(seconds > 0 for seconds in timings.values())
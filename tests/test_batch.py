@@ -0,0 +1,133 @@
+"""
+Tests for the batch pipeline and command-line interface
+"""
+
+import json
+import logging
+import shutil
+from pathlib import Path
+
+import pytest
+
+from metamar.__main__ import main
+from metamar.batch import BatchRunner, discover_jobs, read_checkpoint
+
+DATA_DIR = Path(__file__).parent / "data"
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Binary and correlation datasets plus one invalid file"""
+    for kind in ["binary", "correlation"]:
+        shutil.copytree(DATA_DIR / kind, tmp_path / "data" / kind)
+    (tmp_path / "data" / "binary" / "broken.csv").write_text("studlab,event.e\nA,1\n")
+    return tmp_path / "data"
+
+class FakeGenerator:
+    """ReportGenerator stand-in that records requests instead of calling LLMs"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def generate_comparative_report(self, results, analysis_type, meta_settings, custom_instructions, reuse):
+        self.calls.append((analysis_type, meta_settings['summary_measure'], custom_instructions))
+        return {"id": len(self.calls), "analysis_type": analysis_type}
+
+class TestBatch:
+    """Test the load → pool → interpret → store pipeline"""
+    
+    def test_discover(self, data_dir, tmp_path):
+        """Test analysis types and structures are inferred or taken from a manifest"""
+        jobs = discover_jobs(data_dir)
+        assert [(Path(j.path).parent.name, j.analysis_type) for j in jobs].count(("binary", "binary")) == 3
+        assert {j.analysis_type for j in jobs} == {"binary", "correlation"}
+        
+        manifest = tmp_path / "manifest.json"
+        manifest.write_text(json.dumps({"datasets": [
+            "data/binary/metabin_with_subgroup.xlsx",
+            {"path": str(DATA_DIR / "continuous" / "metacont_range_with_subgroup.xlsx"),
+             "meta_settings": {"summary_measure": "MD"}}
+        ]}))
+        first, second = discover_jobs(manifest, custom_instructions="Be brief")
+        assert (first.analysis_type, first.structure_type) == ("binary", "basic")
+        assert (second.analysis_type, second.structure_type) == ("continuous", "range")
+        assert second.meta_settings == {"summary_measure": "MD"}
+        assert second.custom_instructions == "Be brief"
+        
+        with pytest.raises(ValueError):
+            discover_jobs(tmp_path / "manifest.txt")
+    
+    def test_pipeline_and_resume(self, data_dir, tmp_path):
+        """Test results and failures are checkpointed and finished datasets skipped"""
+        generator = FakeGenerator()
+        runner = BatchRunner(
+            output_dir=tmp_path / "out", generator=generator,
+            workers={"load": 2, "pool": 2, "interpret": 2}, queue_size=1
+        )
+        jobs = discover_jobs(data_dir)
+        summary = runner.run(jobs)
+        
+        assert (summary.total, summary.completed, summary.failed) == (5, 4, 1)
+        assert summary.stage_count == {"load": 5, "pool": 4, "interpret": 4, "store": 5}
+        assert [e["path"] for e in summary.errors.values()] == [str(data_dir / "binary" / "broken.csv")]
+        assert sorted(call[:2] for call in generator.calls) == [("binary", "OR")] * 2 + [("correlation", "ZCOR")] * 2
+        
+        records = read_checkpoint(runner.checkpoint_path)
+        done = [r for r in records.values() if r["status"] == "done"]
+        output = json.loads(Path(done[0]["output"]).read_text())
+        assert output["results"]["k"] > 0
+        assert output["comparison_id"] == done[0]["comparison_id"]
+        
+        # An interrupted write leaves a partial line; that job simply runs again
+        with open(runner.checkpoint_path, "a") as f:
+            f.write('{"key": "trunc')
+        summary = runner.run(jobs)
+        assert (summary.skipped, summary.completed, summary.failed) == (4, 0, 1)
+        assert len(generator.calls) == 4
+        assert len(read_checkpoint(runner.checkpoint_path)) == 5
+        
+        summary = runner.run(jobs, resume=False)
+        assert summary.completed == 4
+        assert len(generator.calls) == 8
+    
+    def test_failures_per_job(self, data_dir, tmp_path):
+        """Test manifest entries sharing a file fail separately"""
+        broken = str(data_dir / "binary" / "broken.csv")
+        manifest = tmp_path / "manifest.json"
+        manifest.write_text(json.dumps([
+            {"path": broken, "meta_settings": {"summary_measure": "OR"}},
+            {"path": broken, "meta_settings": {"summary_measure": "RR"}}
+        ]))
+        runner = BatchRunner(output_dir=tmp_path / "out", interpret=False, workers={"pool": 1})
+        summary = runner.run(discover_jobs(manifest))
+        
+        assert (summary.completed, summary.failed) == (0, 2)
+        assert summary.format().count(f"FAILED {broken}") == 2
+    
+    def test_cli(self, data_dir, tmp_path, capsys):
+        """Test the batch command prints timing and exits non-zero on failures"""
+        args = ["batch", str(data_dir / "correlation"), "--no-llm", "--output", str(tmp_path / "out")]
+        assert main(args) == 0
+        output = capsys.readouterr().out
+        assert "2 completed, 0 failed" in output
+        assert "throughput" in output
+        
+        assert main(args + ["-q"]) == 0
+        assert "0 completed, 0 failed, 2 already done" in capsys.readouterr().out
+        assert main(["batch", str(data_dir), "--no-llm", "-q", "--output", str(tmp_path / "out")]) == 1
+    
+    def test_cli_logging(self, data_dir, tmp_path, caplog, monkeypatch):
+        """Test stage errors are logged only with -v, and warnings always"""
+        args = ["batch", str(data_dir / "binary"), "--no-llm", "-q", "--output", str(tmp_path / "out")]
+        
+        def warn_and_fail(self, item):
+            logging.getLogger("metamar.stats").warning("did not converge")
+            raise ValueError("bad data")
+        
+        monkeypatch.setattr(BatchRunner, "_load", warn_and_fail)
+        assert main(args) == 1
+        assert "did not converge" in caplog.text
+        assert "bad data" not in caplog.text
+        
+        caplog.clear()
+        assert main(args + ["-v"]) == 1
+        assert "Error in batch stage load" in caplog.text
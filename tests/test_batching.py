@@ -0,0 +1,189 @@
+"""
+Tests for multi-analysis prompt batching
+"""
+
+import re
+import time
+
+import pytest
+
+from metamar.llm.batching import (
+    analysis_ids, batch_instructions, estimate_tokens, pack_analyses, parse_batch_output
+)
+
+def _analyses(n, k=10):
+    """Subgroup results of similar size"""
+    return {f"Subgroup {i} (n={k})": {"k": k, "effect_size": 0.1 * i, "i2": 40.0} for i in range(n)}
+
+def _respond(ids, skip=()):
+    """Well-formed batched response, leaving out the given ids"""
+    return "\n".join(
+        f"=== BEGIN REPORT {i} ===\nEffect size report for {i}\n=== END REPORT {i} ==="
+        for i in ids if i not in skip
+    )
+
+class TestBatching:
+    """Test packing analyses and parsing delimited responses"""
+    
+    def test_pack(self):
+        """Test greedy packing respects the token budget and batch size"""
+        analyses = _analyses(10)
+        size = estimate_tokens(next(iter(analyses.values())))
+        groups = pack_analyses(analyses, token_budget=4 * (size + 20), max_size=8)
+        assert [len(g) for g in groups] == [4, 4, 2]
+        assert sum(groups, []) == list(analyses)
+        assert [len(g) for g in pack_analyses(analyses, 10 ** 6, max_size=3)] == [3, 3, 3, 1]
+        assert [len(g) for g in pack_analyses(analyses, 1, max_size=8)] == [1] * 10
+    
+    def test_parse(self):
+        """Test only exactly-once, non-empty, requested reports are accepted"""
+        ids = list(analysis_ids(["a", "b", "c", "d"]))
+        text = (
+            "Preamble\n" + _respond(["A1", "A2", "A9"])
+            + "\n=== BEGIN REPORT A2 ===\nagain\n=== END REPORT A2 ==="
+            + "\n=== BEGIN REPORT A3 ===\n\n=== END REPORT A3 ==="
+            + "\n=== BEGIN REPORT A4 ===\nno end marker"
+        )
+        assert parse_batch_output(text, ids) == {"A1": "Effect size report for A1"}
+        assert parse_batch_output(None, ids) == {}
+        assert "=== BEGIN REPORT A1 ===" in batch_instructions(ids)
+
+class TestBatchReports:
+    """Test ReportGenerator batch mode"""
+    
+    @pytest.fixture
+    def generator(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+        from metamar.llm.report_generator import ReportGenerator
+        return ReportGenerator()
+    
+    def test_handler_prompts(self, generator, monkeypatch):
+        """Test the instruction block is sent once with every analysis delimited"""
+        sent = {}
+        monkeypatch.setattr(generator.gpt4, "_complete", lambda messages, settings: sent.setdefault("gpt4", messages) and "")
+        monkeypatch.setattr(generator.claude, "_complete", lambda prompt, settings: sent.setdefault("claude", prompt) and "")
+        analyses = {"A1": {"k": 5}, "A2": {"k": 7}}
+        labels = {"A1": "Outcome: pain", "A2": "Outcome: === function ==="}
+        settings = {"summary_measure": "SMD", "pooling_method": "Inverse", "tau2_estimator": "REML",
+                    "ci_method": "classic", "publication_bias_method": "Egger"}
+        
+        generator.gpt4.generate_batch_report(analyses, labels, "continuous", settings, "Be brief")
+        generator.claude.generate_batch_report(analyses, labels, "continuous", settings, "Be brief")
+        system, user = (m["content"] for m in sent["gpt4"])
+        for prompt in (system + user, sent["claude"]):
+            assert prompt.count("Provide a comprehensive analysis") + prompt.count("Please provide a comprehensive") == 1
+            assert "=== ANALYSIS A1: Outcome: pain ===" in prompt
+            assert "=== ANALYSIS A2: Outcome: === function ===" in prompt
+            assert "Be brief" in prompt
+    
+    def test_batch_and_reissue(self, generator, monkeypatch):
+        """Test analyses share requests and only unparsed reports are re-issued"""
+        calls = {"gpt4": [], "claude": []}
+        
+        def fake(name, skip):
+            def generate_batch_report(analyses, labels, analysis_type, meta_settings, instructions, settings):
+                calls[name].append((sorted(analyses), settings["max_tokens"]))
+                # The first response of each model misses its second report
+                return _respond(analyses, skip=list(analyses)[1:2] if len(calls[name]) == 1 else skip)
+            return generate_batch_report
+        
+        for name, skip in (("gpt4", ()), ("claude", list(analysis_ids(range(8))))):
+            monkeypatch.setattr(getattr(generator, name), "generate_batch_report", fake(name, skip))
+            monkeypatch.setattr(
+                getattr(generator, name), "generate_report",
+                lambda *args, name=name: calls[name].append(("single",)) or "Effect size single report"
+            )
+        
+        analyses = _analyses(10)
+        labels = list(analyses)
+        reports = generator.generate_batch_reports(analyses, "continuous", {"summary_measure": "SMD"}, max_batch_size=8)
+        
+        assert list(reports) == labels
+        assert all(r["input_data"] == analyses[label] for label, r in reports.items())
+        # 8 + 2 packed, then the one missing report re-issued on its own
+        assert [len(c[0]) for c in calls["gpt4"][:2]] == [8, 2]
+        assert calls["gpt4"][2:] == [("single",)]
+        assert reports[labels[1]]["gpt4"]["batch_size"] == 1
+        assert reports[labels[0]]["gpt4"]["batch_size"] == 8
+        assert re.search(r"report for A1$", reports[labels[0]]["gpt4"]["report"])
+        # A model that never delimits correctly falls back to single requests after one retry
+        assert calls["claude"][-1] == ("single",)
+        assert all(r["claude"]["report"] for r in reports.values())
+        assert calls["gpt4"][0][1] > calls["gpt4"][1][1]
+        
+        with pytest.raises(ValueError):
+            generator.generate_batch_reports(analyses, "binary", {"summary_measure": "SMD"})
+    
+    def test_output_limit_and_errors(self, generator, monkeypatch):
+        """Test requests fit the completion limit and a failed request keeps the others"""
+        calls = []
+        observed = []
+        
+        def generate_batch_report(analyses, labels, analysis_type, meta_settings, instructions, settings):
+            calls.append((len(analyses), settings["max_tokens"]))
+            if len(calls) == 1:
+                raise RuntimeError("Rate limited")
+            time.sleep(0.02)
+            return _respond(analyses)
+        
+        for name in ("gpt4", "claude"):
+            monkeypatch.setattr(getattr(generator, name), "generate_batch_report", generate_batch_report)
+            monkeypatch.setattr(getattr(generator, name), "generate_report", lambda *args: "Effect size single report")
+        monkeypatch.setattr(generator.router, "complexity", lambda results, instructions=None: 1.0)
+        monkeypatch.setattr(generator.router, "observe", lambda route, seconds: observed.append(seconds))
+        
+        analyses = _analyses(10)
+        reports = generator.generate_batch_reports(analyses, "continuous", {"summary_measure": "SMD"}, max_batch_size=8)
+        
+        # Full tiers allow 4096 output tokens, i.e. four 1000-token reports per request
+        assert all(size <= 4 and tokens <= 4096 for size, tokens in calls)
+        assert list(reports) == list(analyses)
+        batched = reports[list(analyses)[-1]]["gpt4"]
+        assert batched["prompt_version"] == generator.gpt4.BATCH_PROMPT_VERSION != generator.gpt4.PROMPT_VERSION
+        # The router sees the wall time of a request, the report its share
+        assert batched["batch_size"] > 1
+        assert min(observed) >= 0.02 > batched["time"]
+    
+    def test_unrecoverable_request(self, generator, monkeypatch):
+        """Test analyses whose single requests also fail are left out"""
+        def failing(*args):
+            if args[0]["effect_size"] == 0.0:
+                raise RuntimeError("Content filtered")
+            return "Effect size single report"
+        
+        for name in ("gpt4", "claude"):
+            monkeypatch.setattr(
+                getattr(generator, name), "generate_batch_report",
+                lambda analyses, *args: (_ for _ in ()).throw(RuntimeError("Server error"))
+            )
+            monkeypatch.setattr(getattr(generator, name), "generate_report", failing)
+        
+        analyses = _analyses(3)
+        reports = generator.generate_batch_reports(analyses, "continuous", {"summary_measure": "SMD"})
+        assert list(reports) == list(analyses)[1:]
+    
+    def test_reuse(self, generator, monkeypatch, tmp_path):
+        """Test batched reports are reused without recording routing side effects"""
+        from metamar.llm.result_store import ResultStore
+        
+        calls = []
+        for name in ("gpt4", "claude"):
+            monkeypatch.setattr(
+                getattr(generator, name), "generate_batch_report",
+                lambda analyses, *args: calls.append(len(analyses)) or _respond(analyses)
+            )
+        generator.store = ResultStore(tmp_path / "reports.sqlite")
+        routed = []
+        route = generator.router.route
+        monkeypatch.setattr(generator.router, "route", lambda *args, **kwargs: routed.append(kwargs) or route(*args, **kwargs))
+        
+        analyses = _analyses(4)
+        first = generator.generate_batch_reports(analyses, "continuous", {"summary_measure": "SMD"}, reuse=True)
+        assert calls == [4, 4]
+        routed.clear()
+        second = generator.generate_batch_reports(analyses, "continuous", {"summary_measure": "SMD"}, reuse=True)
+        assert calls == [4, 4]
+        assert len(generator.store) == 4
+        assert {label: r["id"] for label, r in second.items()} == {label: r["id"] for label, r in first.items()}
+        assert all(kwargs.get("record") is False for kwargs in routed)
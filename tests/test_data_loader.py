@@ -155,4 +155,63 @@ class TestMetaAnalysisDataLoader:
         
         # Check validation
         with pytest.raises(ValueError):
-            data_loader.load_data(test_file, 'correlation')
\ No newline at end of file
+            data_loader.load_data(test_file, 'correlation')
+    
+    def test_compact_mode(self, data_loader, sample_binary_data, tmp_path):
+        """Test compact memory representation"""
+        test_file = tmp_path / "test_compact.csv"
+        sample_binary_data.to_csv(test_file, index=False)
+        
+        full = data_loader.load_data(test_file, 'binary')
+        data = data_loader.load_data(test_file, 'binary', compact=True)
+        
+        assert data['n.e'].dtype == np.int8
+        assert data['event.c'].dtype == np.int8
+        assert isinstance(data['studlab'].dtype, pd.CategoricalDtype)
+        assert isinstance(data['subgroup'].dtype, pd.CategoricalDtype)
+        assert (data['n.e'] == full['n.e']).all()
+        
+        usage = data.attrs['memory_usage']
+        assert usage['after_bytes'] < usage['before_bytes']
+    
+    def test_compact_float32(self, data_loader, sample_continuous_data, tmp_path):
+        """Test float32 storage of continuous fields"""
+        test_file = tmp_path / "test_compact_float.csv"
+        sample_continuous_data.to_csv(test_file, index=False)
+        
+        data = data_loader.load_data(test_file, 'continuous', compact=True, float32=True)
+        assert data['mean.e'].dtype == np.float32
+        assert data['year'].dtype == np.int16
+        
+        # Values that need more than float32 precision stay float64
+        precise = pd.Series([1.0000000001, 2.0])
+        assert not data_loader._fits_float32(precise.to_numpy(), 1e-12)
+    
+    def test_range_structure(self, data_loader):
+        """Test median/range data is converted to means and SDs"""
+        from tests import get_test_file_path
+        data = data_loader.load_data(
+            get_test_file_path('continuous', 'metacont_range_without_subgroup.xlsx'),
+            'continuous', 'range'
+        )
+        
+        assert data[['mean.e', 'sd.e', 'mean.c', 'sd.c']].notna().all().all()
+        assert (data['sd.e'] > 0).all()
+        assert data.attrs['mean_sd_conversion']['e']['S1'] == len(data)
+    
+    def test_median_structure(self, data_loader, tmp_path):
+        """Test quartile rows, and rows with both quartiles and range, are converted"""
+        test_file = tmp_path / "test_median.csv"
+        pd.DataFrame({
+            'studlab': ['Test1', 'Test2'],
+            'n.e': [50, 40], 'median.e': [10.0, 12.0], 'q1.e': [8.0, 10.0], 'q3.e': [12.5, 14.0],
+            'min.e': [np.nan, 4.0], 'max.e': [np.nan, 20.0],
+            'n.c': [48, 45], 'median.c': [9.0, 11.0], 'q1.c': [7.0, 9.5], 'q3.c': [11.0, 13.0]
+        }).to_csv(test_file, index=False)
+        
+        data = data_loader.load_data(test_file, 'continuous', 'median')
+        assert data.attrs['mean_sd_conversion']['e'] == {'S1': 0, 'S2': 1, 'S3': 1}
+        assert data[['mean.e', 'sd.e', 'mean.c', 'sd.c']].notna().all().all()
+        
+        raw = data_loader.load_data(test_file, 'continuous', 'median', convert=False)
+        assert 'mean.e' not in raw.columns
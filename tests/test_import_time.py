@@ -0,0 +1,59 @@
+"""
+Import-time benchmark for the metamar package
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Budget for a cold ``import metamar``, excluding interpreter start-up
+IMPORT_BUDGET_SECONDS = 0.2
+
+HEAVY_MODULES = ['openai', 'anthropic', 'pandas', 'numpy', 'yaml']
+
+SRC_DIR = Path(__file__).parents[1] / "src"
+
+def _cold_import() -> dict:
+    """Import metamar in a fresh interpreter and report timing"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import metamar\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in [str(SRC_DIR), env.get('PYTHONPATH', '')] if p
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output)
+
+class TestImportTime:
+    """Test package import cost"""
+    
+    def test_cold_import_budget(self):
+        """Test cold import stays under the fixed budget"""
+        # Best of three runs to smooth out filesystem cache noise
+        elapsed = min(_cold_import()['elapsed'] for _ in range(3))
+        assert elapsed < IMPORT_BUDGET_SECONDS
+    
+    def test_no_heavy_imports(self):
+        """Test heavy dependencies are deferred until first use"""
+        assert _cold_import()['heavy'] == []
+    
+    def test_lazy_attribute_access(self):
+        """Test public names resolve on first access"""
+        import metamar
+        assert metamar.MetaAnalysisDataLoader.__name__ == 'MetaAnalysisDataLoader'
+        assert metamar.DataLoader is metamar.MetaAnalysisDataLoader
+        with pytest.raises(AttributeError):
+            metamar.NotAnAttribute
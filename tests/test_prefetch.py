@@ -0,0 +1,134 @@
+"""
+Tests for speculative report prefetching
+"""
+
+import threading
+import time
+
+import pytest
+
+from metamar.llm.prefetch import RateLimiter, ReportPrefetcher, infer_analysis_type
+
+SETTINGS = {"summary_measure": "SMD"}
+
+class FakeGenerator:
+    """Records requests; blocks each one until released"""
+    
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+    
+    def generate_comparative_report(self, results, analysis_type, settings, custom_instructions=None):
+        self.calls.append((results["effect_size"], threading.current_thread().name))
+        self.started.set()
+        assert self.release.wait(5)
+        return {"input_data": results, "gpt4": {"report": f"Effect size {results['effect_size']}"}}
+
+def _results(effect_size):
+    return {"k": 5, "effect_size": effect_size}
+
+@pytest.fixture
+def generator():
+    return FakeGenerator()
+
+@pytest.fixture
+def prefetcher(generator):
+    prefetcher = ReportPrefetcher(generator, rate_limit=6000, prefetch_share=0.5)
+    yield prefetcher
+    generator.release.set()
+    prefetcher.close()
+
+class TestReportPrefetcher:
+    """Test cache hits, cancellation and foreground priority"""
+    
+    def test_prefetch_hit(self, prefetcher, generator):
+        """Test the explicit request is served by the finished prefetch"""
+        generator.release.set()
+        future = prefetcher.prefetch(_results(0.3), SETTINGS)
+        future.result(5)
+        
+        start = time.monotonic()
+        report = prefetcher.get_report(_results(0.3), SETTINGS, "continuous")
+        assert time.monotonic() - start < 0.5
+        assert report["gpt4"]["report"] == "Effect size 0.3"
+        assert len(generator.calls) == 1
+        assert generator.calls[0][1].startswith("metamar-prefetch")
+        assert prefetcher.stats["hits"] == 1
+        assert prefetcher.prefetch(_results(0.3), SETTINGS) is future
+    
+    def test_input_change_cancels(self, prefetcher, generator):
+        """Test a new prefetch cancels the session's queued one"""
+        running = prefetcher.prefetch(_results(0.1), SETTINGS)
+        assert generator.started.wait(5)
+        queued = prefetcher.prefetch(_results(0.2), SETTINGS)
+        latest = prefetcher.prefetch(_results(0.3), SETTINGS)
+        other_session = prefetcher.prefetch(_results(0.4), SETTINGS, session="other")
+        assert queued.cancelled()
+        assert not running.cancelled()
+        
+        prefetcher.cancel("other")
+        assert other_session.cancelled()
+        generator.release.set()
+        assert latest.result(5)["input_data"] == _results(0.3)
+        assert running.result(5)
+        assert [effect for effect, _ in generator.calls] == [0.1, 0.3]
+        assert prefetcher.stats["cancelled"] == 2
+    
+    def test_foreground_takes_over(self, prefetcher, generator):
+        """Test a queued prefetch is generated in the foreground when requested"""
+        prefetcher.prefetch(_results(0.1), SETTINGS, session="a")
+        assert generator.started.wait(5)
+        queued = prefetcher.prefetch(_results(0.2), SETTINGS, session="b")
+        
+        reports = []
+        request = threading.Thread(target=lambda: reports.append(prefetcher.get_report(_results(0.2), SETTINGS)))
+        request.start()
+        while len(generator.calls) < 2:
+            time.sleep(0.01)
+        generator.release.set()
+        request.join(5)
+        assert queued.result(5) is reports[0]
+        assert [effect for effect, _ in generator.calls].count(0.2) == 1
+        assert not generator.calls[-1][1].startswith("metamar-prefetch")
+        assert prefetcher.stats["misses"] == 1
+    
+    def test_failed_prefetch_regenerates(self, prefetcher, generator, monkeypatch):
+        """Test a failed prefetch is dropped and the request generates again"""
+        fail = iter([True, False])
+        original = generator.generate_comparative_report
+        
+        def flaky(*args):
+            if next(fail):
+                raise RuntimeError("API down")
+            return original(*args)
+        
+        monkeypatch.setattr(generator, "generate_comparative_report", flaky)
+        generator.release.set()
+        with pytest.raises(RuntimeError):
+            prefetcher.prefetch(_results(0.5), SETTINGS).result(5)
+        assert prefetcher.get_report(_results(0.5), SETTINGS)["gpt4"]["report"] == "Effect size 0.5"
+    
+    def test_rate_limiter(self):
+        """Test the token bucket paces requests and stops waiting when cancelled"""
+        limiter = RateLimiter(1200, burst=1)
+        start = time.monotonic()
+        for _ in range(3):
+            assert limiter.acquire()
+        assert time.monotonic() - start >= 0.09
+        
+        cancelled = threading.Event()
+        cancelled.set()
+        slow = RateLimiter(1, burst=1)
+        slow.acquire()
+        assert not slow.acquire(1, cancelled)
+    
+    def test_infer_analysis_type(self):
+        """Test the analysis type follows from the summary measure"""
+        assert infer_analysis_type("SMD") == "continuous"
+        assert infer_analysis_type("OR") == "binary"
+        assert infer_analysis_type("HR") == "generic"
+        with pytest.raises(ValueError):
+            infer_analysis_type("XYZ")
+        with pytest.raises(ValueError):
+            ReportPrefetcher(FakeGenerator(), rate_limit=60, prefetch_share=1.5)
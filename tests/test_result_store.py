@@ -0,0 +1,119 @@
+"""
+Tests for the comparative report store
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from metamar.llm.result_store import ResultStore, content_hash
+
+@pytest.fixture
+def store(tmp_path):
+    """Empty store in a temporary directory"""
+    with ResultStore(tmp_path / "reports.sqlite") as store:
+        yield store
+
+@pytest.fixture
+def comparison():
+    """Comparative report as returned by ReportGenerator"""
+    return {
+        "timestamp": "2026-01-05T10:00:00",
+        "analysis_type": "continuous",
+        "settings_used": {"summary_measure": "SMD", "tau2_estimator": "REML"},
+        "input_data": {"effect_size": 0.45, "k": 15, "heterogeneity": {"i2": 75.5}},
+        "gpt4": {"report": "Effect size " * 200, "time": 2.5, "model": "gpt-4o", "prompt_version": 1},
+        "claude": {"report": "Heterogeneity " * 200, "time": 3.0, "model": "claude-3-opus", "prompt_version": 1},
+        "comparison_metrics": {"length_comparison": {"gpt4_length": 2400, "claude_length": 2800}}
+    }
+
+class TestResultStore:
+    """Test storing, querying and reusing comparative reports"""
+    
+    def test_round_trip(self, store, comparison):
+        """Test a stored comparison loads back unchanged"""
+        comparison_id = store.save(comparison)
+        assert store.get(comparison_id) == {**comparison, "id": comparison_id}
+        assert store.get(comparison_id + 1) is None
+        assert len(store) == 1
+    
+    def test_inputs_deduplicated(self, store, comparison):
+        """Test equal inputs and settings are stored once and texts compressed"""
+        for i in range(5):
+            reordered = dict(reversed(list(comparison["input_data"].items())))
+            store.save({**comparison, "input_data": reordered, "timestamp": f"2026-01-0{i + 1}T00:00:00"})
+        store.save({**comparison, "input_data": {**comparison["input_data"], "k": 16}})
+        
+        kinds = dict(store._conn.execute("SELECT kind, COUNT(*) FROM payloads GROUP BY kind").fetchall())
+        assert kinds == {"input": 2, "settings": 1}
+        text_size = store._conn.execute("SELECT MAX(LENGTH(text)) FROM reports").fetchone()[0]
+        assert text_size < len(comparison["claude"]["report"]) / 10
+        assert content_hash({"a": 1, "b": np.float64(2.0)}) == content_hash({"b": 2.0, "a": 1})
+    
+    def test_query(self, store, comparison):
+        """Test filtering by analysis type, time, model and prompt version"""
+        start = datetime(2026, 1, 1)
+        for i in range(6):
+            store.save({
+                **comparison,
+                "timestamp": (start + timedelta(days=i)).isoformat(),
+                "analysis_type": "binary" if i % 2 else "continuous",
+                "gpt4": {**comparison["gpt4"], "prompt_version": 1 + i // 3}
+            })
+        
+        rows = store.query()
+        assert [row["timestamp"][:10] for row in rows] == [f"2026-01-0{6 - i}" for i in range(6)]
+        assert rows[0]["reports"]["gpt4"] == {"model": "gpt-4o", "prompt_version": 2}
+        assert len(store.query(analysis_type="binary")) == 3
+        assert len(store.query(prompt_version=2)) == 3
+        assert len(store.query(model="gpt-4o", prompt_version=2, analysis_type="binary")) == 2
+        assert len(store.query(model="gpt-3.5")) == 0
+        assert len(store.query(since=start + timedelta(days=2), until="2026-01-05")) == 2
+        assert len(store.query(input_data=comparison["input_data"], limit=4)) == 4
+    
+    def test_find_and_delete(self, store, comparison):
+        """Test reuse lookups match content, instructions, models and prompt versions"""
+        first = store.save(comparison)
+        second = store.save({**comparison, "timestamp": "2026-01-06T10:00:00"}, "Focus on bias")
+        args = (comparison["input_data"], "continuous", comparison["settings_used"])
+        
+        assert store.find(*args)["id"] == first
+        assert store.find(*args, "Focus on bias")["id"] == second
+        assert store.find(*args, models={"gpt4": "gpt-4o"}, prompt_versions={"claude": 1})["id"] == first
+        assert store.find(*args, prompt_versions={"gpt4": 2}) is None
+        assert store.find(comparison["input_data"], "binary", comparison["settings_used"]) is None
+        
+        assert store.delete(second)
+        assert not store.delete(second)
+        assert store.find(*args, "Focus on bias") is None
+        assert store._conn.execute("SELECT COUNT(*) FROM payloads").fetchone()[0] == 2
+
+class TestReportGeneratorStore:
+    """Test report generation with a result store"""
+    
+    def test_store_and_reuse(self, tmp_path, monkeypatch, comparison):
+        """Test generated reports are stored and reused without new LLM calls"""
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+        from metamar.llm.report_generator import ReportGenerator
+        
+        calls = []
+        generator = ReportGenerator(store=ResultStore(tmp_path / "reports.sqlite"))
+        for handler in (generator.gpt4, generator.claude):
+            monkeypatch.setattr(
+                handler, "generate_report",
+                lambda *args, **kwargs: calls.append(args) or "Effect size and heterogeneity"
+            )
+        
+        settings = {"summary_measure": "SMD"}
+        report = generator.generate_comparative_report(comparison["input_data"], "continuous", settings)
+        reused = generator.generate_comparative_report(comparison["input_data"], "continuous", settings, reuse=True)
+        assert len(calls) == 2
+        assert reused["id"] == report["id"]
+        assert reused["gpt4"] == report["gpt4"]
+        assert reused["gpt4"]["prompt_version"] == generator.gpt4.PROMPT_VERSION
+        
+        generator.generate_comparative_report(comparison["input_data"], "continuous", settings, "Be brief", reuse=True)
+        assert len(calls) == 4
+        assert len(generator.store) == 2
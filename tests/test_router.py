@@ -0,0 +1,167 @@
+"""
+Tests for adaptive model routing
+"""
+
+from pathlib import Path
+
+import pytest
+
+from metamar.config.settings import Settings
+from metamar.llm.router import ModelRouter, ModelTier, RoutingPolicy, complexity_features
+
+CONFIG_DIR = Path(__file__).parents[1] / "config"
+
+@pytest.fixture
+def policy():
+    """Three tiers for one provider"""
+    return RoutingPolicy(
+        enabled=True,
+        tiers={'gpt4': (
+            ModelTier('fast', 'small', 0.3, 600),
+            ModelTier('standard', 'medium', 0.6, 800),
+            ModelTier('full', 'large', 1.0, 1200)
+        )},
+        latency_slo=10.0
+    )
+
+@pytest.fixture
+def simple_results():
+    """Three-study common-effect analysis"""
+    return {'model_type': 'Fixed effect', 'effect_size': 0.3, 'k': 3, 'i2': 0.0}
+
+@pytest.fixture
+def complex_results():
+    """Large heterogeneous analysis with every optional section"""
+    return {
+        'k': 80,
+        'i2': 85.0,
+        'subgroups': {'groups': [{'subgroup': str(i), 'k': 10} for i in range(8)]},
+        'publication_bias': {'p_value': 0.01},
+        'trim_and_fill': {'k0': 4},
+        'sensitivity': {'influential': []},
+        'meta_regression': {'r2': 30.0},
+        'multilevel': {'n_clusters': 20},
+        'prediction_interval': {'lower': -0.2},
+        'tau2_ci': {'lower': 0.01},
+        'studies': ['x' * 80] * 200
+    }
+
+LLM_SETTINGS = {'gpt4': {'model': 'configured', 'max_tokens': 1000, 'temperature': 0.3}}
+
+class TestModelRouter:
+    """Test complexity scoring, tier choice and latency feedback"""
+    
+    def test_complexity(self, simple_results, complex_results):
+        """Test features and score order simple below complex"""
+        router = ModelRouter(RoutingPolicy(enabled=True, tiers={}))
+        features = complexity_features(complex_results)
+        assert features['subgroups'] == 1.0
+        assert features['sections'] == 1.0
+        assert complexity_features({'heterogeneity': {'i2': 50.0}})['heterogeneity'] == 0.5
+        assert router.complexity(simple_results) < 0.15
+        assert router.complexity(complex_results) > 0.9
+    
+    def test_route(self, policy, simple_results, complex_results):
+        """Test simple requests go to the cheapest tier without cutting the token budget"""
+        router = ModelRouter(policy)
+        simple = router.route('gpt4', simple_results, LLM_SETTINGS['gpt4'])
+        complex_ = router.route('gpt4', complex_results, LLM_SETTINGS['gpt4'])
+        assert (simple.tier, simple.model) == ('fast', 'small')
+        assert (complex_.tier, complex_.model) == ('full', 'large')
+        # Tier budgets are caps and never undercut the configured budget
+        assert (simple.max_tokens, complex_.max_tokens) == (1000, 1200)
+        assert simple.apply(LLM_SETTINGS['gpt4']) == {'model': 'small', 'max_tokens': 1000, 'temperature': 0.3}
+        
+        disabled = ModelRouter(RoutingPolicy(enabled=False, tiers=policy.tiers))
+        decision = disabled.route('gpt4', complex_results, LLM_SETTINGS['gpt4'])
+        assert (decision.model, decision.max_tokens) == ('configured', 1000)
+    
+    def test_latency_feedback(self, policy):
+        """Test slow tiers shed borderline requests, then get probed again"""
+        router = ModelRouter(policy)
+        borderline = 0.7
+        assert router.route('gpt4', {}, LLM_SETTINGS['gpt4'], complexity=borderline).tier == 'full'
+        
+        router.observe(router.route('gpt4', {}, LLM_SETTINGS['gpt4'], complexity=1.0), 40.0)
+        assert router.latency('gpt4', 'full') == 40.0
+        assert router.route('gpt4', {}, LLM_SETTINGS['gpt4'], complexity=borderline).tier == 'standard'
+        
+        heavy = router.route('gpt4', {}, LLM_SETTINGS['gpt4'], complexity=1.0)
+        assert heavy.tier == 'full'
+        assert heavy.max_tokens == 1200
+        
+        tiers = [router.route('gpt4', {}, LLM_SETTINGS['gpt4'], complexity=borderline).tier for _ in range(10)]
+        assert tiers[0] == 'standard'
+        assert tiers[-1] == 'full'
+    
+    def test_project_policy(self, simple_results):
+        """Test the configured policy parses and routes simple cases to fast models"""
+        settings = Settings(CONFIG_DIR)
+        policy = RoutingPolicy.from_config(settings.config['routing'], settings.llm_settings)
+        assert policy.enabled
+        assert [tier.name for tier in policy.tiers['claude']] == ['fast', 'standard', 'full']
+        assert policy.tiers['claude'][-1].max_output_tokens == 4096
+        assert ModelRouter(policy).route('claude', {}, settings.llm_settings['claude'], complexity=1.0).batch_capacity == 4
+        
+        routes = ModelRouter(policy).route_all(simple_results, settings.llm_settings)
+        assert routes['gpt4'].model != settings.gpt4_config.model
+        assert routes['claude'].model != settings.claude_config.model
+        
+        with pytest.raises(ValueError):
+            RoutingPolicy.from_config(
+                {'tiers': {'gpt4': [{'name': 'x', 'model': 'm', 'max_complexity': 0.5, 'max_tokens': 10}]}},
+                LLM_SETTINGS
+            )
+    
+    def test_report_generator(self, monkeypatch, simple_results):
+        """Test reports are generated with the routed settings and latency is recorded"""
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+        from metamar.llm.report_generator import ReportGenerator
+        
+        generator = ReportGenerator()
+        used = {}
+        for name in ('gpt4', 'claude'):
+            monkeypatch.setattr(
+                getattr(generator, name), "generate_report",
+                lambda *args, name=name: used.setdefault(name, args[-1]) and "Effect size"
+            )
+        
+        comparison = generator.generate_comparative_report(simple_results, "continuous", {"summary_measure": "SMD"})
+        assert comparison["gpt4"]["tier"] == "fast"
+        assert used["gpt4"]["model"] == comparison["gpt4"]["model"]
+        assert used["claude"]["max_tokens"] == 1000
+        assert {row["provider"] for row in generator.router.stats()} == {"gpt4", "claude"}
+    
+    def test_truncation_retry(self, monkeypatch, simple_results):
+        """Test cut-off completions are retried with a larger budget and never returned"""
+        from types import SimpleNamespace
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+        from metamar.llm.report_generator import ReportGenerator
+        from metamar.llm.router import TruncatedReportError
+        
+        generator = ReportGenerator()
+        budgets = {"gpt4": [], "claude": []}
+        
+        def openai_create(model, messages, temperature, max_tokens):
+            budgets["gpt4"].append(max_tokens)
+            finish_reason = "length" if max_tokens < 2000 else "stop"
+            return SimpleNamespace(choices=[SimpleNamespace(
+                finish_reason=finish_reason, message=SimpleNamespace(content="Effect size report")
+            )])
+        
+        def anthropic_create(model, max_tokens, messages):
+            budgets["claude"].append(max_tokens)
+            return SimpleNamespace(stop_reason="max_tokens", content=[SimpleNamespace(text="Effect size")])
+        
+        monkeypatch.setattr(generator.gpt4.client.chat.completions, "create", openai_create)
+        monkeypatch.setattr(generator.claude.client.messages, "create", anthropic_create)
+        
+        with pytest.raises(TruncatedReportError):
+            generator.generate_comparative_report(simple_results, "continuous", {
+                "summary_measure": "SMD", "pooling_method": "Inverse", "tau2_estimator": "REML",
+                "ci_method": "classic", "publication_bias_method": "Egger"
+            })
+        assert budgets["gpt4"] == [1000, 2000]
+        assert budgets["claude"] == [1000, 2000, 4000, 4096]
@@ -0,0 +1,116 @@
+"""
+Tests for settings snapshots and hot reload
+"""
+
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+import yaml
+
+from metamar.config.settings import (
+    Settings, SettingsSnapshot, ConfigWatcher, _validation_error
+)
+
+CONFIG_DIR = Path(__file__).parents[1] / "config"
+
+@pytest.fixture
+def config_dir(tmp_path):
+    """Copy of the project configuration that tests may modify"""
+    for name in ['config.yml', 'logging.yml']:
+        shutil.copy(CONFIG_DIR / name, tmp_path / name)
+    return tmp_path
+
+def _update_config(config_dir: Path, section: str, key: str, value):
+    """Rewrite one configuration value and bump the file's mtime"""
+    path = config_dir / 'config.yml'
+    config = yaml.safe_load(path.read_text())
+    config[section][key] = value
+    path.write_text(yaml.safe_dump(config))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+class TestSettingsSnapshot:
+    """Test immutable settings snapshots"""
+    
+    def test_snapshot_is_frozen_and_hashable(self, config_dir):
+        """Test snapshots cannot be mutated and compare by content"""
+        first = Settings(config_dir).snapshot
+        second = Settings(config_dir).snapshot
+        
+        assert first == second
+        assert hash(first) == hash(second)
+        assert first.version != second.version
+        with pytest.raises(AttributeError):
+            first.meta = None
+    
+    def test_settings_dicts_built_once(self, config_dir):
+        """Test settings dicts are cached per snapshot"""
+        settings = Settings(config_dir)
+        assert settings.meta_settings is settings.meta_settings
+        assert settings.llm_settings['gpt4']['model'] == settings.gpt4_config.model
+    
+    def test_validation_memoized(self, config_dir):
+        """Test validation results are memoized per (snapshot, analysis_type)"""
+        snapshot = Settings(config_dir).snapshot
+        _validation_error.cache_clear()
+        
+        assert snapshot.validate_meta_settings('continuous')
+        assert snapshot.validate_meta_settings('continuous')
+        assert not snapshot.validate_meta_settings('binary')
+        
+        info = _validation_error.cache_info()
+        assert info.hits == 1
+        assert info.misses == 2
+    
+    def test_meta_overrides(self, config_dir):
+        """Test overriding meta-analysis settings yields a new snapshot"""
+        snapshot = Settings(config_dir).snapshot
+        binary = snapshot.with_meta_settings({'summary_measure': 'OR', 'unknown': 1})
+        
+        assert binary.validate_meta_settings('binary')
+        assert snapshot.meta.summary_measure == 'SMD'
+
+class TestHotReload:
+    """Test configuration hot reload"""
+    
+    def test_reload_swaps_snapshot(self, config_dir):
+        """Test reload installs a new snapshot and in-flight holders keep theirs"""
+        settings = Settings(config_dir)
+        in_flight = settings.snapshot
+        
+        _update_config(config_dir, 'llm', 'gpt4', {
+            **settings.llm_settings['gpt4'], 'max_tokens': 500
+        })
+        assert settings.reload()
+        
+        assert settings.gpt4_config.max_tokens == 500
+        assert in_flight.gpt4.max_tokens == 1000
+    
+    def test_invalid_reload_rejected(self, config_dir):
+        """Test invalid configurations keep the current snapshot"""
+        settings = Settings(config_dir)
+        current = settings.snapshot
+        
+        _update_config(config_dir, 'meta_analysis', 'tau2_estimator', 'INVALID')
+        assert not settings.reload()
+        assert settings.snapshot is current
+    
+    def test_watcher_detects_changes(self, config_dir):
+        """Test watcher reloads settings when files change"""
+        settings = Settings(config_dir)
+        watcher = ConfigWatcher(settings, interval=0.01)
+        assert not watcher.check()
+        
+        _update_config(config_dir, 'meta_analysis', 'summary_measure', 'MD')
+        watcher.start()
+        try:
+            deadline = time.monotonic() + 5
+            while settings.meta_config.summary_measure != 'MD' and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            watcher.stop()
+        
+        assert settings.meta_config.summary_measure == 'MD'
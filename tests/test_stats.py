@@ -0,0 +1,1176 @@
+"""
+Tests for the native meta-analysis engine
+
+Reference values for the BCG vaccine trials (Colditz et al., 1994) are
+those reported by R's meta and metafor packages. Where R with the meta
+package is installed, the engine is also compared against it directly.
+"""
+
+import json
+import shutil
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import linalg, optimize, stats
+
+from metamar.stats import MetaAnalysisEngine, pool_inverse, compute_effect_sizes, pool_outcomes, fdr_bh
+from metamar.stats import leave_one_out, CumulativeMetaAnalysis, publication_bias, kendall_tau, BIAS_TESTS
+from metamar.stats import bootstrap, permutation_test, pool_mh, pool_peto, subgroup_analysis
+from metamar.stats import tau2_ci, prediction_interval, meta_regression, screen_moderators, gosh
+from metamar.stats import multilevel_meta, trimfill, downsample_points, funnel_payload, gosh_payload, PLOT_LAYERS
+from metamar.stats.intervals import _GeneralisedQ, quadratic_form_cdf
+from metamar.stats.effect_sizes import binary_effects, continuous_effects
+from metamar.stats.bias import egger_test
+from metamar.stats.conversion import estimate_mean_sd
+from metamar.stats.tau2 import estimate_tau2, TAU2_ESTIMATORS
+from metamar.utils.data_loader import MetaAnalysisDataLoader
+from metamar.utils.helpers import format_results
+from tests import get_test_file_path
+
+def _settings(**overrides):
+    settings = {
+        'summary_measure': 'RR',
+        'pooling_method': 'Inverse',
+        'tau2_estimator': 'DL',
+        'ci_method': 'classic',
+        'hartung_knapp_adjustment': ''
+    }
+    settings.update(overrides)
+    return settings
+
+class TestEffectSizes:
+    """Test per-study effect size computation"""
+    
+    def test_mean_difference(self):
+        """Test MD and its standard error"""
+        te, se = continuous_effects(10, 5.0, 2.0, 20, 3.0, 4.0, 'MD')
+        assert te == pytest.approx(2.0)
+        assert se == pytest.approx(np.sqrt(4 / 10 + 16 / 20))
+    
+    def test_hedges_g(self):
+        """Test SMD uses Hedges' small-sample correction"""
+        te, _ = continuous_effects(10, 5.0, 2.0, 10, 3.0, 2.0, 'SMD')
+        assert te == pytest.approx(1.0 * (1 - 3 / (4 * 20 - 9)))
+    
+    def test_zero_cell_correction(self):
+        """Test continuity correction applies to zero-cell studies only"""
+        te, se = binary_effects([0, 5, 0], [10, 10, 10], [2, 5, 0], [10, 10, 10], 'OR')
+        assert te[0] == pytest.approx(np.log((0.5 * 8.5) / (10.5 * 2.5)))
+        assert te[1] == pytest.approx(0.0)
+        assert np.isnan(te[2])
+    
+    def test_generic_se_from_ci(self):
+        """Test standard errors are derived from confidence limits"""
+        data = pd.DataFrame({'studlab': ['A'], 'TE': [0.5], 'lower': [0.1], 'upper': [0.9]})
+        effects = compute_effect_sizes(data, 'generic', 'MD')
+        assert effects.se[0] == pytest.approx(0.8 / (2 * 1.959964), rel=1e-5)
+
+class TestPooling:
+    """Test inverse-variance pooling against R reference values"""
+    
+    def test_bcg_dersimonian_laird(self, bcg_data):
+        """Test BCG log risk ratios match meta::metabin(sm = "RR", method.tau = "DL")"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        result = pool_inverse(effects.te, effects.vi, 'RR', 'DL')
+        
+        assert result.fixed.te == pytest.approx(-0.4303, abs=1e-4)
+        assert result.fixed.se == pytest.approx(0.0405, abs=1e-4)
+        assert result.random.te == pytest.approx(-0.7141, abs=1e-4)
+        assert result.random.se == pytest.approx(0.1787, abs=1e-4)
+        assert result.tau2 == pytest.approx(0.3088, abs=1e-4)
+        assert result.q == pytest.approx(152.2330, abs=1e-4)
+        assert result.i2 == pytest.approx(92.12, abs=1e-2)
+    
+    def test_batched_matches_single(self, bcg_data):
+        """Test stacked, NaN-padded analyses match individual runs"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        yi = np.vstack([effects.te, np.r_[effects.te[:8], [np.nan] * 5]])
+        vi = np.vstack([effects.vi, np.r_[effects.vi[:8], [np.nan] * 5]])
+        
+        batched = pool_inverse(yi, vi, 'RR', 'DL')
+        single = pool_inverse(effects.te[:8], effects.vi[:8], 'RR', 'DL')
+        
+        assert batched.k.tolist() == [13, 8]
+        assert batched.random.te[1] == pytest.approx(float(single.random.te))
+        assert batched.tau2[1] == pytest.approx(float(single.tau2))
+    
+    def test_homogeneous_studies(self):
+        """Test identical effects give zero heterogeneity"""
+        result = pool_inverse([0.3, 0.3, 0.3], [0.1, 0.2, 0.3])
+        assert result.tau2 == 0
+        assert result.i2 == 0
+        assert result.random.te == pytest.approx(0.3)
+    
+    def test_hartung_knapp(self, bcg_data):
+        """Test Hartung-Knapp intervals use a t distribution"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        classic = pool_inverse(effects.te, effects.vi, 'RR', 'DL')
+        hk = pool_inverse(effects.te, effects.vi, 'RR', 'DL', ci_method='HK')
+        assert hk.random.te == pytest.approx(float(classic.random.te))
+        assert hk.random.upper - hk.random.lower != pytest.approx(
+            float(classic.random.upper - classic.random.lower)
+        )
+
+class TestTau2Estimators:
+    """Test τ² estimators against metafor::rma on the BCG trials"""
+    
+    BCG_TAU2 = {
+        'REML': 0.3132, 'PM': 0.3181, 'DL': 0.3088, 'ML': 0.2800,
+        'HS': 0.2284, 'SJ': 0.3455, 'HE': 0.3286, 'EB': 0.3181
+    }
+    
+    @pytest.fixture
+    def bcg_effects(self, bcg_data):
+        return compute_effect_sizes(bcg_data, 'binary', 'RR')
+    
+    @pytest.mark.parametrize("method", TAU2_ESTIMATORS)
+    def test_bcg_reference(self, bcg_effects, method):
+        """Test each estimator against its reference value"""
+        result = estimate_tau2(bcg_effects.te, bcg_effects.vi, method)
+        assert result.tau2 == pytest.approx(self.BCG_TAU2[method], abs=1e-4)
+        assert result.converged
+        assert not result.fallback
+    
+    def test_reml_pooled_estimate(self, bcg_effects):
+        """Test REML random-effects estimate"""
+        result = pool_inverse(bcg_effects.te, bcg_effects.vi, 'RR', 'REML')
+        assert result.random.te == pytest.approx(-0.7145, abs=1e-4)
+        assert result.random.se == pytest.approx(0.1798, abs=1e-4)
+    
+    @pytest.mark.parametrize("method", TAU2_ESTIMATORS)
+    def test_stacked_solve(self, bcg_effects, method):
+        """Test many analyses solved in one call match individual solves"""
+        rng = np.random.default_rng(1)
+        yi = bcg_effects.te + rng.normal(0, 0.3, size=(50, 13))
+        vi = np.tile(bcg_effects.vi, (50, 1))
+        yi[::3, 9:] = np.nan
+        
+        stacked = estimate_tau2(yi, vi, method).tau2
+        single = [float(estimate_tau2(y[np.isfinite(y)], v[np.isfinite(y)], method).tau2)
+                  for y, v in zip(yi, vi)]
+        np.testing.assert_allclose(stacked, single, rtol=1e-7, atol=1e-10)
+    
+    def test_warm_start(self, bcg_effects):
+        """Test warm starts at the solution converge immediately"""
+        cold = estimate_tau2(bcg_effects.te, bcg_effects.vi, 'REML')
+        warm = estimate_tau2(bcg_effects.te, bcg_effects.vi, 'REML', tau2_init=cold.tau2)
+        assert warm.iterations <= 1 < cold.iterations
+        assert warm.tau2 == pytest.approx(float(cold.tau2))
+    
+    @pytest.mark.parametrize("method", ['REML', 'ML', 'PM', 'EB'])
+    def test_bisection_fallback(self, bcg_effects, method):
+        """Test non-converged analyses fall back to bisection"""
+        result = estimate_tau2(bcg_effects.te, bcg_effects.vi, method, tau2_init=50.0, max_iter=1)
+        assert result.fallback
+        assert result.tau2 == pytest.approx(self.BCG_TAU2[method], abs=1e-4)
+    
+    def test_boundary_and_single_study(self):
+        """Test homogeneous data and single studies give zero τ²"""
+        result = estimate_tau2([[0.2, 0.2, 0.2], [0.5, np.nan, np.nan]], [[0.1, 0.2, 0.3]] * 2, 'REML')
+        assert result.tau2.tolist() == [0.0, 0.0]
+        assert result.converged.all()
+
+class TestBatchPooling:
+    """Test many-outcome pooling on long-format data"""
+    
+    @pytest.fixture
+    def long_data(self):
+        rng = np.random.default_rng(7)
+        k = rng.integers(1, 9, 200)
+        outcome = np.repeat([f"gene{i:04d}" for i in range(200)], k)
+        data = pd.DataFrame({
+            'outcome': outcome,
+            'studlab': np.arange(k.sum()),
+            'TE': rng.normal(0, 0.3, k.sum()) + np.repeat(rng.normal(0, 0.3, 200), k),
+            'seTE': rng.uniform(0.1, 0.5, k.sum())
+        })
+        return data.sample(frac=1, random_state=3).reset_index(drop=True)
+    
+    @pytest.mark.parametrize("method", ['DL', 'REML', 'PM'])
+    def test_matches_individual_analyses(self, long_data, method):
+        """Test each outcome matches a separate meta-analysis"""
+        table = pool_outcomes(long_data, tau2_method=method).set_index('outcome')
+        
+        for name in ['gene0000', 'gene0007', 'gene0123']:
+            rows = long_data[long_data['outcome'] == name]
+            single = pool_inverse(rows['TE'], rows['seTE'] ** 2, 'MD', method)
+            assert table.loc[name, 'k'] == len(rows)
+            assert table.loc[name, 'TE.random'] == pytest.approx(float(single.random.te))
+            assert table.loc[name, 'tau2'] == pytest.approx(float(single.tau2), abs=1e-9)
+            assert table.loc[name, 'Q'] == pytest.approx(float(single.q))
+    
+    def test_raw_arm_columns(self, bcg_data):
+        """Test raw binary columns are accepted"""
+        data = pd.concat([bcg_data.assign(outcome='a'), bcg_data.iloc[:6].assign(outcome='b')])
+        table = pool_outcomes(data, 'binary', 'RR')
+        assert table['k'].tolist() == [13, 6]
+        assert table.loc[0, 'TE.random'] == pytest.approx(-0.7141, abs=1e-4)
+    
+    def test_fdr_bh(self):
+        """Test Benjamini-Hochberg adjustment"""
+        adjusted = fdr_bh([0.01, 0.04, 0.03, np.nan, 0.5])
+        np.testing.assert_allclose(adjusted[[0, 1, 2, 4]], [0.04, 0.0533333, 0.0533333, 0.5], rtol=1e-5)
+        assert np.isnan(adjusted[3])
+    
+    def test_many_outcomes_speed(self):
+        """Test 50k outcomes pool within seconds"""
+        rng = np.random.default_rng(0)
+        k = rng.integers(2, 9, 50000)
+        data = pd.DataFrame({
+            'outcome': np.repeat(np.arange(50000), k),
+            'TE': rng.normal(0, 0.3, k.sum()),
+            'seTE': rng.uniform(0.1, 0.5, k.sum())
+        })
+        start = time.perf_counter()
+        table = pool_outcomes(data, tau2_method='REML')
+        assert time.perf_counter() - start < 10
+        assert len(table) == 50000
+        assert table['pval.fdr'].notna().all()
+
+class TestLeaveOneOut:
+    """Test leave-one-out sensitivity analysis"""
+    
+    @pytest.mark.parametrize("tau2_method", ['DL', 'HE', 'HS', 'REML', 'PM', 'SJ'])
+    def test_matches_refits(self, bcg_data, tau2_method):
+        """Test against refitting the model without each study"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        table = leave_one_out(effects.te, effects.vi, tau2_method, studlab=effects.studlab)
+        full = pool_inverse(effects.te, effects.vi, 'RR', tau2_method)
+        
+        for i in range(len(bcg_data)):
+            keep = np.arange(len(bcg_data)) != i
+            refit = pool_inverse(effects.te[keep], effects.vi[keep], 'RR', tau2_method)
+            row = table.iloc[i]
+            assert row['TE.omit'] == pytest.approx(float(refit.random.te), abs=1e-8)
+            assert row['seTE.omit'] == pytest.approx(float(refit.random.se), abs=1e-8)
+            assert row['tau2.omit'] == pytest.approx(float(refit.tau2), abs=1e-8)
+            assert row['Q.omit'] == pytest.approx(float(refit.q), rel=1e-10)
+            assert row['delta.I2'] == pytest.approx(float(refit.i2 - full.i2), abs=1e-8)
+        assert table['weight'].sum() == pytest.approx(100)
+    
+    def test_influence_measures(self, bcg_data):
+        """Test influence measures follow their definitions"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        table = leave_one_out(effects.te, effects.vi, 'DL')
+        full = pool_inverse(effects.te, effects.vi, 'RR', 'DL')
+        
+        delta = float(full.random.te) - table['TE.omit']
+        assert np.allclose(table['cook.d'], delta ** 2 / float(full.random.se) ** 2)
+        assert np.allclose(table['cov.r'], table['seTE.omit'] ** 2 / float(full.random.se) ** 2)
+        assert np.allclose(
+            table['dffits'], delta / np.sqrt(table['hat'] * (table['tau2.omit'] + effects.vi))
+        )
+    
+    def test_too_few_studies(self):
+        """Test at least three studies are required"""
+        with pytest.raises(ValueError):
+            leave_one_out([0.1, 0.2], [0.01, 0.02])
+    
+    def test_engine_block(self, bcg_data):
+        """Test the sensitivity block in the engine results"""
+        results = MetaAnalysisEngine(_settings()).run(bcg_data, 'binary', sensitivity=True)
+        block = results['sensitivity']
+        
+        low, high = block['estimate_range']
+        assert low <= results['effect_size'] <= high
+        assert len(block['largest_changes']) == 3
+        assert all(s in bcg_data['studlab'].tolist() for s in block['influential_studies'])
+
+class TestCumulative:
+    """Test cumulative and online pooling"""
+    
+    @pytest.mark.parametrize("tau2_method", ['DL', 'HS', 'HE'])
+    def test_trajectory_matches_refits(self, bcg_data, tau2_method):
+        """Test every trajectory point against pooling the studies so far"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        state = CumulativeMetaAnalysis('RR', tau2_method)
+        trajectory = state.update(effects.te, effects.vi, effects.studlab, bcg_data['year'])
+        order = np.argsort(bcg_data['year'].to_numpy(), kind='stable')
+        
+        assert trajectory['studlab'].tolist() == bcg_data['studlab'].to_numpy()[order].tolist()
+        for k in range(2, len(order) + 1):
+            used = order[:k]
+            refit = pool_inverse(effects.te[used], effects.vi[used], 'RR', tau2_method)
+            row = trajectory.iloc[k - 1]
+            assert row['TE.fixed'] == pytest.approx(float(refit.fixed.te), abs=1e-10)
+            assert row['TE.random'] == pytest.approx(float(refit.random.te), abs=1e-10)
+            assert row['tau2'] == pytest.approx(float(refit.tau2), abs=1e-10)
+            assert row['Q'] == pytest.approx(float(refit.q), abs=1e-8)
+            assert row['I2'] == pytest.approx(float(refit.i2), abs=1e-8)
+    
+    def test_save_and_resume(self, bcg_data, tmp_path):
+        """Test a saved state continues exactly like an uninterrupted one"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        years = bcg_data['year'].to_numpy()
+        early = years < 1970
+        
+        state = CumulativeMetaAnalysis('RR')
+        state.update(effects.te[early], effects.vi[early], effects.studlab[early], years[early])
+        state.save(tmp_path / 'state.npz')
+        resumed = CumulativeMetaAnalysis.load(tmp_path / 'state.npz')
+        resumed.update(effects.te[~early], effects.vi[~early], effects.studlab[~early], years[~early])
+        
+        uninterrupted = CumulativeMetaAnalysis('RR')
+        uninterrupted.update(effects.te, effects.vi, effects.studlab, years)
+        pd.testing.assert_frame_equal(resumed.trajectory(), uninterrupted.trajectory())
+        
+        results = resumed.to_results()
+        assert results['tau2'] == pytest.approx(0.3088, abs=1e-4)
+        assert len(results['cumulative']['effects']) == 13
+    
+    def test_iterative_estimator_rejected(self):
+        """Test estimators without running-sum updates are rejected"""
+        with pytest.raises(ValueError):
+            CumulativeMetaAnalysis('MD', 'REML')
+    
+    def test_engine_update(self, bcg_data):
+        """Test the engine starts and extends a running analysis"""
+        engine = MetaAnalysisEngine(_settings(tau2_estimator='REML'))
+        state = engine.cumulative(bcg_data.iloc[:6], 'binary')
+        state = engine.cumulative(bcg_data.iloc[6:], 'binary', state)
+        
+        assert state.tau2_method == 'DL'
+        assert state.k == 13
+        assert state.to_results()['effect_size'] == pytest.approx(np.exp(-0.7141), abs=1e-4)
+
+class TestPublicationBias:
+    """Test funnel plot asymmetry tests"""
+    
+    def test_egger(self, bcg_data):
+        """Test Egger's test against metafor's regtest (model = "lm")"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        test = publication_bias('Egger', effects.te, effects.vi)
+        
+        assert float(test.statistic) == pytest.approx(-1.4013, abs=1e-4)
+        assert float(test.pval) == pytest.approx(0.1887, abs=1e-4)
+        assert int(test.df) == 11
+    
+    def test_begg(self, bcg_data):
+        """Test Begg's test against metafor's ranktest"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        test = publication_bias('Begg', effects.te, effects.vi)
+        
+        assert float(test.bias) == pytest.approx(0.0256, abs=1e-4)
+    
+    def test_kendall_tau(self):
+        """Test Kendall's τ-b and its tie-corrected test against scipy"""
+        rng = np.random.default_rng(0)
+        x = rng.integers(0, 6, size=(5, 40)).astype(float)
+        y = rng.integers(0, 4, size=(5, 40)).astype(float)
+        x[2, 25:] = np.nan
+        tau, s, var_s = kendall_tau(x, y)
+        
+        for i in range(5):
+            keep = np.isfinite(x[i])
+            expected = stats.kendalltau(x[i][keep], y[i][keep], method='asymptotic')
+            assert tau[i] == pytest.approx(expected.statistic)
+            assert 2 * stats.norm.sf(abs(s[i]) / np.sqrt(var_s[i])) == pytest.approx(expected.pvalue)
+    
+    def test_batched(self, bcg_data):
+        """Test stacked analyses give the same results as separate calls"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        yi = np.stack([effects.te, np.where(np.arange(13) < 9, effects.te, np.nan)])
+        vi = np.stack([effects.vi, effects.vi])
+        
+        for method in ('Egger', 'Begg', 'Thompson'):
+            batched = publication_bias(method, yi, vi)
+            single = publication_bias(method, effects.te[:9], effects.vi[:9])
+            assert batched.k.tolist() == [13, 9]
+            assert batched.pval[1] == pytest.approx(float(single.pval))
+    
+    def test_egger_is_weighted_regression_on_se(self, bcg_data):
+        """Test Egger's intercept equals the slope of TE on seTE with weights 1/vi"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'OR')
+        test = publication_bias('Egger', effects.te, effects.vi)
+        X = np.column_stack([np.ones(13), effects.se])
+        W = 1 / effects.vi
+        beta = np.linalg.solve(X.T @ (W[:, None] * X), X.T @ (W * effects.te))
+        
+        assert float(test.bias) == pytest.approx(beta[1])
+    
+    def test_count_based_tests(self, bcg_data):
+        """Test Harbord's and Deeks' tests run on 2x2 counts"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'OR')
+        counts = {name: bcg_data[col].to_numpy() for name, col in
+                  [('event_e', 'event.e'), ('n_e', 'n.e'), ('event_c', 'event.c'), ('n_c', 'n.c')]}
+        
+        for method in ('Harbord', 'Deeks'):
+            test = publication_bias(method, effects.te, effects.vi, **counts)
+            assert 0 < float(test.pval) < 1
+        with pytest.raises(ValueError):
+            publication_bias('Harbord', effects.te, effects.vi)
+    
+    @pytest.mark.parametrize("method", BIAS_TESTS)
+    def test_engine_block(self, bcg_data, method):
+        """Test the configured test lands in the engine results"""
+        results = MetaAnalysisEngine(
+            _settings(publication_bias_method=method)
+        ).run(bcg_data, 'binary')
+        
+        assert results['publication_bias']['method'] == method
+        assert results['publication_bias']['k'] == 13
+        assert 0 <= results['publication_bias']['p_value'] <= 1
+
+class TestResampling:
+    """Test bootstrap and permutation resampling"""
+    
+    def test_reproducible_across_workers(self, bcg_data):
+        """Test replicates depend on the seed only, not the worker count"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        serial = bootstrap(effects.te, effects.vi, 'REML', n_boot=400, batch_size=100, seed=7)
+        parallel = bootstrap(effects.te, effects.vi, 'REML', n_boot=400, batch_size=100, seed=7, n_workers=2)
+        
+        assert np.array_equal(serial.replicates['te'], parallel.replicates['te'])
+        assert serial.ci['te'][0] < serial.observed['te'] < serial.ci['te'][1]
+        assert serial.ci['tau2'][0] >= 0
+    
+    def test_early_stopping_and_progress(self, bcg_data):
+        """Test resampling stops once the Monte Carlo error is small"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        done = []
+        result = bootstrap(
+            effects.te, effects.vi, n_boot=50000, batch_size=250, seed=1,
+            mc_tol=0.02, progress=lambda n, total: done.append(n)
+        )
+        
+        assert result.stopped_early
+        assert result.n_replicates < 50000
+        assert result.mc_error['te'] < 0.02
+        assert done == list(range(250, result.n_replicates + 1, 250))
+    
+    def test_permutation_test(self, bcg_data):
+        """Test the sign-flip permutation test detects the BCG effect"""
+        effects = compute_effect_sizes(bcg_data, 'binary', 'RR')
+        result = permutation_test(effects.te, effects.vi, n_perm=1000, seed=3)
+        
+        assert result.pval < 0.01
+        assert result.to_dict()['n_replicates'] == 1000
+    
+    def test_invalid_kind(self, bcg_data):
+        """Test unknown bootstrap types are rejected"""
+        with pytest.raises(ValueError):
+            bootstrap([0.1, 0.2, 0.3], [0.01, 0.01, 0.01], kind='jackknife')
+
+class TestMantelHaenszel:
+    """Test Mantel-Haenszel and Peto pooling"""
+    
+    @pytest.fixture
+    def counts(self, bcg_data):
+        return [bcg_data[col].to_numpy() for col in ('event.e', 'n.e', 'event.c', 'n.c')]
+    
+    def test_bcg(self, counts):
+        """Test against metafor's rma.mh for the BCG trials"""
+        assert float(pool_mh(*counts, 'OR').fixed.te) == pytest.approx(-0.4734, abs=1e-4)
+    
+    def test_peto(self, counts):
+        """Test the Peto estimate equals Σ(O - E)/ΣV"""
+        a, n1, c, n2 = (np.asarray(x, dtype=float) for x in counts)
+        n = n1 + n2
+        o_e = a - n1 * (a + c) / n
+        v = n1 * n2 * (a + c) * (n - a - c) / (n ** 2 * (n - 1))
+        result = pool_peto(*counts)
+        
+        assert float(result.fixed.te) == pytest.approx(o_e.sum() / v.sum())
+        assert float(result.fixed.se) == pytest.approx(1 / np.sqrt(v.sum()))
+    
+    @pytest.mark.parametrize("summary_measure", ['OR', 'RR', 'RD'])
+    def test_single_table(self, summary_measure):
+        """Test one table reduces to its own estimate and variance"""
+        result = pool_mh([4], [123], [11], [139], summary_measure)
+        te, se = binary_effects(4, 123, 11, 139, summary_measure)
+        
+        assert float(result.fixed.te) == pytest.approx(float(te))
+        assert float(result.fixed.se) == pytest.approx(float(se))
+    
+    def test_zero_cells(self):
+        """Test double-zero studies are excluded for OR but kept for RD"""
+        tables = ([0, 0, 2, 1], [10, 10, 10, 10], [0, 3, 1, 0], [10, 10, 10, 10])
+        
+        assert int(pool_mh(*tables, 'OR').k) == 3
+        assert int(pool_mh(*tables, 'RD').k) == 4
+        # Corrections only touch zero-cell studies
+        untouched = pool_mh([2, 3], [10, 10], [1, 4], [10, 10], 'OR', incr=0.5)
+        assert float(untouched.fixed.te) == pytest.approx(
+            float(pool_mh([2, 3], [10, 10], [1, 4], [10, 10], 'OR', incr='TACC').fixed.te)
+        )
+    
+    def test_batched(self, counts):
+        """Test stacked tables with padding match separate calls"""
+        events = np.stack([counts[0], counts[0]]).astype(float)
+        events[1, 10:] = np.nan
+        stacked = pool_mh(events, *(np.stack([x, x]) for x in counts[1:]), 'RR')
+        single = pool_mh(*(x[:10] for x in counts), 'RR')
+        
+        assert stacked.fixed.te[1] == pytest.approx(float(single.fixed.te))
+        assert stacked.random.te[1] == pytest.approx(float(single.random.te))
+    
+    def test_safety_screen(self, counts):
+        """Test many tables pooled by outcome in one call"""
+        frame = pd.DataFrame({
+            'outcome': np.repeat(['AE1', 'AE2'], 13),
+            'event.e': np.tile(counts[0], 2), 'n.e': np.tile(counts[1], 2),
+            'event.c': np.tile(counts[2], 2), 'n.c': np.tile(counts[3], 2)
+        })
+        table = pool_outcomes(frame, 'binary', 'OR', pooling_method='MH', model='fixed')
+        
+        assert np.allclose(table['TE.fixed'], -0.4734, atol=1e-4)
+    
+    @pytest.mark.parametrize("method,label", [('MH', 'Mantel-Haenszel'), ('Peto', 'Peto')])
+    def test_engine(self, bcg_data, method, label):
+        """Test the engine honours the binary pooling method"""
+        engine = MetaAnalysisEngine(_settings(pooling_method=method, summary_measure='OR'))
+        engine.model = 'fixed'
+        results = engine.run(bcg_data, 'binary')
+        
+        assert results['model_type'] == f"Common effect ({label})"
+        assert results['pooling_method'] == method
+
+class TestMeanSDConversion:
+    """Test mean/SD estimation from medians"""
+    
+    def test_formulas(self):
+        """Test the Luo/Wan estimators for one sample of size 50"""
+        n = 50
+        xi = 2 * stats.norm.ppf((n - 0.375) / (n + 0.25))
+        eta = 2 * stats.norm.ppf((0.75 * n - 0.125) / (n + 0.25))
+        
+        mean, sd, scenario = estimate_mean_sd([n], [10.0], minimum=[2.0], maximum=[20.0])
+        w = 4 / (4 + n ** 0.75)
+        assert scenario[0] == 'S1'
+        assert mean[0] == pytest.approx(w * 11.0 + (1 - w) * 10.0)
+        assert sd[0] == pytest.approx(18.0 / xi)
+        
+        mean, sd, scenario = estimate_mean_sd([n], [10.0], q1=[8.0], q3=[13.0])
+        w = 0.7 + 0.39 / n
+        assert scenario[0] == 'S2'
+        assert mean[0] == pytest.approx(w * 10.5 + (1 - w) * 10.0)
+        assert sd[0] == pytest.approx(5.0 / eta)
+    
+    def test_normal_samples(self):
+        """Test estimates are close to the truth for normal samples"""
+        rng = np.random.default_rng(0)
+        x = np.sort(rng.normal(50, 10, size=(500, 101)), axis=1)
+        n = np.full(500, 101)
+        q1, median, q3 = np.quantile(x, [0.25, 0.5, 0.75], axis=1)
+        
+        for kwargs in (
+            dict(minimum=x[:, 0], maximum=x[:, -1]),
+            dict(q1=q1, q3=q3),
+            dict(q1=q1, q3=q3, minimum=x[:, 0], maximum=x[:, -1])
+        ):
+            mean, sd, _ = estimate_mean_sd(n, median, **kwargs)
+            assert mean.mean() == pytest.approx(50, abs=0.2)
+            assert sd.mean() == pytest.approx(10, abs=0.2)
+    
+    def test_insufficient_rows(self):
+        """Test rows without quartiles or range get NaN"""
+        mean, sd, scenario = estimate_mean_sd([30, 30], [5.0, 5.0], q1=[4.0, np.nan], q3=[6.0, np.nan])
+        
+        assert scenario.tolist() == ['S2', '']
+        assert np.isnan(mean[1]) and np.isnan(sd[1])
+
+class TestSubgroups:
+    """Test single-pass subgroup analysis"""
+    
+    def test_matches_separate_analyses(self, bcg_data):
+        """Test subgroup estimates and Q tests against per-subgroup refits"""
+        te, se = binary_effects(bcg_data['event.e'], bcg_data['n.e'], bcg_data['event.c'], bcg_data['n.c'], 'RR')
+        subgroup = np.where(bcg_data['year'] < 1960, 'early', np.where(bcg_data['year'] < 1975, 'middle', 'late'))
+        result = subgroup_analysis(te, se ** 2, subgroup, 'RR', tau2_method='REML')
+        
+        assert result.subgroups.tolist() == ['early', 'late', 'middle']
+        for i, label in enumerate(result.subgroups):
+            group = subgroup == label
+            expected = pool_inverse(te[group], se[group] ** 2, 'RR', 'REML')
+            assert result.result.random.te[i] == pytest.approx(expected.random.te, abs=1e-8)
+            assert result.result.tau2[i] == pytest.approx(expected.tau2, abs=1e-8)
+            assert result.result.q[i] == pytest.approx(expected.q)
+        
+        overall = pool_inverse(te, se ** 2, 'RR')
+        assert result.q_within + result.q_between_fixed == pytest.approx(overall.q)
+        assert result.df_between == 2
+        assert result.df_within == 13 - 3
+    
+    def test_engine_block(self):
+        """Test the results block on the shipped subgroup data"""
+        data = MetaAnalysisDataLoader().load_data(
+            get_test_file_path('binary', 'metabin_with_subgroup.xlsx'), 'binary'
+        )
+        engine = MetaAnalysisEngine(_settings(summary_measure='OR', pooling_method='MH'))
+        block = engine.run(data, 'binary')['subgroups']
+        
+        assert [g['subgroup'] for g in block['groups']] == sorted(data['subgroup'].unique())
+        assert sum(g['k'] for g in block['groups']) == len(data)
+        assert 0 <= block['test_between']['p_value'] <= 1
+        assert block['test_between']['df'] == data['subgroup'].nunique() - 1
+        
+        group = data[data['subgroup'] == block['groups'][0]['subgroup']]
+        expected = pool_mh(*(group[col].to_numpy(dtype=float) for col in ('event.e', 'n.e', 'event.c', 'n.c')))
+        assert block['groups'][0]['TE'] == pytest.approx(float(expected.random.te))
+        
+        no_subgroups = engine.run(data.drop(columns='subgroup'), 'binary')
+        assert 'subgroups' not in no_subgroups
+    
+    def test_single_study_subgroup(self):
+        """Test a one-study subgroup gets its study estimate and no Q"""
+        result = subgroup_analysis([0.1, 0.3, 0.8], [0.04, 0.05, 0.1], ['a', 'a', 'b'])
+        block = result.to_results()
+        
+        assert block['groups'][1]['TE'] == pytest.approx(0.8)
+        assert block['groups'][1]['q_pval'] is None
+        assert block['test_within']['df'] == 1
+
+class TestIntervals:
+    """Test τ² confidence intervals and prediction intervals"""
+    
+    @pytest.fixture
+    def bcg_effects(self, bcg_data):
+        te, se = binary_effects(bcg_data['event.e'], bcg_data['n.e'], bcg_data['event.c'], bcg_data['n.c'], 'RR')
+        return te, se ** 2
+    
+    def test_q_profile(self, bcg_effects):
+        """Test the Q-profile interval against metafor's confint"""
+        ci = tau2_ci(*bcg_effects, 'QP', 'REML')
+        
+        assert ci.tau2 == pytest.approx(0.3132, abs=1e-4)
+        assert ci.lower == pytest.approx(0.1197, abs=1e-4)
+        assert ci.upper == pytest.approx(1.1115, abs=1e-4)
+    
+    def test_profile_likelihood(self, bcg_effects):
+        """Test the likelihood ratio at the PL bounds equals the χ² quantile"""
+        yi, vi = bcg_effects
+        ci = tau2_ci(yi, vi, 'PL', 'REML')
+        
+        def deviance(tau2):
+            w = 1 / (vi + tau2)
+            mu = np.sum(w * yi) / np.sum(w)
+            return np.sum(np.log(vi + tau2)) + np.log(np.sum(w)) + np.sum(w * (yi - mu) ** 2)
+        
+        crit = stats.chi2.ppf(0.95, 1)
+        assert deviance(ci.lower) - deviance(ci.tau2) == pytest.approx(crit, abs=1e-6)
+        assert deviance(ci.upper) - deviance(ci.tau2) == pytest.approx(crit, abs=1e-6)
+    
+    def test_quadratic_form_cdf(self):
+        """Test the χ² mixture series against simulation"""
+        lam = np.array([0.1, 0.5, 2.0, 3.0])
+        draws = (np.random.default_rng(0).standard_normal((400000, 4)) ** 2 * lam).sum(1)
+        x = np.array([0.5, 2.0, 6.0, 12.0])
+        
+        np.testing.assert_allclose(quadratic_form_cdf(np.broadcast_to(lam, (4, 4)), x), [(draws <= q).mean() for q in x], atol=3e-3)
+        assert quadratic_form_cdf(np.ones(5), 4.0) == pytest.approx(stats.chi2.cdf(4.0, 5))
+    
+    def test_generalised_q_eigenvalues(self):
+        """Test eigenvalues computed once match decomposing S^½AS^½ per τ²"""
+        rng = np.random.default_rng(4)
+        yi = rng.normal(0, 0.5, (2, 6))
+        vi = rng.uniform(0.02, 0.3, (2, 6))
+        valid = np.ones(yi.shape, dtype=bool)
+        valid[1, 4:] = False
+        q = _GeneralisedQ(yi, vi, valid, 1.0)
+        tau2 = np.array([[0.0, 0.0], [0.05, 0.2], [1.0, 3.0]])
+        
+        root_s = np.sqrt(np.where(valid, vi + tau2[..., None], 0.0))
+        lam = np.linalg.eigvalsh(root_s[..., :, None] * q.matrix * root_s[..., None, :])
+        expected = quadratic_form_cdf(lam, np.broadcast_to(q.q, tau2.shape))
+        np.testing.assert_allclose(q.cdf(tau2), expected, rtol=1e-10)
+    
+    def test_biggerstaff_jackson(self, bcg_effects):
+        """Test the observed DL Q is at the interval's tail quantiles"""
+        yi, vi = bcg_effects
+        ci = tau2_ci(yi, vi, 'BJ')
+        q_obs = float(pool_inverse(yi, vi).q)
+        
+        rng = np.random.default_rng(1)
+        w = 1 / vi
+        for tau2, expected in ((ci.lower, 0.975), (ci.upper, 0.025)):
+            y = rng.normal(0.0, np.sqrt(vi + tau2), size=(200000, yi.size))
+            mu = (y * w).sum(1) / w.sum()
+            q = (w * (y - mu[:, None]) ** 2).sum(1)
+            assert (q <= q_obs).mean() == pytest.approx(expected, abs=3e-3)
+    
+    @pytest.mark.parametrize("method", ['QP', 'BJ', 'J', 'PL'])
+    def test_batched(self, method):
+        """Test padded batches and segments match single analyses"""
+        rng = np.random.default_rng(3)
+        yi = rng.normal(0, 0.5, (3, 8))
+        vi = rng.uniform(0.02, 0.3, (3, 8))
+        yi[1, 5:] = np.nan
+        batched = tau2_ci(yi, vi, method)
+        keep = np.isfinite(yi)
+        segmented = tau2_ci(yi[keep], vi[keep], method, segments=[0, 8, 13])
+        
+        for i in range(3):
+            single = tau2_ci(yi[i][keep[i]], vi[i][keep[i]], method)
+            assert batched.lower[i] == pytest.approx(float(single.lower), abs=1e-8)
+            assert batched.upper[i] == pytest.approx(float(single.upper), abs=1e-8)
+        np.testing.assert_allclose(segmented.upper, batched.upper)
+    
+    def test_kenward_roger_equal_variances(self):
+        """Test KR reduces to the usual SE with k - 1 df for equal variances"""
+        yi = np.random.default_rng(2).normal(0, 1, 6)
+        vi = np.full(6, 0.1)
+        kr = pool_inverse(yi, vi, ci_method='KR')
+        
+        assert kr.random.se == pytest.approx(float(pool_inverse(yi, vi).random.se))
+        assert prediction_interval(yi, vi, 'KR').df == pytest.approx(4.0)
+    
+    def test_prediction_intervals(self, bcg_effects):
+        """Test the HTS interval formula and NNF reproducibility"""
+        yi, vi = bcg_effects
+        fit = pool_inverse(yi, vi, tau2_method='REML')
+        hts = prediction_interval(yi, vi, 'HTS', 'REML')
+        half = stats.t.ppf(0.975, 11) * np.sqrt(fit.tau2 + fit.random.se ** 2)
+        
+        assert hts.lower == pytest.approx(float(fit.random.te - half))
+        assert hts.upper == pytest.approx(float(fit.random.te + half))
+        
+        nnf = prediction_interval(yi, vi, 'NNF', seed=1, n_draws=2000)
+        again = prediction_interval(yi, vi, 'NNF', seed=1, n_draws=2000)
+        assert nnf.lower < nnf.te < nnf.upper
+        assert (nnf.lower, nnf.upper) == (again.lower, again.upper)
+    
+    def test_engine_blocks(self, bcg_data):
+        """Test configured intervals are added to the results"""
+        settings = _settings(tau2_ci_method='QP', prediction_interval_method='HTS')
+        results = MetaAnalysisEngine(settings).run(bcg_data, 'binary')
+        
+        assert results['tau2_ci']['tau2_lower'] < results['tau2'] < results['tau2_ci']['tau2_upper']
+        assert results['prediction_interval']['lower'] < results['ci_lower']
+        assert results['prediction_interval']['df'] == 11
+
+class TestMetaRegression:
+    """Test mixed-effects meta-regression"""
+    
+    ABLAT = [44, 55, 42, 52, 13, 44, 19, 13, 27, 42, 18, 33, 33]
+    
+    @pytest.fixture
+    def bcg_effects(self, bcg_data):
+        te, se = binary_effects(bcg_data['event.e'], bcg_data['n.e'], bcg_data['event.c'], bcg_data['n.c'], 'RR')
+        return te, se ** 2
+    
+    def test_metafor_reference(self, bcg_effects):
+        """Test against metafor's rma(yi, vi, mods = ~ ablat) for the BCG trials"""
+        fit = meta_regression(*bcg_effects, self.ABLAT, names=['ablat'], knha=False)
+        
+        np.testing.assert_allclose(fit.coef, [0.2515, -0.0291], atol=1e-4)
+        np.testing.assert_allclose(fit.se, [0.2491, 0.0072], atol=1e-4)
+        assert fit.tau2 == pytest.approx(0.0763, abs=1e-4)
+        assert fit.qe == pytest.approx(30.7331, abs=1e-4)
+        assert fit.qm == pytest.approx(16.3582, abs=1e-3)
+    
+    def test_knapp_hartung(self, bcg_effects):
+        """Test the Knapp-Hartung scaling and t/F tests on k - p df"""
+        yi, vi = bcg_effects
+        z = meta_regression(yi, vi, self.ABLAT, knha=False)
+        kh = meta_regression(yi, vi, self.ABLAT)
+        
+        w = 1 / (vi + kh.tau2)
+        x = np.column_stack([np.ones(13), self.ABLAT])
+        resid = yi - x @ kh.coef
+        s2 = np.sum(w * resid ** 2) / 11
+        np.testing.assert_allclose(kh.se, z.se * np.sqrt(s2))
+        assert kh.pval[1] == pytest.approx(2 * stats.t.sf(abs(kh.statistic[1]), 11))
+        assert kh.qm == pytest.approx(kh.statistic[1] ** 2)
+    
+    def test_batched_outcomes(self, bcg_effects):
+        """Test stacked analyses with missing values match separate fits"""
+        yi, vi = bcg_effects
+        year = np.array([1948, 1949, 1960, 1977, 1973, 1953, 1973, 1980, 1968, 1961, 1974, 1969, 1976], dtype=float)
+        x = np.stack([np.column_stack([self.ABLAT, year])] * 2)
+        y = np.stack([yi, yi[::-1]])
+        x[1, 4, 1] = np.nan
+        batched = meta_regression(y, vi, x, names=['ablat', 'year'])
+        
+        keep = np.arange(13) != 4
+        single = meta_regression(yi[::-1][keep], vi[keep], x[1][keep], names=['ablat', 'year'])
+        np.testing.assert_allclose(batched.coef[1], single.coef, rtol=1e-8)
+        assert batched.k.tolist() == [13, 12]
+        assert batched.to_results(1)['coefficients'][2]['term'] == 'year'
+    
+    @pytest.mark.parametrize("method", ['REML', 'ML'])
+    def test_heavy_tailed_variances(self, method):
+        """Test the safeguarded solver converges where plain Fisher scoring oscillates"""
+        from metamar.stats.regression import _score
+        
+        rng = np.random.default_rng(1)
+        vi = rng.standard_cauchy((2000, 6)) ** 2 * 0.05 + 1e-3
+        x = rng.normal(size=(2000, 6))
+        yi = 0.3 * x + rng.normal(scale=np.sqrt(vi + 0.1))
+        fit = meta_regression(yi, vi, x, tau2_method=method)
+        
+        assert fit.converged.all()
+        q = np.linalg.qr(np.stack([np.ones_like(x), x], axis=-1))[0]
+        valid = np.ones_like(x, dtype=bool)
+        score, info = _score(q, yi, vi, valid, fit.tau2, method)
+        interior = fit.tau2 > 1e-8
+        # Fisher step left at the solution, relative to τ²
+        np.testing.assert_allclose((score / info / (1 + fit.tau2))[interior], 0, atol=1e-8)
+        assert (_score(q, yi, vi, valid, np.zeros(2000), method)[0][~interior] <= 0).all()
+    
+    def test_screen(self, bcg_effects, bcg_data):
+        """Test one-call moderator screening, including a constant column"""
+        moderators = pd.DataFrame({'ablat': self.ABLAT, 'year': bcg_data['year'], 'constant': 1.0})
+        table = screen_moderators(*bcg_effects, moderators)
+        single = meta_regression(*bcg_effects, bcg_data['year'].to_numpy(dtype=float))
+        
+        assert table['moderator'].tolist() == ['ablat', 'year', 'constant']
+        assert table.loc[1, 'estimate'] == pytest.approx(single.coef[1])
+        assert np.isnan(table.loc[2, 'estimate'])
+    
+    def test_engine_block(self, bcg_data):
+        """Test the engine adds a coefficient table for the year moderator"""
+        results = MetaAnalysisEngine(_settings()).run(bcg_data, 'binary')
+        block = results['meta_regression']
+        
+        assert [c['term'] for c in block['coefficients']] == ['intercept', 'year']
+        assert block['test_moderators']['df_residual'] == 11
+
+class TestGosh:
+    """Test GOSH subset diagnostics"""
+    
+    @pytest.fixture
+    def bcg_effects(self, bcg_data):
+        te, se = binary_effects(bcg_data['event.e'], bcg_data['n.e'], bcg_data['event.c'], bcg_data['n.c'], 'RR')
+        return te, se ** 2
+    
+    def test_matches_direct_fits(self, bcg_effects):
+        """Test Gray-code updates against pool_inverse on each subset"""
+        yi, vi = bcg_effects
+        result = gosh(yi, vi, summary_measure='RR', chunk_size=1000)
+        
+        assert result.values.shape == (2 ** 13 - 1, 7)
+        assert result.values.dtype == np.float32
+        members = np.column_stack([result.includes(j) for j in range(13)])
+        assert len({tuple(row) for row in members}) == 2 ** 13 - 1
+        
+        for row in [0, 1, 4000, 8190]:
+            subset = members[row]
+            fit = pool_inverse(yi[subset], vi[subset], tau2_method='DL')
+            np.testing.assert_allclose(
+                result.values[row, [0, 1, 2, 3, 6]],
+                [subset.sum(), fit.fixed.te, fit.fixed.se, fit.q, fit.tau2],
+                rtol=1e-5, atol=1e-6
+            )
+        assert np.isnan(result.column('I2')[result.column('k') == 1]).all()
+    
+    def test_sampled(self, bcg_effects):
+        """Test stratified sampling is reproducible and independent of workers"""
+        yi, vi = bcg_effects
+        options = dict(max_exhaustive=10, n_samples=5000, chunk_size=700, seed=1)
+        first = gosh(yi, vi, **options)
+        second = gosh(yi, vi, n_workers=2, **options)
+        
+        assert not first.exhaustive
+        np.testing.assert_array_equal(first.values, second.values)
+        np.testing.assert_array_equal(first.membership, second.membership)
+        k = first.column('k')
+        assert (np.diff(k) >= 0).all()
+        members = np.column_stack([first.includes(j) for j in range(13)])
+        np.testing.assert_array_equal(members.sum(1), k)
+    
+    def test_summary(self, bcg_data):
+        """Test the engine entry point and the summary block"""
+        calls = []
+        result = MetaAnalysisEngine(_settings()).gosh(
+            bcg_data, 'binary', chunk_size=2048, progress=lambda done, total: calls.append(done)
+        )
+        summary = result.summary()
+        
+        assert calls[-1] == 2 ** 13 - 1
+        assert summary['n_subsets'] == 2 ** 13 - 1
+        assert 0 < summary['estimate']['min'] < summary['estimate']['max'] < 2
+        assert len(summary['influential_studies']) == 3
+
+class TestMultilevel:
+    """Test the three-level model and CR2 cluster-robust inference"""
+    
+    @pytest.fixture
+    def nested(self):
+        rng = np.random.default_rng(3)
+        cluster = np.repeat(np.arange(25), rng.integers(1, 6, 25))
+        vi = rng.uniform(0.02, 0.2, cluster.size)
+        yi = 0.3 + rng.normal(0, 0.3, 25)[cluster] + rng.normal(0, 0.15, cluster.size) + rng.normal(0, np.sqrt(vi))
+        return yi, vi, cluster
+    
+    def test_dense_reference(self, nested):
+        """Test against the REML fit and CR2 sandwich built from the dense k x k covariance"""
+        yi, vi, cluster = nested
+        fit = multilevel_meta(yi, vi, cluster, rho=0.4)
+        
+        same = cluster[:, None] == cluster[None, :]
+        dense = lambda sb, sw: (
+            np.diag(vi + sw) + sb * same
+            + 0.4 * (same & ~np.eye(vi.size, dtype=bool)) * np.sqrt(np.outer(vi, vi))
+        )
+        def restricted(theta):
+            cov = dense(*theta)
+            w = np.linalg.inv(cov)
+            total = w.sum()
+            resid = yi - w.sum(0) @ yi / total
+            return 0.5 * (np.linalg.slogdet(cov)[1] + np.log(total) + resid @ w @ resid)
+        ref = optimize.minimize(restricted, [0.05, 0.05], bounds=[(0, None)] * 2, method='L-BFGS-B')
+        np.testing.assert_allclose([fit.sigma2_between, fit.sigma2_within], ref.x, rtol=1e-3)
+        
+        cov = dense(fit.sigma2_between, fit.sigma2_within)
+        w = np.linalg.inv(cov)
+        m = 1 / w.sum()
+        assert fit.estimate.se ** 2 == pytest.approx(m)
+        
+        # CR2 as in clubSandwich: Aⱼ = Dⱼᵀ Bⱼ^{-1/2} Dⱼ with
+        # Bⱼ = Dⱼ (I - H)ⱼ Σ (I - H)ⱼᵀ Dⱼᵀ and Σⱼ = DⱼᵀDⱼ
+        residual_maker = np.eye(vi.size) - m * np.ones((vi.size, 1)) @ w.sum(0, keepdims=True)
+        resid = yi - fit.estimate.te
+        contributions, projections = [], []
+        for j in np.unique(cluster):
+            block = cluster == j
+            d = np.linalg.cholesky(cov[np.ix_(block, block)]).T
+            rows = residual_maker[block]
+            b = d @ rows @ cov @ rows.T @ d.T
+            adjust = d.T @ np.real(linalg.inv(linalg.sqrtm(b))) @ d
+            g = m * adjust @ w[np.ix_(block, block)].sum(1)
+            contributions.append(g @ resid[block])
+            projections.append(rows.T @ g)
+        p = np.array(projections)
+        between = p @ cov @ p.T
+        assert fit.robust.se ** 2 == pytest.approx(np.sum(np.square(contributions)), rel=1e-8)
+        assert fit.robust_df == pytest.approx(np.trace(between) ** 2 / np.sum(between ** 2), rel=1e-8)
+    
+    def test_singleton_clusters(self, bcg_data):
+        """Test that independent effect sizes reduce to the two-level REML model"""
+        te, se = binary_effects(bcg_data['event.e'], bcg_data['n.e'], bcg_data['event.c'], bcg_data['n.c'], 'RR')
+        fit = multilevel_meta(te, se ** 2, np.arange(13), summary_measure='RR')
+        reml = pool_inverse(te, se ** 2, 'RR', tau2_method='REML')
+        
+        assert fit.sigma2_between + fit.sigma2_within == pytest.approx(float(reml.tau2), rel=1e-4)
+        assert fit.estimate.te == pytest.approx(float(reml.random.te), abs=1e-5)
+    
+    def test_validation(self, nested):
+        """Test rho range and cluster count checks"""
+        yi, vi, cluster = nested
+        with pytest.raises(ValueError):
+            multilevel_meta(yi, vi, cluster, rho=1.0)
+        with pytest.raises(ValueError):
+            multilevel_meta(yi, vi, np.zeros(yi.size))
+    
+    def test_engine_block(self, bcg_data):
+        """Test the engine adds a multilevel block for the cluster and rho columns"""
+        data = bcg_data.assign(cluster=bcg_data['year'] // 10, rho=0.5)
+        results = MetaAnalysisEngine(_settings(tau2_estimator='REML')).run(data, 'binary')
+        block = results['multilevel']
+        
+        assert block['n_clusters'] == 5
+        assert block['rho'] == 0.5
+        assert block['robust']['method'] == 'CR2'
+        assert block['robust']['ci_lower'] < block['robust']['effect_size'] < block['robust']['ci_upper']
+
+class TestTrimFill:
+    """Test trim-and-fill with the L0 and R0 estimators"""
+    
+    @staticmethod
+    def _reference(yi, vi, estimator):
+        """Direct implementation refitting and re-ranking every iteration"""
+        left = not egger_test(yi, vi).bias < 0
+        y = yi if left else -yi
+        order = np.argsort(y, kind='stable')
+        y, v, k = y[order], vi[order], yi.size
+        k0, previous = 0, -1
+        while k0 != previous:
+            previous = k0
+            beta = float(pool_inverse(y[:k - k0], v[:k - k0]).fixed.te)
+            signed = np.sign(y - beta) * stats.rankdata(np.abs(y - beta), method='ordinal')
+            if estimator == 'L0':
+                estimate = (4 * signed[signed > 0].sum() - k * (k + 1)) / (2 * k - 1)
+            else:
+                estimate = k - np.max(-signed[signed < 0], initial=0) - 1
+            k0 = int(min(max(0, np.round(estimate)), k - 1))
+        filled = 2 * beta - y[k - k0:]
+        return k0, np.sort(filled if left else -filled)
+    
+    @pytest.mark.parametrize('estimator', ['L0', 'R0'])
+    def test_matches_reference(self, estimator):
+        """Test sorted-once ranks and prefix-sum pooling against direct refits"""
+        rng = np.random.default_rng(5)
+        for trial in range(40):
+            k = rng.integers(3, 30)
+            vi = rng.uniform(0.01, 0.3, k)
+            yi = (rng.normal(0.2, 0.3, k) + np.sqrt(vi) * rng.uniform(0, 2)) * (-1) ** trial
+            k0, filled = self._reference(yi, vi, estimator)
+            result = trimfill(yi, vi, estimator)
+            assert int(result.k0) == k0
+            np.testing.assert_allclose(np.sort(result.filled_yi[:k0]), filled)
+    
+    def test_batched(self):
+        """Test stacked analyses with padding match separate runs"""
+        rng = np.random.default_rng(6)
+        yi = np.full((20, 25), np.nan)
+        vi = np.full((20, 25), np.nan)
+        for i in range(20):
+            k = rng.integers(3, 26)
+            vi[i, :k] = rng.uniform(0.01, 0.3, k)
+            yi[i, :k] = rng.normal(0, 0.3, k) + np.sqrt(vi[i, :k])
+        batched = trimfill(yi, vi, summary_measure='OR')
+        
+        for i in range(20):
+            valid = np.isfinite(yi[i])
+            single = trimfill(yi[i][valid], vi[i][valid], summary_measure='OR')
+            assert batched.k0[i] == single.k0
+            assert batched.result.random.te[i] == pytest.approx(float(single.result.random.te))
+            block, expected = batched.to_results(index=i), single.to_results()
+            assert block['side'] == expected['side']
+            assert [s['TE'] for s in block['imputed']] == pytest.approx([s['TE'] for s in expected['imputed']])
+    
+    def test_engine_block(self, bcg_data):
+        """Test the engine reports the imputed studies and adjusted estimate"""
+        results = MetaAnalysisEngine(_settings()).run(bcg_data, 'binary')
+        block = results['trim_and_fill']
+        
+        assert block['k_adjusted'] == 13 + block['k0']
+        assert len(block['imputed']) == block['k0']
+        assert block['adjusted']['ci_lower'] < block['adjusted']['effect_size'] < block['adjusted']['ci_upper']
+
+class TestPlotPayloads:
+    """Test plot-ready payloads and downsampling"""
+    
+    @pytest.mark.parametrize('method', ['sample', 'bin'])
+    def test_downsampling(self, method):
+        """Test reduction keeps the point budget, total mass and outliers"""
+        rng = np.random.default_rng(0)
+        x = np.append(rng.normal(0, 1, 200000), 12.0)
+        y = np.append(rng.exponential(1, 200000), 0.5)
+        points = downsample_points(x, y, max_points=2000, method=method)
+        
+        assert len(points) <= 2000
+        assert points['n'].sum() == pytest.approx(200001)
+        assert points['x'].max() == pytest.approx(12.0, abs=0.5)
+        assert np.average(points['x'], weights=points['n']) == pytest.approx(x.mean(), abs=0.02)
+        assert np.average(points['y'], weights=points['n']) == pytest.approx(y.mean(), abs=0.02)
+        assert len(downsample_points(x[:100], y[:100], max_points=2000)) == 100
+    
+    def test_engine_payloads(self, bcg_data):
+        """Test forest rows, funnel contours and the stable schema"""
+        payloads = MetaAnalysisEngine(_settings(prediction_interval_method='HTS')).plots(bcg_data, 'binary')
+        forest, funnel = payloads['forest'], payloads['funnel']
+        
+        studies = forest.layers['studies']
+        assert tuple(studies.columns) == PLOT_LAYERS['forest']['studies']
+        assert studies['w.random'].sum() == pytest.approx(100)
+        assert forest.layers['pooled']['label'].tolist() == ['fixed', 'random', 'prediction']
+        assert forest.layers['pooled'].loc[1, 'effect'] == pytest.approx(0.4896, abs=1e-4)
+        assert forest.meta['scale'] == 'log'
+        
+        contours = funnel.layers['contours']
+        assert set(contours['center']) == {'estimate', 'null'}
+        wide = contours[(contours['level'] == 0.95) & (contours['center'] == 'null')].iloc[1]
+        assert wide['upper'] == pytest.approx(1.959964 * funnel.layers['points']['seTE'].max(), rel=1e-5)
+        
+        payload = json.loads(forest.to_json())
+        assert payload['version'] == 1
+        assert payload['layers']['studies']['studlab'][0] == 'Trial 1'
+    
+    def test_funnel_contours(self):
+        """Test the contours reach the largest SE when the points are binned"""
+        rng = np.random.default_rng(2)
+        vi = np.append(rng.uniform(0.01, 0.1, 50000), [3.9, 4.0])
+        yi = np.append(rng.normal(0.3, np.sqrt(vi[:-2])), [0.3, 0.3])
+        payload = funnel_payload(yi, vi, 0.3, max_points=500, method='bin')
+        
+        assert payload.meta['downsampled']
+        assert payload.layers['points']['seTE'].max() < 2.0
+        contours = payload.layers['contours']
+        assert contours['seTE'].max() == pytest.approx(2.0)
+        estimate = contours[contours['center'] == 'estimate'].iloc[1]
+        assert estimate['upper'] - estimate['lower'] == pytest.approx(2 * 1.959964 * 2.0, rel=1e-5)
+    
+    def test_gosh_payload(self):
+        """Test the GOSH scatter is downsampled with its metadata"""
+        rng = np.random.default_rng(1)
+        result = gosh(rng.normal(0.2, 0.2, 15), rng.uniform(0.01, 0.1, 15))
+        payload = gosh_payload(result, max_points=3000)
+        
+        assert len(payload.layers['points']) <= 3000
+        assert payload.meta['n_total'] == 2 ** 15 - 1
+        assert payload.layers['points']['n'].sum() == pytest.approx(2 ** 15 - 1 - np.isnan(result.column('I2')).sum())
+
+class TestMetaAnalysisEngine:
+    """Test the engine on loader output"""
+    
+    def test_results_shape(self, bcg_data):
+        """Test results plug into format_results"""
+        results = MetaAnalysisEngine(_settings()).run(bcg_data, 'binary')
+        formatted = format_results(results)
+        
+        assert formatted['effect_size']['value'] == pytest.approx(np.exp(-0.7141), abs=1e-4)
+        assert formatted['heterogeneity']['tau2'] == pytest.approx(0.3088, abs=1e-4)
+        assert formatted['studies']['count'] == 13
+        assert formatted['studies']['total_sample'] == bcg_data[['n.e', 'n.c']].to_numpy().sum()
+    
+    @pytest.mark.parametrize("analysis_type,folder,filename,summary_measure", [
+        ('continuous', 'continuous', 'metacont_with_subgroup.xlsx', 'SMD'),
+        ('binary', 'binary', 'metabin_without_subgroup.xlsx', 'OR'),
+        ('correlation', 'correlation', 'metacor_without_subgroup.xlsx', 'ZCOR'),
+        ('generic', 'inverse_variance', 'metagen_without_subgroup.xlsx', 'MD'),
+    ])
+    def test_test_data(self, analysis_type, folder, filename, summary_measure):
+        """Test the engine runs on the shipped test data"""
+        data = MetaAnalysisDataLoader().load_data(
+            get_test_file_path(folder, filename), analysis_type
+        )
+        results = MetaAnalysisEngine(_settings(summary_measure=summary_measure)).run(data, analysis_type)
+        
+        assert results['k'] == len(data)
+        assert results['ci_lower'] < results['effect_size'] < results['ci_upper']
+    
+    def test_invalid_summary_measure(self, bcg_data):
+        """Test summary measures are checked against the analysis type"""
+        with pytest.raises(ValueError):
+            MetaAnalysisEngine(_settings(summary_measure='SMD')).run(bcg_data, 'binary')
+
+def _r_meta_available() -> bool:
+    if shutil.which('Rscript') is None:
+        return False
+    check = subprocess.run(['Rscript', '-e', 'library(meta)'], capture_output=True)
+    return check.returncode == 0
+
+R_SCRIPT = {
+    'continuous': 'metacont(n.e, mean.e, sd.e, n.c, mean.c, sd.c, data = d, sm = "{sm}", method.tau = "{tau}")',
+    'binary': 'metabin(event.e, n.e, event.c, n.c, data = d, sm = "{sm}", method = "Inverse", method.tau = "{tau}")',
+    'correlation': 'metacor(cor, n, data = d, sm = "{sm}", method.tau = "{tau}")',
+    'generic': 'metagen(TE, seTE, data = d, sm = "{sm}", method.tau = "{tau}")',
+}
+
+@pytest.mark.skipif(not _r_meta_available(), reason="R package meta not installed")
+@pytest.mark.parametrize("tau2_method", ['DL', 'REML', 'PM', 'ML', 'SJ'])
+@pytest.mark.parametrize("analysis_type,folder,filename,summary_measure", [
+    ('continuous', 'continuous', 'metacont_with_subgroup.xlsx', 'MD'),
+    ('continuous', 'continuous', 'metacont_with_subgroup.xlsx', 'SMD'),
+    ('binary', 'binary', 'metabin_with_subgroup.xlsx', 'OR'),
+    ('binary', 'binary', 'metabin_with_subgroup.xlsx', 'RR'),
+    ('binary', 'binary', 'metabin_with_subgroup.xlsx', 'RD'),
+    ('correlation', 'correlation', 'metacor_with_subgroup.xlsx', 'ZCOR'),
+    ('generic', 'inverse_variance', 'metagen_with_subgroup.xlsx', 'MD'),
+])
+def test_agreement_with_r_meta(tmp_path, analysis_type, folder, filename, summary_measure, tau2_method):
+    """Test the engine agrees with the R meta package"""
+    data = MetaAnalysisDataLoader().load_data(get_test_file_path(folder, filename), analysis_type)
+    csv = tmp_path / "data.csv"
+    data.to_csv(csv, index=False)
+    
+    call = R_SCRIPT[analysis_type].format(sm=summary_measure, tau=tau2_method)
+    script = (
+        f'suppressMessages(library(meta)); d <- read.csv("{csv}", check.names = FALSE); '
+        f'm <- {call}; '
+        'te.f <- if (is.null(m$TE.common)) m$TE.fixed else m$TE.common; '
+        'se.f <- if (is.null(m$seTE.common)) m$seTE.fixed else m$seTE.common; '
+        'cat(te.f, se.f, m$TE.random, m$seTE.random, m$tau2, m$Q, sep = "\\n")'
+    )
+    output = subprocess.run(['Rscript', '-e', script], capture_output=True, text=True, check=True)
+    expected = [float(x) for x in output.stdout.split()]
+    
+    effects = MetaAnalysisEngine(_settings(summary_measure=summary_measure)).effect_sizes(data, analysis_type)
+    result = pool_inverse(effects.te, effects.vi, summary_measure, tau2_method)
+    actual = [result.fixed.te, result.fixed.se, result.random.te, result.random.se, result.tau2, result.q]
+    
+    np.testing.assert_allclose(np.array(actual, dtype=float), expected, rtol=1e-6, atol=1e-10)